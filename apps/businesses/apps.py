@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class BusinessesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.businesses'
+
+    def ready(self):
+        # Import signals
+        try:
+            import apps.businesses.signals
+        except ImportError:
+            pass
@@ -0,0 +1,114 @@
+"""
+Dashboard snapshots
+
+Dashboard widgets poll their JSON endpoints every few seconds, and each poll
+used to recompute its figures. Dashboard payloads are now cached per tenant
+under the tenant's dashboard version, which combines:
+
+* the report ``data_version``, bumped when committed order, payment, refund,
+  expense or stock changes are folded into the report facts, and
+* the latest ``BusinessMetrics.updated_at``, which moves when a metrics
+  refresh writes rows (new customers, attendance, today's low stock).
+
+Both are read from the tenant database, so a write handled by one worker is
+seen by every other worker's next poll even when the cache is per process.
+
+A payload is built once per version and day. JSON endpoints also cache the
+serialised body with a strong ``ETag`` (a hash of the body) and answer a
+matching ``If-None-Match`` with ``304 Not Modified``, so an idle dashboard
+costs one or two cache reads per poll. ``DASHBOARD_SNAPSHOT_TIMEOUT`` bounds
+how long a snapshot is kept even when nothing bumps the version.
+"""
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, router
+from django.db.models import Max
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.http import parse_etags
+
+from apps.reports.fact_utils import data_version
+
+from .models import BusinessMetrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_TIMEOUT = 600
+
+
+def _timeout():
+    return getattr(settings, 'DASHBOARD_SNAPSHOT_TIMEOUT', DEFAULT_SNAPSHOT_TIMEOUT)
+
+
+# ================================
+# DASHBOARD VERSION
+# ================================
+
+def dashboard_version(db_alias=None):
+    """Version string that changes whenever a tenant's dashboard figures may have changed"""
+    db_alias = db_alias or router.db_for_read(BusinessMetrics)
+    try:
+        refreshed = BusinessMetrics.objects.using(db_alias).aggregate(latest=Max('updated_at'))['latest']
+    except DatabaseError as e:
+        logger.warning(f"Could not read dashboard version: {e}")
+        refreshed = None
+    return f"{data_version(db_alias)}.{refreshed.timestamp() if refreshed else 0}"
+
+
+# ================================
+# SNAPSHOTS
+# ================================
+
+def _snapshot_key(name, args):
+    db_alias = router.db_for_read(BusinessMetrics)
+    parts = [str(arg) for arg in args] + [timezone.localdate().isoformat(), dashboard_version(db_alias)]
+    return f"dashboard_snapshot:{db_alias}:{name}:{':'.join(parts)}"
+
+
+def cached_payload(name, build, *args):
+    """``build(*args)``, cached for the current tenant, dashboard version and day"""
+    key = _snapshot_key(name, args)
+    try:
+        payload = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Could not read dashboard snapshot {name}: {e}")
+        payload = None
+    if payload is None:
+        payload = build(*args)
+        try:
+            cache.set(key, payload, _timeout())
+        except Exception as e:
+            logger.warning(f"Could not store dashboard snapshot {name}: {e}")
+    return payload
+
+
+def _json_body(build):
+    def serialise(*args):
+        body = json.dumps(build(*args), cls=DjangoJSONEncoder).encode('utf-8')
+        return body, f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    return serialise
+
+
+def snapshot_response(request, name, build, *args):
+    """
+    JSON response for a cached dashboard payload.
+
+    The ETag is a hash of the exact body, so it is a strong validator; a
+    request whose ``If-None-Match`` lists it gets an empty 304.
+    """
+    body, etag = cached_payload(f"{name}:json", _json_body(build), *args)
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    # Browsers may keep the body but must revalidate on every poll
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,88 @@
+"""
+Management command to recompute daily business metrics for a date range
+"""
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from apps.core.tenant_models import Tenant
+from apps.core.database_router import TenantDatabaseManager, tenant_context
+
+
+class Command(BaseCommand):
+    help = 'Recompute BusinessMetrics rows for a date range, writing only days whose values changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            help='Specific tenant slug to backfill (backfills all active tenants if not specified)'
+        )
+        parser.add_argument(
+            '--date-from',
+            type=str,
+            help='First date to recompute (YYYY-MM-DD, defaults to 90 days ago)'
+        )
+        parser.add_argument(
+            '--date-to',
+            type=str,
+            help='Last date to recompute (YYYY-MM-DD, defaults to today)'
+        )
+        parser.add_argument(
+            '--chunk-days',
+            type=int,
+            default=31,
+            help='Days computed per batch of grouped queries (default: 31)'
+        )
+
+    def handle(self, *args, **options):
+        date_to = self._parse_date(options.get('date_to')) or timezone.localdate()
+        date_from = self._parse_date(options.get('date_from')) or date_to - timedelta(days=90)
+        if date_from > date_to:
+            raise CommandError('--date-from must not be after --date-to')
+        if options['chunk_days'] < 1:
+            raise CommandError('--chunk-days must be at least 1')
+
+        if options.get('tenant'):
+            tenants = Tenant.objects.filter(slug=options['tenant'])
+            if not tenants.exists():
+                raise CommandError(f"Tenant '{options['tenant']}' not found")
+        else:
+            tenants = Tenant.objects.filter(is_active=True)
+
+        for tenant in tenants:
+            self.backfill_tenant(tenant, date_from, date_to, options['chunk_days'])
+
+    def backfill_tenant(self, tenant, date_from, date_to, chunk_days):
+        """Recompute metrics for a single tenant database"""
+        from apps.businesses.metrics_utils import refresh_daily_metrics
+
+        TenantDatabaseManager.add_tenant_to_settings(tenant)
+
+        created = updated = 0
+        try:
+            with tenant_context(tenant):
+                start = date_from
+                while start <= date_to:
+                    end = min(start + timedelta(days=chunk_days - 1), date_to)
+                    chunk_created, chunk_updated = refresh_daily_metrics(start, end)
+                    created += chunk_created
+                    updated += chunk_updated
+                    start = end + timedelta(days=1)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"✓ {tenant.name}: {created} days created, {updated} updated "
+                    f"for {date_from} to {date_to}"
+                )
+            )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f"✗ {tenant.name}: {e}")
+            )
+
+    def _parse_date(self, value):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD")
@@ -0,0 +1,273 @@
+"""
+Daily business metrics
+
+``BusinessMetrics`` rows used to be recomputed and saved on every dashboard
+load, with separate count and sum queries per figure. Metrics for any date
+range are now computed with one conditional-aggregate query per source
+table (orders, payments, new customers, attendance), grouped by day, and a
+row is only written when one of its values changed.
+
+Order, payment, customer and attendance changes schedule a debounced
+refresh of the affected day: the first change starts a refresh
+``METRICS_REFRESH_DELAY`` seconds later, and further changes inside that
+window are folded into it. ``METRICS_REFRESH_BACKEND`` selects
+``'thread'`` (default) or ``'celery'``, like ``REPORT_JOB_BACKEND``.
+``manage.py backfill_business_metrics`` recomputes a date range in bulk.
+Writing any row moves the tenant's dashboard version (see ``dashboard_utils``).
+"""
+from datetime import timedelta
+from decimal import Decimal
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.core.database_router import TenantDatabaseManager, get_current_tenant, tenant_context
+from apps.core.tenant_models import Tenant
+
+from .models import BusinessMetrics
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0.00')
+
+# Statuses counted as completed work and revenue on the dashboard
+COMPLETED_STATUSES = ('completed', 'confirmed')
+PRESENT_STATUSES = ('present', 'late', 'half_day')
+
+METRIC_FIELDS = (
+    'total_services', 'completed_services', 'cancelled_services', 'gross_revenue',
+    'new_customers', 'total_customers_served',
+    'cash_payments', 'card_payments', 'mpesa_payments',
+    'total_employees_present', 'total_employees_absent',
+    'low_stock_items',
+)
+
+BULK_BATCH_SIZE = 500
+
+
+def _refresh_delay():
+    return getattr(settings, 'METRICS_REFRESH_DELAY', 30)
+
+
+def _backend():
+    return getattr(settings, 'METRICS_REFRESH_BACKEND', 'thread')
+
+
+# ================================
+# COMPUTATION
+# ================================
+
+def _by_day(queryset, date_field, **aggregates):
+    """``{date: {name: value}}`` for one grouped aggregate query"""
+    rows = queryset.annotate(day=TruncDate(date_field)).values('day').annotate(**aggregates).order_by()
+    return {row.pop('day'): row for row in rows}
+
+
+def compute_daily_metrics(start_date, end_date=None):
+    """
+    Metric values for every day from ``start_date`` to ``end_date``.
+
+    Returns ``{date: {field: value}}`` covering each day in the range, with
+    zeros for days without activity.
+    """
+    from apps.customers.models import Customer
+    from apps.employees.models import Attendance
+    from apps.payments.models import Payment
+    from apps.services.models import ServiceOrder
+
+    end_date = end_date or start_date
+    date_filter = {'created_at__date__range': [start_date, end_date]}
+
+    orders = _by_day(
+        ServiceOrder.objects.filter(**date_filter), 'created_at',
+        total_services=Count('id'),
+        completed_services=Count('id', filter=Q(status__in=COMPLETED_STATUSES)),
+        cancelled_services=Count('id', filter=Q(status='cancelled')),
+        gross_revenue=Sum('total_amount', filter=Q(status__in=COMPLETED_STATUSES)),
+        customers_served=Count('customer', distinct=True),
+    )
+    payments = _by_day(
+        Payment.objects.filter(status='completed', **date_filter), 'created_at',
+        cash_payments=Sum('amount', filter=Q(payment_method__method_type='cash')),
+        card_payments=Sum('amount', filter=Q(payment_method__method_type='card')),
+        mpesa_payments=Sum('amount', filter=Q(payment_method__method_type='mpesa')),
+    )
+    new_customers = _by_day(
+        Customer.objects.filter(**date_filter), 'created_at', new_customers=Count('id'),
+    )
+    attendance = {
+        row.pop('date'): row for row in Attendance.objects.filter(
+            date__range=[start_date, end_date]
+        ).values('date').annotate(
+            present=Count('id', filter=Q(status__in=PRESENT_STATUSES)),
+            absent=Count('id', filter=Q(status='absent')),
+        ).order_by()
+    }
+
+    # Low stock is a current snapshot, so only today's row carries it
+    today = timezone.localdate()
+    low_stock = None
+    if start_date <= today <= end_date:
+        from apps.inventory.models import InventoryItem
+        low_stock = InventoryItem.objects.filter(
+            is_active=True, current_stock__lte=F('minimum_stock_level')
+        ).count()
+
+    results = {}
+    day = start_date
+    while day <= end_date:
+        order = orders.get(day, {})
+        payment = payments.get(day, {})
+        new = new_customers.get(day, {}).get('new_customers', 0)
+        staff = attendance.get(day, {})
+        results[day] = {
+            'total_services': order.get('total_services', 0),
+            'completed_services': order.get('completed_services', 0),
+            'cancelled_services': order.get('cancelled_services', 0),
+            'gross_revenue': order.get('gross_revenue') or ZERO,
+            'new_customers': new,
+            'total_customers_served': max(new, order.get('customers_served', 0)),
+            'cash_payments': payment.get('cash_payments') or ZERO,
+            'card_payments': payment.get('card_payments') or ZERO,
+            'mpesa_payments': payment.get('mpesa_payments') or ZERO,
+            'total_employees_present': staff.get('present', 0),
+            'total_employees_absent': staff.get('absent', 0),
+        }
+        if day == today:
+            results[day]['low_stock_items'] = low_stock
+        day += timedelta(days=1)
+    return results
+
+
+def refresh_daily_metrics(start_date, end_date=None, user=None):
+    """
+    Recompute ``BusinessMetrics`` rows for a date range, writing only rows that changed.
+
+    Returns ``(created, updated)`` counts.
+    """
+    end_date = end_date or start_date
+    computed = compute_daily_metrics(start_date, end_date)
+    existing = {
+        metrics.date: metrics
+        for metrics in BusinessMetrics.objects.filter(date__range=[start_date, end_date])
+    }
+
+    now = timezone.now()
+    to_create, to_update = [], []
+    for day, values in computed.items():
+        metrics = existing.get(day)
+        if metrics is None:
+            metrics = BusinessMetrics(date=day, **values)
+            metrics.set_created_by(user)
+            metrics.set_updated_by(user)
+            to_create.append(metrics)
+            continue
+        if all(getattr(metrics, field) == value for field, value in values.items()):
+            continue
+        for field, value in values.items():
+            setattr(metrics, field, value)
+        metrics.updated_at = now
+        metrics.set_updated_by(user)
+        to_update.append(metrics)
+
+    if to_create or to_update:
+        db_alias = router.db_for_write(BusinessMetrics)
+        with transaction.atomic(using=db_alias):
+            # A concurrent refresh may create the same day; the next refresh reconciles it
+            BusinessMetrics.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+            BusinessMetrics.objects.bulk_update(
+                to_update, list(METRIC_FIELDS) + ['updated_at', 'updated_by_user_id'], batch_size=BULK_BATCH_SIZE
+            )
+    return len(to_create), len(to_update)
+
+
+def get_daily_metrics(day=None, user=None):
+    """The stored metrics row for ``day`` (default today), computing it if it does not exist yet"""
+    day = day or timezone.localdate()
+    metrics = BusinessMetrics.objects.filter(date=day).first()
+    if metrics is None:
+        refresh_daily_metrics(day, user=user)
+        metrics = BusinessMetrics.objects.filter(date=day).first() or BusinessMetrics(date=day)
+    return metrics
+
+
+# ================================
+# DEBOUNCED REFRESH
+# ================================
+
+def _pending_key(db_alias, day):
+    return f"business_metrics_pending:{db_alias}:{day.isoformat()}"
+
+
+def schedule_metrics_refresh(db_alias, dates):
+    """Refresh the given days shortly after the current transaction commits"""
+    dates = {day for day in dates if day is not None}
+    if not dates:
+        return
+
+    tenant = get_current_tenant()
+    tenant_id = str(tenant.id) if tenant else ''
+    delay = _refresh_delay()
+
+    def start():
+        for day in dates:
+            try:
+                # The key outlives the delay so a lost worker cannot block refreshes for long
+                if not cache.add(_pending_key(db_alias, day), 1, delay * 4):
+                    continue  # a refresh for this day is already pending
+            except Exception as e:
+                logger.warning(f"Cache add failed for metrics refresh {day}: {e}")
+            _start_refresh(tenant_id, db_alias, day, delay)
+
+    transaction.on_commit(start, using=db_alias)
+
+
+def _start_refresh(tenant_id, db_alias, day, delay):
+    if _backend() == 'celery':
+        try:
+            from .tasks import refresh_business_metrics
+            refresh_business_metrics.apply_async((tenant_id, db_alias, day.isoformat()), countdown=delay)
+            return
+        except Exception as e:
+            logger.warning(f"Could not queue metrics refresh for {day} on celery, using a timer: {e}")
+
+    timer = threading.Timer(delay, _refresh_in_thread, args=(tenant_id, db_alias, day))
+    timer.daemon = True
+    timer.start()
+
+
+def _refresh_in_thread(tenant_id, db_alias, day):
+    try:
+        run_metrics_refresh(tenant_id, db_alias, day)
+    finally:
+        connections.close_all()
+
+
+def run_metrics_refresh(tenant_id, db_alias, day):
+    """Run a scheduled refresh in the owning tenant's database"""
+    # Cleared first, so changes committed while this refresh runs schedule another one
+    try:
+        cache.delete(_pending_key(db_alias, day))
+    except Exception:
+        pass
+
+    try:
+        if not tenant_id:
+            return refresh_daily_metrics(day)
+
+        tenant = Tenant.objects.using('default').filter(id=tenant_id, is_active=True).first()
+        if tenant is None:
+            logger.error(f"Metrics refresh for {day}: tenant {tenant_id} not found")
+            return None
+        TenantDatabaseManager.add_tenant_to_settings(tenant)
+        with tenant_context(tenant):
+            return refresh_daily_metrics(day)
+    except Exception as e:
+        logger.error(f"Metrics refresh for {day} failed: {e}")
+        return None
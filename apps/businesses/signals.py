@@ -0,0 +1,43 @@
+"""
+Signals that keep daily BusinessMetrics current
+"""
+import logging
+
+from django.db import router
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from apps.customers.models import Customer
+from apps.employees.models import Attendance
+from apps.inventory.models import InventoryItem
+from apps.payments.models import Payment
+from apps.services.models import ServiceOrder
+
+logger = logging.getLogger(__name__)
+
+
+def _metrics_date(instance):
+    from apps.reports.fact_utils import local_date
+
+    if isinstance(instance, Attendance):
+        return instance.date
+    if isinstance(instance, InventoryItem):
+        # Stock levels only feed today's low stock count
+        return timezone.localdate()
+    return local_date(instance.created_at)
+
+
+def schedule_business_metrics(sender, instance, **kwargs):
+    """Debounced refresh of the day an order, payment, customer or attendance record belongs to"""
+    from .metrics_utils import schedule_metrics_refresh
+
+    try:
+        db_alias = instance._state.db or router.db_for_write(sender)
+        schedule_metrics_refresh(db_alias, [_metrics_date(instance)])
+    except Exception as e:
+        logger.error(f"Failed to schedule business metrics for {sender.__name__} {instance.pk}: {e}")
+
+
+for model in (ServiceOrder, Payment, Customer, Attendance, InventoryItem):
+    post_save.connect(schedule_business_metrics, sender=model, dispatch_uid=f'business_metrics_save_{model.__name__}')
+    post_delete.connect(schedule_business_metrics, sender=model, dispatch_uid=f'business_metrics_delete_{model.__name__}')
@@ -0,0 +1,17 @@
+from celery import shared_task
+from datetime import date
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def refresh_business_metrics(tenant_id, db_alias, day):
+    """
+    Recompute one day's BusinessMetrics in its tenant's database
+    Queued by metrics_utils.schedule_metrics_refresh when METRICS_REFRESH_BACKEND is 'celery'
+    """
+    from .metrics_utils import run_metrics_refresh
+
+    result = run_metrics_refresh(tenant_id, db_alias, date.fromisoformat(day))
+    return list(result) if result else None
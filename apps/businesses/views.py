@@ -16,6 +16,8 @@ from apps.core.decorators import employee_required, business_required
 from apps.core.utils import get_business_performance_metrics
 from apps.employees.models import Department, Employee
 from .models import BusinessMetrics, BusinessGoal, BusinessAlert, QuickAction, DashboardWidget
+from .dashboard_utils import cached_payload, snapshot_response
+from .metrics_utils import get_daily_metrics, refresh_daily_metrics
 from .utils import (
     get_orders_for_date, get_orders_for_date_range, get_completed_statuses,
     get_revenue_eligible_statuses, get_customers_for_date,
@@ -108,34 +110,12 @@ def get_business_urls(request):
 @employee_required()
 def dashboard_view(request):
     """Main business dashboard"""
-    today = timezone.now().date()
+    today = timezone.localdate()
     business = request.business
     employee = request.employee
     
-    # Get today's metrics - Use tenant-safe audit fields
-    today_metrics, created = BusinessMetrics.objects.get_or_create(
-        date=today,
-        defaults={
-            'new_customers': 0,
-            'returning_customers': 0,
-            'total_customers_served': 0,
-            'total_services': 0,
-            'completed_services': 0,
-            'gross_revenue': 0,
-        }
-    )
-    
-    # Set audit fields safely for new records
-    if created:
-        today_metrics.set_created_by(request.user)
-        today_metrics.set_updated_by(request.user)
-        today_metrics.save()
-    
-    if created or True:  # Always update for real-time data
-        update_daily_metrics(today_metrics, request.user)  # Pass user for audit trail
-    
-    # Refresh from database to get updated values
-    today_metrics.refresh_from_db()
+    # Today's metrics are kept current by order/payment signals; computed here only if missing
+    today_metrics = get_daily_metrics(today, request.user)
     
     # Quick stats for cards
     quick_stats = {
@@ -145,20 +125,8 @@ def dashboard_view(request):
         'employee_attendance': today_metrics.employee_attendance_rate,
     }
     
-    # Get recent performance data for charts
-    last_7_days = BusinessMetrics.objects.filter(
-        date__gte=today - timedelta(days=7)
-    ).order_by('date')
-    
-    # Revenue trend data
-    revenue_trend = []
-    for metric in last_7_days:
-        trend_data = {
-            'date': metric.date.strftime('%Y-%m-%d'),
-            'revenue': float(metric.gross_revenue),
-            'customers': metric.total_customers_served
-        }
-        revenue_trend.append(trend_data)
+    # Revenue trend data for the last 7 days, one entry per day
+    revenue_trend = get_revenue_trend(today - timedelta(days=7), today)
     
     # Convert revenue_trend to JSON string for template
     revenue_trend_json = json.dumps(revenue_trend)
@@ -314,16 +282,14 @@ def dashboard_view(request):
 
 
 def get_business_insights():
+    """Business insights from the tenant's dashboard snapshot"""
+    return cached_payload('insights', _build_business_insights)
+
+
+def _build_business_insights():
     """Get comprehensive business insights with optimized queries"""
     from django.apps import apps
     from decimal import Decimal
-    from django.core.cache import cache
-    
-    # Cache insights for 5 minutes to improve performance
-    cache_key = f'business_insights_{timezone.now().date()}'
-    cached_data = cache.get(cache_key)
-    if cached_data:
-        return cached_data
     
     insights = {
         'total_customers': 0,
@@ -383,8 +349,6 @@ def get_business_insights():
     except Exception as e:
         logger.error(f"Error in business insights: {e}")
     
-    # Cache for 5 minutes
-    cache.set(cache_key, insights, 300)
     return insights
 
 
@@ -465,51 +429,37 @@ def get_recent_activities(employee, limit=10):
     return activities[:limit]
 
 
+# Trend periods offered by the dashboard chart, in days
+TREND_PERIODS = (7, 30, 90)
+
+
 @login_required
 @employee_required()
 def dashboard_data_api(request):
-    """API endpoint for dashboard data updates"""
-    today = timezone.now().date()
-    period = request.GET.get('period', '7')
-    
-    # Get or update today's metrics
-    today_metrics, created = BusinessMetrics.objects.get_or_create(
-        date=today,
-        defaults={
-            'new_customers': 0,
-            'returning_customers': 0,
-            'total_customers_served': 0,
-            'total_services': 0,
-            'completed_services': 0,
-            'gross_revenue': 0,
-        }
-    )
+    """API endpoint for dashboard data updates; answers 304 while the snapshot is unchanged"""
+    # Calculate period for trend data; only the chart's periods, so snapshot keys stay bounded
+    try:
+        period_days = int(request.GET.get('period', '7'))
+    except (TypeError, ValueError):
+        period_days = 7
+    if period_days not in TREND_PERIODS:
+        period_days = 7
     
-    if created:
-        today_metrics.set_created_by(request.user)
-        today_metrics.set_updated_by(request.user)
+    return snapshot_response(
+        request, 'trend', lambda days: _build_dashboard_data(days, request.user), period_days
+    )
+
+
+def _build_dashboard_data(period_days, user=None):
+    """Revenue trend and today's figures for dashboard_data_api"""
+    today = timezone.localdate()
     
-    # Always update for real-time data
-    update_daily_metrics(today_metrics, request.user)
+    # Today's metrics are kept current by order/payment signals
+    today_metrics = get_daily_metrics(today, user)
     
-    # Calculate period for trend data
-    try:
-        period_days = int(period)
-    except:
-        period_days = 7    # Get trend data for the specified period
+    # Get trend data for the specified period
     start_date = today - timedelta(days=period_days)
-    period_metrics = BusinessMetrics.objects.filter(
-        date__gte=start_date
-    ).order_by('date')
-    
-    revenue_trend = [
-        {
-            'date': metric.date.strftime('%Y-%m-%d'),
-            'revenue': float(metric.gross_revenue),
-            'customers': metric.total_customers_served
-        }
-        for metric in period_metrics
-    ]
+    revenue_trend = get_revenue_trend(start_date, today)
     
     # Current metrics for real-time updates
     current_metrics = {
@@ -519,85 +469,50 @@ def dashboard_data_api(request):
         'employee_attendance': float(today_metrics.employee_attendance_rate),
     }
     
-    return JsonResponse({
+    return {
         'revenue_trend': revenue_trend,
         'current_metrics': current_metrics,
         **current_metrics,  # For backward compatibility
         'status': 'success'
-    })
+    }
+
+
+def get_revenue_trend(start_date, end_date):
+    """Daily revenue and customers served from stored metrics; days without a row are zero"""
+    from apps.reports.timeseries_utils import TimeSeries
+    
+    series = TimeSeries.from_rows(
+        BusinessMetrics.objects.filter(date__range=[start_date, end_date]).values(
+            'date', 'gross_revenue', 'total_customers_served'
+        ),
+        start_date, end_date,
+        revenue='gross_revenue', customers='total_customers_served',
+    )
+    return [
+        {'date': label, 'revenue': row['revenue'], 'customers': row['customers']}
+        for label, row in zip(series.labels(), series.rows('revenue', 'customers', integers=('customers',)))
+    ]
+
 
 def update_daily_metrics(metrics, user=None):
-    """Update daily metrics with optimized bulk queries"""
-    from django.apps import apps
-    from decimal import Decimal
-    
-    today = metrics.date
-    
-    try:
-        # Single aggregated query for all service metrics
-        ServiceOrder = apps.get_model('services', 'ServiceOrder')
-        service_stats = ServiceOrder.objects.filter(
-            created_at__date=today
-        ).aggregate(
-            total=Count('id'),
-            completed=Count('id', filter=Q(status__in=['completed', 'confirmed'])),
-            cancelled=Count('id', filter=Q(status='cancelled')),
-            revenue=Sum('total_amount', filter=Q(status__in=['completed', 'confirmed'])),
-            customers_served=Count('customer', distinct=True)
-        )
-        
-        metrics.total_services = service_stats['total'] or 0
-        metrics.completed_services = service_stats['completed'] or 0
-        metrics.cancelled_services = service_stats['cancelled'] or 0
-        metrics.gross_revenue = service_stats['revenue'] or Decimal('0.00')
-        
-        # Single query for new customers
-        Customer = apps.get_model('customers', 'Customer')
-        new_customers = Customer.objects.filter(
-            created_at__date=today
-        ).count()
-        metrics.new_customers = new_customers
-        
-        # Set total customers served (max of new customers or customers from orders)
-        metrics.total_customers_served = max(new_customers, service_stats['customers_served'] or 0)
-        
-        # Single query for low stock items (if inventory app available)
-        try:
-            InventoryItem = apps.get_model('inventory', 'InventoryItem')
-            low_stock = InventoryItem.objects.filter(
-                current_stock__lte=F('minimum_stock_level')
-            ).count()
-            metrics.low_stock_items = low_stock
-        except:
-            metrics.low_stock_items = 0
-        
-        # Employee attendance is calculated as a property, not set directly
-        # Default employee counts (could be enhanced with actual attendance tracking)
-        metrics.total_employees_present = 1  # Default to at least the current user
-        metrics.total_employees_absent = 0
-        
-    except Exception as e:
-        logger.error(f"Error in optimized daily metrics update: {e}")
-    
-    # Set audit fields safely
-    if user:
-        metrics.set_updated_by(user)
-    
-    metrics.save()
+    """Recompute a metrics row now, writing it only if its values changed"""
+    refresh_daily_metrics(metrics.date, user=user)
+    if metrics.pk:
+        metrics.refresh_from_db()
 
 
 def get_pending_dashboard_items(employee, request):
+    """Pending items from the tenant's dashboard snapshot; stock alerts only for owners and managers"""
+    return cached_payload(
+        'pending', _build_pending_dashboard_items, employee.role in ['owner', 'manager'], request.tenant.slug
+    )
+
+
+def _build_pending_dashboard_items(include_stock, tenant_slug):
     """Get pending items that need attention with optimized queries"""
-    # Cache pending items for better performance
-    cache_key = f'pending_items_{employee.id}_{timezone.now().date()}'
-    cached_data = cache.get(cache_key)
-    if cached_data:
-        return cached_data
-    
     from django.apps import apps
     
-    today = timezone.now().date()
-    tenant_slug = request.tenant.slug
+    today = timezone.localdate()
     
     pending_items = {
         'pending_orders': 0,
@@ -649,7 +564,7 @@ def get_pending_dashboard_items(employee, request):
             })
         
         # Low stock check for managers/owners only
-        if employee.role in ['owner', 'manager']:
+        if include_stock:
             try:
                 InventoryItem = apps.get_model('inventory', 'InventoryItem')
                 low_stock_count = InventoryItem.objects.filter(
@@ -672,74 +587,9 @@ def get_pending_dashboard_items(employee, request):
     except Exception as e:
         logger.error(f"Error in pending dashboard items: {e}")
     
-    # Cache for 2 minutes (shorter cache for real-time updates)
-    cache.set(cache_key, pending_items, 120)
     return pending_items
 
 
-@login_required
-@employee_required()
-def dashboard_data_api(request):
-    """API endpoint for dashboard data updates"""
-    today = timezone.now().date()
-    period = request.GET.get('period', '7')
-    
-    # Get or update today's metrics
-    today_metrics, created = BusinessMetrics.objects.get_or_create(
-        date=today,
-        defaults={
-            'new_customers': 0,
-            'returning_customers': 0,
-            'total_customers_served': 0,
-            'total_services': 0,
-            'completed_services': 0,
-            'gross_revenue': 0,
-        }
-    )
-    
-    if created:
-        today_metrics.set_created_by(request.user)
-        today_metrics.set_updated_by(request.user)
-    
-    # Always update for real-time data
-    update_daily_metrics(today_metrics, request.user)
-    
-    # Calculate period for trend data
-    try:
-        period_days = int(period)
-    except:
-        period_days = 7
-    
-    # Get trend data for the specified period
-    start_date = today - timedelta(days=period_days)
-    period_metrics = BusinessMetrics.objects.filter(
-        date__gte=start_date
-    ).order_by('date')
-    
-    revenue_trend = [
-        {
-            'date': metric.date.strftime('%Y-%m-%d'),
-            'revenue': float(metric.gross_revenue),
-            'customers': metric.total_customers_served
-        }
-        for metric in period_metrics
-    ]
-    
-    # Current metrics for real-time updates
-    current_metrics = {
-        'today_revenue': float(today_metrics.gross_revenue),
-        'today_customers': today_metrics.total_customers_served,
-        'today_services': today_metrics.completed_services,
-        'employee_attendance': float(today_metrics.employee_attendance_rate),
-    }
-    
-    return JsonResponse({
-        'revenue_trend': revenue_trend,
-        'current_metrics': current_metrics,
-        **current_metrics,  # For backward compatibility
-        'status': 'success'
-    })
-
 @login_required
 @employee_required()
 def analytics_view(request):
@@ -921,30 +771,22 @@ def resolve_alert(request, alert_id):
 @login_required
 @employee_required()
 def api_dashboard_data(request):
-    """API endpoint for dashboard data (for AJAX updates)"""
-    today = timezone.now().date()
-    employee = request.employee
+    """API endpoint for dashboard data (for AJAX updates); answers 304 while the snapshot is unchanged"""
+    return snapshot_response(request, 'today', lambda: _build_today_data(request.user))
+
+
+def _build_today_data(user=None):
+    # Today's key metrics, kept current by order/payment signals
+    today_metrics = get_daily_metrics(timezone.localdate(), user)
     
-    # Get today's key metrics - Use tenant-safe audit approach
-    try:
-        today_metrics = BusinessMetrics.objects.get(date=today)
-        update_daily_metrics(today_metrics, request.user)
-    except BusinessMetrics.DoesNotExist:
-        today_metrics = BusinessMetrics.objects.create(date=today)
-        today_metrics.set_created_by(request.user)
-        today_metrics.set_updated_by(request.user)
-        today_metrics.save()
-        update_daily_metrics(today_metrics, request.user)
-    
-    data = {
+    return {
         'today_revenue': float(today_metrics.gross_revenue),
         'today_customers': today_metrics.total_customers_served,
         'today_services': today_metrics.completed_services,
         'employee_attendance': float(today_metrics.employee_attendance_rate),
+        # When the snapshot was built, so it is part of the ETagged body
         'timestamp': timezone.now().isoformat()
     }
-    
-    return JsonResponse(data)
 
 
 
@@ -162,46 +162,25 @@ def user_role_context(request):
         if hasattr(request, 'tenant') and request.tenant:
             tenant = request.tenant
             
-            # Check if user is owner
-            if tenant.owner == request.user:
+            # Check if user is owner (compare ids so the owner is not loaded from the main database)
+            if tenant.owner_id == request.user.id:
                 context['user_role'] = 'owner'
                 context['is_owner'] = True
                 context['is_admin'] = True
                 context['is_manager'] = True
             else:
-                # Check if user is an employee
+                # Check if user is an employee (cached role, loaded once per session)
                 try:
-                    from apps.employees.models import Employee
-                    from apps.core.database_router import TenantDatabaseManager
+                    from apps.employees.role_utils import get_employee_role, get_request_employee, role_permissions
                     
-                    # Ensure tenant database is registered
-                    db_alias = f"tenant_{tenant.id}"
-                    TenantDatabaseManager.add_tenant_to_settings(tenant)
-                    
-                    employee = Employee.objects.using(db_alias).filter(
-                        user_id=request.user.id, 
-                        is_active=True
-                    ).first()
-                    
-                    if employee:
-                        context['user_role'] = employee.role
-                        context['is_owner'] = employee.role == 'owner'
-                        context['is_admin'] = employee.role in ['owner', 'manager']
-                        context['is_manager'] = employee.role in ['owner', 'manager']
-                        context['is_attendant'] = employee.role == 'attendant'
-                        context['is_supervisor'] = employee.role == 'supervisor'
-                        context['is_cashier'] = employee.role == 'cashier'
-                        context['is_cleaner'] = employee.role == 'cleaner'
-                        context['employee'] = employee
+                    role = get_employee_role(request)
+                    if role:
+                        context['user_role'] = role['role']
+                        context.update(role['permissions'])
+                        context['employee'] = get_request_employee(request)
                     else:
                         context['user_role'] = None
-                        context['is_owner'] = False
-                        context['is_admin'] = False
-                        context['is_manager'] = False
-                        context['is_attendant'] = False
-                        context['is_supervisor'] = False
-                        context['is_cashier'] = False
-                        context['is_cleaner'] = False
+                        context.update(role_permissions(None))
                         context['employee'] = None
                 except Exception as e:
                     # Handle database connection errors gracefully
@@ -72,19 +72,16 @@ def suspension_check_required(view_func):
                     print(f"Warning: Could not check subscription status for tenant {request.tenant.slug}: {e}")
                 pass
             
-            # Check employee suspension
+            # Check employee suspension (cached role, no query in steady state)
             try:
-                from apps.employees.models import Employee
-                employee = Employee.objects.filter(
-                    user_id=request.user.id,
-                    is_active=True
-                ).first()
+                from apps.employees.role_utils import get_employee_role, get_request_employee
                 
-                if employee and employee.status == 'suspended':
+                role = get_employee_role(request)
+                if role and role['status'] == 'suspended':
                     return render(request, 'suspension/employee_suspended.html', {
                         'suspension_type': 'employee',
                         'business': request.tenant,
-                        'employee': employee,
+                        'employee': get_request_employee(request),
                         'title': 'Employee Account Suspended',
                         'message': f'Your employee account at "{request.tenant.name}" has been suspended.',
                     })
@@ -106,119 +103,84 @@ def employee_required(roles=None):
             if not request.user.is_authenticated or not request.user.id:
                 return redirect('/auth/login/')
             
-            # Check if user is the business owner directly (fallback)
-            if hasattr(request, 'tenant') and request.tenant:
-                if request.tenant.owner_id == request.user.id:
-                    # User is the business owner, grant access
-                    try:
-                        from apps.employees.models import Employee
-                        from apps.core.database_router import TenantDatabaseManager
-                        
-                        # Ensure tenant database is registered in settings
-                        TenantDatabaseManager.add_tenant_to_settings(request.tenant)
-                        
-                        # Use the correct tenant database for owner employee record
-                        db_alias = f"tenant_{request.tenant.id}"
-                        
-                        # Try to get or create employee record for owner in tenant database
-                        employee, created = Employee.objects.using(db_alias).get_or_create(
-                            user_id=request.user.id,
-                            defaults={
-                                'employee_id': f'OWN{request.user.id}',
-                                'role': 'owner',
-                                'employment_type': 'full_time',
-                                'status': 'active',
-                                'is_active': True,
-                                'can_login': True,
-                                'hire_date': request.tenant.created_at.date(),
-                            }
-                        )
-                        if created:
-                            print(f"DEBUG: Auto-created employee record for business owner: {request.user.username}")
-                        else:
-                            print(f"DEBUG: Found existing employee record for owner: {employee.employee_id}")
-                        
-                        print(f"DEBUG: Owner employee role: {employee.role}, status: {employee.status}, active: {employee.is_active}")
-                        request.employee = employee
-                        return view_func(request, *args, **kwargs)
-                    except Exception as e:
-                        print(f"Error creating employee record for owner: {e}")
-                        # Continue with regular employee check
-                        pass
-                
-            try:
+            if not hasattr(request, 'tenant') or not request.tenant:
+                # Fallback to default database if no tenant (shouldn't happen)
                 from apps.employees.models import Employee
-                from apps.core.database_router import TenantDatabaseManager
                 
-                # Ensure tenant database is registered in settings
-                if hasattr(request, 'tenant') and request.tenant:
-                    TenantDatabaseManager.add_tenant_to_settings(request.tenant)
-                    
-                    # Use the correct tenant database
-                    db_alias = f"tenant_{request.tenant.id}"
-                    
-                    # FIX: Use user_id and tenant-specific database for cross-schema compatibility
-                    employee = Employee.objects.using(db_alias).get(user_id=request.user.id, is_active=True)
-                    print(f"DEBUG: Found regular employee: {employee.employee_id}, role: {employee.role}")
-                else:
-                    # Fallback to default database if no tenant (shouldn't happen)
-                    employee = Employee.objects.get(user_id=request.user.id, is_active=True)
-                    print(f"DEBUG: Found employee in default database: {employee.employee_id}")
-                
-                if not employee.is_active:
-                    print(f"DEBUG: Employee {employee.employee_id} is not active")
+                try:
+                    request.employee = Employee.objects.get(user_id=request.user.id, is_active=True)
+                except Employee.DoesNotExist:
                     return render(request, 'errors/access_denied.html', {
-                        'title': 'Account Inactive',
-                        'message': 'Your employee account is inactive.',
-                        'business': getattr(request, 'tenant', None),
-                        'employee': employee,
+                        'title': 'Not an Employee',
+                        'message': 'You are not registered as an employee in this business.',
+                        'business': None,
                     }, status=403)
-                
-                if not employee.can_login:
-                    return render(request, 'errors/access_denied.html', {
-                        'title': 'Login Disabled',
-                        'message': 'Your login access has been disabled. Please contact your manager.',
-                        'business': getattr(request, 'tenant', None),
-                        'employee': employee,
-                    }, status=403)
-                
-                if employee.status == 'suspended':
-                    return render(request, 'suspension/employee_suspended.html', {
-                        'suspension_type': 'employee',
-                        'business': getattr(request, 'tenant', None),
-                        'employee': employee,
-                        'title': 'Employee Account Suspended',
-                        'message': f'Your employee account has been suspended.',
-                    })
-                
-                if employee.status not in ['active']:
-                    return render(request, 'errors/access_denied.html', {
-                        'title': 'Account Not Active',
-                        'message': f'Your account status is "{employee.get_status_display()}". Only active employees can access the system.',
-                        'business': getattr(request, 'tenant', None),
-                        'employee': employee,
-                    }, status=403)
-                
-                if roles and employee.role not in roles:
-                    print(f"DEBUG: Role check failed. Required: {roles}, User has: {employee.role}")
-                    return render(request, 'errors/access_denied.html', {
-                        'title': 'Insufficient Permissions',
-                        'message': f'You need {" or ".join(roles)} role to access this page. Your current role is "{employee.get_role_display()}".',
-                        'business': getattr(request, 'tenant', None),
-                        'employee': employee,
-                    }, status=403)
-                
-                print(f"DEBUG: Role check passed. Required: {roles}, User has: {employee.role}")
-                request.employee = employee
                 return view_func(request, *args, **kwargs)
-                
-            except Employee.DoesNotExist:
-                print(f"DEBUG: No employee record found for user {request.user.id} in tenant {request.tenant.slug}")
+            
+            from apps.employees.models import Employee
+            from apps.employees.role_utils import get_employee_role, get_request_employee
+            
+            # Role, status and flags come from the session/shared cache; the row is loaded lazily
+            role = get_employee_role(request)
+            if role is None:
                 return render(request, 'errors/access_denied.html', {
                     'title': 'Not an Employee',
                     'message': 'You are not registered as an employee in this business.',
-                    'business': getattr(request, 'tenant', None),
+                    'business': request.tenant,
                 }, status=403)
+            
+            employee = get_request_employee(request)
+            
+            # The business owner is granted access directly
+            if role['is_owner']:
+                request.employee = employee
+                return view_func(request, *args, **kwargs)
+            
+            if not role['is_active']:
+                return render(request, 'errors/access_denied.html', {
+                    'title': 'Account Inactive',
+                    'message': 'Your employee account is inactive.',
+                    'business': request.tenant,
+                    'employee': employee,
+                }, status=403)
+            
+            if not role['can_login']:
+                return render(request, 'errors/access_denied.html', {
+                    'title': 'Login Disabled',
+                    'message': 'Your login access has been disabled. Please contact your manager.',
+                    'business': request.tenant,
+                    'employee': employee,
+                }, status=403)
+            
+            if role['status'] == 'suspended':
+                return render(request, 'suspension/employee_suspended.html', {
+                    'suspension_type': 'employee',
+                    'business': request.tenant,
+                    'employee': employee,
+                    'title': 'Employee Account Suspended',
+                    'message': f'Your employee account has been suspended.',
+                })
+            
+            if role['status'] not in ['active']:
+                status_display = dict(Employee.STATUS_CHOICES).get(role['status'], role['status'])
+                return render(request, 'errors/access_denied.html', {
+                    'title': 'Account Not Active',
+                    'message': f'Your account status is "{status_display}". Only active employees can access the system.',
+                    'business': request.tenant,
+                    'employee': employee,
+                }, status=403)
+            
+            if roles and role['role'] not in roles:
+                role_display = dict(Employee.ROLE_CHOICES).get(role['role'], role['role'])
+                return render(request, 'errors/access_denied.html', {
+                    'title': 'Insufficient Permissions',
+                    'message': f'You need {" or ".join(roles)} role to access this page. Your current role is "{role_display}".',
+                    'business': request.tenant,
+                    'employee': employee,
+                }, status=403)
+            
+            request.employee = employee
+            return view_func(request, *args, **kwargs)
                 
         return _wrapped_view
     return decorator
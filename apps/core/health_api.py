@@ -9,6 +9,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.cache import never_cache
 from django.db import connection
 from django.utils import timezone
+from apps.core.http_utils import provider_metrics
 import time
 
 
@@ -52,6 +53,20 @@ def health_check(request):
         }, status=500)
 
 
+@require_http_methods(["GET"])
+@never_cache
+def http_client_metrics(request):
+    """Per-provider HTTP call counts and latency, for staff only"""
+    if not (request.user.is_authenticated and request.user.is_staff):
+        return JsonResponse({'status': 'error', 'error': 'Staff access required'}, status=403)
+
+    return JsonResponse({
+        'status': 'ok',
+        'timestamp': timezone.now().isoformat(),
+        'http_clients': provider_metrics()
+    })
+
+
 @csrf_exempt  
 @require_http_methods(["GET"])
 @never_cache
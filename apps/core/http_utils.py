@@ -0,0 +1,167 @@
+"""
+Pooled HTTP client for payment and SMS providers
+
+``requests.get``/``requests.post`` open a new TCP+TLS connection per call.
+Provider calls go through one process-wide ``requests.Session`` per provider
+instead, whose adapters keep per-host keep-alive pools, with separate
+connect/read timeouts. Idempotent calls (GET by default, or ``retry=True``)
+are retried with jittered exponential backoff on connection errors and
+gateway errors; every call records per-provider latency in
+``provider_metrics()``.
+
+Usage::
+
+    response = http_post('mpesa', url, json=payload, headers=headers)
+"""
+import logging
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 20
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 20
+
+RETRY_ATTEMPTS = 2
+RETRY_BACKOFF = 0.3
+RETRY_STATUSES = (502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+SLOW_REQUEST_MS = 2000
+
+_sessions = {}
+_metrics = {}
+_lock = threading.Lock()
+
+
+def _timeout():
+    return (
+        getattr(settings, 'HTTP_CONNECT_TIMEOUT', CONNECT_TIMEOUT),
+        getattr(settings, 'HTTP_READ_TIMEOUT', READ_TIMEOUT),
+    )
+
+
+def _build_session():
+    session = requests.Session()
+    # Only re-establishing a connection is retried here; it sends nothing twice
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=Retry(total=1, connect=1, read=0, status=0, redirect=0),
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session(provider):
+    """Shared session for ``provider``, created on first use"""
+    session = _sessions.get(provider)
+    if session is None:
+        with _lock:
+            session = _sessions.get(provider)
+            if session is None:
+                session = _sessions[provider] = _build_session()
+    return session
+
+
+def close_sessions():
+    """Close every pooled connection, e.g. after forking a worker"""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+# ================================
+# METRICS
+# ================================
+
+def _record(provider, elapsed_ms, failed, retries):
+    with _lock:
+        stats = _metrics.setdefault(provider, {
+            'calls': 0, 'errors': 0, 'retries': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+        })
+        stats['calls'] += 1
+        stats['errors'] += int(failed)
+        stats['retries'] += retries
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+
+def provider_metrics():
+    """Per-provider call counts and latency for this process"""
+    with _lock:
+        return {
+            provider: {
+                'calls': stats['calls'],
+                'errors': stats['errors'],
+                'retries': stats['retries'],
+                'avg_ms': round(stats['total_ms'] / stats['calls'], 1) if stats['calls'] else 0,
+                'max_ms': round(stats['max_ms'], 1),
+            }
+            for provider, stats in _metrics.items()
+        }
+
+
+# ================================
+# REQUESTS
+# ================================
+
+def _retry_delay(attempt):
+    return RETRY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def http_request(provider, method, url, retry=None, timeout=None, **kwargs):
+    """
+    Send a request through the provider's pooled session.
+
+    ``retry`` defaults to True for idempotent methods; pass ``retry=True`` for
+    read-only POST APIs. Raises ``requests.RequestException`` like requests.
+    """
+    method = method.upper()
+    if retry is None:
+        retry = method in IDEMPOTENT_METHODS
+    attempts = RETRY_ATTEMPTS + 1 if retry else 1
+    session = get_session(provider)
+
+    start = time.monotonic()
+    attempt = 0
+    try:
+        while True:
+            try:
+                response = session.request(method, url, timeout=timeout or _timeout(), **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt + 1 >= attempts:
+                    raise
+                logger.warning(f"{provider} {method} {url} failed ({e}), retrying")
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt + 1 >= attempts:
+                    elapsed_ms = (time.monotonic() - start) * 1000
+                    _record(provider, elapsed_ms, response.status_code >= 500, attempt)
+                    if elapsed_ms > SLOW_REQUEST_MS:
+                        logger.warning(f"Slow {provider} request: {method} {url} took {elapsed_ms:.0f}ms")
+                    return response
+                logger.warning(f"{provider} {method} {url} returned {response.status_code}, retrying")
+
+            time.sleep(_retry_delay(attempt))
+            attempt += 1
+    except requests.RequestException:
+        _record(provider, (time.monotonic() - start) * 1000, True, attempt)
+        raise
+
+
+def http_get(provider, url, **kwargs):
+    return http_request(provider, 'GET', url, **kwargs)
+
+
+def http_post(provider, url, **kwargs):
+    return http_request(provider, 'POST', url, **kwargs)
@@ -0,0 +1,298 @@
+"""
+Idempotency keys for order creation and payment initiation
+
+Clients send an ``Idempotency-Key`` header (or an ``idempotency_key`` form
+field) with POSTs that must not run twice. The first request claims the key
+in the main database; retries with the same key replay the recorded response,
+and concurrent duplicates wait for the first request to finish instead of
+repeating its work. Failed attempts release the key so they can be retried.
+
+Usage::
+
+    @idempotent()
+    def quick_order_view(request): ...
+
+    call_idempotent('mpesa_stk', key, lambda: push(...))
+"""
+from datetime import timedelta
+from functools import wraps
+import hashlib
+import json
+import logging
+import time
+
+from django.contrib import messages
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import redirect
+from django.utils import timezone
+
+from .database_router import get_current_tenant
+from .tenant_models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+DB_ALIAS = 'default'
+HEADER_NAME = 'Idempotency-Key'
+FORM_FIELD = 'idempotency_key'
+MAX_KEY_LENGTH = 100
+
+DEFAULT_TTL = timedelta(hours=24)
+LOCK_TIMEOUT = timedelta(seconds=60)
+WAIT_TIMEOUT = 15
+POLL_INTERVAL = 0.25
+
+MAX_BODY_SIZE = 64 * 1024
+REPLAY_HEADERS = ('Content-Type', 'Location')
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different request"""
+
+
+class IdempotencyInProgress(Exception):
+    """The first request with this key is still running"""
+
+
+def get_idempotency_key(request):
+    """Key supplied by the client, or None"""
+    key = request.headers.get(HEADER_NAME) or request.POST.get(FORM_FIELD) or ''
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return None
+    return key
+
+
+def request_fingerprint(request):
+    """Hash of path, user and POST payload, so a key cannot be replayed for another request"""
+    payload = sorted(
+        (name, value)
+        for name, values in request.POST.lists()
+        if name not in (FORM_FIELD, 'csrfmiddlewaretoken')
+        for value in values
+    )
+    files = sorted((name, f.name, f.size) for name, f in request.FILES.items())
+    user_id = request.user.id if getattr(request, 'user', None) and request.user.is_authenticated else None
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps([request.path, user_id, payload, files], default=str).encode())
+    return digest.hexdigest()
+
+
+def _tenant_id():
+    tenant = get_current_tenant()
+    return str(tenant.id) if tenant else ''
+
+
+def _keys():
+    return IdempotencyKey.objects.using(DB_ALIAS)
+
+
+# ================================
+# KEY LIFECYCLE
+# ================================
+
+def claim(scope, key, fingerprint='', user_id=None, ttl=DEFAULT_TTL,
+          lock_timeout=LOCK_TIMEOUT, wait=WAIT_TIMEOUT):
+    """
+    Claim ``key`` for ``scope`` in the current tenant.
+
+    Returns ``(record, True)`` when the caller owns the key and must do the
+    work, or ``(record, False)`` when a completed result should be replayed.
+    Waits up to ``wait`` seconds for an in-flight duplicate to finish.
+    """
+    tenant_id = _tenant_id()
+    deadline = time.monotonic() + wait
+
+    while True:
+        now = timezone.now()
+        try:
+            with transaction.atomic(using=DB_ALIAS):
+                record = _keys().create(
+                    tenant_id=tenant_id,
+                    scope=scope,
+                    key=key,
+                    fingerprint=fingerprint,
+                    user_id=user_id,
+                    locked_until=now + lock_timeout,
+                    expires_at=now + ttl,
+                )
+            return record, True
+        except IntegrityError:
+            pass
+
+        record = _keys().filter(tenant_id=tenant_id, scope=scope, key=key).first()
+        if record is None:
+            # Released between our insert and read
+            continue
+
+        if record.expires_at <= now:
+            _keys().filter(pk=record.pk, expires_at__lte=now).delete()
+            continue
+
+        if fingerprint and record.fingerprint and record.fingerprint != fingerprint:
+            raise IdempotencyConflict(f"Idempotency key '{key}' was used for a different request")
+
+        if record.status == 'completed':
+            return record, False
+
+        if record.locked_until <= now:
+            # The first request died or overran its lock; take the key over
+            taken = _keys().filter(
+                pk=record.pk, status='processing', locked_until=record.locked_until
+            ).update(locked_until=now + lock_timeout)
+            if taken:
+                record.locked_until = now + lock_timeout
+                return record, True
+            continue
+
+        if time.monotonic() >= deadline:
+            raise IdempotencyInProgress(f"Request with idempotency key '{key}' is still processing")
+        time.sleep(POLL_INTERVAL)
+
+
+def complete(record, status=200, headers=None, body=''):
+    """Record the result so retries replay it"""
+    _keys().filter(pk=record.pk).update(
+        status='completed',
+        response_status=status,
+        response_headers=headers or {},
+        response_body=body,
+    )
+
+
+def release(record):
+    """Drop an unfinished claim so the request can be retried"""
+    _keys().filter(pk=record.pk, status='processing').delete()
+
+
+def purge_expired_keys():
+    """Delete expired keys, returning how many were removed"""
+    deleted, _ = _keys().filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+# ================================
+# VIEWS
+# ================================
+
+def _is_ajax(request):
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+
+def _is_replayable(response):
+    """Only successful redirects and JSON results are recorded; failures are retried"""
+    if getattr(response, 'streaming', False) or response.status_code >= 400:
+        return False
+    if 300 <= response.status_code < 400:
+        return True
+    if 'application/json' not in response.get('Content-Type', ''):
+        return False
+    if len(response.content) > MAX_BODY_SIZE:
+        return False
+    try:
+        data = json.loads(response.content)
+    except ValueError:
+        return False
+    return not (isinstance(data, dict) and data.get('success') is False)
+
+
+def _replay(request, record):
+    response = HttpResponse(record.response_body, status=record.response_status or 200)
+    for header, value in (record.response_headers or {}).items():
+        response[header] = value
+    response['Idempotent-Replayed'] = 'true'
+    if not _is_ajax(request) and 300 <= response.status_code < 400:
+        messages.info(request, 'This request was already processed.')
+    return response
+
+
+def _refuse(request, status, message):
+    if _is_ajax(request):
+        response = JsonResponse({'success': False, 'message': message}, status=status)
+        if status == 409:
+            response['Retry-After'] = '2'
+        return response
+    messages.warning(request, message)
+    return redirect(request.META.get('HTTP_REFERER') or request.path)
+
+
+def idempotent(scope=None, ttl=DEFAULT_TTL, methods=('POST',)):
+    """
+    View decorator replaying the first response for a repeated idempotency key.
+
+    Requests without a key run normally, as do requests made while the key
+    store is unavailable.
+    """
+    def decorator(view_func):
+        view_scope = scope or f"{view_func.__module__}.{view_func.__name__}"
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            key = get_idempotency_key(request) if request.method in methods else None
+            if not key:
+                return view_func(request, *args, **kwargs)
+
+            user_id = request.user.id if request.user.is_authenticated else None
+            try:
+                record, owner = claim(view_scope, key, request_fingerprint(request), user_id, ttl)
+            except IdempotencyConflict:
+                return _refuse(request, 422, 'This request key was already used for a different request.')
+            except IdempotencyInProgress:
+                return _refuse(request, 409, 'This request is still being processed. Please wait.')
+            except DatabaseError as e:
+                logger.warning(f"Idempotency store unavailable for {view_scope}: {e}")
+                return view_func(request, *args, **kwargs)
+
+            if not owner:
+                logger.info(f"Replaying idempotent response for {view_scope} key {key}")
+                return _replay(request, record)
+
+            try:
+                response = view_func(request, *args, **kwargs)
+            except Exception:
+                release(record)
+                raise
+
+            if _is_replayable(response):
+                headers = {header: response[header] for header in REPLAY_HEADERS if response.has_header(header)}
+                body = '' if 300 <= response.status_code < 400 else response.content.decode(response.charset)
+                complete(record, response.status_code, headers, body)
+            else:
+                release(record)
+            return response
+
+        return _wrapped_view
+    return decorator
+
+
+# ================================
+# SERVICE CALLS
+# ================================
+
+def call_idempotent(scope, key, func, fingerprint='', ttl=DEFAULT_TTL, replayable=None):
+    """
+    Run ``func`` once per key, replaying its JSON-serialisable result on retries.
+
+    ``replayable(result)`` decides whether a result is recorded; results it
+    rejects release the key so the call can be retried.
+    """
+    if not key:
+        return func()
+
+    record, owner = claim(scope, key, fingerprint)
+    if not owner:
+        return json.loads(record.response_body)
+
+    try:
+        result = func()
+    except Exception:
+        release(record)
+        raise
+
+    if replayable is None or replayable(result):
+        complete(record, body=json.dumps(result, cls=DjangoJSONEncoder))
+    else:
+        release(record)
+    return result
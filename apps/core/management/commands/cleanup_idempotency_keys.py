@@ -0,0 +1,22 @@
+"""
+Django management command to purge expired idempotency keys
+Schedule it (cron or celery beat) to keep the key table small
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys whose replay window has expired'
+
+    def handle(self, *args, **options):
+        from apps.core.idempotency_utils import purge_expired_keys
+
+        try:
+            deleted = purge_expired_keys()
+            self.stdout.write(
+                self.style.SUCCESS(f'✓ Removed {deleted} expired idempotency keys')
+            )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'✗ Failed to purge idempotency keys: {e}')
+            )
@@ -0,0 +1,80 @@
+"""
+Django management command to run periodic jobs in every tenant database
+Use it from cron where celery beat is not available, e.g. nightly:
+    python manage.py run_tenant_jobs reports.kpi_values expenses.budget_spent
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Run registered periodic jobs for every active tenant and report per-tenant timings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'jobs',
+            nargs='*',
+            help='Job names to run (see --list)'
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='List the registered job names'
+        )
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            help='Specific tenant slug (runs all active tenants if not specified)'
+        )
+        parser.add_argument(
+            '--shards',
+            type=int,
+            help='Number of shards to split tenants into (default: TENANT_JOB_SHARDS)'
+        )
+        parser.add_argument(
+            '--time-limit',
+            type=int,
+            help='Seconds after which a shard stops starting new tenants'
+        )
+
+    def handle(self, *args, **options):
+        from apps.core.scheduler_utils import TENANT_JOBS, run_tenant_jobs
+
+        if options['list']:
+            for name, path in TENANT_JOBS.items():
+                self.stdout.write(f"{name}  ({path})")
+            return
+
+        if not options['jobs']:
+            raise CommandError('Name at least one job, or use --list')
+        unknown = [name for name in options['jobs'] if name not in TENANT_JOBS]
+        if unknown:
+            raise CommandError(f"Unknown jobs: {', '.join(unknown)}")
+
+        outcome = run_tenant_jobs(
+            options['jobs'],
+            shards=options.get('shards'),
+            time_limit=options.get('time_limit'),
+            tenant_slug=options.get('tenant'),
+        )
+
+        if 'queued' in outcome:
+            self.stdout.write(
+                self.style.SUCCESS(f"✓ Queued {len(outcome['queued'])} shards for {outcome['tenants']} tenants")
+            )
+            return
+
+        for summary in outcome['shards']:
+            for report in summary['tenants']:
+                if report['errors']:
+                    self.stdout.write(
+                        self.style.ERROR(f"✗ {report['tenant']} ({report['seconds']}s): {report['errors']}")
+                    )
+                else:
+                    self.stdout.write(
+                        self.style.SUCCESS(f"✓ {report['tenant']} ({report['seconds']}s): {report['results']}")
+                    )
+            if summary['skipped']:
+                self.stdout.write(
+                    self.style.WARNING(f"Skipped {len(summary['skipped'])} tenants after the time limit")
+                )
+        self.stdout.write(f"{outcome['tenants']} tenants processed")
@@ -0,0 +1,209 @@
+"""
+Shared OAuth client-credential tokens
+
+Tokens are kept in process memory and in the shared cache. A token close to
+expiry is still returned while one background thread refreshes it, so
+payment calls do not wait on an OAuth round trip. Refreshes are single-flight:
+one thread per process holds a local lock, and one process holds a lock key
+in the shared cache while the others wait for its result. If a refresh fails,
+the last good token is used until it actually expires. A token the provider
+rejects with 401 is dropped and the call is retried once with a new one
+(``send_with_token``).
+
+Usage::
+
+    token = get_mpesa_token(base_url, consumer_key, consumer_secret, 'gateway_1')
+"""
+import base64
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+
+from .http_utils import http_get
+
+logger = logging.getLogger(__name__)
+
+REFRESH_MARGIN = 300
+EXPIRY_MARGIN = 30
+LOCK_TIMEOUT = 30
+WAIT_TIMEOUT = 10
+POLL_INTERVAL = 0.1
+
+_tokens = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def _cache_key(name):
+    return f"oauth_token:{name}"
+
+
+def _lock_for(name):
+    with _registry_lock:
+        return _locks.setdefault(name, threading.Lock())
+
+
+def _usable(entry, margin):
+    return bool(entry) and entry['expires_at'] - margin > time.time()
+
+
+def _read_shared(name):
+    try:
+        return cache.get(_cache_key(name))
+    except Exception as e:
+        logger.warning(f"Cache get failed for token {name}: {e}")
+        return None
+
+
+def _store(name, token, expires_in):
+    entry = {'token': token, 'expires_at': time.time() + expires_in}
+    _tokens[name] = entry
+    try:
+        cache.set(_cache_key(name), entry, max(int(expires_in), 1))
+    except Exception as e:
+        logger.warning(f"Cache set failed for token {name}: {e}")
+    return entry
+
+
+def _latest(name):
+    """Newest of the in-process and shared copies"""
+    local, shared = _tokens.get(name), _read_shared(name)
+    if shared and (not local or shared['expires_at'] > local['expires_at']):
+        _tokens[name] = shared
+        return shared
+    return local
+
+
+def _wait_for_shared(name, deadline):
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = _read_shared(name)
+        if _usable(entry, REFRESH_MARGIN):
+            _tokens[name] = entry
+            return entry
+    return None
+
+
+def _refresh(name, fetch):
+    """Fetch a new token unless another thread or process already did"""
+    with _lock_for(name):
+        entry = _latest(name)
+        if _usable(entry, REFRESH_MARGIN):
+            return entry
+
+        lock_key = f"{_cache_key(name)}:lock"
+        try:
+            owner = cache.add(lock_key, 1, LOCK_TIMEOUT)
+        except Exception:
+            owner = True
+
+        if not owner:
+            waited = _wait_for_shared(name, time.monotonic() + WAIT_TIMEOUT)
+            if waited:
+                return waited
+            # The other refresher stalled or failed; fall through and fetch
+
+        try:
+            token, expires_in = fetch()
+            return _store(name, token, expires_in)
+        except Exception as e:
+            if _usable(entry, EXPIRY_MARGIN):
+                logger.warning(f"Token refresh for {name} failed, using last good token: {e}")
+                return entry
+            raise
+        finally:
+            if owner:
+                try:
+                    cache.delete(lock_key)
+                except Exception:
+                    pass
+
+
+def _refresh_in_background(name, fetch):
+    lock = _lock_for(name)
+    if lock.locked():
+        return
+
+    def run():
+        try:
+            _refresh(name, fetch)
+        except Exception as e:
+            logger.warning(f"Background token refresh for {name} failed: {e}")
+
+    threading.Thread(target=run, name=f"token-refresh-{name}", daemon=True).start()
+
+
+def get_token(name, fetch):
+    """
+    Access token for ``name``; ``fetch()`` returns ``(token, expires_in)``.
+
+    Raises whatever ``fetch`` raised when no valid token is available.
+    """
+    entry = _tokens.get(name)
+    if not _usable(entry, REFRESH_MARGIN):
+        entry = _latest(name)
+
+    if _usable(entry, REFRESH_MARGIN):
+        return entry['token']
+
+    if _usable(entry, EXPIRY_MARGIN):
+        # Still valid: serve it and refresh ahead of expiry
+        _refresh_in_background(name, fetch)
+        return entry['token']
+
+    return _refresh(name, fetch)['token']
+
+
+def invalidate_token(name):
+    """Forget a token the provider rejected"""
+    _tokens.pop(name, None)
+    try:
+        cache.delete(_cache_key(name))
+    except Exception as e:
+        logger.warning(f"Cache delete failed for token {name}: {e}")
+
+
+def send_with_token(name, token, send):
+    """
+    ``send(token())``; when the provider answers 401 the token ``name`` is
+    dropped and the call is sent once more with a freshly fetched token.
+
+    A 401 is returned before the request is processed, so resending is safe
+    even for calls that are otherwise never retried.
+    """
+    response = send(token())
+    if response.status_code == 401:
+        logger.warning(f"Token {name} was rejected, fetching a new one")
+        invalidate_token(name)
+        response = send(token())
+    return response
+
+
+# ================================
+# M-PESA
+# ================================
+
+def mpesa_token_name(name):
+    return f"mpesa:{name}"
+
+
+def get_mpesa_token(base_url, consumer_key, consumer_secret, name):
+    """Daraja OAuth token for one set of consumer credentials"""
+    def fetch():
+        auth_b64 = base64.b64encode(f"{consumer_key}:{consumer_secret}".encode('ascii')).decode('ascii')
+        response = http_get(
+            'mpesa',
+            f"{base_url}/oauth/v1/generate?grant_type=client_credentials",
+            headers={'Authorization': f'Basic {auth_b64}', 'Content-Type': 'application/json'},
+        )
+        if response.status_code != 200:
+            logger.error(f"M-Pesa token request failed: {response.status_code} - {response.text}")
+        response.raise_for_status()
+
+        data = response.json()
+        logger.info(f"Fetched M-Pesa access token for {name}")
+        return data['access_token'], int(data.get('expires_in', 3600))
+
+    return get_token(mpesa_token_name(name), fetch)
@@ -0,0 +1,289 @@
+"""
+Keyset (cursor) pagination for large tenant lists
+
+``Paginator`` needs a ``COUNT(*)`` over the filtered queryset and an
+``OFFSET`` scan that grows with the page number. ``KeysetPaginator`` instead
+seeks past the last row of the current page using its sort key, so every page
+costs the same as the first. Cursors are opaque strings carried in the
+``cursor`` query parameter; totals are only computed when a template asks for
+``paginator.count``; they are live by default and a view can opt in to
+cached or estimated totals.
+
+Sort keys must be non-nullable fields or annotations, and the primary key is
+appended as a tie-breaker when the ordering does not already end with it.
+"""
+import base64
+import datetime
+import hashlib
+import json
+import logging
+
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router
+from django.db.models import Q
+from django.http import QueryDict
+from django.utils.functional import cached_property
+
+logger = logging.getLogger(__name__)
+
+CURSOR_PARAM = 'cursor'
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Keeps full microsecond precision, which seeks on timestamps depend on"""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded for the paginator's ordering"""
+
+
+class KeysetPage:
+    """One page of results; iterable like ``django.core.paginator.Page``"""
+
+    def __init__(self, object_list, paginator, has_next, has_previous,
+                 next_cursor=None, previous_cursor=None, params=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.params = params if params is not None else QueryDict(mutable=True)
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self.object_list)} items>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def _query_for(self, cursor):
+        params = self.params.copy()
+        params[CURSOR_PARAM] = cursor
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        """Query string (without '?') for the next page, keeping current filters"""
+        return self._query_for(self.next_cursor) if self._has_next else ''
+
+    @property
+    def previous_query(self):
+        return self._query_for(self.previous_cursor) if self._has_previous else ''
+
+    @property
+    def first_query(self):
+        return self.params.urlencode()
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by seeking on its ordering instead of using OFFSET.
+
+    ``ordering`` defaults to the queryset's explicit ``order_by()``. Pass
+    ``approximate_count=True`` to read unfiltered totals from table statistics
+    (MySQL) and ``count_cache_timeout`` (seconds) to cache exact counts per
+    query; by default the count is live.
+    """
+
+    def __init__(self, queryset, per_page, ordering=None, approximate_count=False,
+                 count_cache_timeout=None):
+        ordering = list(ordering or queryset.query.order_by or queryset.model._meta.ordering)
+        if not ordering:
+            raise ValueError('KeysetPaginator requires an ordered queryset')
+
+        self.model = queryset.model
+        pk_name = self.model._meta.pk.name
+        last_key = ordering[-1].lstrip('-')
+        if last_key not in ('pk', pk_name):
+            ordering.append('-pk' if ordering[-1].startswith('-') else 'pk')
+
+        self.keys = [(key.lstrip('-'), key.startswith('-')) for key in ordering]
+        self.queryset = queryset.order_by(*ordering)
+        self.per_page = int(per_page)
+        self.approximate_count = approximate_count
+        self.count_cache_timeout = count_cache_timeout
+
+    # ----------------------------------------------------------------
+    # Cursors
+    # ----------------------------------------------------------------
+
+    def _key_field(self, name):
+        if name == 'pk':
+            return self.model._meta.pk
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        try:
+            return self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise ValueError(f"Cannot paginate on '{name}': not a field or annotation")
+
+    def _key_values(self, obj):
+        return [getattr(obj, name) for name, _ in self.keys]
+
+    def encode_cursor(self, values, direction):
+        payload = json.dumps({'v': values, 'd': direction}, cls=CursorEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Return (values, direction) or raise InvalidCursor"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            raw_values, direction = payload['v'], payload['d']
+        except (ValueError, KeyError, TypeError) as e:
+            raise InvalidCursor(str(e))
+
+        if direction not in ('next', 'prev') or len(raw_values) != len(self.keys):
+            raise InvalidCursor('Cursor does not match this ordering')
+        try:
+            values = [
+                self._key_field(name).to_python(value)
+                for (name, _), value in zip(self.keys, raw_values)
+            ]
+        except Exception as e:
+            raise InvalidCursor(str(e))
+        return values, direction
+
+    def _seek(self, values, forward):
+        """
+        Rows strictly after ``values`` in the given direction.
+
+        Expands the row comparison into ``(a > x) OR (a = x AND b > y) ...``
+        and adds a range bound on the leading key so the index is used.
+        """
+        condition = None
+        for i, (name, descending) in enumerate(self.keys):
+            lookup = 'lt' if descending == forward else 'gt'
+            clause = Q(**{f'{name}__{lookup}': values[i]})
+            for j, (prior_name, _) in enumerate(self.keys[:i]):
+                clause &= Q(**{prior_name: values[j]})
+            condition = clause if condition is None else condition | clause
+
+        lead_name, lead_descending = self.keys[0]
+        bound = 'lte' if lead_descending == forward else 'gte'
+        return Q(**{f'{lead_name}__{bound}': values[0]}) & condition
+
+    def after(self, values):
+        """The ordered queryset restricted to rows after ``values``, for chunked scans"""
+        return self.queryset.filter(self._seek(values, True))
+
+    # ----------------------------------------------------------------
+    # Pages
+    # ----------------------------------------------------------------
+
+    def get_page(self, params=None):
+        """
+        Return the page addressed by ``params[CURSOR_PARAM]`` (a request.GET).
+
+        Missing or invalid cursors return the first page.
+        """
+        params = params.copy() if params is not None else QueryDict(mutable=True)
+        cursor = params.pop(CURSOR_PARAM, [None])[-1]
+        params.pop('page', None)
+
+        values, direction = None, 'next'
+        if cursor:
+            try:
+                values, direction = self.decode_cursor(cursor)
+            except InvalidCursor:
+                logger.debug(f"Ignoring invalid pagination cursor: {cursor}")
+                values, direction = None, 'next'
+
+        forward = direction == 'next'
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, forward))
+        if not forward:
+            queryset = queryset.reverse()
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if forward:
+            has_next, has_previous = has_more, values is not None
+        else:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+
+        next_cursor = previous_cursor = None
+        if rows:
+            next_cursor = self.encode_cursor(self._key_values(rows[-1]), 'next')
+            previous_cursor = self.encode_cursor(self._key_values(rows[0]), 'prev')
+        else:
+            has_next = has_previous = False
+
+        return KeysetPage(rows, self, has_next, has_previous, next_cursor, previous_cursor, params)
+
+    # ----------------------------------------------------------------
+    # Counts
+    # ----------------------------------------------------------------
+
+    @cached_property
+    def count(self):
+        """Total rows; live unless the paginator opted in to estimates or caching"""
+        queryset = self.queryset.order_by()
+
+        if self.approximate_count and not queryset.query.where:
+            estimate = self._estimated_table_rows()
+            if estimate is not None:
+                return estimate
+
+        if not self.count_cache_timeout:
+            return queryset.count()
+
+        db_alias = router.db_for_read(self.model)
+        try:
+            sql, sql_params = queryset.query.sql_with_params()
+        except Exception:
+            return queryset.count()
+        digest = hashlib.md5(f"{db_alias}:{sql}:{sql_params}".encode()).hexdigest()
+        cache_key = f"keyset_count:{digest}"
+
+        count = cache.get(cache_key)
+        if count is None:
+            count = queryset.count()
+            cache.set(cache_key, count, self.count_cache_timeout)
+        return count
+
+    def _estimated_table_rows(self):
+        """Row estimate from MySQL table statistics, or None on other backends"""
+        db_alias = router.db_for_read(self.model)
+        connection = connections[db_alias]
+        if connection.vendor != 'mysql':
+            return None
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                    [self.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            return int(row[0]) if row and row[0] is not None else None
+        except Exception as e:
+            logger.warning(f"Could not estimate row count for {self.model._meta.db_table}: {e}")
+            return None
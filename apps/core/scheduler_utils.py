@@ -0,0 +1,176 @@
+"""
+Tenant-aware periodic jobs
+
+Periodic work (scheduled reports, KPIs, recurring expenses, budgets, ...)
+lives in each tenant's database, so a celery beat task that queries models
+directly only ever sees the default database. Jobs are registered here by
+name and run through ``run_tenant_jobs``:
+
+* active tenants are split into shards, one celery task per shard
+  (``TENANT_JOB_BACKEND = 'celery'``), or run in-process
+  (``'inline'``, the default);
+* each tenant is entered once per shard, all requested jobs run back to back
+  on its connection, and the connection is closed before the next tenant;
+* every tenant's duration, results and errors are logged and returned;
+* a shard stops starting new tenants once its ``time_limit`` is spent, so a
+  run finishes within a bounded window. Skipped tenants are reported, and
+  each shard's order is shuffled per run so the same tenants are not always
+  the ones left at the tail.
+
+Usage::
+
+    run_tenant_jobs(['expenses.recurring_expenses', 'expenses.budget_spent'])
+"""
+import json
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from .database_router import TenantDatabaseManager, tenant_context
+from .tenant_models import Tenant
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARDS = 4
+
+# Job name -> callable run inside a tenant's database context
+TENANT_JOBS = {
+    'reports.scheduled_reports': 'apps.reports.utils.generate_scheduled_reports',
+    'reports.kpi_values': 'apps.reports.utils.update_kpi_values',
+    'expenses.recurring_expenses': 'apps.expenses.tasks.create_due_recurring_expenses',
+    'expenses.budget_spent': 'apps.expenses.tasks.refresh_budget_spent_amounts',
+    'expenses.inventory_links': 'apps.expenses.tasks.link_inventory_expenses',
+    'expenses.commission_links': 'apps.expenses.tasks.link_commission_expenses',
+    'expenses.overdue': 'apps.expenses.tasks.find_overdue_expenses',
+    'expenses.monthly_report': 'apps.expenses.tasks.build_monthly_expense_report',
+    'expenses.cleanup': 'apps.expenses.tasks.purge_old_expense_data',
+}
+
+
+def _backend():
+    return getattr(settings, 'TENANT_JOB_BACKEND', 'inline')
+
+
+def _job(name):
+    if name not in TENANT_JOBS:
+        raise ValueError(f"Unknown tenant job: {name}")
+    return import_string(TENANT_JOBS[name])
+
+
+def _plain(value):
+    """Job results as JSON-safe data, so shard reports survive the celery result backend"""
+    return json.loads(json.dumps(value, cls=DjangoJSONEncoder))
+
+
+def active_tenant_ids(tenant_slug=None):
+    tenants = Tenant.objects.using('default').filter(is_active=True)
+    if tenant_slug:
+        tenants = tenants.filter(slug=tenant_slug)
+    return [str(tenant_id) for tenant_id in tenants.order_by('id').values_list('id', flat=True)]
+
+
+def shard(items, count):
+    """Split ``items`` round-robin into at most ``count`` non-empty shards"""
+    count = max(1, min(count, len(items)))
+    return [items[index::count] for index in range(count)] if items else []
+
+
+# ================================
+# RUNNING
+# ================================
+
+def run_jobs_for_tenant(tenant, job_names):
+    """Run the named jobs back to back in one tenant's database; returns its report"""
+    report = {'tenant': tenant.slug, 'results': {}, 'errors': {}}
+    started = time.monotonic()
+
+    TenantDatabaseManager.add_tenant_to_settings(tenant)
+    try:
+        with tenant_context(tenant):
+            for name in job_names:
+                try:
+                    report['results'][name] = _plain(_job(name)())
+                except Exception as e:
+                    logger.exception(f"Tenant job {name} failed for {tenant.slug}")
+                    report['errors'][name] = str(e) or e.__class__.__name__
+    finally:
+        # One connection per tenant batch; close it before moving to the next tenant
+        alias = f"tenant_{tenant.id}"
+        if alias in settings.DATABASES:
+            connections[alias].close()
+
+    report['seconds'] = round(time.monotonic() - started, 3)
+    log = logger.warning if report['errors'] else logger.info
+    log(f"Tenant jobs for {tenant.slug} finished in {report['seconds']}s: "
+        f"{report['results']}{' errors: ' + str(report['errors']) if report['errors'] else ''}")
+    return report
+
+
+def run_shard(job_names, tenant_ids, time_limit=None):
+    """
+    Run jobs for a list of tenants in order, stopping after ``time_limit`` seconds.
+
+    Returns ``{'tenants': [reports], 'skipped': [tenant ids], 'seconds': total}``.
+    """
+    for name in job_names:
+        _job(name)
+
+    started = time.monotonic()
+    tenants = {
+        str(tenant.id): tenant
+        for tenant in Tenant.objects.using('default').filter(id__in=tenant_ids, is_active=True)
+    }
+    summary = {'tenants': [], 'skipped': [], 'seconds': 0}
+
+    for position, tenant_id in enumerate(tenant_ids):
+        if time_limit and time.monotonic() - started >= time_limit:
+            summary['skipped'] = list(tenant_ids[position:])
+            logger.warning(
+                f"Tenant job shard hit its {time_limit}s limit; skipped {len(summary['skipped'])} tenants"
+            )
+            break
+        tenant = tenants.get(tenant_id)
+        if tenant is None:
+            continue
+        try:
+            summary['tenants'].append(run_jobs_for_tenant(tenant, job_names))
+        except Exception as e:
+            logger.error(f"Tenant jobs could not run for {tenant.slug}: {e}")
+            summary['tenants'].append({'tenant': tenant.slug, 'results': {}, 'errors': {'*': str(e)}, 'seconds': 0})
+
+    summary['seconds'] = round(time.monotonic() - started, 3)
+    return summary
+
+
+def run_tenant_jobs(job_names, shards=None, time_limit=None, tenant_slug=None):
+    """
+    Run jobs for every active tenant (or one tenant), sharded across workers.
+
+    With the celery backend, returns the ids of the queued shard tasks;
+    inline, returns the shard summaries.
+    """
+    job_names = list(job_names)
+    for name in job_names:
+        _job(name)
+
+    tenant_ids = active_tenant_ids(tenant_slug)
+    shards = shard(tenant_ids, shards or getattr(settings, 'TENANT_JOB_SHARDS', DEFAULT_SHARDS))
+    # A time limit cuts off the end of a shard; vary which tenants end up there
+    for ids in shards:
+        random.shuffle(ids)
+
+    if _backend() == 'celery':
+        try:
+            from .tasks import run_tenant_job_shard
+            queued = [run_tenant_job_shard.delay(job_names, ids, time_limit).id for ids in shards]
+            logger.info(f"Queued {job_names} for {len(tenant_ids)} tenants in {len(queued)} shards")
+            return {'queued': queued, 'tenants': len(tenant_ids)}
+        except Exception as e:
+            logger.warning(f"Could not queue tenant job shards on celery, running inline: {e}")
+
+    return {'shards': [run_shard(job_names, ids, time_limit) for ids in shards], 'tenants': len(tenant_ids)}
@@ -0,0 +1,27 @@
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def run_tenant_job_shard(job_names, tenant_ids, time_limit=None):
+    """
+    Run registered tenant jobs for one shard of tenants
+    Queued by scheduler_utils.run_tenant_jobs when TENANT_JOB_BACKEND is 'celery'
+    """
+    from .scheduler_utils import run_shard
+
+    return run_shard(job_names, tenant_ids, time_limit)
+
+
+@shared_task
+def run_tenant_jobs(job_names, shards=None, time_limit=None):
+    """
+    Fan registered jobs out to every active tenant
+    Schedule with celery beat, e.g. args [["reports.scheduled_reports"]] every
+    15 minutes, or run the run_tenant_jobs management command from cron
+    """
+    from .scheduler_utils import run_tenant_jobs as run
+
+    return run(job_names, shards=shards, time_limit=time_limit)
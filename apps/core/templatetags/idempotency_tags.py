@@ -0,0 +1,19 @@
+import uuid
+
+from django import template
+from django.utils.html import format_html
+
+from apps.core.idempotency_utils import FORM_FIELD
+
+register = template.Library()
+
+
+@register.simple_tag
+def idempotency_key_input():
+    """
+    Hidden idempotency key for a POST form.
+    Usage: {% load idempotency_tags %}{% idempotency_key_input %}
+    A fresh key is rendered with each form, so resubmitting it is replayed
+    instead of repeated.
+    """
+    return format_html('<input type="hidden" name="{}" value="{}">', FORM_FIELD, uuid.uuid4().hex)
@@ -475,6 +475,47 @@ class TenantBackup(models.Model):
         return f"/api/backups/{self.backup_id}/download/"
 
 
+class IdempotencyKey(models.Model):
+    """
+    Client-supplied idempotency key and the response recorded for it.
+
+    Lives in the main database (always query with ``using('default')``) and is
+    scoped per tenant and endpoint, so retried POSTs replay the first result.
+    """
+    STATUS_CHOICES = [
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+    ]
+    
+    tenant_id = models.CharField(max_length=36, blank=True, default='', help_text="Tenant the request was made for")
+    scope = models.CharField(max_length=100, help_text="Endpoint or operation the key applies to")
+    key = models.CharField(max_length=100)
+    fingerprint = models.CharField(max_length=64, blank=True, help_text="Hash of the request payload")
+    user_id = models.IntegerField(null=True, blank=True)
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='processing')
+    locked_until = models.DateTimeField(help_text="Another request may take over a processing key after this")
+    
+    # Recorded result
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_headers = models.JSONField(default=dict, blank=True)
+    response_body = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = "Idempotency Key"
+        verbose_name_plural = "Idempotency Keys"
+        unique_together = ['tenant_id', 'scope', 'key']
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.scope}:{self.key} ({self.status})"
+
+
 # Base models for tenant databases
 class TenantTimeStampedModel(models.Model):
     """
@@ -546,4 +587,86 @@ class TenantSoftDeleteModel(TenantTimeStampedModel):
     def set_deleted_by(self, user):
         """Set the deleted_by user ID"""
         if user and user.id:
-            self.deleted_by_user_id = user.id
\ No newline at end of file
+            self.deleted_by_user_id = user.id
+
+
+class MPesaCheckoutIndex(models.Model):
+    """
+    Maps an STK push CheckoutRequestID to the tenant that initiated it.
+
+    Lives in the main database (always query with ``using('default')``) so a
+    callback arriving without a business path resolves its tenant with one
+    indexed lookup instead of searching every tenant database. Pending rows
+    are also the work list of the background status reconciler.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('resolved', 'Resolved'),
+        ('expired', 'Expired'),
+    ]
+    
+    checkout_request_id = models.CharField(max_length=100, unique=True)
+    merchant_request_id = models.CharField(max_length=100, blank=True, db_index=True)
+    tenant_id = models.CharField(max_length=36, help_text="Tenant that initiated the STK push")
+    payment_id = models.CharField(max_length=50, blank=True, help_text="Payment.payment_id in the tenant database")
+    
+    # Status reconciliation
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    status_checks = models.PositiveSmallIntegerField(default=0)
+    next_check_at = models.DateTimeField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = "M-Pesa Checkout Index"
+        verbose_name_plural = "M-Pesa Checkout Index"
+        indexes = [
+            models.Index(fields=['expires_at']),
+            models.Index(fields=['status', 'next_check_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.checkout_request_id} -> {self.tenant_id}"
+
+
+class MPesaCallback(models.Model):
+    """
+    Raw M-Pesa callback waiting to be processed.
+
+    Lives in the main database (always query with ``using('default')``).
+    Callbacks are stored and acknowledged straight away; workers process them
+    later with retries, and ``dedupe_key`` stops Daraja retries from being
+    stored twice.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+    ]
+    
+    dedupe_key = models.CharField(max_length=128, unique=True, help_text="CheckoutRequestID or payload hash")
+    checkout_request_id = models.CharField(max_length=100, blank=True)
+    tenant_id = models.CharField(max_length=36, blank=True, default='', help_text="Tenant path the callback was posted to, if any")
+    payload = models.TextField(help_text="Raw callback body")
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=django_timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "M-Pesa Callback"
+        verbose_name_plural = "M-Pesa Callbacks"
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['processed_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.dedupe_key} ({self.status})"
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class CustomersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.customers'
+    
+    def ready(self):
+        # Import signals
+        try:
+            import apps.customers.signals
+        except ImportError:
+            pass
@@ -0,0 +1,514 @@
+"""
+Bulk customer and vehicle import
+
+Imports used to save the upload, call ``update_or_create`` for every CSV row
+and queue a flash message per row in the session. Uploads (CSV or .xlsx) are
+now streamed row by row and handled ``CHUNK_SIZE`` rows at a time: each
+chunk is validated, existing customers and vehicles are loaded with one
+``customer_id__in`` / ``registration_number__in`` query, and new and changed
+rows are written with ``bulk_create`` / ``bulk_update`` in one transaction.
+Search tokens for the chunk are rewritten in one batch.
+
+Columns are matched by header name (see ``HEADER_ALIASES``), so files
+produced by the customer export can be imported back. A row may carry one
+vehicle; blank cells leave existing values unchanged.
+
+The result is one summary with created/updated counts and a per-row error
+report. Large uploads run as a background job (``CUSTOMER_IMPORT_BACKEND``:
+``'thread'`` by default, or ``'celery'``) whose progress and summary are kept
+on a ``CustomerImportJob`` row in the tenant database, so any web worker can
+answer the import page's polls whichever process runs the import.
+"""
+from datetime import date, datetime
+import csv
+import io
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.validators import validate_email
+from django.db import DatabaseError, connections, router, transaction
+from django.utils import timezone
+
+from apps.core.database_router import TenantDatabaseManager, get_current_tenant, tenant_context
+from apps.core.tenant_models import Tenant
+from apps.core.utils import generate_unique_code
+
+from . import search
+from .models import Customer, CustomerImportJob, Vehicle
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+BULK_BATCH_SIZE = 500
+HEADER_SCAN_ROWS = 10
+MAX_REPORTED_ERRORS = 1000
+INLINE_MAX_BYTES = 256 * 1024
+
+# Normalized header names for each import column, in order of preference
+HEADER_ALIASES = {
+    'customer_id': ('customer id', 'customer code', 'customer no', 'id'),
+    'first_name': ('first name', 'firstname', 'given name'),
+    'last_name': ('last name', 'lastname', 'surname'),
+    'name': ('name', 'full name', 'customer name'),
+    'company_name': ('company', 'company name', 'business name'),
+    'customer_type': ('type', 'customer type'),
+    'email': ('email', 'email address', 'e-mail'),
+    'phone': ('phone', 'phone number', 'mobile', 'telephone'),
+    'city': ('city', 'town'),
+    'is_vip': ('vip', 'vip status', 'is vip'),
+    'is_active': ('active', 'active status', 'is active'),
+    'registration_number': ('registration', 'registration number', 'reg no', 'plate', 'license plate',
+                            'vehicle registration'),
+    'make': ('make', 'vehicle make'),
+    'model': ('model', 'vehicle model'),
+    'year': ('year', 'vehicle year'),
+    'color': ('color', 'colour', 'vehicle color'),
+    'vehicle_type': ('vehicle type',),
+    'fuel_type': ('fuel', 'fuel type'),
+}
+
+CUSTOMER_COLUMNS = ('first_name', 'last_name', 'company_name', 'customer_type', 'email', 'phone',
+                    'city', 'is_vip', 'is_active')
+VEHICLE_COLUMNS = ('make', 'model', 'year', 'color', 'vehicle_type', 'fuel_type')
+VEHICLE_DEFAULTS = {'color': '', 'vehicle_type': 'other', 'fuel_type': 'other'}
+
+TRUE_VALUES = ('yes', 'y', 'true', '1', 'active', 'vip')
+FALSE_VALUES = ('no', 'n', 'false', '0', 'inactive')
+
+
+class ImportFileError(ValueError):
+    """The uploaded file could not be read as a customer import"""
+
+
+class RowError(ValueError):
+    """One row failed validation"""
+
+
+def _backend():
+    return getattr(settings, 'CUSTOMER_IMPORT_BACKEND', 'thread')
+
+
+# ================================
+# PARSING
+# ================================
+
+def _header(value):
+    return ' '.join(str(value or '').strip().lower().replace('_', ' ').split())
+
+
+def _column_map(headers):
+    """{field: column index} for a header row, or None if it is not one"""
+    positions = {name: i for i, name in reversed(list(enumerate(_header(h) for h in headers)))}
+    columns = {}
+    for field, aliases in HEADER_ALIASES.items():
+        for alias in aliases:
+            if alias in positions and positions[alias] not in columns.values():
+                columns[field] = positions[alias]
+                break
+    if 'customer_id' in columns or 'first_name' in columns or 'name' in columns:
+        return columns
+    return None
+
+
+def _raw_rows(file):
+    """Rows of a CSV or .xlsx file object as lists of cell values"""
+    if file.name.lower().endswith('.xlsx'):
+        try:
+            import openpyxl
+        except ImportError:
+            raise ImportFileError('Excel support requires openpyxl; upload a CSV file instead.')
+        try:
+            workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        except Exception as e:
+            raise ImportFileError(f'Could not open the Excel file: {e}')
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    else:
+        file.seek(0)
+        raw = getattr(file, 'file', file)
+        text = io.TextIOWrapper(raw, encoding='utf-8-sig', errors='replace', newline='')
+        try:
+            yield from csv.reader(text)
+        finally:
+            text.detach()
+
+
+def iter_import_rows(file):
+    """Yield ``(row_number, {field: text})`` for every non-empty data row"""
+    columns = None
+    for row_number, row in enumerate(_raw_rows(file), start=1):
+        if columns is None:
+            if row_number > HEADER_SCAN_ROWS:
+                raise ImportFileError('No header row with a Customer ID or name column found.')
+            columns = _column_map(row)
+            continue
+
+        values = {}
+        for field, index in columns.items():
+            value = row[index] if index < len(row) else None
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            if isinstance(value, (datetime, date)):
+                value = value.isoformat()
+            values[field] = str(value).strip() if value is not None else ''
+        if any(values.values()):
+            yield row_number, values
+
+    if columns is None:
+        raise ImportFileError('The file is empty.')
+
+
+# ================================
+# VALIDATION
+# ================================
+
+def _choice(model, field, value):
+    choices = dict(model._meta.get_field(field).choices)
+    labels = {str(label).lower(): key for key, label in choices.items()}
+    key = value.lower().replace(' ', '_')
+    if key in choices:
+        return key
+    if value.lower() in labels:
+        return labels[value.lower()]
+    raise RowError(f"Unknown {field.replace('_', ' ')} '{value}'")
+
+
+def _boolean(field, value):
+    if value.lower() in TRUE_VALUES:
+        return True
+    if value.lower() in FALSE_VALUES:
+        return False
+    raise RowError(f"{field.replace('_', ' ').capitalize()} must be Yes or No, not '{value}'")
+
+
+def _check_length(model, field, value):
+    max_length = model._meta.get_field(field).max_length
+    if max_length and len(value) > max_length:
+        raise RowError(f"{field.replace('_', ' ').capitalize()} is longer than {max_length} characters")
+    return value
+
+
+def clean_row(values):
+    """
+    Validate one row; returns ``(customer_id, customer fields, vehicle fields or None)``.
+
+    Only non-blank cells are returned, so updates keep existing values.
+    """
+    from phonenumber_field.phonenumber import to_python
+
+    if values.get('name') and not values.get('first_name'):
+        first, _, last = values['name'].partition(' ')
+        values['first_name'] = first
+        values['last_name'] = values.get('last_name') or last.strip()
+
+    customer = {}
+    for field in CUSTOMER_COLUMNS:
+        value = values.get(field, '')
+        if not value:
+            continue
+        if field == 'customer_type':
+            customer[field] = _choice(Customer, field, value)
+        elif field in ('is_vip', 'is_active'):
+            customer[field] = _boolean(field, value)
+        elif field == 'email':
+            try:
+                validate_email(value)
+            except ValidationError:
+                raise RowError(f"Invalid email '{value}'")
+            customer[field] = value.lower()
+        elif field == 'phone':
+            phone = to_python(value)
+            if not getattr(phone, 'is_valid', lambda: False)():
+                raise RowError(f"Invalid phone number '{value}'")
+            customer[field] = phone
+        else:
+            customer[field] = _check_length(Customer, field, value)
+
+    customer_id = _check_length(Customer, 'customer_id', values.get('customer_id', ''))
+
+    registration = values.get('registration_number', '').upper()
+    if not registration:
+        return customer_id, customer, None
+    vehicle = {'registration_number': _check_length(Vehicle, 'registration_number', registration)}
+    for field in VEHICLE_COLUMNS:
+        value = values.get(field, '')
+        if not value:
+            continue
+        if field == 'year':
+            try:
+                year = int(value)
+            except ValueError:
+                raise RowError(f"Invalid vehicle year '{value}'")
+            if not 1900 <= year <= timezone.localdate().year + 1:
+                raise RowError(f"Invalid vehicle year '{value}'")
+            vehicle[field] = year
+        elif field in ('vehicle_type', 'fuel_type'):
+            vehicle[field] = _choice(Vehicle, field, value)
+        else:
+            vehicle[field] = _check_length(Vehicle, field, value)
+    return customer_id, customer, vehicle
+
+
+# ================================
+# IMPORTING
+# ================================
+
+def new_summary():
+    return {
+        'rows': 0,
+        'created': {'customers': 0, 'vehicles': 0},
+        'updated': {'customers': 0, 'vehicles': 0},
+        'unchanged': 0,
+        'error_count': 0,
+        'errors': [],
+    }
+
+
+def _error(summary, row_number, message):
+    summary['error_count'] += 1
+    if len(summary['errors']) < MAX_REPORTED_ERRORS:
+        summary['errors'].append({'row': row_number, 'error': str(message)})
+
+
+def _apply(instance, fields):
+    """Set changed fields on an instance; returns the names that changed"""
+    changed = []
+    for field, value in fields.items():
+        if getattr(instance, field) != value:
+            setattr(instance, field, value)
+            changed.append(field)
+    return changed
+
+
+def import_chunk(rows, summary, user=None):
+    """Validate and write one chunk of ``(row_number, values)`` rows"""
+    cleaned = []
+    for row_number, values in rows:
+        try:
+            cleaned.append((row_number, *clean_row(values)))
+        except RowError as e:
+            _error(summary, row_number, e)
+    summary['rows'] += len(rows)
+    if not cleaned:
+        return
+
+    customer_ids = {customer_id for _, customer_id, _, _ in cleaned if customer_id}
+    registrations = {vehicle['registration_number'] for _, _, _, vehicle in cleaned if vehicle}
+    now = timezone.now()
+
+    try:
+        with transaction.atomic(using=router.db_for_write(Customer)):
+            customers = {
+                customer.customer_id: customer
+                for customer in Customer.all_objects.filter(customer_id__in=customer_ids)
+            }
+            vehicles = {
+                vehicle.registration_number: vehicle
+                for vehicle in Vehicle.objects.filter(registration_number__in=registrations)
+            }
+            created_customers, created_vehicles = {}, {}
+            updated_customers, updated_vehicles = {}, {}
+            customer_fields, vehicle_fields = set(), set()
+
+            for row_number, customer_id, fields, vehicle_values in cleaned:
+                customer = customers.get(customer_id) if customer_id else None
+                if customer is None:
+                    if not fields.get('first_name') and not fields.get('company_name'):
+                        _error(summary, row_number, 'A new customer needs a first name or company name')
+                        continue
+                    customer = Customer(
+                        customer_id=customer_id or generate_unique_code('CUST', 6),
+                        first_name=fields.get('first_name') or fields.get('company_name', ''),
+                        last_name='',
+                    )
+                    customer.set_created_by(user)
+                    customer.set_updated_by(user)
+                    customers[customer.customer_id] = created_customers[customer.pk] = customer
+                elif customer.is_deleted:
+                    _error(summary, row_number, f'Customer {customer_id} was deleted; restore it before importing')
+                    continue
+
+                changed = _apply(customer, fields)
+                if changed and customer.pk not in created_customers:
+                    customer_fields.update(changed)
+                    updated_customers[customer.pk] = customer
+
+                if vehicle_values is None:
+                    if not changed and customer.pk not in created_customers:
+                        summary['unchanged'] += 1
+                    continue
+
+                registration = vehicle_values['registration_number']
+                vehicle = vehicles.get(registration)
+                if vehicle is None:
+                    missing = [field for field in ('make', 'model', 'year') if field not in vehicle_values]
+                    if missing:
+                        _error(summary, row_number, f"New vehicle {registration} needs {', '.join(missing)}")
+                        continue
+                    vehicle = Vehicle(customer=customer, **{**VEHICLE_DEFAULTS, **vehicle_values})
+                    vehicle.set_created_by(user)
+                    vehicle.set_updated_by(user)
+                    vehicles[registration] = created_vehicles[vehicle.pk] = vehicle
+                elif vehicle.customer_id != customer.pk:
+                    _error(summary, row_number, f'Vehicle {registration} belongs to another customer')
+                    continue
+                elif vehicle.pk not in created_vehicles:
+                    vehicle_changed = _apply(vehicle, vehicle_values)
+                    if vehicle_changed:
+                        vehicle_fields.update(vehicle_changed)
+                        updated_vehicles[vehicle.pk] = vehicle
+                    elif not changed:
+                        summary['unchanged'] += 1
+                else:
+                    _apply(vehicle, vehicle_values)
+
+            for instance in list(updated_customers.values()) + list(updated_vehicles.values()):
+                instance.updated_at = now
+                instance.set_updated_by(user)
+
+            Customer.objects.bulk_create(created_customers.values(), batch_size=BULK_BATCH_SIZE)
+            Vehicle.objects.bulk_create(created_vehicles.values(), batch_size=BULK_BATCH_SIZE)
+            if updated_customers:
+                Customer.all_objects.bulk_update(
+                    updated_customers.values(), sorted(customer_fields | {'updated_at', 'updated_by_user_id'}),
+                    batch_size=BULK_BATCH_SIZE,
+                )
+            if updated_vehicles:
+                Vehicle.objects.bulk_update(
+                    updated_vehicles.values(), sorted(vehicle_fields | {'updated_at', 'updated_by_user_id'}),
+                    batch_size=BULK_BATCH_SIZE,
+                )
+
+            # bulk writes send no signals, so the chunk's search tokens are rewritten here
+            search.index_batch(
+                list(created_customers.values()) + list(updated_customers.values()),
+                list(created_vehicles.values()) + list(updated_vehicles.values()),
+            )
+    except DatabaseError as e:
+        logger.error(f"Customer import chunk failed: {e}")
+        for row_number, *_ in cleaned:
+            _error(summary, row_number, f'Not imported: {e}')
+        return
+
+    summary['created']['customers'] += len(created_customers)
+    summary['created']['vehicles'] += len(created_vehicles)
+    summary['updated']['customers'] += len(updated_customers)
+    summary['updated']['vehicles'] += len(updated_vehicles)
+
+
+def import_customers(file, user=None, progress=None):
+    """
+    Import every row of an uploaded CSV/XLSX file; returns the summary.
+
+    ``progress(summary)`` is called after each chunk.
+    """
+    summary = new_summary()
+    chunk = []
+    for row in iter_import_rows(file):
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            import_chunk(chunk, summary, user)
+            chunk = []
+            if progress:
+                progress(summary)
+    if chunk:
+        import_chunk(chunk, summary, user)
+    return summary
+
+
+# ================================
+# BACKGROUND JOBS
+# ================================
+
+def get_import_job(job_id):
+    """Import job of the current tenant, or None for an unknown id"""
+    try:
+        return CustomerImportJob.objects.filter(pk=job_id).first()
+    except ValidationError:
+        return None
+
+
+def _set_job(job_id, **state):
+    CustomerImportJob.objects.filter(pk=job_id).update(updated_at=timezone.now(), **state)
+
+
+def should_run_in_background(uploaded_file):
+    return uploaded_file.size > getattr(settings, 'CUSTOMER_IMPORT_INLINE_MAX_BYTES', INLINE_MAX_BYTES)
+
+
+def start_import_job(uploaded_file, user=None):
+    """Store the upload and import it in the background; returns the job id"""
+    tenant = get_current_tenant()
+    tenant_id = str(tenant.id) if tenant else ''
+    job = CustomerImportJob(file_name=uploaded_file.name[:255])
+    job.set_created_by(user)
+    job.save()
+    job_id = str(job.pk)
+    extension = '.xlsx' if uploaded_file.name.lower().endswith('.xlsx') else '.csv'
+    path = default_storage.save(f"customer_imports/{job.pk.hex}{extension}", uploaded_file)
+    user_id = user.pk if user else None
+
+    def start():
+        if _backend() == 'celery':
+            try:
+                from .tasks import import_customers_job
+                import_customers_job.delay(tenant_id, job_id, path, user_id)
+                return
+            except Exception as e:
+                logger.warning(f"Could not queue customer import {job_id} on celery, running in a thread: {e}")
+        threading.Thread(
+            target=_run_in_thread, args=(tenant_id, job_id, path, user_id),
+            name=f"customer-import-{job_id}", daemon=True,
+        ).start()
+
+    # The worker reads the job row, so it starts once the row is committed
+    transaction.on_commit(start, using=router.db_for_write(CustomerImportJob))
+    return job_id
+
+
+def _run_in_thread(tenant_id, job_id, path, user_id):
+    try:
+        run_import_job(tenant_id, job_id, path, user_id)
+    finally:
+        connections.close_all()
+
+
+def run_import_job(tenant_id, job_id, path, user_id=None):
+    """Import a stored upload in its tenant's database, recording progress on the job row"""
+    from django.contrib.auth.models import User
+
+    tenant = Tenant.objects.using('default').filter(id=tenant_id, is_active=True).first() if tenant_id else None
+    try:
+        if tenant is None:
+            # The job row lives in the tenant database, so there is nowhere to record this
+            logger.error(f"Customer import {job_id}: tenant {tenant_id or '(none)'} not found")
+            return None
+        TenantDatabaseManager.add_tenant_to_settings(tenant)
+
+        with tenant_context(tenant):
+            _set_job(job_id, status='running')
+            try:
+                user = User.objects.using('default').filter(pk=user_id).first() if user_id else None
+                with default_storage.open(path, 'rb') as file:
+                    file.name = os.path.basename(path)
+                    summary = import_customers(
+                        file, user, progress=lambda summary: _set_job(job_id, rows=summary['rows'])
+                    )
+                _set_job(job_id, status='completed', rows=summary['rows'], summary=summary)
+                logger.info(f"Customer import {job_id} finished: {summary['rows']} rows, {summary['error_count']} errors")
+                return summary
+            except Exception as e:
+                logger.exception(f"Customer import {job_id} failed")
+                _set_job(job_id, status='failed', error=str(e) or e.__class__.__name__)
+                return None
+    finally:
+        try:
+            default_storage.delete(path)
+        except Exception:
+            pass
@@ -0,0 +1,240 @@
+"""
+Loyalty points ledger and stored tiers
+
+Points used to be added and redeemed by reading ``Customer.loyalty_points``,
+changing it in Python and saving it back, so two concurrent redemptions could
+both pass the balance check and one update would be lost. Tiers were computed
+per customer from ``LoyaltyProgram`` thresholds whenever a page needed them.
+
+Every change is now a ``LoyaltyTransaction`` row (append-only) and the
+balance moves with a single ``F()`` update; redemptions only apply when the
+balance still covers them, checked in the same UPDATE. The tier is stored in
+``Customer.loyalty_tier``: set when a balance changes and recomputed for the
+whole tenant, one UPDATE per tier, when program thresholds change
+(``manage.py recompute_loyalty_tiers`` does the same on demand). The loyalty
+dashboard reads aggregates over the ledger and the tier column.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import router, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import Customer, LoyaltyProgram, LoyaltyTransaction
+
+logger = logging.getLogger(__name__)
+
+RECENT_ACTIVITY_LIMIT = 10
+TOP_MEMBERS_LIMIT = 10
+
+TIER_DISPLAY = {
+    'bronze': {'color': 'secondary', 'description': 'Entry tier for every customer'},
+    'silver': {'color': 'info', 'description': 'Regular customers'},
+    'gold': {'color': 'warning', 'description': 'Frequent customers'},
+    'platinum': {'color': 'primary', 'description': 'Top customers'},
+}
+ACTIVITY_DISPLAY = {
+    'earn': ('plus-circle', 'success'),
+    'redeem': ('gift', 'info'),
+    'adjust': ('sliders-h', 'secondary'),
+    'expire': ('hourglass-end', 'warning'),
+}
+
+
+def active_program():
+    return LoyaltyProgram.objects.filter(is_active=True).first()
+
+
+def tier_bounds(program):
+    """``[(tier, lower, upper)]`` point ranges, upper bound exclusive (None for platinum)"""
+    thresholds = [
+        ('bronze', None),
+        ('silver', program.silver_threshold),
+        ('gold', program.gold_threshold),
+        ('platinum', program.platinum_threshold),
+    ]
+    bounds = []
+    for index, (tier, lower) in enumerate(thresholds):
+        upper = thresholds[index + 1][1] if index + 1 < len(thresholds) else None
+        bounds.append((tier, lower, upper))
+    return bounds
+
+
+def tier_for(program, points):
+    """Tier for a balance, matching ``LoyaltyProgram.get_customer_tier``"""
+    if program is None:
+        return 'bronze'
+    if points >= program.platinum_threshold:
+        return 'platinum'
+    elif points >= program.gold_threshold:
+        return 'gold'
+    elif points >= program.silver_threshold:
+        return 'silver'
+    return 'bronze'
+
+
+# ================================
+# LEDGER
+# ================================
+
+def _apply(customer, points, transaction_type, description, service_order, user, guard=None):
+    """
+    Move a customer's balance by ``points`` and record it in the ledger.
+
+    ``guard`` is an extra filter on the balance UPDATE; when it no longer
+    matches (e.g. the balance dropped below a redemption) nothing is written
+    and None is returned.
+    """
+    db_alias = router.db_for_write(Customer)
+    with transaction.atomic(using=db_alias):
+        rows = Customer.all_objects.filter(pk=customer.pk)
+        if guard:
+            rows = rows.filter(**guard)
+        if not rows.update(loyalty_points=F('loyalty_points') + points):
+            return None
+
+        # The UPDATE holds the row lock until commit, so this read is the balance we just wrote
+        balance, tier = Customer.all_objects.filter(pk=customer.pk).values_list(
+            'loyalty_points', 'loyalty_tier'
+        ).get()
+        new_tier = tier_for(active_program(), balance)
+        if new_tier != tier:
+            Customer.all_objects.filter(pk=customer.pk).update(loyalty_tier=new_tier)
+
+        entry = LoyaltyTransaction(
+            customer_id=customer.pk,
+            transaction_type=transaction_type,
+            points=points,
+            balance_after=balance,
+            service_order_id=getattr(service_order, 'pk', service_order),
+            description=description[:255],
+        )
+        if user:
+            entry.set_created_by(user)
+        entry.save()
+
+    customer.loyalty_points = balance
+    customer.loyalty_tier = new_tier
+    return entry
+
+
+def award_points(customer, points, description='', service_order=None, user=None):
+    """Credit ``points`` to a customer; returns the ledger entry"""
+    if points <= 0:
+        raise ValueError("Points awarded must be positive")
+    return _apply(customer, points, 'earn', description, service_order, user)
+
+
+def redeem_points(customer, points, description='', service_order=None, user=None):
+    """Debit ``points`` if the balance covers them; returns the ledger entry or None"""
+    if points <= 0:
+        raise ValueError("Points redeemed must be positive")
+    return _apply(
+        customer, -points, 'redeem', description, service_order, user,
+        guard={'loyalty_points__gte': points},
+    )
+
+
+def adjust_points(customer, points, description='', user=None):
+    """Manual correction in either direction; the balance is not allowed to go negative"""
+    guard = {'loyalty_points__gte': -points} if points < 0 else None
+    return _apply(customer, points, 'adjust', description, None, user, guard=guard)
+
+
+# ================================
+# TIERS
+# ================================
+
+def recompute_tiers(program=None):
+    """
+    Store the tier of every customer in the current tenant for ``program``
+    (the active program by default); returns the number of rows changed.
+
+    One UPDATE per tier over its point range, touching only customers whose
+    stored tier differs. Without an active program every customer is reset to
+    the entry tier, as ``tier_for`` does for single balances.
+    """
+    program = program or active_program()
+    if program is None or not program.is_active:
+        return Customer.all_objects.exclude(loyalty_tier='bronze').update(loyalty_tier='bronze')
+
+    changed = 0
+    with transaction.atomic(using=router.db_for_write(Customer)):
+        for tier, lower, upper in tier_bounds(program):
+            rows = Customer.all_objects.exclude(loyalty_tier=tier)
+            if lower is not None:
+                rows = rows.filter(loyalty_points__gte=lower)
+            if upper is not None:
+                rows = rows.filter(loyalty_points__lt=upper)
+            changed += rows.update(loyalty_tier=tier)
+    return changed
+
+
+# ================================
+# DASHBOARD
+# ================================
+
+def dashboard_summary(program):
+    """Context for the loyalty dashboard, built from grouped queries"""
+    customers = Customer.objects.filter(is_active=True)
+    month_start = timezone.now() - timedelta(days=30)
+
+    ledger = LoyaltyTransaction.objects.aggregate(
+        awarded=Sum('points', filter=Q(transaction_type='earn')),
+        redemptions=Count('id', filter=Q(transaction_type='redeem')),
+        active=Count('customer', filter=Q(created_at__gte=month_start), distinct=True),
+    )
+    tier_counts = dict(
+        customers.values('loyalty_tier').annotate(members=Count('id')).order_by().values_list('loyalty_tier', 'members')
+    )
+    total_customers = sum(tier_counts.values())
+
+    multipliers = {
+        'bronze': 1,
+        'silver': program.silver_multiplier,
+        'gold': program.gold_multiplier,
+        'platinum': program.platinum_multiplier,
+    }
+    loyalty_tiers = [
+        {
+            'pk': tier,
+            'name': dict(Customer.LOYALTY_TIER_CHOICES)[tier],
+            'min_points': lower or 0,
+            'min_orders': None,
+            'point_multiplier': multipliers[tier],
+            'member_count': tier_counts.get(tier, 0),
+            **TIER_DISPLAY[tier],
+        }
+        for tier, lower, upper in tier_bounds(program)
+    ]
+
+    recent_activity = []
+    for entry in LoyaltyTransaction.objects.select_related('customer')[:RECENT_ACTIVITY_LIMIT]:
+        icon, color = ACTIVITY_DISPLAY.get(entry.transaction_type, ('star', 'secondary'))
+        recent_activity.append({
+            'icon': icon,
+            'color': color,
+            'title': f"{entry.customer.display_name} - {entry.get_transaction_type_display()}",
+            'description': entry.description or f"{entry.points:+d} points, balance {entry.balance_after}",
+            'created_at': entry.created_at,
+            'points': entry.points if entry.points > 0 else None,
+        })
+
+    return {
+        'loyalty_stats': {
+            'total_members': customers.filter(loyalty_points__gt=0).count(),
+            'total_points_awarded': ledger['awarded'] or 0,
+            'total_rewards_redeemed': ledger['redemptions'],
+            'active_members': ledger['active'],
+        },
+        'loyalty_tiers': loyalty_tiers,
+        'tier_stats': {tier['pk']: tier['member_count'] for tier in loyalty_tiers},
+        'recent_activity': recent_activity,
+        'top_members': customers.order_by('-loyalty_points')[:TOP_MEMBERS_LIMIT],
+        'total_customers': total_customers,
+        'program_settings': {
+            'points_per_dollar': program.points_per_currency_unit,
+            'is_active': program.is_active,
+        },
+    }
@@ -0,0 +1,53 @@
+"""
+Management command to rebuild stored customer and vehicle lifetime statistics
+"""
+from django.core.management.base import BaseCommand, CommandError
+from apps.core.tenant_models import Tenant
+from apps.core.database_router import TenantDatabaseManager, tenant_context
+
+
+class Command(BaseCommand):
+    help = 'Recompute lifetime order statistics (orders, last visit, average ticket, total spent) for customers and vehicles'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            help='Specific tenant slug to rebuild (rebuilds all active tenants if not specified)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Customers or vehicles recomputed per transaction'
+        )
+
+    def handle(self, *args, **options):
+        if options.get('tenant'):
+            tenants = Tenant.objects.filter(slug=options['tenant'])
+            if not tenants.exists():
+                raise CommandError(f"Tenant '{options['tenant']}' not found")
+        else:
+            tenants = Tenant.objects.filter(is_active=True)
+
+        for tenant in tenants:
+            self.rebuild_tenant(tenant, options['chunk_size'])
+
+    def rebuild_tenant(self, tenant, chunk_size):
+        """Rebuild lifetime statistics for a single tenant database"""
+        from apps.customers.stats_utils import rebuild_lifetime_stats
+
+        TenantDatabaseManager.add_tenant_to_settings(tenant)
+
+        try:
+            with tenant_context(tenant):
+                totals = rebuild_lifetime_stats(chunk_size=chunk_size)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"✓ {tenant.name}: {totals['customers']} customers and {totals['vehicles']} vehicles updated"
+                )
+            )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f"✗ {tenant.name}: {e}")
+            )
@@ -0,0 +1,51 @@
+"""
+Management command to rebuild the customer/vehicle/order search index
+"""
+from django.core.management.base import BaseCommand, CommandError
+from apps.core.tenant_models import Tenant
+from apps.core.database_router import TenantDatabaseManager, tenant_context
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search token index for customers, vehicles and service orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            help='Specific tenant slug to rebuild (rebuilds all active tenants if not specified)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows fetched per database round trip'
+        )
+
+    def handle(self, *args, **options):
+        if options.get('tenant'):
+            tenants = Tenant.objects.filter(slug=options['tenant'])
+            if not tenants.exists():
+                raise CommandError(f"Tenant '{options['tenant']}' not found")
+        else:
+            tenants = Tenant.objects.filter(is_active=True)
+
+        for tenant in tenants:
+            self.rebuild_tenant(tenant, options['chunk_size'])
+
+    def rebuild_tenant(self, tenant, chunk_size):
+        """Rebuild the index for a single tenant database"""
+        from apps.customers.search import rebuild_search_index
+
+        TenantDatabaseManager.add_tenant_to_settings(tenant)
+
+        try:
+            with tenant_context(tenant):
+                total = rebuild_search_index(chunk_size=chunk_size)
+            self.stdout.write(
+                self.style.SUCCESS(f"✓ {tenant.name}: {total} search tokens indexed")
+            )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f"✗ {tenant.name}: {e}")
+            )
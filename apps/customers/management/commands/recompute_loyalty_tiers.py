@@ -0,0 +1,45 @@
+"""
+Management command to recompute stored customer loyalty tiers
+"""
+from django.core.management.base import BaseCommand, CommandError
+from apps.core.tenant_models import Tenant
+from apps.core.database_router import TenantDatabaseManager, tenant_context
+
+
+class Command(BaseCommand):
+    help = 'Recompute stored loyalty tiers for every customer from the active loyalty program thresholds'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            help='Specific tenant slug to recompute (recomputes all active tenants if not specified)'
+        )
+
+    def handle(self, *args, **options):
+        if options.get('tenant'):
+            tenants = Tenant.objects.filter(slug=options['tenant'])
+            if not tenants.exists():
+                raise CommandError(f"Tenant '{options['tenant']}' not found")
+        else:
+            tenants = Tenant.objects.filter(is_active=True)
+
+        for tenant in tenants:
+            self.recompute_tenant(tenant)
+
+    def recompute_tenant(self, tenant):
+        """Recompute loyalty tiers for a single tenant database"""
+        from apps.customers.loyalty_utils import recompute_tiers
+
+        TenantDatabaseManager.add_tenant_to_settings(tenant)
+
+        try:
+            with tenant_context(tenant):
+                changed = recompute_tiers()
+            self.stdout.write(
+                self.style.SUCCESS(f"✓ {tenant.name}: {changed} customers moved to a new tier")
+            )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f"✗ {tenant.name}: {e}")
+            )
@@ -5,7 +5,6 @@ from phonenumber_field.modelfields import PhoneNumberField
 from apps.core.tenant_models import TenantTimeStampedModel, TenantSoftDeleteModel
 from apps.core.models import Address, ContactInfo
 from apps.core.utils import upload_to_path
-from decimal import Decimal
 import uuid
 
 class Customer(TenantSoftDeleteModel, Address, ContactInfo):
@@ -65,10 +64,24 @@ class Customer(TenantSoftDeleteModel, Address, ContactInfo):
     credit_limit = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     current_balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     
-    # Loyalty program
+    LOYALTY_TIER_CHOICES = [
+        ('bronze', 'Bronze'),
+        ('silver', 'Silver'),
+        ('gold', 'Gold'),
+        ('platinum', 'Platinum'),
+    ]
+    
+    # Loyalty program; balance changes go through the LoyaltyTransaction ledger
     loyalty_points = models.IntegerField(default=0)
+    loyalty_tier = models.CharField(max_length=10, choices=LOYALTY_TIER_CHOICES, default='bronze', db_index=True)
     total_spent = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     
+    # Lifetime order statistics, maintained by apps.customers.stats_utils
+    order_count = models.PositiveIntegerField(default=0)
+    completed_order_count = models.PositiveIntegerField(default=0)
+    last_service_date = models.DateField(null=True, blank=True)
+    average_ticket = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    
     # Notes
     notes = models.TextField(blank=True, help_text="Internal notes about the customer")
     
@@ -91,34 +104,12 @@ class Customer(TenantSoftDeleteModel, Address, ContactInfo):
     @property
     def total_orders(self):
         """Get total number of orders"""
-        try:
-            from apps.services.models import ServiceOrder
-            return ServiceOrder.objects.filter(customer=self).count()
-        except ImportError:
-            return 0
-    
-    @property
-    def last_service_date(self):
-        """Get last service date"""
-        try:
-            from apps.services.models import ServiceOrder
-            last_order = ServiceOrder.objects.filter(customer=self).order_by('-created_at').first()
-            return last_order.created_at.date() if last_order else None
-        except ImportError:
-            return None
+        return self.order_count
     
     @property
     def average_order_value(self):
-        """Calculate average order value"""
-        try:
-            from apps.services.models import ServiceOrder
-            from django.db.models import Avg
-            avg = ServiceOrder.objects.filter(customer=self, status='completed').aggregate(
-                avg=Avg('total_amount')
-            )['avg']
-            return avg or Decimal('0.00')
-        except ImportError:
-            return Decimal('0.00')
+        """Average value of completed orders"""
+        return self.average_ticket
     
     @property
     def can_place_order(self):
@@ -127,18 +118,15 @@ class Customer(TenantSoftDeleteModel, Address, ContactInfo):
             return True  # No credit limit
         return self.current_balance <= self.credit_limit
     
-    def add_loyalty_points(self, points):
+    def add_loyalty_points(self, points, description='', service_order=None, user=None):
         """Add loyalty points to customer"""
-        self.loyalty_points += points
-        self.save(update_fields=['loyalty_points'])
-    
-    def redeem_loyalty_points(self, points):
-        """Redeem loyalty points"""
-        if self.loyalty_points >= points:
-            self.loyalty_points -= points
-            self.save(update_fields=['loyalty_points'])
-            return True
-        return False
+        from .loyalty_utils import award_points
+        return award_points(self, points, description, service_order, user)
+    
+    def redeem_loyalty_points(self, points, description='', service_order=None, user=None):
+        """Redeem loyalty points; False if the balance is too low"""
+        from .loyalty_utils import redeem_points
+        return redeem_points(self, points, description, service_order, user) is not None
     
     class Meta:
         verbose_name = "Customer"
@@ -195,6 +183,12 @@ class Vehicle(TenantTimeStampedModel):
     last_service_date = models.DateField(null=True, blank=True)
     last_service_mileage = models.IntegerField(null=True, blank=True)
     
+    # Lifetime order statistics, maintained by apps.customers.stats_utils
+    order_count = models.PositiveIntegerField(default=0)
+    completed_order_count = models.PositiveIntegerField(default=0)
+    average_ticket = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    total_spent = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    
     # Notes
     notes = models.TextField(blank=True, help_text="Special notes about the vehicle")
     
@@ -228,18 +222,14 @@ class Vehicle(TenantTimeStampedModel):
     @property
     def service_count(self):
         """Get total number of services for this vehicle"""
-        try:
-            from apps.services.models import ServiceOrder
-            return ServiceOrder.objects.filter(vehicle=self).count()
-        except ImportError:
-            return 0
+        return self.order_count
     
     @property
     def days_since_last_service(self):
         """Calculate days since last service"""
         if self.last_service_date:
-            from datetime import date
-            return (date.today() - self.last_service_date).days
+            from django.utils import timezone
+            return (timezone.localdate() - self.last_service_date).days
         return None
     
     class Meta:
@@ -444,9 +434,23 @@ class LoyaltyProgram(TenantTimeStampedModel):
     gold_multiplier = models.DecimalField(max_digits=3, decimal_places=2, default=1.5)
     platinum_multiplier = models.DecimalField(max_digits=3, decimal_places=2, default=2.0)
     
+    TIER_FIELDS = ('is_active', 'bronze_threshold', 'silver_threshold', 'gold_threshold', 'platinum_threshold')
+    
     def __str__(self):
         return self.name
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Loaded thresholds, so stored customer tiers are only recomputed when they change
+        instance._tier_origin = instance.tier_state
+        return instance
+    
+    @property
+    def tier_state(self):
+        """Fields that decide stored customer tiers"""
+        return tuple(self.__dict__.get(field) for field in self.TIER_FIELDS)
+    
     def get_customer_tier(self, customer):
         """Get customer's loyalty tier"""
         points = customer.loyalty_points
@@ -482,3 +486,98 @@ class LoyaltyProgram(TenantTimeStampedModel):
     class Meta:
         verbose_name = "Loyalty Program"
         verbose_name_plural = "Loyalty Programs"
+
+
+class LoyaltyTransaction(TenantTimeStampedModel):
+    """Append-only ledger of loyalty point changes; ``Customer.loyalty_points`` is its running balance"""
+    
+    TRANSACTION_TYPES = [
+        ('earn', 'Earned'),
+        ('redeem', 'Redeemed'),
+        ('adjust', 'Adjustment'),
+        ('expire', 'Expired'),
+    ]
+    
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='loyalty_transactions')
+    transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
+    points = models.IntegerField(help_text="Signed change: positive when earned, negative when redeemed")
+    balance_after = models.IntegerField()
+    service_order_id = models.UUIDField(null=True, blank=True)
+    description = models.CharField(max_length=255, blank=True)
+    
+    def __str__(self):
+        return f"{self.customer_id}: {self.points:+d} ({self.get_transaction_type_display()})"
+    
+    class Meta:
+        verbose_name = "Loyalty Transaction"
+        verbose_name_plural = "Loyalty Transactions"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['customer', '-created_at']),
+            models.Index(fields=['transaction_type', 'created_at']),
+        ]
+
+
+class CustomerImportJob(TenantTimeStampedModel):
+    """Progress and summary of a background customer import, polled by the import page"""
+    
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    file_name = models.CharField(max_length=255, blank=True)
+    rows = models.PositiveIntegerField(default=0, help_text="Rows read so far")
+    summary = models.JSONField(null=True, blank=True, help_text="Import summary once completed")
+    error = models.TextField(blank=True)
+    
+    def __str__(self):
+        return f"Customer import {self.pk} ({self.get_status_display()})"
+    
+    class Meta:
+        verbose_name = "Customer Import Job"
+        verbose_name_plural = "Customer Import Jobs"
+        ordering = ['-created_at']
+
+
+class SearchIndexEntry(models.Model):
+    """
+    Normalized search tokens for customers, vehicles and service orders.
+    Prefix lookups on ``token`` use the index, unlike chained __icontains filters.
+    """
+    
+    ENTITY_CHOICES = [
+        ('customer', 'Customer'),
+        ('vehicle', 'Vehicle'),
+        ('order', 'Service Order'),
+    ]
+    
+    KIND_CHOICES = [
+        ('name', 'Name'),
+        ('phone', 'Phone'),
+        ('email', 'Email'),
+        ('registration', 'Registration Number'),
+        ('code', 'Reference Code'),
+    ]
+    
+    entity_type = models.CharField(max_length=10, choices=ENTITY_CHOICES)
+    entity_id = models.UUIDField()
+    customer_id = models.UUIDField(null=True, blank=True, help_text="Owning customer, for grouping results")
+    kind = models.CharField(max_length=15, choices=KIND_CHOICES)
+    token = models.CharField(max_length=64)
+    
+    def __str__(self):
+        return f"{self.entity_type}:{self.token}"
+    
+    class Meta:
+        verbose_name = "Search Index Entry"
+        verbose_name_plural = "Search Index Entries"
+        unique_together = ['entity_type', 'entity_id', 'token']
+        indexes = [
+            models.Index(fields=['entity_type', 'token']),
+            models.Index(fields=['token']),
+            models.Index(fields=['entity_id']),
+        ]
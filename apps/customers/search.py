@@ -0,0 +1,371 @@
+"""
+Token search index for customers, vehicles and service orders
+
+Entries hold normalized tokens (registration numbers without spaces, phone
+numbers in E.164 and local forms, lower-cased name words and reference codes)
+so typeahead lookups are indexed prefix matches instead of __icontains scans
+across joins. The index lives in each tenant database, is kept current by
+signals and can be rebuilt with ``manage.py rebuild_search_index``.
+"""
+import logging
+import re
+
+from django.db import router, transaction
+
+from .models import Customer, Vehicle, SearchIndexEntry
+
+logger = logging.getLogger(__name__)
+
+MIN_QUERY_LENGTH = 2
+MIN_SUFFIX_LENGTH = 3
+TOKEN_MAX_LENGTH = 64
+BULK_BATCH_SIZE = 1000
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+_NON_DIGIT = re.compile(r'\D+')
+
+
+def compact(value):
+    """Lower-case a value and strip everything but letters and digits"""
+    if not value:
+        return ''
+    return _NON_ALNUM.sub('', str(value).lower())[:TOKEN_MAX_LENGTH]
+
+
+def words(value):
+    """Split free text into lower-cased alphanumeric words"""
+    if not value:
+        return []
+    return [word[:TOKEN_MAX_LENGTH] for word in _NON_ALNUM.split(str(value).lower()) if word]
+
+
+def phone_tokens(phone):
+    """E.164 digits plus the local (0-prefixed) and national forms of a phone number"""
+    if not phone:
+        return set()
+    e164 = getattr(phone, 'as_e164', None) or str(phone)
+    digits = _NON_DIGIT.sub('', e164)
+    if not digits:
+        return set()
+
+    tokens = {digits}
+    national = getattr(phone, 'national_number', None)
+    if national:
+        national = str(national)
+    elif digits.startswith('254') and len(digits) > 9:
+        national = digits[3:]
+    elif digits.startswith('0'):
+        national = digits[1:]
+    if national:
+        tokens.update({national, f"0{national}"})
+    return tokens
+
+
+def registration_tokens(registration_number):
+    """Compact registration number plus its suffixes, so 'KCA 123A' matches '123a'"""
+    value = compact(registration_number)
+    if not value:
+        return set()
+    return {value[i:] for i in range(len(value) - MIN_SUFFIX_LENGTH + 1)} | {value}
+
+
+def customer_tokens(customer):
+    tokens = set()
+    for field in (customer.first_name, customer.last_name, customer.company_name):
+        tokens.update(('name', word) for word in words(field))
+    if customer.customer_id:
+        tokens.add(('code', compact(customer.customer_id)))
+    if customer.email:
+        email = customer.email.lower()[:TOKEN_MAX_LENGTH]
+        tokens.add(('email', email))
+    for phone in (customer.phone, customer.phone_secondary):
+        tokens.update(('phone', token) for token in phone_tokens(phone))
+    return tokens
+
+
+def vehicle_tokens(vehicle):
+    tokens = {('registration', token) for token in registration_tokens(vehicle.registration_number)}
+    for field in (vehicle.make, vehicle.model):
+        tokens.update(('name', word) for word in words(field))
+    return tokens
+
+
+def order_tokens(order_number):
+    token = compact(order_number)
+    return {('code', token)} if token else set()
+
+
+def _replace_entries(entity_type, entity_id, customer_id, tokens):
+    """Write the token set for one entity, touching only rows that changed"""
+    tokens = {(kind, token) for kind, token in tokens if token}
+    existing = {}
+    moved = []
+    for pk, kind, token, owner_id in SearchIndexEntry.objects.filter(
+        entity_type=entity_type, entity_id=entity_id
+    ).values_list('pk', 'kind', 'token', 'customer_id'):
+        existing[(kind, token)] = pk
+        if owner_id != customer_id:
+            moved.append(pk)
+    stale = [pk for key, pk in existing.items() if key not in tokens]
+    missing = tokens - set(existing)
+    if not stale and not missing and not moved:
+        return
+
+    if stale:
+        SearchIndexEntry.objects.filter(pk__in=stale).delete()
+    if moved:
+        # A vehicle that changed owner keeps its tokens but must resolve to the new customer
+        SearchIndexEntry.objects.filter(pk__in=moved).update(customer_id=customer_id)
+    if missing:
+        SearchIndexEntry.objects.bulk_create(
+            [
+                SearchIndexEntry(
+                    entity_type=entity_type,
+                    entity_id=entity_id,
+                    customer_id=customer_id,
+                    kind=kind,
+                    token=token,
+                )
+                for kind, token in missing
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def index_customer(customer):
+    if customer.is_deleted:
+        remove_entity('customer', customer.pk)
+        return
+    _replace_entries('customer', customer.pk, customer.pk, customer_tokens(customer))
+
+
+def index_vehicle(vehicle):
+    _replace_entries('vehicle', vehicle.pk, vehicle.customer_id, vehicle_tokens(vehicle))
+
+
+def index_order(order):
+    _replace_entries('order', order.pk, order.customer_id, order_tokens(order.order_number))
+
+
+def remove_entity(entity_type, entity_id):
+    SearchIndexEntry.objects.filter(entity_type=entity_type, entity_id=entity_id).delete()
+
+
+def index_batch(customers=(), vehicles=()):
+    """Re-index many customers and vehicles with one delete per type and batched inserts"""
+    entries = []
+    for entity_type, instances, tokens, owner in (
+        ('customer', customers, customer_tokens, lambda customer: customer.pk),
+        ('vehicle', vehicles, vehicle_tokens, lambda vehicle: vehicle.customer_id),
+    ):
+        if not instances:
+            continue
+        SearchIndexEntry.objects.filter(
+            entity_type=entity_type, entity_id__in=[instance.pk for instance in instances]
+        ).delete()
+        entries.extend(
+            SearchIndexEntry(entity_type=entity_type, entity_id=instance.pk,
+                             customer_id=owner(instance), kind=kind, token=token)
+            for instance in instances
+            if not getattr(instance, 'is_deleted', False)
+            for kind, token in tokens(instance) if token
+        )
+    SearchIndexEntry.objects.bulk_create(entries, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+    return len(entries)
+
+
+def rebuild_search_index(chunk_size=2000):
+    """Rebuild every entry in the current tenant database, returning the entry count"""
+    def flush(batch):
+        SearchIndexEntry.objects.bulk_create(batch, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+        return len(batch)
+
+    from apps.services.models import ServiceOrder
+
+    db_alias = router.db_for_write(SearchIndexEntry)
+    total = 0
+    with transaction.atomic(using=db_alias):
+        SearchIndexEntry.objects.all().delete()
+
+        batch = []
+        for customer in Customer.objects.only(
+            'id', 'first_name', 'last_name', 'company_name', 'customer_id',
+            'email', 'phone', 'phone_secondary'
+        ).iterator(chunk_size=chunk_size):
+            batch.extend(
+                SearchIndexEntry(entity_type='customer', entity_id=customer.pk,
+                                 customer_id=customer.pk, kind=kind, token=token)
+                for kind, token in customer_tokens(customer)
+            )
+            if len(batch) >= BULK_BATCH_SIZE:
+                total += flush(batch)
+                batch = []
+
+        for vehicle in Vehicle.objects.only(
+            'id', 'customer_id', 'registration_number', 'make', 'model'
+        ).iterator(chunk_size=chunk_size):
+            batch.extend(
+                SearchIndexEntry(entity_type='vehicle', entity_id=vehicle.pk,
+                                 customer_id=vehicle.customer_id, kind=kind, token=token)
+                for kind, token in vehicle_tokens(vehicle)
+            )
+            if len(batch) >= BULK_BATCH_SIZE:
+                total += flush(batch)
+                batch = []
+
+        for order_id, order_number, customer_id in ServiceOrder.objects.values_list(
+            'id', 'order_number', 'customer_id'
+        ).iterator(chunk_size=chunk_size):
+            batch.extend(
+                SearchIndexEntry(entity_type='order', entity_id=order_id,
+                                 customer_id=customer_id, kind=kind, token=token)
+                for kind, token in order_tokens(order_number)
+            )
+            if len(batch) >= BULK_BATCH_SIZE:
+                total += flush(batch)
+                batch = []
+
+        if batch:
+            total += flush(batch)
+
+    return total
+
+
+# ================================
+# QUERY API
+# ================================
+
+def _matching(entity_types, query, field):
+    """
+    Values queryset of ``field`` for entries matching every word of ``query``.
+
+    Multi-word queries also match the compacted query as a single token, so
+    'KCA 123A' and '0712 345 678' hit registration and phone tokens. A query
+    containing '@' is a prefix of the whole email token, which is indexed as
+    one value. Returns None when the query is too short to search.
+    """
+    query = (query or '').strip()
+    if len(query) < MIN_QUERY_LENGTH:
+        return None
+
+    base = SearchIndexEntry.objects.filter(entity_type__in=entity_types)
+    if '@' in query:
+        return base.filter(kind='email', token__startswith=query.lower()[:TOKEN_MAX_LENGTH]).values(field)
+
+    terms = words(query)
+    joined = compact(query)
+    if not terms:
+        return None
+
+    matches = base.filter(token__startswith=terms[0])
+    for term in terms[1:]:
+        matches = matches.filter(
+            **{f'{field}__in': base.filter(token__startswith=term).values(field)}
+        )
+    if len(terms) > 1 and joined:
+        matches = base.filter(token__startswith=joined) | matches
+    return matches.values(field)
+
+
+def customer_ids_matching(query):
+    """Customer ids matched by customer details or by one of their vehicles"""
+    return _matching(('customer', 'vehicle'), query, 'customer_id')
+
+
+def vehicle_ids_matching(query):
+    return _matching(('vehicle',), query, 'entity_id')
+
+
+def order_ids_matching(query):
+    return _matching(('order',), query, 'entity_id')
+
+
+def filter_customers(queryset, query):
+    ids = customer_ids_matching(query)
+    return queryset.none() if ids is None else queryset.filter(id__in=ids)
+
+
+def filter_vehicles(queryset, query):
+    ids = vehicle_ids_matching(query)
+    return queryset.none() if ids is None else queryset.filter(id__in=ids)
+
+
+def filter_orders(queryset, query):
+    """Orders matched by order number, customer details or vehicle registration"""
+    from django.db.models import Q
+
+    order_ids = order_ids_matching(query)
+    if order_ids is None:
+        return queryset.none()
+    return queryset.filter(
+        Q(id__in=order_ids) |
+        Q(customer_id__in=_matching(('customer',), query, 'entity_id')) |
+        Q(vehicle_id__in=vehicle_ids_matching(query))
+    )
+
+
+def search(query, limit=10, entity_types=('customer', 'vehicle', 'order')):
+    """
+    Shared typeahead search returning plain dicts grouped by entity type.
+
+    Each group costs one query: a semi-join from the token index to the
+    entity table with only the displayed columns selected.
+    """
+    from apps.services.models import ServiceOrder
+
+    results = {'customers': [], 'vehicles': [], 'orders': []}
+    if len((query or '').strip()) < MIN_QUERY_LENGTH:
+        return results
+
+    if 'customer' in entity_types:
+        customers = filter_customers(Customer.objects.filter(is_active=True), query).values(
+            'id', 'customer_id', 'first_name', 'last_name', 'company_name',
+            'customer_type', 'phone', 'email', 'is_vip'
+        )[:limit]
+        for row in customers:
+            full_name = f"{row['first_name']} {row['last_name']}".strip()
+            results['customers'].append({
+                'id': str(row['id']),
+                'customer_id': row['customer_id'],
+                'name': row['company_name'] if row['customer_type'] == 'corporate' and row['company_name'] else full_name,
+                'full_name': full_name,
+                'phone': str(row['phone']) if row['phone'] else '',
+                'email': row['email'],
+                'is_vip': row['is_vip'],
+            })
+
+    if 'vehicle' in entity_types:
+        vehicles = filter_vehicles(Vehicle.objects.filter(is_active=True), query).values(
+            'id', 'registration_number', 'make', 'model', 'year', 'color',
+            'customer_id', 'customer__first_name', 'customer__last_name', 'customer__phone'
+        )[:limit]
+        for row in vehicles:
+            results['vehicles'].append({
+                'id': str(row['id']),
+                'registration_number': row['registration_number'],
+                'make_model': f"{row['make']} {row['model']} ({row['year']})",
+                'color': row['color'],
+                'customer': {
+                    'id': str(row['customer_id']),
+                    'name': f"{row['customer__first_name']} {row['customer__last_name']}".strip(),
+                    'phone': str(row['customer__phone']) if row['customer__phone'] else '',
+                },
+            })
+
+    if 'order' in entity_types:
+        order_ids = order_ids_matching(query)
+        orders = ServiceOrder.objects.filter(id__in=order_ids).values(
+            'id', 'order_number', 'status', 'total_amount', 'created_at',
+            'customer__first_name', 'customer__last_name'
+        ).order_by('-created_at')[:limit]
+        for row in orders:
+            results['orders'].append({
+                'id': str(row['id']),
+                'order_number': row['order_number'],
+                'status': row['status'],
+                'total_amount': float(row['total_amount'] or 0),
+                'created_at': row['created_at'].isoformat() if row['created_at'] else None,
+                'customer_name': f"{row['customer__first_name']} {row['customer__last_name']}".strip(),
+            })
+
+    return results
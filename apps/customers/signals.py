@@ -0,0 +1,128 @@
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.dispatch import receiver
+import logging
+
+from .models import Customer, Vehicle, LoyaltyProgram
+from . import search
+
+logger = logging.getLogger(__name__)
+
+# Saves limited to other fields (loyalty points, balances) skip re-indexing
+CUSTOMER_INDEXED_FIELDS = {
+    'first_name', 'last_name', 'company_name', 'customer_id',
+    'email', 'phone', 'phone_secondary', 'is_deleted',
+}
+VEHICLE_INDEXED_FIELDS = {'registration_number', 'make', 'model', 'customer'}
+
+
+def _touches_index(update_fields, indexed_fields):
+    return update_fields is None or bool(set(update_fields) & indexed_fields)
+
+
+@receiver(post_save, sender=Customer)
+def index_customer_on_save(sender, instance, **kwargs):
+    """Keep customer search tokens current"""
+    if not _touches_index(kwargs.get('update_fields'), CUSTOMER_INDEXED_FIELDS):
+        return
+    try:
+        search.index_customer(instance)
+    except Exception as e:
+        logger.error(f"Failed to index customer {instance.pk}: {e}")
+
+
+@receiver(post_delete, sender=Customer)
+def remove_customer_from_index(sender, instance, **kwargs):
+    try:
+        search.remove_entity('customer', instance.pk)
+    except Exception as e:
+        logger.error(f"Failed to remove customer {instance.pk} from search index: {e}")
+
+
+@receiver(post_save, sender=Vehicle)
+def index_vehicle_on_save(sender, instance, **kwargs):
+    """Keep vehicle registration tokens current"""
+    if not _touches_index(kwargs.get('update_fields'), VEHICLE_INDEXED_FIELDS):
+        return
+    try:
+        search.index_vehicle(instance)
+    except Exception as e:
+        logger.error(f"Failed to index vehicle {instance.pk}: {e}")
+
+
+@receiver(post_delete, sender=Vehicle)
+def remove_vehicle_from_index(sender, instance, **kwargs):
+    try:
+        search.remove_entity('vehicle', instance.pk)
+    except Exception as e:
+        logger.error(f"Failed to remove vehicle {instance.pk} from search index: {e}")
+
+
+@receiver(post_save, sender='services.ServiceOrder')
+def index_order_on_save(sender, instance, created, **kwargs):
+    """Index order numbers when orders are created (order numbers never change)"""
+    update_fields = kwargs.get('update_fields')
+    if not created and not (update_fields and 'order_number' in update_fields):
+        return
+    try:
+        search.index_order(instance)
+    except Exception as e:
+        logger.error(f"Failed to index order {instance.pk}: {e}")
+
+
+@receiver(post_delete, sender='services.ServiceOrder')
+def remove_order_from_index(sender, instance, **kwargs):
+    try:
+        search.remove_entity('order', instance.pk)
+    except Exception as e:
+        logger.error(f"Failed to remove order {instance.pk} from search index: {e}")
+
+
+@receiver(post_save, sender='services.ServiceOrder')
+def update_lifetime_stats_on_order_save(sender, instance, created, **kwargs):
+    """Recompute stored customer/vehicle statistics when an order's customer, vehicle, status or amount changes"""
+    from .stats_utils import refresh_lifetime_stats
+
+    origin = getattr(instance, '_lifetime_origin', None)
+    current = instance.lifetime_state
+    instance._lifetime_origin = current
+    if origin == current:
+        return
+
+    try:
+        refresh_lifetime_stats(
+            {origin[0] if origin else None, current[0]},
+            {origin[1] if origin else None, current[1]},
+        )
+    except Exception as e:
+        logger.error(f"Failed to refresh lifetime stats for order {instance.pk}: {e}")
+
+
+@receiver(post_delete, sender='services.ServiceOrder')
+def update_lifetime_stats_on_order_delete(sender, instance, **kwargs):
+    from .stats_utils import refresh_lifetime_stats
+
+    try:
+        refresh_lifetime_stats({instance.customer_id}, {instance.vehicle_id})
+    except Exception as e:
+        logger.error(f"Failed to refresh lifetime stats after deleting order {instance.pk}: {e}")
+
+
+@receiver(post_save, sender=LoyaltyProgram)
+def recompute_tiers_on_program_save(sender, instance, created, **kwargs):
+    """Re-tier every customer once the program's thresholds or active flag change"""
+    from .loyalty_utils import recompute_tiers
+
+    origin = getattr(instance, '_tier_origin', None)
+    current = instance.tier_state
+    instance._tier_origin = current
+    if origin == current:
+        return
+
+    def recompute():
+        try:
+            recompute_tiers()
+        except Exception as e:
+            logger.error(f"Failed to recompute loyalty tiers for program {instance.pk}: {e}")
+
+    transaction.on_commit(recompute, using=kwargs.get('using'))
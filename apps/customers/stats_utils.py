@@ -0,0 +1,122 @@
+"""
+Customer and vehicle lifetime statistics
+
+Order counts, last visit, average ticket and total spent used to be queried
+from ``ServiceOrder`` per customer or vehicle, so list pages and exports ran
+one or more queries per row. They are now stored on ``Customer`` and
+``Vehicle`` and recomputed from the orders of the affected customers and
+vehicles, in the same transaction as any order save that changes its
+customer, vehicle, status, amount or date. ``manage.py
+rebuild_customer_stats`` recomputes every row in chunks.
+"""
+from decimal import Decimal
+import logging
+
+from django.db import router, transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+
+from .models import Customer, Vehicle
+
+logger = logging.getLogger(__name__)
+
+LIFETIME_FIELDS = ['order_count', 'completed_order_count', 'last_service_date', 'average_ticket', 'total_spent']
+CHUNK_SIZE = 2000
+
+ZERO = Decimal('0.00')
+EMPTY = {
+    'order_count': 0,
+    'completed_order_count': 0,
+    'last_service_date': None,
+    'average_ticket': ZERO,
+    'total_spent': ZERO,
+}
+
+
+def _aggregate(owner_field, ids):
+    """``{owner_id: lifetime values}`` from one grouped query over the owners' orders"""
+    from apps.services.models import ServiceOrder
+
+    completed = Q(status='completed')
+    rows = ServiceOrder.objects.filter(**{f'{owner_field}__in': ids}).values(owner_field).annotate(
+        orders=Count('id'),
+        completed=Count('id', filter=completed),
+        last_order_at=Max('created_at'),
+        spent=Sum('total_amount', filter=completed),
+    ).order_by()
+
+    values = {}
+    for row in rows:
+        spent = row['spent'] or ZERO
+        values[row[owner_field]] = {
+            'order_count': row['orders'],
+            'completed_order_count': row['completed'],
+            'last_service_date': timezone.localdate(row['last_order_at']) if row['last_order_at'] else None,
+            'average_ticket': (spent / row['completed']).quantize(Decimal('0.01')) if row['completed'] else ZERO,
+            'total_spent': spent,
+        }
+    return values
+
+
+def _store(model, queryset, values):
+    """Write computed values onto the rows of ``queryset``, touching only rows that changed"""
+    changed = []
+    for instance in queryset:
+        fields = values.get(instance.pk, EMPTY)
+        if all(getattr(instance, field) == value for field, value in fields.items()):
+            continue
+        for field, value in fields.items():
+            setattr(instance, field, value)
+        changed.append(instance)
+    if changed:
+        # bulk_update sends no signals, so search indexing and updated_at are left alone
+        model._default_manager.bulk_update(changed, LIFETIME_FIELDS, batch_size=CHUNK_SIZE)
+    return len(changed)
+
+
+def _managers():
+    return ((Customer, Customer.all_objects, 'customer_id'), (Vehicle, Vehicle.objects, 'vehicle_id'))
+
+
+def refresh_lifetime_stats(customer_ids=(), vehicle_ids=()):
+    """Recompute the stored statistics of the given customers and vehicles; returns rows changed"""
+    ids = {
+        'customer_id': {pk for pk in customer_ids if pk},
+        'vehicle_id': {pk for pk in vehicle_ids if pk},
+    }
+    if not any(ids.values()):
+        return 0
+
+    changed = 0
+    with transaction.atomic(using=router.db_for_write(Customer)):
+        for model, manager, owner_field in _managers():
+            if not ids[owner_field]:
+                continue
+            rows = manager.select_for_update().filter(pk__in=ids[owner_field]).only('pk', *LIFETIME_FIELDS)
+            changed += _store(model, rows, _aggregate(owner_field, ids[owner_field]))
+    return changed
+
+
+def rebuild_lifetime_stats(chunk_size=CHUNK_SIZE):
+    """
+    Recompute every customer's and vehicle's statistics in the current tenant.
+
+    Works through primary keys ``chunk_size`` at a time, each chunk in its own
+    transaction; returns ``{'customers': changed, 'vehicles': changed}``.
+    """
+    totals = {}
+    for model, manager, owner_field in _managers():
+        changed, last_pk = 0, None
+        while True:
+            page = manager.order_by('pk')
+            if last_pk is not None:
+                page = page.filter(pk__gt=last_pk)
+            chunk = list(page.values_list('pk', flat=True)[:chunk_size])
+            if not chunk:
+                break
+            with transaction.atomic(using=router.db_for_write(model)):
+                rows = manager.select_for_update().filter(pk__in=chunk).only('pk', *LIFETIME_FIELDS)
+                changed += _store(model, rows, _aggregate(owner_field, chunk))
+            last_pk = chunk[-1]
+        totals[f"{model._meta.model_name}s"] = changed
+    return totals
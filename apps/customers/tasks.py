@@ -0,0 +1,16 @@
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def import_customers_job(tenant_id, job_id, path, user_id=None):
+    """
+    Import a stored customer/vehicle upload in its tenant's database
+    Queued by import_utils.start_import_job when CUSTOMER_IMPORT_BACKEND is 'celery'
+    """
+    from .import_utils import run_import_job
+
+    summary = run_import_job(tenant_id, job_id, path, user_id)
+    return {'rows': summary['rows'], 'errors': summary['error_count']} if summary else None
@@ -27,6 +27,7 @@ urlpatterns = [
     # AJAX endpoints
     path('ajax/search/', views.customer_search_ajax, name='search_ajax'),
     path('ajax/vehicles/search/', views.vehicle_search_ajax, name='vehicle_search_ajax'),
+    path('ajax/quick-search/', views.quick_search_ajax, name='quick_search_ajax'),
     path('ajax/vehicle-customer/', views.vehicle_customer_ajax, name='vehicle_customer_ajax'),
     path('ajax/check-walk-in-transactions/', views.check_walk_in_transactions_ajax, name='check_walk_in_transactions'),
     
@@ -41,4 +42,5 @@ urlpatterns = [
 
     # Import
     path('import/', views.customer_import_view, name='import'),
+    path('import/<str:job_id>/status/', views.customer_import_status, name='import_status'),
 ]
\ No newline at end of file
@@ -1,11 +1,10 @@
-import csv
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.http import require_http_methods, require_POST
 from django.db import transaction
-from django.db.models import Q, Count, Sum, Avg
+from django.db.models import Avg, Prefetch
 from django.utils import timezone
 from django.core.paginator import Paginator
 from django.template.loader import render_to_string
@@ -14,6 +13,7 @@ from django.urls import reverse
 from apps.core.decorators import employee_required, ajax_required
 from apps.core.utils import generate_unique_code, send_sms_notification, send_email_notification
 from apps.core.logging_utils import AutoWashLogger
+from apps.core.pagination_utils import KeysetPaginator
 from .models import (
     Customer, Vehicle, CustomerNote, CustomerDocument, 
     CustomerFeedback, LoyaltyProgram
@@ -22,9 +22,14 @@ from .forms import (
     CustomerForm, VehicleForm, CustomerNoteForm, 
     CustomerDocumentForm, CustomerFeedbackForm, CustomerSearchForm
 )
+from . import search
+from .loyalty_utils import dashboard_summary
 import json
+import logging
 import uuid
 
+logger = logging.getLogger(__name__)
+
 def _convert_uuid(pk):
     """Convert string UUID to UUID object if needed"""
     try:
@@ -52,6 +57,7 @@ def get_customer_urls(request):
         'feedback': f"{base_url}/{{customer_pk}}/feedback/",
         'search_ajax': f"{base_url}/ajax/search/",
         'vehicle_search_ajax': f"{base_url}/ajax/vehicles/search/",
+        'quick_search_ajax': f"{base_url}/ajax/quick-search/",
         'loyalty_dashboard': f"{base_url}/loyalty/",
         'export': f"{base_url}/export/",
         'import': f"{base_url}/import/",
@@ -78,6 +84,7 @@ def get_business_url(request, url_name, **kwargs):
         'customers:loyalty_dashboard': f"{base_url}/loyalty/",
         'customers:export': f"{base_url}/export/",
         'customers:import': f"{base_url}/import/",
+        'customers:import_status': f"{base_url}/import/{{job_id}}/status/",
     }
     url = url_mapping.get(url_name, f"{base_url}/")
     for key, value in kwargs.items():
@@ -99,15 +106,7 @@ def customer_list_view(request):
         is_active = search_form.cleaned_data.get('is_active')
         
         if search_query:
-            customers = customers.filter(
-                Q(first_name__icontains=search_query) |
-                Q(last_name__icontains=search_query) |
-                Q(company_name__icontains=search_query) |
-                Q(customer_id__icontains=search_query) |
-                Q(email__icontains=search_query) |
-                Q(phone__icontains=search_query) |
-                Q(vehicles__registration_number__icontains=search_query)
-            ).distinct()
+            customers = search.filter_customers(customers, search_query)
         
         if customer_type:
             customers = customers.filter(customer_type=customer_type)
@@ -120,15 +119,15 @@ def customer_list_view(request):
     
     # Sorting
     sort_by = request.GET.get('sort', 'created_at')
-    if sort_by in ['first_name', 'last_name', 'created_at', 'total_spent', 'loyalty_points']:
-        if request.GET.get('order') == 'desc':
-            sort_by = f'-{sort_by}'
-        customers = customers.order_by(sort_by)
+    if sort_by not in ['first_name', 'last_name', 'created_at', 'total_spent', 'loyalty_points']:
+        sort_by = 'created_at'
+    if request.GET.get('order') == 'desc':
+        sort_by = f'-{sort_by}'
+    customers = customers.order_by(sort_by)
     
     # Pagination
-    paginator = Paginator(customers, 20)
-    page = request.GET.get('page')
-    customers_page = paginator.get_page(page)
+    paginator = KeysetPaginator(customers, 20)
+    customers_page = paginator.get_page(request.GET)
     
     # Statistics
     stats = {
@@ -256,28 +255,29 @@ def customer_detail_view(request, pk):
     documents = customer.documents.all()
     feedback = customer.feedback.all()[:3]
     
-    # Calculate customer statistics - Handle import errors gracefully
+    # Customer statistics are stored on the customer (see stats_utils)
+    order_stats = {
+        'total_orders': customer.order_count,
+        'completed_orders': customer.completed_order_count,
+        'total_spent': customer.total_spent,
+        'avg_order_value': customer.average_ticket,
+        'last_service_date': customer.last_service_date,
+    }
     try:
-        from apps.services.models import ServiceOrder
-        order_stats = ServiceOrder.objects.filter(customer=customer).aggregate(
-            total_orders=Count('id'),
-            total_spent=Sum('total_amount'),
-            avg_order_value=Avg('total_amount')
-        )
-        recent_orders = ServiceOrder.objects.filter(customer=customer).order_by('-created_at')[:5]
+        from apps.services.models import ServiceOrder, ServiceOrderItem
+        recent_orders = ServiceOrder.objects.filter(customer=customer).select_related(
+            'vehicle'
+        ).prefetch_related(
+            Prefetch('order_items', queryset=ServiceOrderItem.objects.select_related('service', 'inventory_item'))
+        ).order_by('-created_at')[:5]
     except ImportError:
-        order_stats = {'total_orders': 0, 'total_spent': 0, 'avg_order_value': 0}
-        recent_orders = []
-    except Exception as e:
-        print(f"Error fetching order stats: {e}")
-        order_stats = {'total_orders': 0, 'total_spent': 0, 'avg_order_value': 0}
         recent_orders = []
     
     # Loyalty program info
     loyalty_program = LoyaltyProgram.objects.filter(is_active=True).first()
     customer_tier = None
     if loyalty_program:
-        customer_tier = loyalty_program.get_customer_tier(customer)
+        customer_tier = customer.loyalty_tier
     
     context = {
         'customer': customer,
@@ -462,16 +462,11 @@ def customer_search_ajax(request):
     query = request.GET.get('q', '').strip()
     customers = []
     
-    if len(query) >= 2:
+    if len(query) >= search.MIN_QUERY_LENGTH:
         try:
-            customer_qs = Customer.objects.filter(
-                Q(first_name__icontains=query) |
-                Q(last_name__icontains=query) |
-                Q(company_name__icontains=query) |
-                Q(customer_id__icontains=query) |
-                Q(phone__icontains=query) |
-                Q(vehicles__registration_number__icontains=query)
-            ).distinct()[:10]
+            customer_qs = search.filter_customers(Customer.objects.all(), query).prefetch_related(
+                Prefetch('vehicles', queryset=Vehicle.objects.filter(is_active=True), to_attr='active_vehicles')
+            )[:10]
             
             customers = [
                 {
@@ -488,7 +483,7 @@ def customer_search_ajax(request):
                             'make_model': f"{vehicle.make} {vehicle.model}",
                             'year': vehicle.year
                         }
-                        for vehicle in customer.vehicles.filter(is_active=True)
+                        for vehicle in customer.active_vehicles
                     ]
                 }
                 for customer in customer_qs
@@ -507,11 +502,10 @@ def vehicle_search_ajax(request):
     query = request.GET.get('q', '').strip()
     vehicles = []
     
-    if len(query) >= 2:
+    if len(query) >= search.MIN_QUERY_LENGTH:
         try:
-            vehicle_qs = Vehicle.objects.select_related('customer').filter(
-                registration_number__icontains=query,
-                is_active=True
+            vehicle_qs = search.filter_vehicles(
+                Vehicle.objects.select_related('customer').filter(is_active=True), query
             )[:10]
             
             vehicles = [
@@ -535,6 +529,27 @@ def vehicle_search_ajax(request):
     
     return JsonResponse({'vehicles': vehicles})
 
+@login_required
+@employee_required()
+@ajax_required
+def quick_search_ajax(request):
+    """Shared typeahead search across customers, vehicles and orders"""
+    query = request.GET.get('q', '').strip()
+    types = request.GET.get('types')
+    entity_types = tuple(t for t in types.split(',') if t) if types else ('customer', 'vehicle', 'order')
+    try:
+        limit = min(int(request.GET.get('limit', 10)), 50)
+    except (TypeError, ValueError):
+        limit = 10
+    
+    try:
+        results = search.search(query, limit=limit, entity_types=entity_types)
+    except Exception:
+        logger.exception("Quick search failed")
+        return JsonResponse({'error': 'Search failed', 'customers': [], 'vehicles': [], 'orders': []})
+    
+    return JsonResponse(results)
+
 @login_required
 @employee_required()
 @require_POST
@@ -599,39 +614,45 @@ def deactivate_customer(request, pk):
 @login_required
 @employee_required()
 def customer_export_view(request):
-    """Export customer data to CSV/Excel - FIXED UUID handling"""
-    import csv
-    from django.http import HttpResponse
-    
+    """Export customer data to CSV/Excel (``?format=xlsx``), streamed in chunks"""
+    from apps.core.export_utils import choice_labels, export_response, iter_values
+
     try:
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="customers.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'Customer ID', 'Name', 'Type', 'Email', 'Phone', 'City', 
-            'Total Orders', 'Total Spent', 'Loyalty Points', 'VIP Status', 
+        header = [
+            'Customer ID', 'Name', 'Type', 'Email', 'Phone', 'City',
+            'Total Orders', 'Total Spent', 'Loyalty Points', 'VIP Status',
             'Active Status', 'Created Date'
-        ])
-        
-        customers = Customer.objects.all().select_related()
-        for customer in customers:
-            writer.writerow([
-                customer.customer_id,
-                customer.display_name,
-                customer.get_customer_type_display(),
-                customer.email,
-                str(customer.phone) if customer.phone else '',
-                customer.city,
-                customer.total_orders,
-                float(customer.total_spent) if customer.total_spent else 0,  # Convert Decimal to float
-                customer.loyalty_points,
-                'Yes' if customer.is_vip else 'No',
-                'Yes' if customer.is_active else 'No',
-                customer.created_at.strftime('%Y-%m-%d')
-            ])
-        
-        return response
+        ]
+        type_labels = choice_labels(Customer, 'customer_type')
+        customers = Customer.objects.all()
+        fields = [
+            'customer_id', 'first_name', 'last_name', 'company_name', 'customer_type', 'email',
+            'phone', 'city', 'order_count', 'total_spent', 'loyalty_points', 'is_vip',
+            'is_active', 'created_at',
+        ]
+
+        def rows():
+            for customer in iter_values(customers, fields):
+                if customer['customer_type'] == 'corporate' and customer['company_name']:
+                    name = customer['company_name']
+                else:
+                    name = f"{customer['first_name']} {customer['last_name']}".strip()
+                yield [
+                    customer['customer_id'],
+                    name,
+                    type_labels.get(customer['customer_type'], customer['customer_type']),
+                    customer['email'],
+                    str(customer['phone']) if customer['phone'] else '',
+                    customer['city'],
+                    customer['order_count'],
+                    float(customer['total_spent']) if customer['total_spent'] else 0,
+                    customer['loyalty_points'],
+                    'Yes' if customer['is_vip'] else 'No',
+                    'Yes' if customer['is_active'] else 'No',
+                    timezone.localtime(customer['created_at']).strftime('%Y-%m-%d'),
+                ]
+
+        return export_response(request, 'customers', header, rows(), 'Customers')
     except Exception as e:
         messages.error(request, f'Error exporting customers: {str(e)}')
         return redirect(get_business_url(request, 'customers:list'))
@@ -639,57 +660,67 @@ def customer_export_view(request):
 @login_required
 @employee_required()    
 def customer_import_view(request):
-    """Import customer data from CSV/Excel - FIXED UUID handling"""
-    from django.core.files.storage import FileSystemStorage
-    from django.core.exceptions import ValidationError
+    """Import customers and vehicles from CSV/Excel in chunks; large files import in the background"""
+    from .import_utils import import_customers, should_run_in_background, start_import_job
+    
+    context = {'title': 'Import Customers', 'urls': get_customer_urls(request)}
     
     if request.method == 'POST' and request.FILES.get('file'):
         file = request.FILES['file']
-        fs = FileSystemStorage()
-        filename = fs.save(file.name, file)
-        file_path = fs.path(filename)
+        
+        if should_run_in_background(file):
+            job_id = start_import_job(file, request.user)
+            messages.info(request, 'Your file is being imported. This page updates when it is done.')
+            return redirect(f"{get_business_url(request, 'customers:import')}?job={job_id}")
         
         try:
-            with open(file_path, 'r') as f:
-                reader = csv.reader(f)
-                next(reader)  # Skip header row
-                
-                for row in reader:
-                    if len(row) < 12:  # Ensure all required fields are present
-                        continue
-                    
-                    customer_data = {
-                        'customer_id': row[0],
-                        'first_name': row[1],
-                        'last_name': row[2],
-                        'email': row[3],
-                        'phone': row[4] if row[4] else None,
-                        'city': row[5],
-                        'customer_type': row[6],
-                        'is_vip': row[7].lower() == 'yes',
-                        'is_active': row[8].lower() == 'yes',
-                        'created_at': row[9]
-                    }
-                    
-                    # Create or update customer
-                    customer, created = Customer.objects.update_or_create(
-                        customer_id=customer_data['customer_id'],
-                        defaults=customer_data
-                    )
-                    
-                    if created:
-                        messages.success(request, f'Customer {customer.display_name} imported successfully!')
-                    else:
-                        messages.info(request, f'Customer {customer.display_name} updated successfully!')
-            
-            fs.delete(filename)  # Clean up uploaded file
-            
-            return redirect(get_business_url(request, 'customers:list'))
-        except ValidationError as ve:
-            messages.error(request, f'Validation error: {str(ve)}')
+            summary = import_customers(file, request.user)
         except Exception as e:
             messages.error(request, f'Error importing customers: {str(e)}')
-    return render(request, 'customers/customer_import.html', {'title': 'Import Customers', 'urls': get_customer_urls(request)})
+            return render(request, 'customers/customer_import.html', context)
+        
+        _import_summary_message(request, summary)
+        if summary['error_count']:
+            # Stay on the page so the row errors can be reviewed
+            context['summary'] = summary
+            return render(request, 'customers/customer_import.html', context)
+        return redirect(get_business_url(request, 'customers:list'))
+    
+    job_id = request.GET.get('job')
+    if job_id:
+        context['job_id'] = job_id
+        context['status_url'] = get_business_url(request, 'customers:import_status', job_id=job_id)
+    return render(request, 'customers/customer_import.html', context)
+
+
+def _import_summary_message(request, summary):
+    """One flash message for a whole import instead of one per row"""
+    created, updated = summary['created'], summary['updated']
+    text = (
+        f"Imported {summary['rows']} rows: {created['customers']} customers and {created['vehicles']} vehicles "
+        f"created, {updated['customers']} customers and {updated['vehicles']} vehicles updated"
+    )
+    if summary['error_count']:
+        messages.warning(request, f"{text}; {summary['error_count']} rows had errors.")
+    else:
+        messages.success(request, f"{text}.")
+
+
+@login_required
+@employee_required()
+def customer_import_status(request, job_id):
+    """Progress and summary of a background import, polled by the import page"""
+    from .import_utils import get_import_job
+    
+    job = get_import_job(job_id)
+    if job is None:
+        return JsonResponse({'status': 'unknown', 'error': 'Import not found'}, status=404)
+    return JsonResponse({
+        'status': job.status,
+        'rows': job.rows,
+        'summary': job.summary,
+        'error': job.error,
+    })
 
 @login_required
 @employee_required()
@@ -770,31 +801,11 @@ def loyalty_dashboard_view(request):
         messages.info(request, 'No active loyalty program found.')
         return redirect(get_business_url(request, 'customers:list'))
     
-    # Get customers by tier
-    customers = Customer.objects.filter(is_active=True)
-    tier_stats = {
-        'bronze': 0,
-        'silver': 0,
-        'gold': 0,
-        'platinum': 0
-    }
-    
-    for customer in customers:
-        tier = loyalty_program.get_customer_tier(customer)
-        tier_stats[tier] += 1
-    
-    # Top customers by points
-    top_customers = customers.order_by('-loyalty_points')[:10]
-    
-    # Recent activity (placeholder for now)
-    recent_activity = []
-    
+    summary = dashboard_summary(loyalty_program)
     context = {
         'loyalty_program': loyalty_program,
-        'tier_stats': tier_stats,
-        'top_customers': top_customers,
-        'recent_activity': recent_activity,
-        'total_customers': customers.count(),
+        **summary,
+        'top_customers': summary['top_members'],
         'title': 'Loyalty Program Dashboard',
         'urls': get_customer_urls(request),
     }
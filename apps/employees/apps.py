@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class EmployeesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.employees'
+    
+    def ready(self):
+        # Import signals
+        try:
+            import apps.employees.signals
+        except ImportError:
+            pass
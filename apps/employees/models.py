@@ -1,10 +1,10 @@
 from django.db import models
-from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from phonenumber_field.modelfields import PhoneNumberField
-from apps.core.tenant_models import TenantTimeStampedModel, TenantSoftDeleteModel
+from apps.core.tenant_models import TenantTimeStampedModel, TenantSoftDeleteModel, TenantSoftDeleteManager
 from apps.core.models import Address, ContactInfo
 from apps.core.utils import upload_to_path
+from .user_utils import UserPrefetchQuerySet, get_user
 from decimal import Decimal
 from django.utils import timezone
 
@@ -169,21 +169,22 @@ class Employee(TenantSoftDeleteModel, Address, ContactInfo):
     def __str__(self):
         return f"{self.full_name} ({self.employee_id})"
     
-    def save(self, *args, **kwargs):
-        # Auto-populate user_id from user if not set
-        if hasattr(self, 'user') and self.user and not self.user_id:
-            self.user_id = self.user.id
-        super().save(*args, **kwargs)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Loaded user, so a re-assigned employee row also invalidates the previous user's cached role
+        instance._role_origin_user_id = instance.__dict__.get('user_id')
+        return instance
     
     @property
     def user(self):
-        """Get user object from main database"""
+        """Get user object from main database (attached by prefetch_users, else one lookup per request)"""
         if not self.user_id:
             return None
-        try:
-            return User.objects.using('default').get(id=self.user_id)
-        except User.DoesNotExist:
-            return None
+        cached = self.__dict__.get('_user_cache')
+        if cached is None or cached[0] != self.user_id:
+            cached = self._user_cache = (self.user_id, get_user(self.user_id))
+        return cached[1]
     
     @property
     def full_name(self):
@@ -244,6 +245,9 @@ class Employee(TenantSoftDeleteModel, Address, ContactInfo):
             return self.subordinates.filter(is_active=True)
         return Employee.objects.none()
     
+    objects = TenantSoftDeleteManager.from_queryset(UserPrefetchQuerySet)()
+    all_objects = models.Manager.from_queryset(UserPrefetchQuerySet)()
+    
     class Meta:
         verbose_name = "Employee"
         verbose_name_plural = "Employees"
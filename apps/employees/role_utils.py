@@ -0,0 +1,207 @@
+"""
+Cached employee role resolution
+
+``employee_required`` used to load (or ``get_or_create`` for owners) the
+current user's ``Employee`` row on every request, ``suspension_check_required``
+and the ``user_role_context`` context processor each queried it again, and
+the context processor compared ``tenant.owner == request.user``, which loads
+the owner from the main database.
+
+The facts permission checks need (employee pk and code, role, status, active
+and login flags, owner flag and the role flags templates use) are now cached
+per (tenant database, user):
+
+* in the session, so a user's own requests need no shared-cache read,
+* in the shared cache, so a new session or another worker skips the full
+  load (and the owner's ``get_or_create``),
+* both tagged with the version of the user's ``Employee`` row (its pk and
+  ``updated_at``), read from the tenant database on every check. The version
+  lives with the row rather than in the cache because the default cache is
+  per process on some deployments, where a bumped counter would only reach
+  one worker; any save, deactivation or soft delete changes ``updated_at``,
+  so it applies on the next request in every worker.
+
+In steady state a permission check costs one indexed single-row query.
+``request.employee`` becomes a lazy ``Employee`` that answers the cached fields
+directly and loads the row only when a view uses anything else.
+"""
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject, empty
+
+logger = logging.getLogger(__name__)
+
+SESSION_KEY = 'employee_roles'
+DEFAULT_ROLE_CACHE_TIMEOUT = 3600
+
+MANAGER_ROLES = ('owner', 'manager')
+CACHED_FIELDS = ('employee_id', 'user_id', 'role', 'status', 'is_active', 'can_login')
+
+
+def _timeout():
+    return getattr(settings, 'EMPLOYEE_ROLE_CACHE_TIMEOUT', DEFAULT_ROLE_CACHE_TIMEOUT)
+
+
+def role_permissions(role):
+    """Role flags exposed to templates by ``user_role_context``"""
+    return {
+        'is_owner': role == 'owner',
+        'is_admin': role in MANAGER_ROLES,
+        'is_manager': role in MANAGER_ROLES,
+        'is_attendant': role == 'attendant',
+        'is_supervisor': role == 'supervisor',
+        'is_cashier': role == 'cashier',
+        'is_cleaner': role == 'cleaner',
+    }
+
+
+# ================================
+# VERSIONS
+# ================================
+
+def _record_key(db_alias, user_id):
+    return f"employee_role:{db_alias}:{user_id}"
+
+
+def _version(db_alias, user_id):
+    """Version of a user's employee row in a tenant, shared by every worker through the database"""
+    from .models import Employee
+
+    row = Employee.all_objects.using(db_alias).filter(user_id=user_id).values_list('pk', 'updated_at').first()
+    if row is None:
+        return 'none'
+    return f"{row[0]}:{row[1].isoformat()}"
+
+
+def invalidate_role(db_alias, user_id):
+    """Drop the shared copy of a user's role; other copies fail their version check"""
+    if not user_id:
+        return
+    try:
+        cache.delete(_record_key(db_alias, user_id))
+    except Exception as e:
+        logger.warning(f"Could not invalidate employee role for user {user_id}: {e}")
+
+
+# ================================
+# RESOLUTION
+# ================================
+
+def _load(tenant, db_alias, user_id, is_owner):
+    """Role record built from the tenant database; owners get an employee row on first visit"""
+    from .models import Employee
+
+    employee = None
+    if is_owner:
+        try:
+            employee, created = Employee.objects.using(db_alias).get_or_create(
+                user_id=user_id,
+                defaults={
+                    'employee_id': f'OWN{user_id}',
+                    'role': 'owner',
+                    'employment_type': 'full_time',
+                    'status': 'active',
+                    'is_active': True,
+                    'can_login': True,
+                    'hire_date': tenant.created_at.date(),
+                }
+            )
+            if created:
+                logger.info(f"Created owner employee record for user {user_id} in {db_alias}")
+        except Exception as e:
+            logger.error(f"Could not load owner employee record for user {user_id}: {e}")
+            is_owner = False
+    if employee is None:
+        employee = Employee.objects.using(db_alias).filter(user_id=user_id, is_active=True).first()
+
+    record = {'pk': None, 'user_id': user_id, 'is_owner': is_owner}
+    if employee:
+        record.update({field: getattr(employee, field) for field in CACHED_FIELDS})
+        record['pk'] = str(employee.pk)
+        record['permissions'] = role_permissions(employee.role)
+    return record
+
+
+def resolve_role(tenant, user_id, session=None):
+    """
+    Cached role record of ``user_id`` in ``tenant``; the record's ``pk`` is
+    None when the user has no employee row.
+    """
+    db_alias = f"tenant_{tenant.id}"
+    is_owner = tenant.owner_id == user_id
+
+    version = _version(db_alias, user_id)
+
+    def current(record):
+        return bool(record and record.get('version') == version
+                and record.get('user_id') == user_id and record.get('is_owner') == is_owner)
+
+    roles = session.get(SESSION_KEY, {}) if session is not None else {}
+    record = roles.get(db_alias)
+    if current(record):
+        return record
+
+    try:
+        record = cache.get(_record_key(db_alias, user_id))
+    except Exception:
+        record = None
+    if not current(record):
+        record = _load(tenant, db_alias, user_id, is_owner)
+        record['version'] = version
+        if version == 'none' and record['pk']:
+            # An owner's first visit creates the row, changing the version just read
+            record['version'] = _version(db_alias, user_id)
+        try:
+            cache.set(_record_key(db_alias, user_id), record, _timeout())
+        except Exception as e:
+            logger.warning(f"Could not cache employee role for user {user_id}: {e}")
+
+    if session is not None:
+        roles[db_alias] = record
+        session[SESSION_KEY] = roles
+    return record
+
+
+def get_employee_role(request):
+    """Role record of the current user in the current tenant, or None if not an employee"""
+    if '_employee_role' not in request.__dict__:
+        record = None
+        tenant = getattr(request, 'tenant', None)
+        user = getattr(request, 'user', None)
+        if tenant and user is not None and user.is_authenticated:
+            from apps.core.database_router import TenantDatabaseManager
+
+            TenantDatabaseManager.add_tenant_to_settings(tenant)
+            record = resolve_role(tenant, user.id, getattr(request, 'session', None))
+        request._employee_role = record if record and record['pk'] else None
+    return request._employee_role
+
+
+def get_request_employee(request):
+    """Lazy ``Employee`` for the current user, or None if not an employee"""
+    if '_cached_employee' not in request.__dict__:
+        record = get_employee_role(request)
+        request._cached_employee = CachedEmployee(record, f"tenant_{request.tenant.id}") if record else None
+    return request._cached_employee
+
+
+class CachedEmployee(SimpleLazyObject):
+    """Employee whose cached role fields are served without loading the row"""
+
+    def __init__(self, record, db_alias):
+        from .models import Employee
+
+        self.__dict__['_record'] = record
+        super().__init__(lambda: Employee.objects.using(db_alias).get(pk=record['pk']))
+
+    def __getattr__(self, name):
+        if self._wrapped is empty:
+            record = self.__dict__['_record']
+            if name in ('pk', 'id'):
+                return uuid.UUID(record['pk'])
+            if name in CACHED_FIELDS:
+                return record[name]
+        return super().__getattr__(name)
@@ -0,0 +1,29 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+import logging
+
+from .models import Employee
+from .role_utils import invalidate_role
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Employee)
+def invalidate_role_on_save(sender, instance, **kwargs):
+    """Cached roles follow role, status, activation and login changes"""
+    db_alias = kwargs.get('using') or instance._state.db
+    origin = getattr(instance, '_role_origin_user_id', None)
+    instance._role_origin_user_id = instance.user_id
+    for user_id in {origin, instance.user_id}:
+        try:
+            invalidate_role(db_alias, user_id)
+        except Exception as e:
+            logger.error(f"Failed to invalidate cached role for employee {instance.pk}: {e}")
+
+
+@receiver(post_delete, sender=Employee)
+def invalidate_role_on_delete(sender, instance, **kwargs):
+    try:
+        invalidate_role(kwargs.get('using') or instance._state.db, instance.user_id)
+    except Exception as e:
+        logger.error(f"Failed to invalidate cached role for employee {instance.pk}: {e}")
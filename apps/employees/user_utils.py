@@ -0,0 +1,154 @@
+"""
+Cross-database user resolution for employees
+
+``Employee`` lives in the tenant database and stores a plain ``user_id``; the
+``User`` row is in the main database, so Django cannot ``select_related`` or
+``prefetch_related`` it. ``Employee.user`` used to run one main-database query
+on every access, and ``full_name``, ``username``, ``email`` and the name
+properties all go through it, so any employee list, attendance sheet or order
+list with an attendant cost one or more queries per row.
+
+Users are now resolved through:
+
+* ``prefetch_users(instances, *lookups)``: collects the ``user_id`` of the
+  employees (or of the employees reached through ``lookups`` such as
+  ``'assigned_attendant'``), loads them with one ``in_bulk`` query and
+  attaches them to each employee,
+* ``Employee.objects.with_users(*lookups)``: the same, run when the queryset
+  is evaluated (including paginated slices), and
+* a per-request identity map, so repeated lookups of the same user within a
+  request are free. Outside a request (commands, workers) only the users
+  attached to each instance are reused.
+"""
+import logging
+import threading
+
+from django.contrib.auth.models import User
+from django.core.signals import request_finished, request_started
+from django.db.models import QuerySet
+from django.db.models.query import ModelIterable
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+IDENTITY_MAP_MAX_SIZE = 1000
+
+_local = threading.local()
+
+
+# ================================
+# PER-REQUEST IDENTITY MAP
+# ================================
+
+@receiver(request_started)
+def _open_identity_map(**kwargs):
+    _local.users = {}
+
+
+@receiver(request_finished)
+def _close_identity_map(**kwargs):
+    _local.users = None
+
+
+def _identity_map():
+    return getattr(_local, 'users', None)
+
+
+def resolve_users(user_ids):
+    """``{user_id: User}`` for the given ids, querying only ids not seen in this request"""
+    user_ids = {user_id for user_id in user_ids if user_id}
+    known = _identity_map()
+    if known is None:
+        return User.objects.using('default').in_bulk(user_ids) if user_ids else {}
+
+    missing = user_ids - known.keys()
+    # Taken before any overflow clear below drops them from the map
+    users = {user_id: known[user_id] for user_id in user_ids - missing if known[user_id] is not None}
+    if missing:
+        found = User.objects.using('default').in_bulk(missing)
+        users.update(found)
+        if len(known) + len(missing) > IDENTITY_MAP_MAX_SIZE:
+            known.clear()
+        # Misses are remembered as None so deleted users are not looked up again
+        known.update({user_id: found.get(user_id) for user_id in missing})
+    return users
+
+
+def get_user(user_id):
+    if not user_id:
+        return None
+    return resolve_users([user_id]).get(user_id)
+
+
+def forget_user(user_id):
+    """Drop a user from this request's identity map after it changes"""
+    known = _identity_map()
+    if known:
+        known.pop(user_id, None)
+
+
+@receiver(post_save, sender=User)
+def _forget_saved_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+# ================================
+# PREFETCHING
+# ================================
+
+def _follow(instances, lookup):
+    """Objects reached from ``instances`` through a ``__``-separated single-valued relation path"""
+    targets = instances
+    for attr in lookup.split('__') if lookup else ():
+        targets = [getattr(target, attr, None) for target in targets]
+        targets = [target for target in targets if target is not None]
+    return targets
+
+
+def prefetch_users(instances, *lookups):
+    """
+    Attach main-database users to employees with one query.
+
+    ``instances`` are employees themselves, or any rows whose ``lookups``
+    lead to employees (``prefetch_users(orders, 'assigned_attendant')``).
+    Querysets are evaluated and keep their result cache, so iterating them
+    afterwards reuses the attached users. Returns ``instances``.
+    """
+    rows = list(instances)
+    employees = []
+    for lookup in lookups or ('',):
+        employees.extend(target for target in _follow(rows, lookup) if hasattr(target, 'user_id'))
+
+    users = resolve_users(employee.user_id for employee in employees)
+    for employee in employees:
+        employee._user_cache = (employee.user_id, users.get(employee.user_id))
+    return instances
+
+
+class UserPrefetchQuerySet(QuerySet):
+    """QuerySet that attaches main-database users to its results when evaluated"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._user_lookups = ()
+
+    def with_users(self, *lookups):
+        """Prefetch users of the rows themselves plus any employees reached through ``lookups``"""
+        clone = self._chain()
+        clone._user_lookups = tuple(dict.fromkeys(clone._user_lookups + ('',) + lookups))
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._user_lookups = self._user_lookups
+        return clone
+
+    def _fetch_all(self):
+        fetched = self._result_cache is None
+        super()._fetch_all()
+        if fetched and self._user_lookups and issubclass(self._iterable_class, ModelIterable):
+            try:
+                prefetch_users(self._result_cache, *self._user_lookups)
+            except Exception as e:
+                logger.warning(f"Could not prefetch users: {e}")
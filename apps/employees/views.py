@@ -125,7 +125,7 @@ def employee_list_view(request):
     """List all employees - FIXED to remove user select_related"""
     employees = Employee.objects.select_related(
         'department', 'position', 'supervisor'
-    ).all()
+    ).with_users('supervisor')
     department_id = request.GET.get('department')
     role = request.GET.get('role')
     status = request.GET.get('status', 'active')
@@ -10,9 +10,12 @@ from .models import (
 
 logger = logging.getLogger(__name__)
 
+# The functions below work on the current tenant's database. The celery tasks
+# at the end of this module run them for every active tenant through
+# apps.core.scheduler_utils.
 
-@shared_task
-def generate_recurring_expenses():
+
+def create_due_recurring_expenses():
     """
     Generate expenses from recurring expense templates
     Run this task daily to create due recurring expenses
@@ -45,8 +48,7 @@ def generate_recurring_expenses():
     return generated_count
 
 
-@shared_task
-def update_budget_spent_amounts():
+def refresh_budget_spent_amounts():
     """
     Update spent amounts for all budgets based on actual expenses
     Run this task nightly to keep budget tracking accurate
@@ -100,8 +102,7 @@ def update_budget_spent_amounts():
     return updated_count
 
 
-@shared_task
-def auto_link_inventory_expenses():
+def link_inventory_expenses():
     """
     Automatically create expenses for inventory purchases
     """
@@ -202,8 +203,7 @@ def auto_link_salary_expenses():
     #     return 0
 
 
-@shared_task
-def auto_link_commission_expenses():
+def link_commission_expenses():
     """
     Automatically create expenses for service commissions
     """
@@ -251,8 +251,7 @@ def auto_link_commission_expenses():
         return 0
 
 
-@shared_task
-def check_overdue_expenses():
+def find_overdue_expenses():
     """
     Check for overdue expenses and send notifications
     """
@@ -279,8 +278,7 @@ def check_overdue_expenses():
     return overdue_expenses.count()
 
 
-@shared_task
-def generate_monthly_expense_report():
+def build_monthly_expense_report():
     """
     Generate monthly expense report and send to management
     Run this task on the first day of each month
@@ -345,8 +343,7 @@ def generate_monthly_expense_report():
         return None
 
 
-@shared_task
-def cleanup_old_expense_data():
+def purge_old_expense_data():
     """
     Cleanup old expense data (soft-deleted expenses older than 1 year)
     """
@@ -363,3 +360,63 @@ def cleanup_old_expense_data():
     
     logger.info(f"Cleaned up {deleted_count} old expense records")
     return deleted_count
+
+
+# ================================
+# TENANT FAN-OUT TASKS
+# ================================
+
+@shared_task
+def generate_recurring_expenses(shards=None, time_limit=None):
+    """Run create_due_recurring_expenses for every active tenant"""
+    from apps.core.scheduler_utils import run_tenant_jobs
+
+    return run_tenant_jobs(['expenses.recurring_expenses'], shards=shards, time_limit=time_limit)
+
+
+@shared_task
+def update_budget_spent_amounts(shards=None, time_limit=None):
+    """Run refresh_budget_spent_amounts for every active tenant"""
+    from apps.core.scheduler_utils import run_tenant_jobs
+
+    return run_tenant_jobs(['expenses.budget_spent'], shards=shards, time_limit=time_limit)
+
+
+@shared_task
+def auto_link_inventory_expenses(shards=None, time_limit=None):
+    """Run link_inventory_expenses for every active tenant"""
+    from apps.core.scheduler_utils import run_tenant_jobs
+
+    return run_tenant_jobs(['expenses.inventory_links'], shards=shards, time_limit=time_limit)
+
+
+@shared_task
+def auto_link_commission_expenses(shards=None, time_limit=None):
+    """Run link_commission_expenses for every active tenant"""
+    from apps.core.scheduler_utils import run_tenant_jobs
+
+    return run_tenant_jobs(['expenses.commission_links'], shards=shards, time_limit=time_limit)
+
+
+@shared_task
+def check_overdue_expenses(shards=None, time_limit=None):
+    """Run find_overdue_expenses for every active tenant"""
+    from apps.core.scheduler_utils import run_tenant_jobs
+
+    return run_tenant_jobs(['expenses.overdue'], shards=shards, time_limit=time_limit)
+
+
+@shared_task
+def generate_monthly_expense_report(shards=None, time_limit=None):
+    """Run build_monthly_expense_report for every active tenant"""
+    from apps.core.scheduler_utils import run_tenant_jobs
+
+    return run_tenant_jobs(['expenses.monthly_report'], shards=shards, time_limit=time_limit)
+
+
+@shared_task
+def cleanup_old_expense_data(shards=None, time_limit=None):
+    """Run purge_old_expense_data for every active tenant"""
+    from apps.core.scheduler_utils import run_tenant_jobs
+
+    return run_tenant_jobs(['expenses.cleanup'], shards=shards, time_limit=time_limit)
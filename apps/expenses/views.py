@@ -1,8 +1,7 @@
-import csv
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods, require_POST
 from django.db import transaction
 from django.db.models import Q, Count, Sum, Avg, F, Max
@@ -18,6 +17,7 @@ import json
 import uuid
 
 from apps.core.decorators import employee_required, ajax_required
+from apps.core.pagination_utils import KeysetPaginator
 from .models import (
     Expense, ExpenseCategory, Vendor, RecurringExpense, 
     ExpenseBudget, ExpenseApproval
@@ -257,12 +257,11 @@ def expense_list_view(request):
         )
     
     # Order by date
-    expenses = expenses.order_by('-expense_date', '-created_at')
+    expenses = expenses.order_by('-expense_date', '-created_at', '-id')
     
     # Pagination
-    paginator = Paginator(expenses, 25)
-    page_number = request.GET.get('page')
-    expenses_page = paginator.get_page(page_number)
+    paginator = KeysetPaginator(expenses, 25)
+    expenses_page = paginator.get_page(request.GET)
     
     context = {
         'expenses': expenses_page,
@@ -605,6 +604,23 @@ def expense_pay_view(request, pk):
     return tenant_redirect(request, 'expenses:detail', pk=expense.pk)
 
 
+def _bulk_update_expenses(queryset, **changes):
+    """
+    Queryset update that also schedules the report facts of the affected
+    dates, since ``.update()`` sends no ``post_save``
+    """
+    from django.db import router
+    from apps.reports.fact_utils import mark_dirty
+
+    db_alias = queryset.db or router.db_for_write(Expense)
+    with transaction.atomic(using=db_alias):
+        dates = set(queryset.values_list('expense_date', flat=True))
+        updated = queryset.update(**changes)
+        if updated:
+            mark_dirty(db_alias, ['expenses'], dates)
+    return updated
+
+
 @employee_required()
 @require_POST
 @login_required
@@ -628,7 +644,8 @@ def expense_bulk_action_view(request):
         )
         
         if action == 'approve':
-            updated = expenses.filter(status='pending').update(
+            updated = _bulk_update_expenses(
+                expenses.filter(status='pending'),
                 status='approved',
                 approved_by_user_id=request.user.id,
                 approved_at=timezone.now()
@@ -636,18 +653,19 @@ def expense_bulk_action_view(request):
             messages.success(request, f'{updated} expenses approved.')
             
         elif action == 'reject':
-            updated = expenses.filter(status='pending').update(status='rejected')
+            updated = _bulk_update_expenses(expenses.filter(status='pending'), status='rejected')
             messages.success(request, f'{updated} expenses rejected.')
             
         elif action == 'mark_paid':
-            updated = expenses.filter(status__in=['approved', 'pending']).update(
+            updated = _bulk_update_expenses(
+                expenses.filter(status__in=['approved', 'pending']),
                 status='paid',
                 paid_date=timezone.now().date()
             )
             messages.success(request, f'{updated} expenses marked as paid.')
             
         elif action == 'delete':
-            updated = expenses.update(is_active=False)
+            updated = _bulk_update_expenses(expenses, is_active=False)
             messages.success(request, f'{updated} expenses deleted.')
     
     return tenant_redirect(request, 'expenses:list')
@@ -1035,40 +1053,45 @@ def expense_search_ajax(request):
 @login_required
 @employee_required(['owner', 'manager', 'supervisor'])
 def expense_export_view(request):
-    """Export expenses to CSV"""
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="expenses.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
+    """Export expenses to CSV (or Excel with ``?format=xlsx``), streamed in chunks"""
+    from apps.core.export_utils import choice_labels, export_response, iter_values
+
+    header = [
         'Title', 'Category', 'Vendor', 'Amount', 'Tax', 'Total',
         'Date', 'Due Date', 'Status', 'Type', 'Payment Method',
         'Reference Number', 'Created At'
-    ])
-    
-    expenses = Expense.objects.filter(is_active=True).select_related(
-        'category', 'vendor'
-    ).order_by('-expense_date')
-    
-    for expense in expenses:
-        writer.writerow([
-            expense.title,
-            expense.category.name,
-            expense.vendor.name if expense.vendor else '',
-            expense.amount,
-            expense.tax_amount,
-            expense.total_amount,
-            expense.expense_date,
-            expense.due_date or '',
-            expense.get_status_display(),
-            expense.get_expense_type_display(),
-            expense.get_payment_method_display(),
-            expense.reference_number,
-            expense.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        ])
-    
-    return response
+    ]
+    status_labels = choice_labels(Expense, 'status')
+    type_labels = choice_labels(Expense, 'expense_type')
+    method_labels = choice_labels(Expense, 'payment_method')
+    fields = [
+        'title', 'category__name', 'vendor__name', 'amount', 'tax_amount', 'total_amount',
+        'expense_date', 'due_date', 'status', 'expense_type', 'payment_method',
+        'reference_number', 'created_at',
+    ]
+
+    def rows():
+        expenses = iter_values(
+            Expense.objects.filter(is_active=True), fields, ordering=['-expense_date', '-created_at']
+        )
+        for expense in expenses:
+            yield [
+                expense['title'],
+                expense['category__name'],
+                expense['vendor__name'] or '',
+                expense['amount'],
+                expense['tax_amount'],
+                expense['total_amount'],
+                expense['expense_date'],
+                expense['due_date'] or '',
+                status_labels.get(expense['status'], expense['status']),
+                type_labels.get(expense['expense_type'], expense['expense_type']),
+                method_labels.get(expense['payment_method'], expense['payment_method']),
+                expense['reference_number'],
+                timezone.localtime(expense['created_at']).strftime('%Y-%m-%d %H:%M:%S'),
+            ]
+
+    return export_response(request, 'expenses', header, rows(), 'Expenses')
 
 
 # Additional views for categories, recurring expenses, budgets, and reports
@@ -1,7 +1,7 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods, require_POST
 from django.db import transaction
 from django.db.models import Q, Count, Sum, Avg, F, Max, Case, When, Value, FloatField, IntegerField
@@ -11,6 +11,7 @@ from django.template.loader import render_to_string
 from django.urls import reverse
 from apps.core.decorators import employee_required, manager_required, ajax_required
 from apps.core.utils import generate_unique_code
+from apps.core.pagination_utils import KeysetPaginator
 from .models import (
     InventoryItem, InventoryCategory, Unit, StockMovement, 
     StockAdjustment, ItemConsumption, StockTake, StockTakeCount,
@@ -511,9 +512,8 @@ def stock_movements_view(request):
         movements = movements.filter(created_at__date__lte=date_to)
     
     # Pagination
-    paginator = Paginator(movements, 50)
-    page = request.GET.get('page')
-    movements_page = paginator.get_page(page)
+    paginator = KeysetPaginator(movements, 50)
+    movements_page = paginator.get_page(request.GET)
     
     # Calculate totals for filtered results
     totals = movements.aggregate(
@@ -935,16 +935,26 @@ def inventory_valuation_report(request):
             'margin': float(item['profit_margin'] or 0)
         })
     
-    # Trend data (mock for now - you can implement actual trend tracking)
-    import datetime
-    trend_chart_data = []
-    for i in range(30, 0, -1):
-        date = datetime.datetime.now() - datetime.timedelta(days=i)
-        # This would be actual historical data in production
-        trend_chart_data.append({
-            'date': date.strftime('%b %d'),
-            'value': float(total_inventory_value) * (0.95 + (i * 0.001))  # Mock trend
-        })
+    # 30-day value trend: walk back from today's value by the stock value
+    # moved in and out on each later day (daily stock facts)
+    from apps.reports.fact_utils import ensure_facts
+    from apps.reports.models import DailyStockFact
+    from apps.reports.timeseries_utils import TimeSeries, balance_history
+    
+    trend_end = timezone.localdate()
+    trend_start = trend_end - timedelta(days=29)
+    ensure_facts(trend_start, trend_end)
+    movements = TimeSeries.from_queryset(
+        DailyStockFact.objects.filter(date__range=[trend_start, trend_end]), 'date',
+        trend_start, trend_end, value_in='value_in', value_out='value_out'
+    )
+    values = balance_history(
+        total_inventory_value, movements.columns['value_in'] - movements.columns['value_out']
+    )
+    trend_chart_data = [
+        {'date': label, 'value': round(float(value), 2)}
+        for label, value in zip(movements.labels('%b %d'), values)
+    ]
     
     context = {
         'inventory_items': inventory_items,
@@ -970,35 +980,45 @@ def inventory_valuation_report(request):
 @login_required
 @employee_required()
 def export_inventory_csv(request):
-    """Export inventory to CSV"""
-    import csv
+    """Export inventory to CSV (or Excel with ``?format=xlsx``), streamed in chunks"""
+    from apps.core.export_utils import export_response, iter_values
 
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="inventory_report.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow([
+    header = [
         'SKU', 'Name', 'Category', 'Current Stock', 'Unit', 'Unit Cost',
         'Stock Value', 'Min Stock', 'Max Stock', 'Reorder Point', 'Status'
-    ])
-
-    items = InventoryItem.objects.filter(is_active=True).select_related('category', 'unit')
-    for item in items:
-        writer.writerow([
-            item.sku,
-            item.name,
-            item.category.name if item.category else '',
-            item.current_stock,
-            item.unit.abbreviation if item.unit else '',
-            item.unit_cost,
-            item.stock_value,
-            item.minimum_stock_level,
-            item.maximum_stock_level,
-            item.reorder_point,
-            item.stock_status
-        ])
-
-    return response
+    ]
+    fields = [
+        'sku', 'name', 'category__name', 'current_stock', 'unit__abbreviation', 'unit_cost',
+        'minimum_stock_level', 'maximum_stock_level', 'reorder_point',
+    ]
+
+    def stock_status(item):
+        # Mirrors InventoryItem.stock_status
+        if item['current_stock'] <= 0:
+            return 'out_of_stock'
+        if item['current_stock'] <= item['minimum_stock_level']:
+            return 'low_stock'
+        if item['current_stock'] >= item['maximum_stock_level']:
+            return 'overstock'
+        return 'normal'
+
+    def rows():
+        for item in iter_values(InventoryItem.objects.filter(is_active=True), fields):
+            yield [
+                item['sku'],
+                item['name'],
+                item['category__name'] or '',
+                item['current_stock'],
+                item['unit__abbreviation'] or '',
+                item['unit_cost'],
+                item['current_stock'] * item['unit_cost'],
+                item['minimum_stock_level'],
+                item['maximum_stock_level'],
+                item['reorder_point'],
+                stock_status(item),
+            ]
+
+    return export_response(request, 'inventory_report', header, rows(), 'Inventory')
 
 @login_required
 @employee_required()
@@ -1833,12 +1853,13 @@ def daily_operations_dashboard(request):
     on_duty_employees = []
     try:
         from apps.employees.models import Attendance
+        from apps.employees.user_utils import prefetch_users
         today_attendances = Attendance.objects.filter(
             date=today,
             check_out_time__isnull=True,
             status='present'
         ).select_related('employee')
-        on_duty_employees = [att.employee for att in today_attendances]
+        on_duty_employees = prefetch_users([att.employee for att in today_attendances])
     except:
         pass
     
@@ -0,0 +1,277 @@
+"""
+M-Pesa callback routing
+
+Daraja posts STK push results to a single callback URL, often without a
+business path, so the callback itself does not say which tenant database
+holds the transaction. When an STK push is accepted its CheckoutRequestID is
+recorded in ``MPesaCheckoutIndex`` in the main database; callbacks look the
+id up, enter the owning tenant's context and process the result there.
+Index rows expire after ``MPESA_CHECKOUT_INDEX_TTL_DAYS`` and are purged by
+``manage.py cleanup_mpesa_checkout_index``.
+
+The callback view only stores the raw body in the ``MPesaCallback`` inbox and
+acknowledges it; payment completion, stock deduction and notifications run in
+``manage.py process_mpesa_callbacks`` workers (or the celery task of the same
+name), which retry failures with exponential backoff.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.core.database_router import TenantDatabaseManager, get_current_tenant, tenant_context
+from apps.core.tenant_models import MPesaCallback, MPesaCheckoutIndex, Tenant
+
+logger = logging.getLogger(__name__)
+
+DB_ALIAS = 'default'
+DEFAULT_TTL_DAYS = 7
+
+# Seconds between background status queries; the last interval repeats
+STATUS_CHECK_BACKOFF = (5, 10, 20, 40)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 8
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 3600
+PROCESSING_TIMEOUT = timedelta(minutes=5)
+
+
+def _index():
+    return MPesaCheckoutIndex.objects.using(DB_ALIAS)
+
+
+def _ttl():
+    return timedelta(days=getattr(settings, 'MPESA_CHECKOUT_INDEX_TTL_DAYS', DEFAULT_TTL_DAYS))
+
+
+def callback_ids(callback_data):
+    """(checkout_request_id, merchant_request_id) from an STK callback body"""
+    stk_callback = (callback_data or {}).get('Body', {}).get('stkCallback', {})
+    return stk_callback.get('CheckoutRequestID'), stk_callback.get('MerchantRequestID')
+
+
+# ================================
+# INDEX MAINTENANCE
+# ================================
+
+def register_checkout(checkout_request_id, merchant_request_id='', payment_id='', tenant=None):
+    """Record which tenant owns an accepted STK push"""
+    tenant = tenant or get_current_tenant()
+    if not checkout_request_id or tenant is None:
+        return None
+
+    try:
+        entry, _ = _index().update_or_create(
+            checkout_request_id=checkout_request_id,
+            defaults={
+                'merchant_request_id': merchant_request_id or '',
+                'tenant_id': str(tenant.id),
+                'payment_id': payment_id or '',
+                'status': 'pending',
+                'status_checks': 0,
+                'next_check_at': timezone.now() + timedelta(seconds=STATUS_CHECK_BACKOFF[0]),
+                'expires_at': timezone.now() + _ttl(),
+            }
+        )
+        return entry
+    except DatabaseError as e:
+        # The callback can still be routed through the tenant path
+        logger.error(f"Could not index M-Pesa checkout {checkout_request_id}: {e}")
+        return None
+
+
+def purge_expired_checkouts():
+    """Delete expired index rows, returning how many were removed"""
+    deleted, _ = _index().filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+# ================================
+# ROUTING
+# ================================
+
+def resolve_tenant(checkout_request_id=None, merchant_request_id=None):
+    """Tenant that initiated the STK push, or None when it is not indexed"""
+    entry = None
+    if checkout_request_id:
+        entry = _index().filter(checkout_request_id=checkout_request_id).only('tenant_id').first()
+    if entry is None and merchant_request_id:
+        entry = _index().filter(merchant_request_id=merchant_request_id).only('tenant_id').first()
+    if entry is None:
+        return None
+
+    return Tenant.objects.using(DB_ALIAS).filter(id=entry.tenant_id, is_active=True).first()
+
+
+def process_mpesa_callback(callback_data, fallback_tenant=None):
+    """
+    Process an STK callback in the database of the tenant that owns it.
+
+    Falls back to ``fallback_tenant`` or the current tenant (callbacks posted
+    to a business path) when the checkout id is not indexed.
+    Returns ``(success, message)``.
+    """
+    checkout_request_id, merchant_request_id = callback_ids(callback_data)
+    tenant = resolve_tenant(checkout_request_id, merchant_request_id) or fallback_tenant
+
+    if tenant is None:
+        if get_current_tenant() is None:
+            logger.error(f"No tenant found for M-Pesa checkout {checkout_request_id}")
+            return False, "Unknown checkout request"
+        return _process_in_current_tenant(callback_data, checkout_request_id)
+
+    TenantDatabaseManager.add_tenant_to_settings(tenant)
+    with tenant_context(tenant):
+        return _process_in_current_tenant(callback_data, checkout_request_id)
+
+
+def _process_in_current_tenant(callback_data, checkout_request_id):
+    from .mpesa import MPesaService
+    from .status_utils import publish_checkout_status
+
+    success, message = MPesaService().process_webhook_callback(callback_data)
+    if success:
+        publish_checkout_status(checkout_request_id)
+    return success, message
+
+
+# ================================
+# CALLBACK INBOX
+# ================================
+
+def _callbacks():
+    return MPesaCallback.objects.using(DB_ALIAS)
+
+
+def dedupe_key(raw_body, callback_data):
+    """One inbox row per STK push; other payloads are deduplicated by content"""
+    checkout_request_id, _ = callback_ids(callback_data)
+    if checkout_request_id:
+        return f"stk:{checkout_request_id}"[:128]
+    return f"sha256:{hashlib.sha256(raw_body).hexdigest()}"
+
+
+def enqueue_callback(raw_body, callback_data):
+    """
+    Store a callback for the workers, returning ``(entry, created)``.
+
+    Repeated deliveries of the same callback return ``(None, False)``.
+    """
+    tenant = get_current_tenant()
+    checkout_request_id, _ = callback_ids(callback_data)
+    try:
+        with transaction.atomic(using=DB_ALIAS):
+            entry = _callbacks().create(
+                dedupe_key=dedupe_key(raw_body, callback_data),
+                checkout_request_id=(checkout_request_id or '')[:100],
+                tenant_id=str(tenant.id) if tenant else '',
+                payload=raw_body.decode('utf-8'),
+            )
+        return entry, True
+    except IntegrityError:
+        return None, False
+
+
+def _due():
+    now = timezone.now()
+    return Q(status='pending', next_attempt_at__lte=now) | Q(status='processing', locked_until__lte=now)
+
+
+def claim_callbacks(limit=BATCH_SIZE):
+    """Lock up to ``limit`` due callbacks for this worker; expired locks are taken over"""
+    now = timezone.now()
+    with transaction.atomic(using=DB_ALIAS):
+        entries = list(
+            _callbacks().select_for_update(skip_locked=True)
+            .filter(_due()).order_by('next_attempt_at')[:limit]
+        )
+        if not entries:
+            return []
+        _callbacks().filter(pk__in=[entry.pk for entry in entries]).update(
+            status='processing',
+            locked_until=now + PROCESSING_TIMEOUT,
+            attempts=F('attempts') + 1,
+        )
+
+    for entry in entries:
+        entry.status = 'processing'
+        entry.attempts += 1
+    return entries
+
+
+def _retry_delay(attempts):
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS))
+
+
+def process_callback_entry(entry):
+    """Process one claimed inbox row; returns 'processed', 'retry' or 'failed'"""
+    try:
+        callback_data = json.loads(entry.payload)
+        fallback_tenant = None
+        if entry.tenant_id:
+            fallback_tenant = Tenant.objects.using(DB_ALIAS).filter(id=entry.tenant_id).first()
+        success, message = process_mpesa_callback(callback_data, fallback_tenant)
+    except Exception as e:
+        logger.exception(f"M-Pesa callback {entry.pk} raised during processing")
+        success, message = False, str(e)
+
+    now = timezone.now()
+    if success:
+        _callbacks().filter(pk=entry.pk).update(
+            status='processed', processed_at=now, locked_until=None, last_error=''
+        )
+        logger.info(f"M-Pesa callback {entry.dedupe_key} processed: {message}")
+        return 'processed'
+
+    if entry.attempts >= MAX_ATTEMPTS:
+        _callbacks().filter(pk=entry.pk).update(status='failed', locked_until=None, last_error=message)
+        logger.error(f"M-Pesa callback {entry.dedupe_key} failed after {entry.attempts} attempts: {message}")
+        return 'failed'
+
+    _callbacks().filter(pk=entry.pk).update(
+        status='pending',
+        next_attempt_at=now + _retry_delay(entry.attempts),
+        locked_until=None,
+        last_error=message,
+    )
+    logger.warning(f"M-Pesa callback {entry.dedupe_key} will be retried: {message}")
+    return 'retry'
+
+
+def _process_in_thread(entry):
+    try:
+        return process_callback_entry(entry)
+    finally:
+        connections.close_all()
+
+
+def process_pending_callbacks(limit=BATCH_SIZE, workers=1):
+    """Claim and process one batch of due callbacks, returning outcome counts"""
+    results = {'processed': 0, 'retry': 0, 'failed': 0}
+    entries = claim_callbacks(limit)
+    if not entries:
+        return results
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(_process_in_thread, entries))
+    else:
+        outcomes = [process_callback_entry(entry) for entry in entries]
+
+    for outcome in outcomes:
+        results[outcome] += 1
+    return results
+
+
+def purge_processed_callbacks(days=30):
+    """Delete callbacks processed more than ``days`` ago, returning how many were removed"""
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = _callbacks().filter(status='processed', processed_at__lte=cutoff).delete()
+    return deleted
@@ -4,7 +4,7 @@ from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Submit, Row, Column, Field, HTML, Div
 from crispy_forms.bootstrap import FormActions
 from phonenumber_field.formfields import PhoneNumberField
-from .models import Payment, PaymentMethod, PaymentRefund, CashTransaction
+from .models import Payment, PaymentMethod, PaymentRefund, CashTransaction, StatementImport
 from .mpesa import validate_mpesa_phone
 from decimal import Decimal
 
@@ -444,4 +444,29 @@ class PaymentSearchForm(forms.Form):
     amount_max = forms.DecimalField(
         required=False,
         widget=forms.NumberInput(attrs={'step': '0.01', 'class': 'form-control'})
-    )
\ No newline at end of file
+    )
+
+
+class StatementUploadForm(forms.Form):
+    """M-Pesa or bank statement upload for reconciliation"""
+    source = forms.ChoiceField(
+        choices=StatementImport.SOURCE_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    statement_file = forms.FileField(
+        help_text='CSV or Excel (.xlsx) export',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'})
+    )
+    time_window_minutes = forms.IntegerField(
+        initial=30,
+        min_value=1,
+        max_value=1440,
+        help_text='How far apart statement and payment times may be for amount matches',
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+    
+    def clean_statement_file(self):
+        statement_file = self.cleaned_data['statement_file']
+        if not statement_file.name.lower().endswith(('.csv', '.xlsx')):
+            raise ValidationError('Upload a CSV or .xlsx statement.')
+        return statement_file
@@ -0,0 +1,41 @@
+"""
+Django management command to purge expired M-Pesa checkout index rows
+and callbacks processed longer ago than the retention period
+Schedule it (cron or celery beat) to keep the routing tables small
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Delete expired M-Pesa checkout routing entries and old processed callbacks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--callback-days',
+            type=int,
+            default=30,
+            help='Keep processed callbacks for this many days'
+        )
+
+    def handle(self, *args, **options):
+        from apps.payments.callback_utils import purge_expired_checkouts, purge_processed_callbacks
+
+        try:
+            deleted = purge_expired_checkouts()
+            self.stdout.write(
+                self.style.SUCCESS(f'✓ Removed {deleted} expired M-Pesa checkout index entries')
+            )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'✗ Failed to purge M-Pesa checkout index: {e}')
+            )
+
+        try:
+            deleted = purge_processed_callbacks(options['callback_days'])
+            self.stdout.write(
+                self.style.SUCCESS(f'✓ Removed {deleted} processed M-Pesa callbacks')
+            )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'✗ Failed to purge M-Pesa callbacks: {e}')
+            )
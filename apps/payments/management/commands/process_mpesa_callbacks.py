@@ -0,0 +1,67 @@
+"""
+Django management command to process queued M-Pesa callbacks
+Runs once by default; use --loop to keep a worker pool running
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Process M-Pesa callbacks stored by the callback endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Callbacks processed concurrently'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Callbacks claimed per batch'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling for new callbacks'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait between polls when the queue is empty'
+        )
+
+    def handle(self, *args, **options):
+        from apps.payments.callback_utils import process_pending_callbacks
+
+        workers = max(options['workers'], 1)
+        batch_size = max(options['batch_size'], 1)
+
+        while True:
+            try:
+                results = process_pending_callbacks(limit=batch_size, workers=workers)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'✗ Failed to process M-Pesa callbacks: {e}'))
+                if not options['loop']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            handled = sum(results.values())
+            if handled:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"✓ Processed {results['processed']}, retrying {results['retry']}, "
+                        f"failed {results['failed']} M-Pesa callbacks"
+                    )
+                )
+
+            if handled >= batch_size:
+                continue
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,60 @@
+"""
+Django management command to reconcile pending M-Pesa STK pushes
+Runs one pass by default; use --loop to keep the reconciler running
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Query Daraja for pending STK pushes and publish their status'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Checkouts checked per pass'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep checking for due checkouts'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait between passes when nothing is due'
+        )
+
+    def handle(self, *args, **options):
+        from apps.payments.status_utils import reconcile_pending_checkouts
+
+        batch_size = max(options['batch_size'], 1)
+
+        while True:
+            try:
+                results = reconcile_pending_checkouts(limit=batch_size)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'✗ M-Pesa status reconciliation failed: {e}'))
+                if not options['loop']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            checked = sum(results.values())
+            if results['resolved'] or results['expired']:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"✓ Resolved {results['resolved']}, expired {results['expired']}, "
+                        f"still pending {results['pending']} M-Pesa payments"
+                    )
+                )
+
+            if checked >= batch_size:
+                continue
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
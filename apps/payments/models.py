@@ -660,7 +660,7 @@ class MPesaTransaction(TenantTimeStampedModel):
     
     # STK Push details
     merchant_request_id = models.CharField(max_length=100, blank=True)
-    checkout_request_id = models.CharField(max_length=100, blank=True)
+    checkout_request_id = models.CharField(max_length=100, blank=True, db_index=True)
     result_code = models.CharField(max_length=10, blank=True)
     result_desc = models.TextField(blank=True)
     
@@ -962,3 +962,104 @@ class RecurringPayment(TenantTimeStampedModel):
     class Meta:
         verbose_name = "Recurring Payment"
         verbose_name_plural = "Recurring Payments"
+
+class StatementImport(TenantTimeStampedModel):
+    """Uploaded M-Pesa or bank statement matched against recorded payments"""
+    
+    SOURCE_CHOICES = [
+        ('mpesa', 'M-Pesa Statement'),
+        ('bank', 'Bank Statement'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, default='mpesa')
+    original_filename = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='processing')
+    
+    # Matching window used for fuzzy matches
+    time_window_minutes = models.PositiveIntegerField(default=30)
+    
+    # Results
+    period_start = models.DateTimeField(null=True, blank=True)
+    period_end = models.DateTimeField(null=True, blank=True)
+    total_rows = models.PositiveIntegerField(default=0)
+    exact_matches = models.PositiveIntegerField(default=0)
+    fuzzy_matches = models.PositiveIntegerField(default=0)
+    exception_rows = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    matched_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    uploaded_by_user_id = models.IntegerField(null=True, blank=True, help_text="User ID from public schema")
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error_message = models.TextField(blank=True)
+    
+    def __str__(self):
+        return f"{self.get_source_display()} - {self.original_filename}"
+    
+    @property
+    def matched_rows(self):
+        return self.exact_matches + self.fuzzy_matches
+    
+    @property
+    def match_rate(self):
+        if not self.total_rows:
+            return 0
+        return round(self.matched_rows / self.total_rows * 100, 1)
+    
+    class Meta:
+        verbose_name = "Statement Import"
+        verbose_name_plural = "Statement Imports"
+        ordering = ['-created_at']
+
+class StatementLine(TenantTimeStampedModel):
+    """One statement row and the payment it was matched to, if any"""
+    
+    MATCH_CHOICES = [
+        ('exact', 'Exact Match'),
+        ('fuzzy', 'Amount & Time Match'),
+        ('amount_mismatch', 'Amount Mismatch'),
+        ('duplicate', 'Duplicate Row'),
+        ('unmatched', 'Unmatched'),
+    ]
+    
+    statement = models.ForeignKey(StatementImport, on_delete=models.CASCADE, related_name='lines')
+    row_number = models.PositiveIntegerField()
+    
+    # Statement values
+    reference = models.CharField(max_length=100, blank=True, help_text="Receipt number or bank reference")
+    transaction_date = models.DateTimeField(null=True, blank=True)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    phone_number = models.CharField(max_length=20, blank=True)
+    details = models.CharField(max_length=255, blank=True)
+    
+    # Match result
+    match_status = models.CharField(max_length=20, choices=MATCH_CHOICES, default='unmatched')
+    payment = models.ForeignKey(
+        Payment,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='statement_lines'
+    )
+    note = models.CharField(max_length=255, blank=True)
+    
+    def __str__(self):
+        return f"{self.reference or self.row_number} - {self.get_match_status_display()}"
+    
+    @property
+    def is_exception(self):
+        return self.match_status not in ('exact', 'fuzzy')
+    
+    class Meta:
+        verbose_name = "Statement Line"
+        verbose_name_plural = "Statement Lines"
+        ordering = ['row_number']
+        indexes = [
+            models.Index(fields=['statement', 'match_status', 'row_number']),
+            models.Index(fields=['reference']),
+        ]
@@ -1,11 +1,12 @@
 import requests
 import base64
 import json
-from datetime import datetime, timedelta
+from datetime import datetime
 from django.conf import settings
-from django.utils import timezone
-from django.core.cache import cache
 from .models import Payment, MPesaTransaction, PaymentGateway
+from apps.core.http_utils import http_post
+from apps.core.oauth_utils import get_mpesa_token, mpesa_token_name, send_with_token
+from .callback_utils import register_checkout
 import logging
 import hashlib
 import hmac
@@ -34,73 +35,35 @@ class MPesaAPI:
             self.base_url = "https://api.safaricom.co.ke"
         else:
             self.base_url = "https://sandbox.safaricom.co.ke"
-        
-        self.access_token = None
-        self.token_expires_at = None
+    
+    @property
+    def token_name(self):
+        return f"gateway_{self.gateway.id}"
     
     def get_access_token(self):
-        """Get OAuth access token with caching"""
-        cache_key = f"mpesa_access_token_{self.gateway.id}"
-        
-        # Try to get from cache with error handling
-        token_data = None
+        """Get OAuth access token from the shared token manager"""
         try:
-            token_data = cache.get(cache_key)
+            return get_mpesa_token(
+                self.base_url,
+                self.consumer_key,
+                self.consumer_secret,
+                self.token_name
+            )
         except Exception as e:
-            logger.warning(f"Cache get failed for M-Pesa token: {e}")
-            # Continue without cache
-        
-        if token_data and token_data.get('expires_at') > timezone.now():
-            return token_data['token']
-        
-        url = f"{self.base_url}/oauth/v1/generate?grant_type=client_credentials"
-        
-        # Debug logging
-        logger.info(f"Requesting M-Pesa token from: {url}")
-        logger.info(f"Using consumer key: {self.consumer_key[:10]}..." if self.consumer_key else "No consumer key")
-        logger.info(f"Gateway ID: {self.gateway.id}, Environment: {'Live' if self.gateway.is_live else 'Sandbox'}")
-        
-        # Create authorization header
-        auth_string = f"{self.consumer_key}:{self.consumer_secret}"
-        auth_bytes = auth_string.encode('ascii')
-        auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
-        
-        headers = {
-            'Authorization': f'Basic {auth_b64}',
-            'Content-Type': 'application/json',
-        }
-        
-        try:
-            logger.info(f"Making auth request with headers: {dict((k, v[:20] + '...' if k == 'Authorization' else v) for k, v in headers.items())}")
-            response = requests.get(url, headers=headers, timeout=30)
-            
-            logger.info(f"Auth response status: {response.status_code}")
-            if response.status_code != 200:
-                logger.error(f"Auth response body: {response.text}")
-            
-            response.raise_for_status()
-            
-            data = response.json()
-            access_token = data['access_token']
-            expires_in = int(data.get('expires_in', 3600))
-            
-            # Cache token with expiry (with error handling)
-            expires_at = timezone.now() + timedelta(seconds=expires_in - 60)
-            try:
-                cache.set(cache_key, {
-                    'token': access_token,
-                    'expires_at': expires_at
-                }, expires_in - 60)
-            except Exception as e:
-                logger.warning(f"Cache set failed for M-Pesa token: {e}")
-                # Continue without caching
-            
-            return access_token
-            
-        except requests.RequestException as e:
             logger.error(f"Failed to get M-Pesa access token: {e}")
             raise Exception(f"M-Pesa authentication failed: {e}")
     
+    def _post(self, url, payload, retry=False):
+        """POST to Daraja with a bearer token, retrying once with a new token on 401"""
+        def send(access_token):
+            headers = {
+                'Authorization': f'Bearer {access_token}',
+                'Content-Type': 'application/json',
+            }
+            return http_post('mpesa', url, json=payload, headers=headers, retry=retry)
+        
+        return send_with_token(mpesa_token_name(self.token_name), self.get_access_token, send)
+    
     def generate_password(self, timestamp=None):
         """Generate password for STK push"""
         if not timestamp:
@@ -113,7 +76,6 @@ class MPesaAPI:
     def initiate_stk_push(self, phone_number, amount, account_reference, transaction_desc, callback_url):
         """Initiate STK Push payment request"""
         try:
-            access_token = self.get_access_token()
             timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
             password = self.generate_password(timestamp)
             
@@ -122,11 +84,6 @@ class MPesaAPI:
             
             url = f"{self.base_url}/mpesa/stkpush/v1/processrequest"
             
-            headers = {
-                'Authorization': f'Bearer {access_token}',
-                'Content-Type': 'application/json',
-            }
-            
             payload = {
                 'BusinessShortCode': self.shortcode,
                 'Password': password,
@@ -144,9 +101,8 @@ class MPesaAPI:
             logger.info(f"Initiating STK Push for {phone_number}, Amount: {amount}")
             logger.info(f"STK Push URL: {url}")
             logger.info(f"STK Push payload: {payload}")
-            logger.info(f"STK Push headers: {dict((k, v[:20] + '...' if k == 'Authorization' else v) for k, v in headers.items())}")
             
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
+            response = self._post(url, payload)
             
             logger.info(f"STK Push response status: {response.status_code}")
             logger.info(f"STK Push response headers: {dict(response.headers)}")
@@ -168,17 +124,11 @@ class MPesaAPI:
     def query_transaction_status(self, checkout_request_id):
         """Query the status of an STK Push transaction"""
         try:
-            access_token = self.get_access_token()
             timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
             password = self.generate_password(timestamp)
             
             url = f"{self.base_url}/mpesa/stkpushquery/v1/query"
             
-            headers = {
-                'Authorization': f'Bearer {access_token}',
-                'Content-Type': 'application/json',
-            }
-            
             payload = {
                 'BusinessShortCode': self.shortcode,
                 'Password': password,
@@ -186,7 +136,7 @@ class MPesaAPI:
                 'CheckoutRequestID': checkout_request_id
             }
             
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
+            response = self._post(url, payload, retry=True)
             response.raise_for_status()
             
             return response.json()
@@ -198,15 +148,8 @@ class MPesaAPI:
     def c2b_register_urls(self, validation_url, confirmation_url):
         """Register C2B URLs for receiving payments"""
         try:
-            access_token = self.get_access_token()
-            
             url = f"{self.base_url}/mpesa/c2b/v1/registerurl"
             
-            headers = {
-                'Authorization': f'Bearer {access_token}',
-                'Content-Type': 'application/json',
-            }
-            
             payload = {
                 'ShortCode': self.shortcode,
                 'ResponseType': 'Completed',  # or 'Cancelled'
@@ -214,7 +157,7 @@ class MPesaAPI:
                 'ValidationURL': validation_url
             }
             
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
+            response = self._post(url, payload, retry=True)
             response.raise_for_status()
             
             return response.json()
@@ -247,6 +190,11 @@ class MPesaAPI:
                 )
                 payment = mpesa_transaction.payment
                 
+                # Retried deliveries of a callback that was already applied
+                if mpesa_transaction.callback_data and payment.status in ('completed', 'failed', 'cancelled', 'refunded'):
+                    logger.info(f"M-Pesa callback already processed: {checkout_request_id}")
+                    return True, "Callback already processed"
+                
                 # Update transaction details
                 mpesa_transaction.result_code = str(result_code)
                 mpesa_transaction.result_desc = result_desc
@@ -284,6 +232,10 @@ class MPesaAPI:
                     
                     mpesa_transaction.save()
                     
+                    if payment.status == 'completed':
+                        # Already completed by a status query; only the receipt details were missing
+                        return True, "Callback processed successfully"
+                    
                     # Complete the payment
                     payment.complete_payment(
                         transaction_id=mpesa_transaction.mpesa_receipt_number,
@@ -357,8 +309,27 @@ class MPesaService:
     def __init__(self):
         self.api = MPesaAPI()
     
-    def create_payment_request(self, payment_id, phone_number, amount, description=None):
-        """Create M-Pesa payment request"""
+    def create_payment_request(self, payment_id, phone_number, amount, description=None, idempotency_key=None):
+        """
+        Create M-Pesa payment request.
+
+        With an ``idempotency_key``, a retried call returns the first successful
+        STK push instead of prompting the customer again.
+        """
+        if idempotency_key:
+            from apps.core.idempotency_utils import call_idempotent
+
+            success, result = call_idempotent(
+                'mpesa_stk',
+                idempotency_key,
+                lambda: self._create_payment_request(payment_id, phone_number, amount, description),
+                fingerprint=hashlib.sha256(f"{payment_id}:{phone_number}:{amount}".encode()).hexdigest(),
+                replayable=lambda outcome: outcome[0],
+            )
+            return success, result
+        return self._create_payment_request(payment_id, phone_number, amount, description)
+    
+    def _create_payment_request(self, payment_id, phone_number, amount, description=None):
         try:
             payment = Payment.objects.get(payment_id=payment_id)
             
@@ -393,6 +364,13 @@ class MPesaService:
                 mpesa_transaction.checkout_request_id = response.get('CheckoutRequestID')
                 mpesa_transaction.save()
                 
+                # Let callbacks find this tenant without a business path
+                register_checkout(
+                    mpesa_transaction.checkout_request_id,
+                    mpesa_transaction.merchant_request_id,
+                    payment.payment_id
+                )
+                
                 # Update payment status
                 payment.status = 'processing'
                 payment.transaction_id = mpesa_transaction.checkout_request_id
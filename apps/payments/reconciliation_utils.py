@@ -0,0 +1,413 @@
+"""
+Statement reconciliation
+
+Matches an uploaded M-Pesa or bank statement (CSV or .xlsx) against recorded
+payments. Rows are streamed from the file in chunks; for each chunk the
+completed payments of its period are loaded and indexed in memory by
+receipt/reference and by amount and time, and every row is matched against
+those indexes: first exactly on the reference, then on amount within a time
+window (preferring the same phone number). Results are written as
+``StatementLine`` rows with bulk inserts, so memory stays bounded by the chunk
+size and a month of statements is a few payment queries and a handful of
+inserts.
+"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, namedtuple
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+import csv
+import io
+import logging
+import re
+
+from django.db import router, transaction
+from django.utils import timezone
+
+from .models import Payment, StatementImport, StatementLine
+
+logger = logging.getLogger(__name__)
+
+BULK_BATCH_SIZE = 1000
+MATCH_CHUNK_ROWS = 5000
+HEADER_SCAN_ROWS = 30
+PERIOD_PADDING = timedelta(days=1)
+
+MATCHED_STATUSES = ('exact', 'fuzzy')
+PAYMENT_STATUSES = ('completed', 'verified')
+COMPLETED_ROW_STATUSES = ('completed', 'success', 'successful', 'posted')
+METHOD_TYPES = {
+    'mpesa': ('mpesa', 'mobile_money'),
+    'bank': ('bank_transfer', 'cheque'),
+}
+
+# Normalized header names for each statement column, in order of preference
+HEADER_ALIASES = {
+    'reference': ('receipt no', 'receipt number', 'receipt', 'transaction code', 'transaction id',
+                  'confirmation code', 'reference number', 'reference', 'ref no', 'ref', 'cheque/ref no'),
+    'date': ('completion time', 'transaction date', 'value date', 'posting date', 'trans date',
+             'date', 'initiation time'),
+    'amount': ('paid in', 'credit', 'credit amount', 'credits', 'deposit', 'deposits', 'money in', 'amount'),
+    'details': ('details', 'narration', 'description', 'particulars', 'transaction details'),
+    'party': ('other party info', 'phone number', 'phone', 'msisdn', 'mobile'),
+    'status': ('transaction status', 'status'),
+}
+
+DATE_FORMATS = (
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%d-%m-%Y %H:%M:%S', '%d-%m-%Y %H:%M',
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d.%m.%Y %H:%M:%S', '%Y-%m-%d', '%d-%m-%Y',
+    '%d/%m/%Y', '%d.%m.%Y', '%d %b %Y', '%d-%b-%Y', '%d %B %Y',
+)
+
+_PHONE = re.compile(r'(?:\+?254|\b0)?([17]\d{8})\b')
+_NON_AMOUNT = re.compile(r'[^\d.\-]')
+_SPACES = re.compile(r'\s+')
+
+StatementRow = namedtuple('StatementRow', 'row_number reference transaction_date amount phone_number details')
+
+
+class StatementError(ValueError):
+    """The uploaded file could not be read as a statement"""
+
+
+# ================================
+# PARSING
+# ================================
+
+def _header(value):
+    return _SPACES.sub(' ', str(value or '').strip().lower().replace('.', '').replace(':', ''))
+
+
+def _column_map(headers):
+    """{field: column index} for a header row, or None if it is not one"""
+    positions = {name: i for i, name in reversed(list(enumerate(_header(h) for h in headers)))}
+    columns = {}
+    for field, aliases in HEADER_ALIASES.items():
+        for alias in aliases:
+            if alias in positions and positions[alias] not in columns.values():
+                columns[field] = positions[alias]
+                break
+    if 'amount' in columns and ('reference' in columns or 'date' in columns):
+        return columns
+    return None
+
+
+def parse_amount(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, (int, float, Decimal)):
+        return Decimal(str(value)).quantize(Decimal('0.01'))
+    cleaned = _NON_AMOUNT.sub('', str(value))
+    if cleaned in ('', '-', '.'):
+        return None
+    try:
+        return Decimal(cleaned).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+
+
+def parse_datetime(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime.combine(value, time.min)
+    else:
+        text = str(value).strip()
+        for fmt in DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(text, fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def normalize_reference(value):
+    return _SPACES.sub('', str(value or '')).upper()[:100]
+
+
+def normalize_phone(value):
+    """254XXXXXXXXX from any phone number found in ``value``, or ''"""
+    match = _PHONE.search(str(value or '').replace(' ', ''))
+    return f"254{match.group(1)}" if match else ''
+
+
+def _raw_rows(uploaded_file):
+    name = uploaded_file.name.lower()
+    if name.endswith('.xlsx'):
+        try:
+            import openpyxl
+        except ImportError:
+            raise StatementError('Excel support requires openpyxl; upload a CSV export instead.')
+        try:
+            workbook = openpyxl.load_workbook(uploaded_file, read_only=True, data_only=True)
+        except Exception as e:
+            raise StatementError(f'Could not open the Excel file: {e}')
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    else:
+        uploaded_file.seek(0)
+        text = io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig', errors='replace', newline='')
+        try:
+            yield from csv.reader(text)
+        finally:
+            text.detach()
+
+
+def iter_statement_rows(uploaded_file):
+    """
+    Yield a ``StatementRow`` for every completed credit in the statement.
+
+    Leading report headers are skipped until a row that looks like the column
+    header; debits, zero amounts and non-completed rows are ignored.
+    """
+    columns = None
+    for row_number, row in enumerate(_raw_rows(uploaded_file), start=1):
+        if columns is None:
+            if row_number > HEADER_SCAN_ROWS:
+                raise StatementError('No receipt/reference, date and amount columns found.')
+            columns = _column_map(row)
+            continue
+
+        def cell(field):
+            index = columns.get(field)
+            return row[index] if index is not None and index < len(row) else None
+
+        status = str(cell('status') or '').strip().lower()
+        if status and status not in COMPLETED_ROW_STATUSES:
+            continue
+
+        amount = parse_amount(cell('amount'))
+        if amount is None or amount <= 0:
+            continue
+
+        details = str(cell('details') or '').strip()
+        party = str(cell('party') or '').strip()
+        yield StatementRow(
+            row_number=row_number,
+            reference=normalize_reference(cell('reference')),
+            transaction_date=parse_datetime(cell('date')),
+            amount=amount,
+            phone_number=normalize_phone(party) or normalize_phone(details),
+            details=(details or party)[:255],
+        )
+
+    if columns is None:
+        raise StatementError('No receipt/reference, date and amount columns found.')
+
+
+# ================================
+# PAYMENT INDEX
+# ================================
+
+class PaymentIndex:
+    """
+    Completed payments for a period, indexed by reference and by amount/time.
+
+    ``claimed`` is shared between the indexes of one statement, so a payment
+    matched in an earlier chunk is not matched again.
+    """
+
+    def __init__(self, source, start, end, claimed=None):
+        self.by_reference = {}
+        self.by_amount = defaultdict(list)
+        self.amounts = {}
+        self.has_receipt = set()
+
+        payments = Payment.objects.filter(
+            status__in=PAYMENT_STATUSES,
+            payment_method__method_type__in=METHOD_TYPES.get(source, ()),
+            created_at__gte=start - PERIOD_PADDING,
+            created_at__lte=end + PERIOD_PADDING,
+        )
+        # Payments already matched on an earlier statement are not matched again
+        self.claimed = claimed if claimed is not None else set()
+        self.claimed.update(
+            StatementLine.objects.filter(
+                match_status__in=MATCHED_STATUSES, payment__in=payments
+            ).values_list('payment_id', flat=True)
+        )
+
+        rows = payments.values_list(
+            'id', 'amount', 'completed_at', 'created_at', 'customer_phone',
+            'transaction_id', 'reference_number', 'external_reference',
+            'mpesa_details__mpesa_receipt_number', 'mpesa_details__phone_number',
+            'bank_details__reference_number', 'bank_details__confirmation_code',
+        )
+        for (payment_id, amount, completed_at, created_at, customer_phone,
+             transaction_id, reference_number, external_reference,
+             receipt_number, mpesa_phone, bank_reference, confirmation_code) in rows.iterator(chunk_size=2000):
+            self.amounts[payment_id] = amount
+            for reference in (transaction_id, reference_number, external_reference,
+                              receipt_number, bank_reference, confirmation_code):
+                reference = normalize_reference(reference)
+                if reference:
+                    self.by_reference.setdefault(reference, payment_id)
+            if receipt_number or bank_reference or confirmation_code:
+                self.has_receipt.add(payment_id)
+
+            phone = normalize_phone(mpesa_phone) or normalize_phone(customer_phone)
+            self.by_amount[amount].append((completed_at or created_at, payment_id, phone))
+
+        self.times = {}
+        for amount, entries in self.by_amount.items():
+            entries.sort(key=lambda entry: entry[0])
+            self.times[amount] = [entry[0] for entry in entries]
+
+    def near(self, amount, moment, window, phone, reference):
+        """Closest unclaimed payment of ``amount`` within ``window``, preferring the same phone"""
+        entries = self.by_amount.get(amount)
+        if not entries or moment is None:
+            return None
+        times = self.times[amount]
+        lo, hi = bisect_left(times, moment - window), bisect_right(times, moment + window)
+
+        best, best_key = None, None
+        for paid_at, payment_id, payment_phone in entries[lo:hi]:
+            if payment_id in self.claimed:
+                continue
+            if reference and payment_id in self.has_receipt:
+                # It has its own receipt, so it is not this statement row
+                continue
+            key = (not (phone and phone == payment_phone), abs(paid_at - moment))
+            if best_key is None or key < best_key:
+                best, best_key = payment_id, key
+        return best
+
+
+# ================================
+# MATCHING
+# ================================
+
+def match_rows(rows, index, window, seen=None):
+    """
+    Build unsaved ``StatementLine`` objects for parsed rows.
+
+    ``seen`` maps references to the row that first used them and carries over
+    between chunks of the same statement.
+    """
+    lines = []
+    seen = {} if seen is None else seen
+    for row in rows:
+        line = StatementLine(
+            row_number=row.row_number,
+            reference=row.reference,
+            transaction_date=row.transaction_date,
+            amount=row.amount,
+            phone_number=row.phone_number,
+            details=row.details,
+        )
+
+        if row.reference and row.reference in seen:
+            line.match_status = 'duplicate'
+            line.note = f"Same reference as row {seen[row.reference]}"
+        else:
+            if row.reference:
+                seen[row.reference] = row.row_number
+            payment_id = index.by_reference.get(row.reference) if row.reference else None
+
+            if payment_id is not None:
+                if payment_id in index.claimed:
+                    line.match_status = 'duplicate'
+                    line.note = 'Payment already matched to another statement row'
+                elif index.amounts[payment_id] != row.amount:
+                    line.match_status = 'amount_mismatch'
+                    line.note = f"Recorded amount KES {index.amounts[payment_id]}"
+                else:
+                    line.match_status = 'exact'
+                line.payment_id = payment_id
+                index.claimed.add(payment_id)
+            else:
+                payment_id = index.near(row.amount, row.transaction_date, window,
+                                        row.phone_number, row.reference)
+                if payment_id is not None:
+                    line.match_status = 'fuzzy'
+                    line.payment_id = payment_id
+                    index.claimed.add(payment_id)
+                else:
+                    line.match_status = 'unmatched'
+
+        lines.append(line)
+    return lines
+
+
+def reconcile_statement(uploaded_file, source='mpesa', time_window_minutes=30, user=None):
+    """
+    Parse, match and store a statement, returning its ``StatementImport``.
+
+    Unreadable files are recorded as failed imports rather than raised.
+    """
+    statement = StatementImport.objects.create(
+        source=source,
+        original_filename=uploaded_file.name[:255],
+        time_window_minutes=time_window_minutes,
+        uploaded_by_user_id=user.id if user and user.is_authenticated else None,
+    )
+
+    try:
+        window = timedelta(minutes=time_window_minutes)
+        claimed, seen = set(), {}
+        counts = defaultdict(int)
+        total_rows = 0
+        total_amount = matched_amount = Decimal('0.00')
+        start = end = None
+
+        with transaction.atomic(using=router.db_for_write(StatementLine)):
+            rows = iter_statement_rows(uploaded_file)
+            for chunk in iter(lambda: list(islice(rows, MATCH_CHUNK_ROWS)), []):
+                dates = [row.transaction_date for row in chunk if row.transaction_date]
+                now = timezone.now()
+                chunk_start, chunk_end = (min(dates), max(dates)) if dates else (now, now)
+
+                index = PaymentIndex(source, chunk_start, chunk_end, claimed)
+                lines = match_rows(chunk, index, window, seen)
+
+                for line in lines:
+                    line.statement = statement
+                    counts[line.match_status] += 1
+                    total_amount += line.amount
+                    if line.match_status in MATCHED_STATUSES:
+                        matched_amount += line.amount
+                StatementLine.objects.bulk_create(lines, batch_size=BULK_BATCH_SIZE)
+                total_rows += len(lines)
+
+                if dates:
+                    start = chunk_start if start is None else min(start, chunk_start)
+                    end = chunk_end if end is None else max(end, chunk_end)
+
+            statement.status = 'completed'
+            statement.period_start = start
+            statement.period_end = end
+            statement.total_rows = total_rows
+            statement.exact_matches = counts['exact']
+            statement.fuzzy_matches = counts['fuzzy']
+            statement.exception_rows = total_rows - counts['exact'] - counts['fuzzy']
+            statement.total_amount = total_amount
+            statement.matched_amount = matched_amount
+            statement.processed_at = timezone.now()
+            statement.save()
+
+        logger.info(
+            f"Reconciled statement {statement.original_filename}: {total_rows} rows, "
+            f"{counts['exact']} exact, {counts['fuzzy']} fuzzy"
+        )
+
+    except StatementError as e:
+        statement.status = 'failed'
+        statement.error_message = str(e)
+        statement.save(update_fields=['status', 'error_message', 'updated_at'])
+    except Exception as e:
+        logger.error(f"Statement reconciliation failed for {statement.original_filename}: {e}")
+        statement.status = 'failed'
+        statement.error_message = 'The statement could not be processed.'
+        statement.save(update_fields=['status', 'error_message', 'updated_at'])
+
+    return statement
@@ -0,0 +1,216 @@
+"""
+Background M-Pesa payment status reconciliation
+
+Browser polls used to query Daraja once per poll, so several cashiers watching
+the same STK push multiplied upstream calls. Pending pushes are now tracked in
+``MPesaCheckoutIndex`` and queried by ``manage.py reconcile_mpesa_payments``
+(or the celery task of the same name) at most once per backoff interval until
+``MPESA_STATUS_TIMEOUT_SECONDS``. Every result, whether from a query or a
+callback, is published to the cache; status polls only read that state.
+"""
+from collections import defaultdict
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.core.database_router import TenantDatabaseManager, get_current_tenant, tenant_context
+from apps.core.tenant_models import MPesaCheckoutIndex, Tenant
+
+from .callback_utils import DB_ALIAS, STATUS_CHECK_BACKOFF
+from .models import MPesaTransaction
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+DEFAULT_TIMEOUT_SECONDS = 180
+STATUS_CACHE_TIMEOUT = 900
+
+PENDING_STATUSES = ('pending', 'processing')
+COMPLETED_STATUSES = ('completed', 'verified')
+
+
+def _index():
+    return MPesaCheckoutIndex.objects.using(DB_ALIAS)
+
+
+def _timeout():
+    return timedelta(seconds=getattr(settings, 'MPESA_STATUS_TIMEOUT_SECONDS', DEFAULT_TIMEOUT_SECONDS))
+
+
+# ================================
+# SHARED STATE
+# ================================
+
+def status_cache_key(payment_id, tenant=None):
+    tenant = tenant or get_current_tenant()
+    return f"mpesa_status:{tenant.id if tenant else 'public'}:{payment_id}"
+
+
+def payment_state(payment, mpesa_transaction=None):
+    """Status payload returned to polling clients"""
+    if payment.status in COMPLETED_STATUSES:
+        status, message = 'completed', 'Payment completed successfully'
+    elif payment.status in PENDING_STATUSES:
+        status, message = 'pending', 'Waiting for M-Pesa confirmation'
+    else:
+        reason = payment.failure_reason or (mpesa_transaction.result_desc if mpesa_transaction else '')
+        status, message = 'failed', reason or 'Payment failed'
+
+    return {
+        'status': status,
+        'message': message,
+        'payment_status': payment.status,
+        'completed_at': payment.completed_at.isoformat() if payment.completed_at else None,
+        'checked_at': timezone.now().isoformat(),
+    }
+
+
+def publish_status(payment_id, state):
+    cache.set(status_cache_key(payment_id), state, STATUS_CACHE_TIMEOUT)
+
+
+def get_published_status(payment_id):
+    """Last published state for a payment in the current tenant, or None"""
+    return cache.get(status_cache_key(payment_id))
+
+
+def _finish(entry_ids, status):
+    _index().filter(pk__in=entry_ids).update(status=status, next_check_at=None)
+
+
+def publish_checkout_status(checkout_request_id):
+    """Publish the current state of an STK push after its callback was applied"""
+    mpesa_transaction = MPesaTransaction.objects.select_related('payment').filter(
+        checkout_request_id=checkout_request_id
+    ).first()
+    if mpesa_transaction is None:
+        return None
+
+    payment = mpesa_transaction.payment
+    state = payment_state(payment, mpesa_transaction)
+    publish_status(payment.payment_id, state)
+    if state['status'] != 'pending':
+        _index().filter(checkout_request_id=checkout_request_id).update(status='resolved', next_check_at=None)
+    return state
+
+
+# ================================
+# RECONCILER
+# ================================
+
+def _backoff(checks):
+    return timedelta(seconds=STATUS_CHECK_BACKOFF[min(checks, len(STATUS_CHECK_BACKOFF) - 1)])
+
+
+def claim_due_checkouts(limit=BATCH_SIZE):
+    """Lock due pending checkouts and push their next check out by the backoff interval"""
+    now = timezone.now()
+    with transaction.atomic(using=DB_ALIAS):
+        entries = list(
+            _index().select_for_update(skip_locked=True)
+            .filter(status='pending', next_check_at__lte=now)
+            .order_by('next_check_at')[:limit]
+        )
+
+        by_delay = defaultdict(list)
+        for entry in entries:
+            entry.status_checks += 1
+            by_delay[_backoff(entry.status_checks)].append(entry.pk)
+        for delay, entry_ids in by_delay.items():
+            _index().filter(pk__in=entry_ids).update(
+                status_checks=F('status_checks') + 1,
+                next_check_at=now + delay,
+            )
+
+    return entries
+
+
+def _reconcile_tenant(entries):
+    """Check each claimed checkout once in the current tenant, sharing one API client"""
+    from .mpesa import MPesaService
+
+    results = {'resolved': 0, 'pending': 0, 'expired': 0}
+    transactions = {
+        mpesa_transaction.checkout_request_id: mpesa_transaction
+        for mpesa_transaction in MPesaTransaction.objects.select_related('payment').filter(
+            checkout_request_id__in=[entry.checkout_request_id for entry in entries]
+        )
+    }
+    deadline = timezone.now() - _timeout()
+    service = None
+    resolved, expired = [], []
+
+    for entry in entries:
+        mpesa_transaction = transactions.get(entry.checkout_request_id)
+        if mpesa_transaction is None:
+            expired.append(entry.pk)
+            continue
+
+        payment = mpesa_transaction.payment
+        if payment.status in PENDING_STATUSES:
+            if not mpesa_transaction.result_code and entry.created_at <= deadline:
+                # Leave the payment open for a late callback, but stop querying
+                publish_status(payment.payment_id, payment_state(payment, mpesa_transaction))
+                expired.append(entry.pk)
+                continue
+            try:
+                service = service or MPesaService()
+                service.check_payment_status(payment.payment_id)
+            except Exception as e:
+                logger.warning(f"M-Pesa status check failed for {entry.checkout_request_id}: {e}")
+            payment.refresh_from_db(fields=['status', 'failure_reason', 'completed_at'])
+
+        state = payment_state(payment, mpesa_transaction)
+        publish_status(payment.payment_id, state)
+        if state['status'] == 'pending':
+            results['pending'] += 1
+        else:
+            resolved.append(entry.pk)
+
+    if resolved:
+        _finish(resolved, 'resolved')
+    if expired:
+        _finish(expired, 'expired')
+    results['resolved'] += len(resolved)
+    results['expired'] += len(expired)
+    return results
+
+
+def reconcile_pending_checkouts(limit=BATCH_SIZE):
+    """Run one reconciliation pass over due checkouts, returning outcome counts"""
+    results = {'resolved': 0, 'pending': 0, 'expired': 0}
+    entries = claim_due_checkouts(limit)
+    if not entries:
+        return results
+
+    by_tenant = defaultdict(list)
+    for entry in entries:
+        by_tenant[entry.tenant_id].append(entry)
+
+    tenants = {
+        str(tenant.id): tenant
+        for tenant in Tenant.objects.using(DB_ALIAS).filter(id__in=list(by_tenant), is_active=True)
+    }
+
+    for tenant_id, tenant_entries in by_tenant.items():
+        tenant = tenants.get(tenant_id)
+        if tenant is None:
+            _finish([entry.pk for entry in tenant_entries], 'expired')
+            results['expired'] += len(tenant_entries)
+            continue
+
+        try:
+            TenantDatabaseManager.add_tenant_to_settings(tenant)
+            with tenant_context(tenant):
+                for outcome, count in _reconcile_tenant(tenant_entries).items():
+                    results[outcome] += count
+        except Exception as e:
+            # Entries stay pending and are retried at their next check time
+            logger.error(f"M-Pesa status reconciliation failed for {tenant.name}: {e}")
+
+    return results
@@ -0,0 +1,48 @@
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def process_mpesa_callbacks(batch_size=50, workers=1):
+    """
+    Process queued M-Pesa callbacks
+    Schedule every few seconds with celery beat, or run the
+    process_mpesa_callbacks management command as a long-lived worker
+    """
+    from .callback_utils import process_pending_callbacks
+
+    total = {'processed': 0, 'retry': 0, 'failed': 0}
+    while True:
+        results = process_pending_callbacks(limit=batch_size, workers=workers)
+        for outcome, count in results.items():
+            total[outcome] += count
+        if sum(results.values()) < batch_size:
+            break
+
+    if any(total.values()):
+        logger.info(f"M-Pesa callbacks: {total}")
+    return total
+
+
+@shared_task
+def reconcile_mpesa_payments(batch_size=100):
+    """
+    Query Daraja for pending STK pushes that are due a status check
+    Schedule every few seconds with celery beat, or run the
+    reconcile_mpesa_payments management command with --loop
+    """
+    from .status_utils import reconcile_pending_checkouts
+
+    total = {'resolved': 0, 'pending': 0, 'expired': 0}
+    while True:
+        results = reconcile_pending_checkouts(limit=batch_size)
+        for outcome, count in results.items():
+            total[outcome] += count
+        if sum(results.values()) < batch_size:
+            break
+
+    if total['resolved'] or total['expired']:
+        logger.info(f"M-Pesa status reconciliation: {total}")
+    return total
@@ -18,6 +18,8 @@ urlpatterns = [
     path('methods/<int:method_id>/config/', views.get_payment_method_config, name='method_config'),
     path('reports/', views.payment_reports_view, name='reports'),
     path('reconciliation/', views.reconciliation_view, name='reconciliation'),
+    path('statements/', views.statement_reconciliation_view, name='statements'),
+    path('statements/<uuid:statement_id>/', views.statement_detail_view, name='statement_detail'),
     path('settings/', views.payment_settings_view, name='settings'),
     path('setup-mpesa/', views.setup_mpesa_gateway_view, name='setup_mpesa'),
     path('configure-mpesa-method/', views.configure_mpesa_method_view, name='configure_mpesa_method'),
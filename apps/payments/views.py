@@ -5,25 +5,30 @@ from django.contrib import messages
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.http import require_http_methods, require_POST
 from django.views.decorators.csrf import csrf_exempt
-from django.db import transaction
+from django.db import DatabaseError, transaction
 from django.db.models import Q, Count, Sum, Avg
 from django.utils import timezone
-from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
 from django.template.loader import render_to_string
 from django.urls import reverse
 from django.conf import settings
 from apps.core.decorators import employee_required, ajax_required
 from apps.core.utils import send_sms_notification, send_email_notification, generate_unique_code
 from apps.core.logging_utils import AutoWashLogger
+from apps.core.pagination_utils import KeysetPaginator
+from apps.core.idempotency_utils import idempotent, get_idempotency_key
 from .models import (
     Payment, PaymentMethod, PaymentRefund, MPesaTransaction,
-    CardTransaction, CashTransaction, BankTransaction, PaymentGateway
+    CardTransaction, CashTransaction, BankTransaction, PaymentGateway,
+    StatementImport, StatementLine
 )
 from .forms import (
     PaymentForm, CashPaymentForm, CardPaymentForm, MPesaPaymentForm,
-    PaymentRefundForm, PaymentMethodForm
+    PaymentRefundForm, PaymentMethodForm, StatementUploadForm
 )
 from .mpesa import MPesaService, validate_mpesa_phone
+from .callback_utils import enqueue_callback, process_mpesa_callback
+from .status_utils import get_published_status, payment_state, publish_status
+from .reconciliation_utils import reconcile_statement
 import json
 import logging
 
@@ -409,15 +414,8 @@ def payment_list_view(request):
         except (ValueError, TypeError):
             page_size = 25
             
-        paginator = Paginator(payments, page_size)
-        page = request.GET.get('page', 1)
-        
-        try:
-            payments_page = paginator.page(page)
-        except PageNotAnInteger:
-            payments_page = paginator.page(1)
-        except EmptyPage:
-            payments_page = paginator.page(paginator.num_pages)
+        paginator = KeysetPaginator(payments, page_size)
+        payments_page = paginator.get_page(request.GET)
         
         # Get all payment methods for filter dropdown
         payment_methods = PaymentMethod.objects.all().order_by('name')
@@ -442,8 +440,7 @@ def payment_list_view(request):
         logger.error(f"Error in payment_list_view: {str(e)}")
         
         # Provide empty page with error message
-        from django.core.paginator import Page
-        empty_page = Page([], 1, Paginator(Payment.objects.none(), 25))
+        empty_page = KeysetPaginator(Payment.objects.none().order_by('-created_at'), 25).get_page()
         
         context = {
             'payments': empty_page,
@@ -690,6 +687,7 @@ def handle_split_payment(request, service_order, split_methods, split_amounts):
 
 @login_required
 @employee_required()
+@idempotent()
 def process_payment_view(request, order_id=None):
     """Process payment for service order with proper URL handling"""
     from apps.services.models import ServiceOrder
@@ -1256,7 +1254,8 @@ def process_mpesa_payment_view(request, payment_id):
                     payment_id=payment.payment_id,
                     phone_number=formatted_phone,
                     amount=payment.amount,
-                    description=f"Payment for {payment.description}"
+                    description=f"Payment for {payment.description}",
+                    idempotency_key=get_idempotency_key(request)
                 )
                 
                 logger.info(f"M-Pesa service result: success={success}, result={result}")
@@ -1316,33 +1315,22 @@ def mpesa_payment_status_view(request, payment_id):
 @login_required
 @employee_required()
 def check_mpesa_status_ajax(request, payment_id):
-    """AJAX endpoint to check M-Pesa payment status"""
+    """
+    AJAX endpoint to check M-Pesa payment status
+
+    Only reads the state published by callbacks and the background
+    reconciler; Daraja is never queried from here.
+    """
     try:
-        payment = Payment.objects.get(payment_id=payment_id)
+        state = get_published_status(payment_id)
+        if state and state['status'] != 'pending':
+            return JsonResponse(state)
         
-        if payment.status in ['completed', 'verified']:
-            return JsonResponse({
-                'status': 'completed',
-                'message': 'Payment completed successfully',
-                'payment_status': payment.status,
-                'completed_at': payment.completed_at.isoformat() if payment.completed_at else None
-            })
-        elif payment.status == 'failed':
-            return JsonResponse({
-                'status': 'failed',
-                'message': payment.failure_reason or 'Payment failed',
-                'payment_status': payment.status
-            })
-        else:
-            # Check with M-Pesa API
-            mpesa_service = MPesaService()
-            success, result = mpesa_service.check_payment_status(payment_id)
-            
-            return JsonResponse({
-                'status': 'completed' if success else 'pending',
-                'message': result,
-                'payment_status': payment.status
-            })
+        payment = Payment.objects.get(payment_id=payment_id)
+        state = payment_state(payment)
+        if state['status'] != 'pending':
+            publish_status(payment_id, state)
+        return JsonResponse(state)
             
     except Payment.DoesNotExist:
         return JsonResponse({
@@ -1359,13 +1347,30 @@ def check_mpesa_status_ajax(request, payment_id):
 @csrf_exempt
 @require_POST
 def mpesa_callback_view(request):
-    """M-Pesa callback endpoint"""
+    """
+    M-Pesa callback endpoint
+
+    Stores the callback and acknowledges it immediately; the payment is
+    completed by the process_mpesa_callbacks workers.
+    """
     try:
-        callback_data = json.loads(request.body.decode('utf-8'))
-        
-        # Process the callback
-        mpesa_service = MPesaService()
-        success, message = mpesa_service.process_webhook_callback(callback_data)
+        raw_body = request.body
+        callback_data = json.loads(raw_body.decode('utf-8'))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        logger.error("Invalid JSON in M-Pesa callback")
+        return JsonResponse({'ResultCode': 1, 'ResultDesc': 'Invalid JSON'})
+    
+    try:
+        _, created = enqueue_callback(raw_body, callback_data)
+        if not created:
+            logger.info("Duplicate M-Pesa callback acknowledged")
+        return JsonResponse({'ResultCode': 0, 'ResultDesc': 'Accepted'})
+    except DatabaseError as e:
+        # Inbox unavailable: process inline rather than lose the result
+        logger.error(f"Could not queue M-Pesa callback, processing inline: {e}")
+    
+    try:
+        success, message = process_mpesa_callback(callback_data)
         
         if success:
             logger.info(f"M-Pesa callback processed successfully: {message}")
@@ -1374,9 +1379,6 @@ def mpesa_callback_view(request):
             logger.error(f"M-Pesa callback processing failed: {message}")
             return JsonResponse({'ResultCode': 1, 'ResultDesc': message})
             
-    except json.JSONDecodeError:
-        logger.error("Invalid JSON in M-Pesa callback")
-        return JsonResponse({'ResultCode': 1, 'ResultDesc': 'Invalid JSON'})
     except Exception as e:
         logger.error(f"M-Pesa callback error: {e}")
         return JsonResponse({'ResultCode': 1, 'ResultDesc': 'Internal error'})
@@ -1888,6 +1890,71 @@ def reconciliation_view(request):
     return render(request, 'payments/reconciliation.html', context)
 
 
+@login_required
+@employee_required(['owner', 'manager'])
+def statement_reconciliation_view(request):
+    """Upload M-Pesa/bank statements and list previous reconciliation runs"""
+    if request.method == 'POST':
+        form = StatementUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            statement = reconcile_statement(
+                form.cleaned_data['statement_file'],
+                source=form.cleaned_data['source'],
+                time_window_minutes=form.cleaned_data['time_window_minutes'],
+                user=request.user
+            )
+            if statement.status == 'completed':
+                messages.success(
+                    request,
+                    f'Matched {statement.matched_rows} of {statement.total_rows} statement rows '
+                    f'({statement.exception_rows} exceptions).'
+                )
+            else:
+                messages.error(request, f'Statement could not be reconciled: {statement.error_message}')
+            return redirect(f'/business/{request.tenant.slug}/payments/statements/{statement.id}/')
+    else:
+        form = StatementUploadForm()
+    
+    paginator = KeysetPaginator(StatementImport.objects.order_by('-created_at'), 20)
+    statements = paginator.get_page(request.GET)
+    
+    context = {
+        'form': form,
+        'statements': statements,
+        'title': 'Statement Reconciliation'
+    }
+    
+    return render(request, 'payments/statement_list.html', context)
+
+@login_required
+@employee_required(['owner', 'manager'])
+def statement_detail_view(request, statement_id):
+    """Matches and exceptions for one uploaded statement"""
+    statement = get_object_or_404(StatementImport, id=statement_id)
+    
+    match_filter = request.GET.get('match', '')
+    lines = statement.lines.select_related('payment')
+    if match_filter == 'exceptions':
+        lines = lines.exclude(match_status__in=['exact', 'fuzzy'])
+    elif match_filter in dict(StatementLine.MATCH_CHOICES):
+        lines = lines.filter(match_status=match_filter)
+    else:
+        match_filter = ''
+    
+    paginator = KeysetPaginator(lines.order_by('row_number'), 50)
+    page = paginator.get_page(request.GET)
+    
+    context = {
+        'statement': statement,
+        'lines': page,
+        'match_filter': match_filter,
+        'match_choices': StatementLine.MATCH_CHOICES,
+        'title': f'Statement - {statement.original_filename}'
+    }
+    
+    return render(request, 'payments/statement_detail.html', context)
+
+
 @login_required
 @employee_required()
 @require_http_methods(["POST"])
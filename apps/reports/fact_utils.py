@@ -0,0 +1,501 @@
+"""
+Daily report fact tables
+
+Reports used to re-scan ServiceOrder, Payment, PaymentRefund, Expense and
+StockMovement for every requested range. Those rows are now summarised per
+day into the ``Daily*Fact`` tables, so a year of a report aggregates a few
+hundred fact rows. Commission facts are the existing
+``EmployeeCommissionRollup`` rows maintained by the services app.
+
+Facts are always re-derived a whole date at a time (delete and re-insert),
+which makes every rebuild idempotent. Model signals mark the affected dates
+and rebuild them once the surrounding transaction commits; dates that were
+never derived are filled in the first time a report reads them, and
+``manage.py rebuild_report_facts`` re-derives any range on demand. Each such
+commit also bumps the tenant's ``data_version``, which keys cached reports. The
+version is a counter row in the tenant database rather than a cache entry, so
+a bump made by one worker is seen by all of them even with a per-process cache.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+import logging
+
+from django.db import DatabaseError, IntegrityError, router, transaction
+from django.db.models import Case, Count, DateField, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import (
+    DailyExpenseFact, DailyFactCoverage, DailyOrderFact, DailyRefundFact,
+    DailyRevenueFact, DailyStockFact, ReportDataVersion,
+)
+
+logger = logging.getLogger(__name__)
+
+FACT_KINDS = ('revenue', 'orders', 'refunds', 'expenses', 'stock')
+PAID_STATUSES = ('completed', 'verified')
+BULK_BATCH_SIZE = 500
+
+ZERO = Decimal('0.00')
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def local_date(value):
+    """Business date of a timestamp in the current timezone"""
+    if value is None:
+        return None
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.date()
+
+
+def date_range(start_date, end_date):
+    day = start_date
+    while day <= end_date:
+        yield day
+        day += timedelta(days=1)
+
+
+# ================================
+# DERIVATION
+# ================================
+
+def _revenue_rows(dates):
+    from apps.payments.models import Payment
+
+    fields = ('day', 'payment_method_id', 'payment_type', 'status', 'order_status')
+    aggregates = {'payment_count': Count('id'), 'amount': Sum('amount'), 'net_amount': Sum('net_amount')}
+
+    linked = Payment.objects.filter(
+        service_order__created_at__date__in=dates
+    ).annotate(
+        day=TruncDate('service_order__created_at'),
+        order_status=F('service_order__status'),
+    ).values(*fields).annotate(**aggregates)
+
+    unlinked = Payment.objects.filter(
+        Q(completed_at__date__in=dates) | Q(completed_at__isnull=True, created_at__date__in=dates),
+        service_order__isnull=True,
+    ).annotate(
+        day=TruncDate(Coalesce('completed_at', 'created_at')),
+        order_status=Value(''),
+    ).values(*fields).annotate(**aggregates)
+
+    for order_linked, rows in ((True, linked), (False, unlinked)):
+        for row in rows:
+            yield DailyRevenueFact(
+                date=row['day'],
+                payment_method_id=row['payment_method_id'],
+                payment_type=row['payment_type'],
+                status=row['status'],
+                order_linked=order_linked,
+                order_status=row['order_status'],
+                payment_count=row['payment_count'],
+                amount=row['amount'] or ZERO,
+                net_amount=row['net_amount'] or ZERO,
+            )
+
+
+def _order_rows(dates):
+    from apps.payments.models import Payment
+    from apps.services.models import ServiceOrder
+
+    paid = {
+        (row['day'], row['service_order__status']): row
+        for row in Payment.objects.filter(
+            service_order__created_at__date__in=dates,
+            status__in=PAID_STATUSES,
+        ).exclude(payment_type='refund').annotate(
+            day=TruncDate('service_order__created_at')
+        ).values('day', 'service_order__status').annotate(
+            paid_amount=Sum('amount'),
+            paid_order_count=Count('service_order', distinct=True),
+        )
+    }
+
+    rows = ServiceOrder.objects.filter(created_at__date__in=dates).annotate(
+        day=TruncDate('created_at')
+    ).values('day', 'status').annotate(order_count=Count('id'), order_value=Sum('total_amount'))
+
+    for row in rows:
+        payments = paid.get((row['day'], row['status']), {})
+        yield DailyOrderFact(
+            date=row['day'],
+            status=row['status'],
+            order_count=row['order_count'],
+            order_value=row['order_value'] or ZERO,
+            paid_order_count=payments.get('paid_order_count', 0),
+            paid_amount=payments.get('paid_amount') or ZERO,
+        )
+
+
+def _refund_rows(dates):
+    from apps.payments.models import PaymentRefund
+
+    aggregates = {'refund_count': Count('id'), 'amount': Sum('amount')}
+
+    linked = PaymentRefund.objects.filter(
+        original_payment__service_order__created_at__date__in=dates
+    ).annotate(
+        day=TruncDate('original_payment__service_order__created_at'),
+        order_status=F('original_payment__service_order__status'),
+    ).values('day', 'status', 'order_status').annotate(**aggregates)
+
+    unlinked = PaymentRefund.objects.filter(
+        Q(processed_at__date__in=dates) | Q(processed_at__isnull=True, created_at__date__in=dates),
+        original_payment__service_order__isnull=True,
+    ).annotate(
+        day=TruncDate(Coalesce('processed_at', 'created_at')),
+        order_status=Value(''),
+    ).values('day', 'status', 'order_status').annotate(**aggregates)
+
+    for order_linked, rows in ((True, linked), (False, unlinked)):
+        for row in rows:
+            yield DailyRefundFact(
+                date=row['day'],
+                status=row['status'],
+                order_linked=order_linked,
+                order_status=row['order_status'],
+                refund_count=row['refund_count'],
+                amount=row['amount'] or ZERO,
+            )
+
+
+def _expense_rows(dates):
+    from apps.expenses.models import Expense
+
+    rows = Expense.objects.filter(expense_date__in=dates).values(
+        'expense_date', 'category_id', 'status'
+    ).annotate(
+        expense_count=Count('id'),
+        amount=Sum('amount'),
+        tax_amount=Sum('tax_amount'),
+        total_amount=Sum('total_amount'),
+    )
+    for row in rows:
+        yield DailyExpenseFact(
+            date=row['expense_date'],
+            category_id=row['category_id'],
+            status=row['status'],
+            expense_count=row['expense_count'],
+            amount=row['amount'] or ZERO,
+            tax_amount=row['tax_amount'] or ZERO,
+            total_amount=row['total_amount'] or ZERO,
+        )
+
+
+def _sum_when(movement_types, expression):
+    return Sum(Case(
+        When(movement_type__in=movement_types, then=expression),
+        default=Value(ZERO),
+        output_field=MONEY,
+    ))
+
+
+def _stock_rows(dates):
+    from apps.inventory.models import StockMovement
+
+    rows = StockMovement.objects.filter(created_at__date__in=dates).annotate(
+        day=TruncDate('created_at')
+    ).values('day', 'item_id').annotate(
+        movement_count=Count('id'),
+        quantity_in=_sum_when(['in'], F('quantity')),
+        quantity_out=_sum_when(['out'], F('quantity')),
+        quantity_adjusted=_sum_when(['adjustment', 'transfer'], F('new_stock') - F('old_stock')),
+        value_in=_sum_when(['in'], F('quantity') * F('unit_cost')),
+        value_out=_sum_when(['out'], F('quantity') * F('unit_cost')),
+    )
+    for row in rows:
+        yield DailyStockFact(
+            date=row['day'],
+            item_id=row['item_id'],
+            movement_count=row['movement_count'],
+            quantity_in=row['quantity_in'] or ZERO,
+            quantity_out=row['quantity_out'] or ZERO,
+            quantity_adjusted=row['quantity_adjusted'] or ZERO,
+            value_in=row['value_in'] or ZERO,
+            value_out=row['value_out'] or ZERO,
+        )
+
+
+FACT_BUILDERS = {
+    'revenue': (DailyRevenueFact, _revenue_rows),
+    'orders': (DailyOrderFact, _order_rows),
+    'refunds': (DailyRefundFact, _refund_rows),
+    'expenses': (DailyExpenseFact, _expense_rows),
+    'stock': (DailyStockFact, _stock_rows),
+}
+
+
+def rebuild_daily_facts(dates, kinds=FACT_KINDS):
+    """
+    Re-derive the given fact kinds for ``dates`` from the transaction tables.
+
+    Each kind costs one delete, one or two grouped aggregates and one bulk
+    insert regardless of how many dates are rebuilt. Returns the number of
+    fact rows written.
+    """
+    dates = sorted({day for day in dates if day})
+    if not dates:
+        return 0
+
+    written = 0
+    db_alias = router.db_for_write(DailyOrderFact)
+    with transaction.atomic(using=db_alias):
+        for kind in kinds:
+            model, build = FACT_BUILDERS[kind]
+            rows = list(build(dates))
+            model.objects.filter(date__in=dates).delete()
+            model.objects.bulk_create(rows, batch_size=BULK_BATCH_SIZE)
+            written += len(rows)
+
+        if set(kinds) >= set(FACT_KINDS):
+            covered = set(DailyFactCoverage.objects.filter(date__in=dates).values_list('date', flat=True))
+            DailyFactCoverage.objects.filter(date__in=covered).update(rebuilt_at=timezone.now())
+            DailyFactCoverage.objects.bulk_create(
+                [DailyFactCoverage(date=day) for day in dates if day not in covered],
+                batch_size=BULK_BATCH_SIZE,
+            )
+    return written
+
+
+def rebuild_fact_range(start_date, end_date, kinds=FACT_KINDS):
+    """Re-derive every date from ``start_date`` to ``end_date`` inclusive"""
+    return rebuild_daily_facts(list(date_range(start_date, end_date)), kinds)
+
+
+def ensure_facts(start_date, end_date):
+    """Derive any dates in the range that have never been built"""
+    end_date = min(end_date, timezone.localdate())
+    if start_date > end_date:
+        return 0
+
+    covered = set(DailyFactCoverage.objects.filter(
+        date__range=[start_date, end_date]
+    ).values_list('date', flat=True))
+    missing = [day for day in date_range(start_date, end_date) if day not in covered]
+    if not missing:
+        return 0
+
+    logger.info(f"Deriving report facts for {len(missing)} uncovered dates")
+    try:
+        return rebuild_daily_facts(missing)
+    except DatabaseError as e:
+        # Usually a concurrent request deriving the same dates
+        logger.warning(f"Could not derive report facts for {missing[0]}..{missing[-1]}: {e}")
+        return 0
+
+
+# ================================
+# DATA VERSION
+# ================================
+
+VERSION_ROW = 1
+
+
+def data_version(db_alias=None):
+    """Counter that changes whenever reported transactions in a tenant change"""
+    db_alias = db_alias or router.db_for_read(ReportDataVersion)
+    try:
+        return ReportDataVersion.objects.using(db_alias).filter(
+            pk=VERSION_ROW
+        ).values_list('version', flat=True).first() or 0
+    except DatabaseError as e:
+        logger.warning(f"Could not read report data version: {e}")
+        return 0
+
+
+def bump_data_version(db_alias):
+    versions = ReportDataVersion.objects.using(db_alias)
+    try:
+        if not versions.filter(pk=VERSION_ROW).update(version=F('version') + 1, updated_at=timezone.now()):
+            try:
+                with transaction.atomic(using=db_alias):
+                    versions.create(pk=VERSION_ROW, version=1)
+            except IntegrityError:
+                # Created by a concurrent bump
+                versions.filter(pk=VERSION_ROW).update(version=F('version') + 1, updated_at=timezone.now())
+    except DatabaseError as e:
+        logger.warning(f"Could not bump report data version: {e}")
+
+
+# ================================
+# INCREMENTAL MAINTENANCE
+# ================================
+
+def _scheduled(connection, callback):
+    return any(entry[1] is callback for entry in connection.run_on_commit)
+
+
+def mark_dirty(db_alias, kinds, dates=(), order_ids=()):
+    """
+    Schedule fact kinds for re-derivation once the current transaction commits.
+
+    ``order_ids`` are resolved to their creation dates at commit time. Marks
+    made inside one transaction are merged into a single rebuild; outside a
+    transaction the rebuild runs immediately.
+    """
+    dates = {day for day in dates if day}
+    order_ids = {order_id for order_id in order_ids if order_id}
+    if not dates and not order_ids:
+        return
+
+    connection = transaction.get_connection(db_alias)
+    queue = getattr(connection, '_report_fact_queue', None)
+    register = queue is None or not _scheduled(connection, queue['flush'])
+    if register:
+        # A rolled back transaction drops its callback, so its queue is replaced
+        queue = {'dates': defaultdict(set), 'orders': defaultdict(set)}
+        queue['flush'] = lambda: _flush(connection, queue)
+        connection._report_fact_queue = queue
+
+    for kind in kinds:
+        queue['dates'][kind].update(dates)
+        queue['orders'][kind].update(order_ids)
+
+    if register:
+        transaction.on_commit(queue['flush'], using=db_alias)
+
+
+def _flush(connection, queue):
+    from apps.services.models import ServiceOrder
+
+    if getattr(connection, '_report_fact_queue', None) is queue:
+        connection._report_fact_queue = None
+    bump_data_version(connection.alias)
+
+    order_ids = set().union(*queue['orders'].values())
+    order_dates = {}
+    if order_ids:
+        order_dates = {
+            order_id: local_date(created_at)
+            for order_id, created_at in ServiceOrder.objects.using(connection.alias).filter(
+                pk__in=order_ids
+            ).values_list('pk', 'created_at')
+        }
+
+    by_dates = defaultdict(set)
+    for kind in FACT_KINDS:
+        dates = set(queue['dates'].get(kind, ()))
+        dates.update(order_dates.get(order_id) for order_id in queue['orders'].get(kind, ()))
+        dates.discard(None)
+        if dates:
+            by_dates[frozenset(dates)].add(kind)
+
+    for dates, kinds in by_dates.items():
+        try:
+            rebuild_daily_facts(dates, [kind for kind in FACT_KINDS if kind in kinds])
+        except Exception as e:
+            logger.error(f"Failed to refresh {', '.join(sorted(kinds))} facts for {sorted(dates)}: {e}")
+
+
+# ================================
+# REPORT QUERIES
+# ================================
+
+def _facts(model, start_date, end_date):
+    ensure_facts(start_date, end_date)
+    return model.objects.filter(date__range=[start_date, end_date])
+
+
+def order_summary_by_day(start_date, end_date, exclude_statuses=()):
+    """Per-day order counts, order value and paid revenue, newest first"""
+    return list(
+        _facts(DailyOrderFact, start_date, end_date).exclude(status__in=exclude_statuses)
+        .values('date').annotate(
+            orders_count=Sum('order_count'),
+            total_order_value=Sum('order_value'),
+            revenue_from_payments=Sum('paid_amount'),
+            paid_orders_count=Sum('paid_order_count'),
+        ).order_by('-date')
+    )
+
+
+def unique_customers_by_period(start_date, end_date, period='day'):
+    """
+    Distinct customers with orders created in each day, week or month.
+
+    Distinct counts cannot be summed from daily rows, so this is one grouped
+    query over the order table.
+    """
+    from apps.services.models import ServiceOrder
+
+    if period == 'day':
+        bucket = TruncDate('created_at')
+    else:
+        trunc = TruncWeek if period == 'week' else TruncMonth
+        bucket = trunc('created_at', output_field=DateField())
+
+    rows = ServiceOrder.objects.filter(
+        created_at__date__range=[start_date, end_date]
+    ).annotate(bucket=bucket).values('bucket').annotate(
+        customers=Count('customer', distinct=True)
+    )
+    return {row['bucket']: row['customers'] for row in rows}
+
+
+def _revenue_facts(start_date, end_date, statuses, order_linked, exclude_order_statuses):
+    return _facts(DailyRevenueFact, start_date, end_date).filter(
+        status__in=statuses, order_linked=order_linked
+    ).exclude(order_status__in=exclude_order_statuses)
+
+
+def revenue_totals(start_date, end_date, statuses=PAID_STATUSES, refunds=False,
+                   order_linked=True, exclude_order_statuses=()):
+    """Payment count and amount for orders created in the range"""
+    facts = _revenue_facts(start_date, end_date, statuses, order_linked, exclude_order_statuses)
+    facts = facts.filter(payment_type='refund') if refunds else facts.exclude(payment_type='refund')
+    totals = facts.aggregate(count=Sum('payment_count'), amount=Sum('amount'))
+    return {'count': totals['count'] or 0, 'amount': totals['amount'] or ZERO}
+
+
+def revenue_by_method(start_date, end_date, statuses=PAID_STATUSES, order_linked=True, exclude_order_statuses=()):
+    """Non-refund payment totals per payment method, largest first"""
+    return list(
+        _revenue_facts(start_date, end_date, statuses, order_linked, exclude_order_statuses)
+        .exclude(payment_type='refund').values('payment_method__name').annotate(
+            total=Sum('amount'),
+            count=Sum('payment_count'),
+        ).order_by('-total')
+    )
+
+
+def refund_record_total(start_date, end_date, statuses=('completed',), order_linked=True, exclude_order_statuses=()):
+    """Amount of formal refund records against orders created in the range"""
+    return _facts(DailyRefundFact, start_date, end_date).filter(
+        status__in=statuses, order_linked=order_linked
+    ).exclude(order_status__in=exclude_order_statuses).aggregate(total=Sum('amount'))['total'] or ZERO
+
+
+def expense_totals(start_date, end_date, statuses=('approved',)):
+    totals = _facts(DailyExpenseFact, start_date, end_date).filter(
+        status__in=statuses
+    ).aggregate(count=Sum('expense_count'), total=Sum('total_amount'))
+    return {'count': totals['count'] or 0, 'total': totals['total'] or ZERO}
+
+
+def expenses_by_category(start_date, end_date, statuses=('approved',)):
+    """Expense totals per category, largest first"""
+    return list(
+        _facts(DailyExpenseFact, start_date, end_date).filter(
+            status__in=statuses
+        ).values('category__name').annotate(
+            total=Sum('total_amount'),
+            count=Sum('expense_count'),
+        ).order_by('-total')
+    )
+
+
+def stock_by_item(start_date, end_date):
+    """Stock in/out totals per inventory item"""
+    return list(
+        _facts(DailyStockFact, start_date, end_date).values('item_id', 'item__name').annotate(
+            movement_count=Sum('movement_count'),
+            quantity_in=Sum('quantity_in'),
+            quantity_out=Sum('quantity_out'),
+            quantity_adjusted=Sum('quantity_adjusted'),
+            value_in=Sum('value_in'),
+            value_out=Sum('value_out'),
+        ).order_by('item__name')
+    )
@@ -0,0 +1,402 @@
+"""
+Background report jobs
+
+PDF and Excel exports used to be rendered inside the request, blocking a web
+worker for the whole render. An export request now creates a queued
+``BusinessReport`` job and returns immediately; the job runs in the owning
+tenant's database context, records its progress on the row and stores the
+output in the report's file field. The browser polls the job status and
+downloads the file when it is ready.
+
+Jobs are keyed by tenant, report type, date range, filters, format and the
+tenant's report ``data_version``, so repeating a request while nothing has
+changed returns the finished file instantly. Only report types built from
+the order, payment, refund, expense and stock data that ``data_version``
+tracks are reused (``CACHEABLE_REPORT_TYPES``); scheduled reports always
+render a fresh job so their email goes out. Schedules run from
+``run_tenant_jobs`` (cron or celery beat), so they render in the calling
+process instead of a thread that would die with a short-lived command.
+
+``REPORT_JOB_BACKEND`` selects how jobs are started: ``'thread'`` (default)
+runs them in a background thread of the web process, ``'celery'`` queues the
+``generate_report_job`` task. ``manage.py process_report_jobs`` (or the
+celery task of the same name) picks up jobs whose worker was lost.
+"""
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+import hashlib
+import logging
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.text import slugify
+
+from apps.core.database_router import TenantDatabaseManager, get_current_tenant, tenant_context
+from apps.core.tenant_models import Tenant
+
+from .fact_utils import data_version
+from .models import BusinessReport, ReportSchedule
+
+logger = logging.getLogger(__name__)
+
+EXPORT_EXTENSIONS = {'pdf': 'pdf', 'excel': 'xlsx'}
+JOB_TIMEOUT = timedelta(minutes=30)
+QUEUE_GRACE = timedelta(minutes=2)
+BATCH_SIZE = 20
+
+# ReportSchedule report types mapped to the report views that render them
+SCHEDULE_REPORT_TYPES = {
+    'daily_summary': 'daily_summary',
+    'weekly_summary': 'weekly_summary',
+    'monthly_summary': 'monthly_summary',
+    'financial_overview': 'financial_summary',
+    'customer_analysis': 'customers',
+    'service_performance': 'services',
+    'payment_summary': 'payments',
+    'employee_performance': 'employees',
+    'itemized_report': 'business_overview',
+}
+
+# Report types whose inputs all bump ``data_version``; the rest (customers,
+# employees, services, inventory, ...) read rows it does not track
+CACHEABLE_REPORT_TYPES = {
+    'business_overview',
+    'payments',
+    'expenses',
+    'financial_summary',
+    'daily_summary',
+    'weekly_summary',
+    'monthly_summary',
+    'sales_analysis',
+    'refunds_report',
+}
+
+SCHEDULE_PERIODS = {
+    'daily': 1,
+    'weekly': 7,
+    'monthly': 30,
+    'quarterly': 91,
+}
+
+
+def _backend():
+    return getattr(settings, 'REPORT_JOB_BACKEND', 'thread')
+
+
+def job_cache_key(report_type, start_date, end_date, export_format, employee_id=None, tenant=None):
+    """Identity of a report result; changes whenever the tenant's report data changes"""
+    tenant = tenant or get_current_tenant()
+    parts = [
+        str(tenant.id) if tenant else router.db_for_read(BusinessReport),
+        report_type,
+        start_date.isoformat(),
+        end_date.isoformat(),
+        export_format,
+        str(employee_id or ''),
+        str(data_version()),
+    ]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+# ================================
+# REQUESTING JOBS
+# ================================
+
+def find_cached_job(cache_key):
+    """Newest usable job for ``cache_key``: finished with a file, or still running"""
+    job = BusinessReport.objects.filter(cache_key=cache_key).exclude(
+        status='failed'
+    ).order_by('-created_at').first()
+    if job is None:
+        return None
+    if job.status == 'completed' and not job.output_file:
+        return None
+    if job.status == 'generating' and job.started_at and job.started_at < timezone.now() - JOB_TIMEOUT:
+        _fail(job.pk, 'Report generation timed out')
+        return None
+    return job
+
+
+def request_report(report_type, start_date, end_date, export_format, employee_id=None,
+                   generated_by=None, schedule_id=None, background=True):
+    """
+    Return ``(job, created)`` for an export, queueing a new job on a cache miss.
+
+    A finished job for the same inputs and data version is returned as is,
+    for cacheable report types and never for a schedule (whose job sends
+    the email when it completes). With ``background=False`` the new job is
+    left queued for the caller to run with ``run_report_job``.
+    """
+    if export_format not in EXPORT_EXTENSIONS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+
+    cache_key = job_cache_key(report_type, start_date, end_date, export_format, employee_id)
+    if not schedule_id and report_type in CACHEABLE_REPORT_TYPES:
+        job = find_cached_job(cache_key)
+        if job is not None:
+            return job, False
+
+    from .views import ReportsView
+
+    job = BusinessReport.objects.create(
+        report_type=report_type,
+        title=ReportsView()._get_report_title(report_type),
+        start_date=start_date,
+        end_date=end_date,
+        generated_by=generated_by,
+        status='queued',
+        export_format=export_format,
+        parameters={'employee_id': str(employee_id) if employee_id else '', 'schedule_id': schedule_id or ''},
+        cache_key=cache_key,
+        progress_message='Waiting for a worker',
+    )
+    if background:
+        dispatch_job(job)
+    return job, True
+
+
+def dispatch_job(job):
+    """Start the job in the background once its row is committed"""
+    tenant = get_current_tenant()
+    tenant_id = str(tenant.id) if tenant else ''
+    job_id = str(job.pk)
+
+    def start():
+        if _backend() == 'celery':
+            try:
+                from .tasks import generate_report_job
+                generate_report_job.delay(tenant_id, job_id)
+                return
+            except Exception as e:
+                logger.warning(f"Could not queue report job {job_id} on celery, running in a thread: {e}")
+        threading.Thread(
+            target=_run_in_thread, args=(tenant_id, job_id), name=f"report-job-{job_id}", daemon=True
+        ).start()
+
+    transaction.on_commit(start, using=router.db_for_write(BusinessReport))
+
+
+def job_state(job):
+    """Status payload returned to polling clients"""
+    return {
+        'job_id': str(job.pk),
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.error_message if job.status == 'failed' else job.progress_message,
+        'format': job.export_format,
+        'ready': job.status == 'completed' and bool(job.output_file),
+    }
+
+
+# ================================
+# RUNNING JOBS
+# ================================
+
+def _run_in_thread(tenant_id, job_id):
+    try:
+        run_job_for_tenant(tenant_id, job_id)
+    finally:
+        connections.close_all()
+
+
+def run_job_for_tenant(tenant_id, job_id):
+    """Enter the tenant's database and run one job"""
+    tenant = Tenant.objects.using('default').filter(id=tenant_id, is_active=True).first() if tenant_id else None
+    if tenant is None:
+        logger.error(f"Report job {job_id}: tenant {tenant_id or '(none)'} not found")
+        return None
+
+    TenantDatabaseManager.add_tenant_to_settings(tenant)
+    with tenant_context(tenant):
+        return run_report_job(job_id, tenant)
+
+
+def _set_progress(job_id, progress, message):
+    BusinessReport.objects.filter(pk=job_id).update(
+        progress=progress, progress_message=message, updated_at=timezone.now()
+    )
+
+
+def _fail(job_id, message):
+    BusinessReport.objects.filter(pk=job_id).update(
+        status='failed', error_message=message[:2000], progress_message='Failed', updated_at=timezone.now()
+    )
+
+
+def _decimal(value):
+    try:
+        return Decimal(str(value or 0))
+    except (InvalidOperation, ValueError):
+        return Decimal('0')
+
+
+def render_report(job, tenant):
+    """
+    Render a job's export, returning ``(content, filename, summary, export_format)``.
+
+    ``export_format`` is ``'excel'`` for a PDF job whose report had too many
+    rows for a PDF (see ``pdf_utils.exceeds_row_limit``).
+    """
+    from django.http import HttpRequest
+    from .views import ReportsView
+
+    employee_id = job.parameters.get('employee_id') or None
+
+    request = HttpRequest()
+    request.GET.update({'report_type': job.report_type, 'employee_id': employee_id or ''})
+    request.tenant = request.business = tenant
+
+    view = ReportsView()
+    view.setup(request)
+    data = view._get_export_data(job.report_type, job.start_date, job.end_date, employee_id)
+
+    _set_progress(job.pk, 50, f"Rendering {job.get_export_format_display()}")
+    if job.export_format == 'pdf':
+        response = view._generate_pdf_export(data, tenant)
+    else:
+        response = view._generate_excel_export(data, tenant)
+    if response.status_code != 200:
+        raise ValueError(response.content.decode('utf-8', 'replace'))
+    content = b''.join(response.streaming_content) if response.streaming else response.content
+
+    export_format = job.export_format
+    if export_format == 'pdf' and not response.get('Content-Type', '').startswith('application/pdf'):
+        export_format = 'excel'
+
+    filename = f"{slugify(tenant.name)}_{job.report_type}_{job.start_date}_{job.end_date}.{EXPORT_EXTENSIONS[export_format]}"
+    return content, filename, data.get('summary') or {}, export_format
+
+
+def run_report_job(job_id, tenant=None):
+    """Claim a queued job and generate its file; returns the job or None if already claimed"""
+    tenant = tenant or get_current_tenant()
+    now = timezone.now()
+    claimed = BusinessReport.objects.filter(pk=job_id, status='queued').update(
+        status='generating', started_at=now, progress=10, progress_message='Collecting data', updated_at=now
+    )
+    if not claimed:
+        return None
+
+    job = BusinessReport.objects.get(pk=job_id)
+    try:
+        content, filename, summary, export_format = render_report(job, tenant)
+        _set_progress(job.pk, 90, 'Saving file')
+
+        message = 'Ready'
+        if export_format != job.export_format:
+            job.export_format = export_format
+            message = 'Ready (too many rows for PDF, saved as Excel)'
+        job.output_file.save(filename, ContentFile(content), save=False)
+        job.status = 'completed'
+        job.progress = 100
+        job.progress_message = message
+        job.generated_at = timezone.now()
+        job.total_revenue = _decimal(summary.get('total_revenue') or summary.get('gross_revenue'))
+        job.total_orders = int(summary.get('total_orders') or 0)
+        job.save()
+        logger.info(f"Report job {job.pk} ({job.report_type}, {job.export_format}) completed")
+    except Exception as e:
+        logger.exception(f"Report job {job_id} failed")
+        _fail(job_id, str(e) or e.__class__.__name__)
+        job.refresh_from_db()
+        return job
+
+    if job.parameters.get('schedule_id'):
+        _send_scheduled_report(job)
+    return job
+
+
+def recover_stale_jobs(limit=BATCH_SIZE):
+    """
+    Run jobs in the current tenant whose worker never started or died.
+
+    Returns outcome counts.
+    """
+    now = timezone.now()
+    results = {'completed': 0, 'failed': 0}
+
+    BusinessReport.objects.filter(
+        status='generating', started_at__lt=now - JOB_TIMEOUT
+    ).update(status='queued', progress=0, progress_message='Retrying', updated_at=now)
+
+    job_ids = list(BusinessReport.objects.filter(
+        status='queued', created_at__lt=now - QUEUE_GRACE
+    ).order_by('created_at').values_list('pk', flat=True)[:limit])
+
+    for job_id in job_ids:
+        job = run_report_job(job_id)
+        if job is not None:
+            results['completed' if job.status == 'completed' else 'failed'] += 1
+    return results
+
+
+def recover_all_tenants(limit=BATCH_SIZE, tenant_slug=None):
+    """Run ``recover_stale_jobs`` in every active tenant, returning totals"""
+    totals = {'completed': 0, 'failed': 0}
+    tenants = Tenant.objects.using('default').filter(is_active=True)
+    if tenant_slug:
+        tenants = tenants.filter(slug=tenant_slug)
+
+    for tenant in tenants:
+        try:
+            TenantDatabaseManager.add_tenant_to_settings(tenant)
+            with tenant_context(tenant):
+                for outcome, count in recover_stale_jobs(limit).items():
+                    totals[outcome] += count
+        except Exception as e:
+            logger.error(f"Report job recovery failed for {tenant.name}: {e}")
+    return totals
+
+
+# ================================
+# SCHEDULED REPORTS
+# ================================
+
+def _next_run(schedule, now):
+    return now + timedelta(days=SCHEDULE_PERIODS.get(schedule.frequency, 1))
+
+
+def queue_scheduled_reports(now=None):
+    """Render and email a job for every due ReportSchedule in the current tenant"""
+    now = now or timezone.now()
+    rendered = 0
+    due = ReportSchedule.objects.filter(Q(next_run__isnull=True) | Q(next_run__lte=now), is_active=True)
+
+    for schedule in due:
+        end_date = timezone.localdate()
+        start_date = end_date - timedelta(days=SCHEDULE_PERIODS.get(schedule.frequency, 1) - 1)
+        report_type = SCHEDULE_REPORT_TYPES.get(schedule.report_type, schedule.report_type)
+        formats = [fmt for fmt, wanted in (('pdf', schedule.include_pdf), ('excel', schedule.include_excel)) if wanted]
+
+        try:
+            jobs = [
+                request_report(report_type, start_date, end_date, export_format,
+                               schedule_id=str(schedule.pk), background=False)[0]
+                for export_format in formats or ['pdf']
+            ]
+        except Exception as e:
+            logger.error(f"Could not queue scheduled report {schedule.pk}: {e}")
+            continue
+
+        # Advanced before rendering so a slow render is not picked up again by an overlapping run
+        ReportSchedule.objects.filter(pk=schedule.pk).update(last_run=now, next_run=_next_run(schedule, now))
+        for job in jobs:
+            if run_report_job(job.pk) is not None:
+                rendered += 1
+    return rendered
+
+
+def _send_scheduled_report(job):
+    from .utils import send_report_email
+
+    schedule = ReportSchedule.objects.filter(pk=job.parameters['schedule_id']).first()
+    if schedule is None or not schedule.email_recipients:
+        return
+    try:
+        send_report_email(schedule, job)
+    except Exception as e:
+        logger.error(f"Could not email scheduled report {job.pk}: {e}")
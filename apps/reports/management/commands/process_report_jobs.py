@@ -0,0 +1,49 @@
+"""
+Django management command to run stalled report export jobs
+Runs one pass by default; use --loop to keep watching for stalled jobs
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Run queued report jobs whose background worker never started or died'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            help='Specific tenant slug (checks all active tenants if not specified)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Jobs run per tenant per pass'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep checking for stalled jobs'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=60.0,
+            help='Seconds to wait between passes'
+        )
+
+    def handle(self, *args, **options):
+        from apps.reports.job_utils import recover_all_tenants
+
+        while True:
+            results = recover_all_tenants(limit=max(options['batch_size'], 1), tenant_slug=options.get('tenant'))
+            if results['completed']:
+                self.stdout.write(self.style.SUCCESS(f"✓ Generated {results['completed']} report jobs"))
+            if results['failed']:
+                self.stdout.write(self.style.ERROR(f"✗ {results['failed']} report jobs failed"))
+
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,88 @@
+"""
+Management command to re-derive the daily report fact tables
+"""
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from apps.core.tenant_models import Tenant
+from apps.core.database_router import TenantDatabaseManager, tenant_context
+
+
+class Command(BaseCommand):
+    help = 'Re-derive daily report facts (revenue, orders, refunds, expenses, stock, commissions) for a date range'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            help='Specific tenant slug to rebuild (rebuilds all active tenants if not specified)'
+        )
+        parser.add_argument(
+            '--date',
+            type=str,
+            help='Single date to rebuild (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--date-from',
+            type=str,
+            help='First date to rebuild (YYYY-MM-DD, defaults to 30 days ago)'
+        )
+        parser.add_argument(
+            '--date-to',
+            type=str,
+            help='Last date to rebuild (YYYY-MM-DD, defaults to today)'
+        )
+        parser.add_argument(
+            '--skip-commissions',
+            action='store_true',
+            help='Do not rebuild employee commission rollups'
+        )
+
+    def handle(self, *args, **options):
+        if options.get('date'):
+            date_from = date_to = self._parse_date(options['date'])
+        else:
+            date_to = self._parse_date(options.get('date_to')) or timezone.localdate()
+            date_from = self._parse_date(options.get('date_from')) or date_to - timedelta(days=30)
+        if date_from > date_to:
+            raise CommandError('--date-from must not be after --date-to')
+
+        if options.get('tenant'):
+            tenants = Tenant.objects.filter(slug=options['tenant'])
+            if not tenants.exists():
+                raise CommandError(f"Tenant '{options['tenant']}' not found")
+        else:
+            tenants = Tenant.objects.filter(is_active=True)
+
+        for tenant in tenants:
+            self.rebuild_tenant(tenant, date_from, date_to, not options['skip_commissions'])
+
+    def rebuild_tenant(self, tenant, date_from, date_to, commissions=True):
+        """Re-derive facts for a single tenant database"""
+        from apps.reports.fact_utils import rebuild_fact_range
+        from apps.services.commission_utils import rebuild_commission_rollups
+
+        TenantDatabaseManager.add_tenant_to_settings(tenant)
+
+        try:
+            with tenant_context(tenant):
+                written = rebuild_fact_range(date_from, date_to)
+                rollups = rebuild_commission_rollups(date_from, date_to) if commissions else 0
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"✓ {tenant.name}: {written} fact rows and {rollups} commission rollups "
+                    f"for {date_from} to {date_to}"
+                )
+            )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f"✗ {tenant.name}: {e}")
+            )
+
+    def _parse_date(self, value):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD")
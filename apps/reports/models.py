@@ -21,6 +21,7 @@ class BusinessReport(TenantTimeStampedModel):
     ]
     
     STATUS_CHOICES = [
+        ('queued', 'Queued'),
         ('generating', 'Generating'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
@@ -65,11 +66,24 @@ class BusinessReport(TenantTimeStampedModel):
     total_orders = models.IntegerField(default=0)
     total_customers = models.IntegerField(default=0)
     
+    # Background generation
+    export_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, blank=True)
+    parameters = models.JSONField(default=dict, blank=True, help_text="Filters such as employee_id")
+    cache_key = models.CharField(
+        max_length=64, blank=True, db_index=True,
+        help_text="Hash of tenant, report type, range, filters, format and data version"
+    )
+    progress = models.PositiveSmallIntegerField(default=0)
+    progress_message = models.CharField(max_length=200, blank=True)
+    error_message = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['report_type', 'start_date', 'end_date']),
             models.Index(fields=['generated_by', 'created_at']),
+            models.Index(fields=['status', 'created_at']),
         ]
     
     def __str__(self):
@@ -77,6 +91,21 @@ class BusinessReport(TenantTimeStampedModel):
     
     def get_absolute_url(self):
         return f"/business/{self.tenant.slug}/reports/{self.id}/"
+    
+    @property
+    def output_file(self):
+        """The generated export file for this job, if any"""
+        if self.export_format == 'pdf':
+            return self.pdf_file
+        if self.export_format == 'excel':
+            return self.excel_file
+        if self.export_format == 'csv':
+            return self.csv_file
+        return None
+    
+    @property
+    def is_finished(self):
+        return self.status in ('completed', 'failed')
 
 
 class ReportSchedule(TenantTimeStampedModel):
@@ -169,3 +198,177 @@ class ExportLog(TenantTimeStampedModel):
     
     def __str__(self):
         return f"{self.report.title} - {self.export_format.upper()} export"
+
+
+# ================================
+# DAILY FACT TABLES
+# ================================
+
+class DailyFact(models.Model):
+    """
+    Base for per-day report facts.
+
+    Rows are derived from transactions by ``apps.reports.fact_utils`` and are
+    always rebuilt a whole date at a time, so re-deriving a date is idempotent.
+    Payments, orders and refunds belonging to a service order are dated by the
+    order's creation date, like the reports that read them.
+    """
+    date = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+        ordering = ['-date']
+
+
+class DailyFactCoverage(models.Model):
+    """Dates whose facts have been derived at least once"""
+    date = models.DateField(unique=True)
+    rebuilt_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Daily Fact Coverage"
+        verbose_name_plural = "Daily Fact Coverage"
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"Facts for {self.date}"
+
+
+class ReportDataVersion(models.Model):
+    """
+    Single-row counter bumped whenever reported transactions change.
+
+    Kept in the tenant database so every worker sees the same value; it keys
+    cached report exports and dashboard snapshots.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Report Data Version"
+        verbose_name_plural = "Report Data Version"
+
+    def __str__(self):
+        return f"Report data version {self.version}"
+
+
+class DailyRevenueFact(DailyFact):
+    """Payment totals per day, payment method, payment type and status"""
+    payment_method = models.ForeignKey(
+        'payments.PaymentMethod',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='daily_revenue_facts'
+    )
+    payment_type = models.CharField(max_length=20)
+    status = models.CharField(max_length=20)
+    order_linked = models.BooleanField(default=True, help_text="Payment belongs to a service order")
+    order_status = models.CharField(max_length=20, blank=True)
+
+    payment_count = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    net_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta(DailyFact.Meta):
+        verbose_name = "Daily Revenue Fact"
+        verbose_name_plural = "Daily Revenue Facts"
+        unique_together = ['date', 'payment_method', 'payment_type', 'status', 'order_linked', 'order_status']
+        indexes = [
+            models.Index(fields=['date', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.payment_type}/{self.status}: KES {self.amount}"
+
+
+class DailyOrderFact(DailyFact):
+    """Service order totals per creation day and order status"""
+    status = models.CharField(max_length=20)
+
+    order_count = models.PositiveIntegerField(default=0)
+    order_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid_order_count = models.PositiveIntegerField(default=0)
+    paid_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta(DailyFact.Meta):
+        verbose_name = "Daily Order Fact"
+        verbose_name_plural = "Daily Order Facts"
+        unique_together = ['date', 'status']
+
+    def __str__(self):
+        return f"{self.date} {self.status}: {self.order_count} orders"
+
+
+class DailyRefundFact(DailyFact):
+    """Formal refund record totals per day and refund status"""
+    status = models.CharField(max_length=20)
+    order_linked = models.BooleanField(default=True, help_text="Refunded payment belongs to a service order")
+    order_status = models.CharField(max_length=20, blank=True)
+
+    refund_count = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta(DailyFact.Meta):
+        verbose_name = "Daily Refund Fact"
+        verbose_name_plural = "Daily Refund Facts"
+        unique_together = ['date', 'status', 'order_linked', 'order_status']
+
+    def __str__(self):
+        return f"{self.date} {self.status}: KES {self.amount}"
+
+
+class DailyExpenseFact(DailyFact):
+    """Expense totals per expense date, category and status"""
+    category = models.ForeignKey(
+        'expenses.ExpenseCategory',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='daily_expense_facts'
+    )
+    status = models.CharField(max_length=20)
+
+    expense_count = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    tax_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta(DailyFact.Meta):
+        verbose_name = "Daily Expense Fact"
+        verbose_name_plural = "Daily Expense Facts"
+        unique_together = ['date', 'category', 'status']
+        indexes = [
+            models.Index(fields=['date', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.status}: KES {self.total_amount}"
+
+
+class DailyStockFact(DailyFact):
+    """Stock movement totals per day and inventory item"""
+    item = models.ForeignKey(
+        'inventory.InventoryItem',
+        on_delete=models.CASCADE,
+        related_name='daily_stock_facts'
+    )
+
+    movement_count = models.PositiveIntegerField(default=0)
+    quantity_in = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantity_out = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantity_adjusted = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0,
+        help_text="Net stock change from adjustments and transfers"
+    )
+    value_in = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    value_out = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta(DailyFact.Meta):
+        verbose_name = "Daily Stock Fact"
+        verbose_name_plural = "Daily Stock Facts"
+        unique_together = ['date', 'item']
+
+    def __str__(self):
+        return f"{self.date} {self.item_id}: +{self.quantity_in} / -{self.quantity_out}"
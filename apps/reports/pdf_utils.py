@@ -0,0 +1,255 @@
+"""
+Chunked PDF rendering for large report tables
+
+ReportLab lays out one ``Table`` flowable as a whole, so a single table
+holding every row of a year-long export grows memory and render time
+faster than the row count. Report tables are now split into chunks of
+``CHUNK_ROWS`` rows, each a separate table repeating the header row:
+
+* when pypdf is installed and a table spans several chunks, the middle
+  chunks are rendered as separate PDF parts in worker processes while the
+  calling process renders the first part (title, summary, first chunk) and
+  the last part (last chunk, signatures, footer); the parts are then
+  concatenated;
+* otherwise all chunks are laid out in one document, which still avoids the
+  cost of splitting one huge table.
+
+Paragraph and table styles are built once per process and reused across
+exports. Exports with more than ``REPORT_PDF_MAX_ROWS`` rows are not
+rendered as PDF at all; ``ReportsView`` falls back to XLSX.
+``REPORT_PDF_WORKERS`` sets the size of the worker pool (0 or 1 renders
+every part in the calling process).
+"""
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import io
+import logging
+import multiprocessing
+import threading
+
+from django.conf import settings
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
+    PDF_AVAILABLE = True
+except ImportError:
+    PDF_AVAILABLE = False
+
+try:
+    from pypdf import PdfWriter
+    PDF_MERGE_AVAILABLE = True
+except ImportError:
+    PDF_MERGE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+CHUNK_ROWS = 400
+DEFAULT_MAX_ROWS = 20000
+DEFAULT_WORKERS = 4
+TABLE_WIDTH = 6.5
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def max_rows():
+    return getattr(settings, 'REPORT_PDF_MAX_ROWS', DEFAULT_MAX_ROWS)
+
+
+def exceeds_row_limit(items):
+    """True when an export has too many rows to render as PDF"""
+    count = len(items or [])
+    if count > max_rows():
+        logger.info(f"{count} rows exceed the PDF limit of {max_rows()}; exporting Excel instead")
+        return True
+    return False
+
+
+def _workers():
+    return getattr(settings, 'REPORT_PDF_WORKERS', DEFAULT_WORKERS)
+
+
+# ================================
+# CACHED STYLES
+# ================================
+
+@lru_cache(maxsize=None)
+def paragraph_styles():
+    """The sample stylesheet, built once per process"""
+    return getSampleStyleSheet()
+
+
+@lru_cache(maxsize=None)
+def header_table_style():
+    return TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ])
+
+
+@lru_cache(maxsize=None)
+def details_table_style():
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.lightblue),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ('BACKGROUND', (1, 0), (1, -1), colors.white),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ])
+
+
+@lru_cache(maxsize=None)
+def summary_table_style():
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
+    ])
+
+
+@lru_cache(maxsize=None)
+def data_table_style():
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
+    ])
+
+
+@lru_cache(maxsize=None)
+def signature_table_style():
+    return TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('TOPPADDING', (0, 0), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ])
+
+
+# ================================
+# CHUNKED TABLES
+# ================================
+
+def chunk_rows(rows, size=CHUNK_ROWS):
+    """Split body rows into lists of at most ``size`` rows"""
+    return [rows[start:start + size] for start in range(0, len(rows), size)]
+
+
+def data_tables(header, rows):
+    """One table per chunk of ``rows``, each repeating ``header`` on every page"""
+    col_width = TABLE_WIDTH * inch / len(header) if header else 1 * inch
+    tables = []
+    for chunk in chunk_rows(rows) or [[]]:
+        table = Table([header] + chunk, colWidths=[col_width] * len(header), repeatRows=1)
+        table.setStyle(data_table_style())
+        tables.append(table)
+    return tables
+
+
+def build_document(story):
+    """Lay out a story on A4 with the report margins; returns the PDF bytes"""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.8 * inch, bottomMargin=1 * inch)
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def render_table_part(header, rows):
+    """Render body rows as a standalone PDF part (runs in a worker process)"""
+    return build_document(data_tables(header, rows))
+
+
+# ================================
+# PARALLEL RENDERING
+# ================================
+
+def _pool():
+    """Worker pool shared by every export in this process"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawned rather than forked: web and job processes run threads and hold DB connections
+            _executor = ProcessPoolExecutor(
+                max_workers=_workers(), mp_context=multiprocessing.get_context('spawn')
+            )
+        return _executor
+
+
+def _reset_pool():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def render_story(head, header, rows, tail):
+    """
+    Render ``head`` flowables, the data table and ``tail`` flowables as one PDF.
+
+    Returns the PDF bytes. Large tables are rendered in parts and merged
+    when pypdf and worker processes are available.
+    """
+    chunks = chunk_rows(rows)
+    if not header or len(chunks) < 3 or not PDF_MERGE_AVAILABLE or _workers() <= 1:
+        tables = data_tables(header, rows) if header else []
+        return build_document(list(head) + tables + list(tail))
+
+    middle = chunks[1:-1]
+    try:
+        pool = _pool()
+        futures = [pool.submit(render_table_part, header, chunk) for chunk in middle]
+    except Exception as e:
+        logger.warning(f"PDF worker pool unavailable, rendering {len(chunks)} parts in process: {e}")
+        _reset_pool()
+        futures = []
+
+    # The first and last parts carry the report's own flowables and render here meanwhile
+    first = build_document(list(head) + data_tables(header, chunks[0]))
+    last = build_document(data_tables(header, chunks[-1]) + list(tail))
+
+    parts = [first]
+    for chunk, future in zip(middle, futures or [None] * len(middle)):
+        try:
+            parts.append(future.result() if future else render_table_part(header, chunk))
+        except Exception as e:
+            logger.warning(f"PDF part failed in a worker, rendering it in process: {e}")
+            _reset_pool()
+            parts.append(render_table_part(header, chunk))
+    parts.append(last)
+    return merge_parts(parts)
+
+
+def merge_parts(parts):
+    """Concatenate PDF documents in order"""
+    writer = PdfWriter()
+    for part in parts:
+        writer.append(io.BytesIO(part))
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
@@ -211,4 +211,115 @@ def generate_service_analytics_data(service_order):
         return {
             'order_id': str(service_order.id),
             'error': 'data_generation_failed'
-        }
\ No newline at end of file
+        }
+
+# ================================
+# DAILY FACT MAINTENANCE
+# ================================
+
+import datetime as _datetime
+import logging
+
+from django.db import router
+from django.db.models.signals import post_delete, post_init, post_save
+
+from apps.expenses.models import Expense
+from apps.inventory.models import StockMovement
+from apps.payments.models import Payment, PaymentRefund
+from apps.services.models import ServiceOrder
+
+logger = logging.getLogger(__name__)
+
+FACT_FIELDS = {
+    Payment: ('status', 'amount', 'net_amount', 'payment_type', 'payment_method_id',
+              'service_order_id', 'completed_at', 'created_at'),
+    ServiceOrder: ('status', 'total_amount', 'created_at'),
+    PaymentRefund: ('status', 'amount', 'original_payment_id', 'processed_at', 'created_at'),
+    Expense: ('status', 'amount', 'tax_amount', 'total_amount', 'category_id', 'expense_date'),
+    StockMovement: ('item_id', 'movement_type', 'quantity', 'unit_cost', 'old_stock', 'new_stock', 'created_at'),
+}
+
+
+def _fact_state(instance):
+    # Read from __dict__ so deferred fields are never fetched while loading rows
+    fields = FACT_FIELDS[type(instance)]
+    return dict(zip(fields, (instance.__dict__.get(field) for field in fields)))
+
+
+def _fact_date(value):
+    from .fact_utils import local_date
+
+    if isinstance(value, _datetime.datetime):
+        return local_date(value)
+    return value
+
+
+def _payment_marks(state):
+    """(kinds, dates, order_ids) touched by a payment in the given state"""
+    if state['service_order_id']:
+        return ('revenue', 'orders', 'refunds'), (), (state['service_order_id'],)
+    return ('revenue',), (_fact_date(state['completed_at'] or state['created_at']),), ()
+
+
+def _refund_marks(state):
+    order_id = Payment.objects.filter(
+        pk=state['original_payment_id']
+    ).values_list('service_order_id', flat=True).first()
+    if order_id:
+        return ('refunds',), (), (order_id,)
+    return ('refunds',), (_fact_date(state['processed_at'] or state['created_at']),), ()
+
+
+def _fact_marks(instance, state):
+    if isinstance(instance, Payment):
+        return _payment_marks(state)
+    if isinstance(instance, PaymentRefund):
+        return _refund_marks(state)
+    if isinstance(instance, ServiceOrder):
+        return ('revenue', 'orders', 'refunds'), (_fact_date(state['created_at']),), ()
+    if isinstance(instance, Expense):
+        return ('expenses',), (_fact_date(state['expense_date']),), ()
+    return ('stock',), (_fact_date(state['created_at']),), ()
+
+
+def _mark_fact_states(instance, states):
+    from .fact_utils import mark_dirty
+
+    db_alias = instance._state.db or router.db_for_write(type(instance))
+    for state in states:
+        if state is None:
+            continue
+        try:
+            kinds, dates, order_ids = _fact_marks(instance, state)
+            mark_dirty(db_alias, kinds, dates, order_ids)
+        except Exception as e:
+            logger.error(f"Failed to schedule report facts for {type(instance).__name__} {instance.pk}: {e}")
+
+
+def remember_fact_state(sender, instance, **kwargs):
+    """Remember the reported fields as loaded so unchanged saves are skipped"""
+    instance._fact_origin = _fact_state(instance)
+
+
+def update_daily_facts(sender, instance, created, raw=False, **kwargs):
+    """Re-derive the report facts of the dates a save moved rows out of and into"""
+    if raw:
+        return
+
+    origin = None if created else getattr(instance, '_fact_origin', None)
+    current = _fact_state(instance)
+    instance._fact_origin = current
+    if origin == current:
+        return
+
+    _mark_fact_states(instance, [origin, current])
+
+
+def remove_daily_facts(sender, instance, **kwargs):
+    _mark_fact_states(instance, [getattr(instance, '_fact_origin', None), _fact_state(instance)])
+
+
+for _model in FACT_FIELDS:
+    post_init.connect(remember_fact_state, sender=_model, dispatch_uid=f'report_facts_init_{_model.__name__}')
+    post_save.connect(update_daily_facts, sender=_model, dispatch_uid=f'report_facts_save_{_model.__name__}')
+    post_delete.connect(remove_daily_facts, sender=_model, dispatch_uid=f'report_facts_delete_{_model.__name__}')
@@ -0,0 +1,53 @@
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def generate_report_job(tenant_id, job_id):
+    """
+    Generate one queued report export in its tenant's database
+    Queued by job_utils.dispatch_job when REPORT_JOB_BACKEND is 'celery'
+    """
+    from .job_utils import run_job_for_tenant
+
+    job = run_job_for_tenant(tenant_id, job_id)
+    return job.status if job else None
+
+
+@shared_task
+def process_report_jobs(batch_size=20):
+    """
+    Run report jobs whose worker never started or died
+    Schedule every few minutes with celery beat, or run the
+    process_report_jobs management command with --loop
+    """
+    from .job_utils import recover_all_tenants
+
+    totals = recover_all_tenants(limit=batch_size)
+    if any(totals.values()):
+        logger.info(f"Recovered report jobs: {totals}")
+    return totals
+
+
+@shared_task
+def generate_scheduled_reports(shards=None, time_limit=None):
+    """
+    Queue due scheduled reports in every active tenant
+    Schedule every 15 minutes or so with celery beat
+    """
+    from apps.core.scheduler_utils import run_tenant_jobs
+
+    return run_tenant_jobs(['reports.scheduled_reports'], shards=shards, time_limit=time_limit)
+
+
+@shared_task
+def update_kpi_values(shards=None, time_limit=None):
+    """
+    Recalculate KPI values in every active tenant
+    Schedule nightly with celery beat
+    """
+    from apps.core.scheduler_utils import run_tenant_jobs
+
+    return run_tenant_jobs(['reports.kpi_values'], shards=shards, time_limit=time_limit)
@@ -0,0 +1,237 @@
+"""
+Columnar time series for report and dashboard charts
+
+Per-period series used to be built by looping over dates in Python, often
+with one query per day, week or month. Here the raw ``(date, value...,
+dimension)`` points are fetched in one query and binned with NumPy into a
+contiguous run of day, week (Monday) or month buckets. Empty buckets are
+filled with zeros, and moving averages and period-over-period deltas are
+computed on the resulting arrays.
+
+Usage::
+
+    series = TimeSeries.from_queryset(
+        Payment.objects.filter(status='completed'), 'created_at', start, end, 'week', amount='amount'
+    )
+    series.chart('amount', window=4)  # {'labels': [...], 'data': [...], 'moving_average': [...], ...}
+"""
+import numpy as np
+from django.db.models import DateField, DateTimeField, F
+from django.db.models.functions import TruncDate
+
+PERIODS = ('day', 'week', 'month')
+ONE_DAY = np.timedelta64(1, 'D')
+
+
+def _days(values):
+    return np.asarray(values, dtype='datetime64[D]')
+
+
+def period_floor(days, period):
+    """Start of the bucket each day falls in"""
+    days = _days(days)
+    if period == 'day':
+        return days
+    if period == 'week':
+        # 1970-01-01 was a Thursday; shift so Monday is 0
+        weekday = (days.astype('int64') + 3) % 7
+        return days - weekday.astype('timedelta64[D]')
+    if period == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    raise ValueError(f"Unknown period: {period}")
+
+
+def bucket_starts(start_date, end_date, period='day'):
+    """Start date of every bucket covering ``start_date`` to ``end_date``"""
+    first, last = period_floor([start_date, end_date], period)
+    if period == 'month':
+        months = np.arange(first.astype('datetime64[M]'), last.astype('datetime64[M]') + 1)
+        return months.astype('datetime64[D]')
+    step = np.timedelta64(7 if period == 'week' else 1, 'D')
+    return np.arange(first, last + ONE_DAY, step)
+
+
+def moving_average(values, window):
+    """Trailing mean over ``window`` buckets; leading buckets average what is available"""
+    values = np.asarray(values, dtype=float)
+    if not len(values) or window <= 1:
+        return values.copy()
+    totals = np.concatenate(([0.0], np.cumsum(values)))
+    ends = np.arange(1, len(values) + 1)
+    starts = np.maximum(ends - window, 0)
+    return (totals[ends] - totals[starts]) / (ends - starts)
+
+
+def deltas(values):
+    """``(change, percent_change)`` against the previous bucket; NaN where undefined"""
+    values = np.asarray(values, dtype=float)
+    if not len(values):
+        return values.copy(), values.copy()
+    previous = np.concatenate(([np.nan], values[:-1]))
+    change = values - previous
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent = np.where(previous != 0, change / np.abs(previous) * 100, np.nan)
+    return change, percent
+
+
+def balance_history(closing, changes):
+    """
+    Balance at the end of each bucket, walking back from the final ``closing``
+    balance by the ``changes`` recorded in later buckets.
+    """
+    changes = np.asarray(changes, dtype=float)
+    later = np.concatenate((np.cumsum(changes[::-1])[::-1][1:], [0.0])) if len(changes) else changes
+    return float(closing) - later
+
+
+def period_for_range(start_date, end_date):
+    """Bucket size that keeps a chart readable for the given range"""
+    days = (end_date - start_date).days + 1
+    if days <= 62:
+        return 'day'
+    if days <= 366:
+        return 'week'
+    return 'month'
+
+
+def _day_expression(model, date_field):
+    field = model._meta.get_field(date_field) if '__' not in date_field else None
+    if isinstance(field, DateField) and not isinstance(field, DateTimeField):
+        return F(date_field)
+    return TruncDate(date_field)
+
+
+def _plain(values, digits=2):
+    """JSON-ready list; NaN becomes None"""
+    return [None if np.isnan(value) else round(float(value), digits) for value in values]
+
+
+class TimeSeries:
+    """Named value columns binned into contiguous buckets of one period"""
+
+    def __init__(self, starts, period, columns, dimensions=None):
+        self.starts = starts
+        self.period = period
+        self.columns = columns
+        self.dimensions = dimensions
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def from_points(cls, dates, start_date, end_date, period='day', dimension=None, **values):
+        """
+        Bin points into buckets from ``start_date`` to ``end_date``.
+
+        ``values`` maps column names to per-point amounts; a ``count`` column
+        is always added. With ``dimension`` (one label per point) every column
+        becomes a ``(len(dimensions), len(buckets))`` matrix.
+        """
+        starts = bucket_starts(start_date, end_date, period)
+        days = _days(dates) if len(dates) else np.array([], dtype='datetime64[D]')
+        inside = (days >= _days(start_date)) & (days <= _days(end_date))
+        index = np.searchsorted(starts, period_floor(days[inside], period), side='right') - 1
+
+        amounts = {name: np.asarray(column, dtype=float)[inside] for name, column in values.items()}
+        amounts['count'] = np.ones(len(index))
+
+        if dimension is None:
+            columns = {
+                name: np.bincount(index, weights=column, minlength=len(starts))
+                for name, column in amounts.items()
+            }
+            return cls(starts, period, columns)
+
+        labels, positions = np.unique(np.asarray(dimension, dtype=object)[inside].astype(str), return_inverse=True)
+        columns = {}
+        for name, column in amounts.items():
+            matrix = np.zeros((len(labels), len(starts)))
+            np.add.at(matrix, (positions, index), column)
+            columns[name] = matrix
+        return cls(starts, period, columns, dimensions=list(labels))
+
+    @classmethod
+    def from_rows(cls, rows, start_date, end_date, period='day', date_key='date', **fields):
+        """Bin dictionaries (e.g. ``.values()`` rows) using ``column=row_key`` pairs"""
+        rows = list(rows)
+        return cls.from_points(
+            [row[date_key] for row in rows], start_date, end_date, period,
+            **{name: [row[key] or 0 for row in rows] for name, key in fields.items()}
+        )
+
+    @classmethod
+    def from_queryset(cls, queryset, date_field, start_date, end_date, period='day', dimension=None, **fields):
+        """
+        One query for ``(local date, field..., dimension)`` tuples, then binned.
+
+        ``date_field`` may be a DateField or a DateTimeField (truncated in the
+        current timezone); ``fields`` maps column names to model lookups.
+        """
+        names = list(fields)
+        lookups = [fields[name] for name in names] + ([dimension] if dimension else [])
+        rows = list(queryset.annotate(_series_day=_day_expression(queryset.model, date_field)).values_list(
+            '_series_day', *lookups
+        ))
+        dates = [row[0] for row in rows]
+        values = {name: [row[position + 1] or 0 for row in rows] for position, name in enumerate(names)}
+        labels = [row[-1] or '' for row in rows] if dimension else None
+        return cls.from_points(dates, start_date, end_date, period, dimension=labels, **values)
+
+    # ----------------------------------------------------------------
+    # Output
+    # ----------------------------------------------------------------
+
+    @property
+    def dates(self):
+        return self.starts.astype(object).tolist()
+
+    def labels(self, fmt=None):
+        if fmt:
+            return [day.strftime(fmt) for day in self.dates]
+        return [str(day) for day in np.datetime_as_string(self.starts, unit='D')]
+
+    def total(self, name):
+        return float(self.columns[name].sum())
+
+    def rows(self, *names, integers=('count',), newest_first=False, key='date'):
+        """One dictionary per bucket, with plain ``int``/``float`` values"""
+        rows = []
+        for position, day in enumerate(self.dates):
+            row = {key: day}
+            for name in names:
+                value = float(self.columns[name][position])
+                row[name] = int(round(value)) if name in integers else round(value, 2)
+            rows.append(row)
+        return rows[::-1] if newest_first else rows
+
+    def chart(self, name, window=None, label_format=None):
+        """Chart-ready arrays for one column, with moving average and deltas"""
+        values = self.columns[name]
+        window = window or {'day': 7, 'week': 4, 'month': 3}[self.period]
+        if values.ndim == 2:
+            return {
+                'labels': self.labels(label_format),
+                'datasets': [
+                    {'label': label, 'data': _plain(row), 'moving_average': _plain(moving_average(row, window))}
+                    for label, row in zip(self.dimensions, values)
+                ],
+            }
+        change, percent = deltas(values)
+        return {
+            'labels': self.labels(label_format),
+            'data': _plain(values),
+            'moving_average': _plain(moving_average(values, window)),
+            'delta': _plain(change),
+            'delta_pct': _plain(percent, 1),
+        }
+
+    def top(self, name, limit):
+        """Restrict a dimensioned series to the ``limit`` largest totals of ``name``"""
+        if self.dimensions is None:
+            return self
+        order = np.argsort(-self.columns[name].sum(axis=1))[:limit]
+        return TimeSeries(
+            self.starts, self.period,
+            {column: matrix[order] for column, matrix in self.columns.items()},
+            dimensions=[self.dimensions[position] for position in order],
+        )
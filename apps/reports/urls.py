@@ -6,4 +6,8 @@ app_name = 'reports'
 urlpatterns = [
     # Reports interface with export functionality
     path('', views.ReportsView.as_view(), name='reports'),
-]
\ No newline at end of file
+    
+    # Background export jobs
+    path('jobs/<uuid:job_id>/', views.report_job_status, name='job_status'),
+    path('jobs/<uuid:job_id>/download/', views.report_job_download, name='job_download'),
+]
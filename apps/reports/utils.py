@@ -627,135 +627,44 @@ class ReportExporter:
         return filepath
 
 def calculate_business_metrics(date=None):
-    """Calculate and save business metrics for a specific date"""
-    from .models import BusinessMetrics
-    from apps.customers.models import Customer
-    from apps.services.models import ServiceOrder
-    from apps.payments.models import Payment
-    from apps.employees.models import Employee, Attendance
+    """Calculate and save business metrics for a specific date (written only if changed)"""
+    from apps.businesses.metrics_utils import get_daily_metrics, refresh_daily_metrics
     
     if date is None:
-        date = timezone.now().date()
-    
-    # Get or create metrics object
-    metrics, created = BusinessMetrics.objects.get_or_create(
-        date=date,
-        defaults={}
-    )
-    
-    # Calculate revenue metrics
-    day_start = timezone.make_aware(datetime.combine(date, datetime.min.time()))
-    day_end = timezone.make_aware(datetime.combine(date, datetime.max.time()))
-    
-    # Revenue calculations
-    payments = Payment.objects.filter(
-        status='completed',
-        created_at__range=[day_start, day_end]
-    )
-    
-    metrics.total_revenue = payments.aggregate(total=Sum('amount'))['total'] or 0
-    
-    # Payment method breakdown
-    metrics.cash_payments = payments.filter(method='cash').aggregate(
-        total=Sum('amount'))['total'] or 0
-    metrics.card_payments = payments.filter(method='card').aggregate(
-        total=Sum('amount'))['total'] or 0
-    metrics.mpesa_payments = payments.filter(method='mpesa').aggregate(
-        total=Sum('amount'))['total'] or 0
-    
-    # Customer metrics
-    customers = Customer.objects.filter(created_at__range=[day_start, day_end])
-    metrics.new_customers = customers.count()
-    
-    # Service metrics
-    services = ServiceOrder.objects.filter(created_at__range=[day_start, day_end])
-    metrics.total_services = services.count()
-    metrics.completed_services = services.filter(status='completed').count()
-    metrics.cancelled_services = services.filter(status='cancelled').count()
-    
-    # Calculate service revenue
-    service_revenue = services.filter(status='completed').aggregate(
-        total=Sum('total_amount'))['total'] or 0
-    metrics.service_revenue = service_revenue
-    
-    # Employee metrics
-    attendance = Attendance.objects.filter(date=date)
-    metrics.employees_present = attendance.filter(status='present').count()
-    metrics.employees_absent = attendance.filter(status='absent').count()
-    
-    # Save metrics
-    metrics.save()
+        date = timezone.localdate()
     
-    return metrics
+    refresh_daily_metrics(date)
+    return get_daily_metrics(date)
 
 def generate_scheduled_reports():
-    """Generate all due scheduled reports"""
-    from .models import ReportSchedule
+    """Render and email all due scheduled reports in the current tenant"""
+    from .job_utils import queue_scheduled_reports
     
-    due_schedules = ReportSchedule.objects.filter(
-        is_active=True,
-        next_generation__lte=timezone.now()
-    )
-    
-    for schedule in due_schedules:
-        try:
-            # Create report instance
-            from .models import GeneratedReport
-            report = GeneratedReport.objects.create(
-                template=schedule.template,
-                date_from=timezone.now().date() - timedelta(days=30),
-                date_to=timezone.now().date(),
-                status='generating'
-            )
-            
-            # Generate report
-            generator = ReportGenerator(schedule.template, report)
-            generator.generate()
-            
-            # Send email if enabled
-            if schedule.email_enabled and schedule.email_recipients:
-                send_report_email(schedule, report)
-            
-            # Update schedule
-            schedule.last_generated = timezone.now()
-            schedule.generation_count += 1
-            schedule.consecutive_failures = 0
-            schedule.calculate_next_generation()
-            
-        except Exception as e:
-            schedule.last_error = str(e)
-            schedule.consecutive_failures += 1
-            schedule.save()
+    return queue_scheduled_reports()
 
 def send_report_email(schedule, report):
-    """Send report via email"""
+    """Send a generated scheduled report to the schedule's recipients"""
     from django.core.mail import EmailMessage
-    from django.template.loader import render_to_string
-    
-    subject = schedule.email_subject or f"Scheduled Report: {schedule.template.name}"
     
-    context = {
-        'schedule': schedule,
-        'report': report,
-        'business': schedule.template.business if hasattr(schedule.template, 'business') else None
-    }
-    
-    html_content = render_to_string('reports/email/scheduled_report.html', context)
+    subject = f"Scheduled Report: {schedule.name or report.title}"
+    body = (
+        f"{report.title}\n"
+        f"Period: {report.start_date:%B %d, %Y} - {report.end_date:%B %d, %Y}\n"
+        f"Generated: {timezone.localtime(report.generated_at or timezone.now()):%B %d, %Y %H:%M}\n"
+    )
     
     email = EmailMessage(
         subject=subject,
-        body=html_content,
+        body=body,
         from_email=settings.DEFAULT_FROM_EMAIL,
         to=schedule.email_recipients
     )
     
-    email.content_subtype = 'html'
-    
-    # Attach files if available
-    if report.pdf_file:
-        email.attach_file(report.pdf_file.path)
-    if report.excel_file:
-        email.attach_file(report.excel_file.path)
+    # Attach the generated file; storage may be remote, so read it through the field
+    output_file = report.output_file
+    if output_file:
+        with output_file.open('rb') as handle:
+            email.attach(os.path.basename(output_file.name), handle.read())
     
     email.send()
 
@@ -784,13 +693,20 @@ def track_analytics_event(event_type, event_data=None, customer=None, employee=N
     )
 
 def update_kpi_values():
-    """Update all KPI current values based on their calculation methods"""
-    from .models import KPI, BusinessMetrics
+    """Update all KPI current values in the current tenant; returns the number updated"""
+    from apps.businesses.models import BusinessMetrics
     from apps.customers.models import Customer
     from apps.services.models import ServiceOrder
     from apps.payments.models import Payment
     
+    try:
+        from .models import KPI
+    except ImportError:
+        # No KPI model in this installation
+        return 0
+    
     kpis = KPI.objects.filter(is_active=True)
+    updated = 0
     
     for kpi in kpis:
         try:
@@ -825,8 +741,11 @@ def update_kpi_values():
             
             kpi.last_calculated = timezone.now()
             kpi.save()
+            updated += 1
             
         except Exception as e:
             # Log error but continue with other KPIs
             print(f"Error updating KPI {kpi.name}: {e}")
-            continue
\ No newline at end of file
+            continue
+    
+    return updated
@@ -1,5 +1,6 @@
-from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render, get_object_or_404, redirect
+from django.http import HttpResponse, JsonResponse, FileResponse, Http404
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.views.generic import View, TemplateView
@@ -8,18 +9,16 @@ from django.db.models.functions import TruncDate, TruncMonth, TruncWeek, TruncYe
 from django.utils import timezone
 from datetime import datetime, timedelta
 from decimal import Decimal
-import io
 import json
 from django.db import models
 
 # Third party imports
 try:
     from reportlab.pdfgen import canvas
-    from reportlab.lib.pagesizes import letter, A4
+    from reportlab.lib.pagesizes import letter
     from reportlab.lib.units import inch
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-    from reportlab.lib import colors
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.platypus import Table, Paragraph, Spacer, PageBreak
     PDF_AVAILABLE = True
 except ImportError:
     PDF_AVAILABLE = False
@@ -34,6 +33,7 @@ except ImportError:
 # Model imports
 from apps.services.models import Service, ServiceCategory, ServiceOrder, ServiceOrderItem, ServicePackage
 from apps.employees.models import Employee, Department, Attendance, PerformanceReview
+from apps.employees.user_utils import prefetch_users
 from apps.customers.models import Customer, Vehicle, LoyaltyProgram
 from apps.payments.models import Payment, PaymentMethod
 from apps.inventory.models import InventoryItem, StockMovement, InventoryCategory
@@ -634,15 +634,14 @@ class ReportsView(TemplateView):
         paginator = Paginator(payments, 20)
         payments_page = paginator.get_page(page)
         
-        # Calculate summary
-        total_payments = payments.aggregate(Sum('amount'))['amount__sum'] or 0
-        payment_count = payments.count()
+        # Calculate summary from the daily revenue facts
+        from .fact_utils import revenue_by_method, revenue_totals
+        totals = revenue_totals(start_date, end_date)
+        total_payments = totals['amount']
+        payment_count = totals['count']
         
         # Payment method breakdown
-        method_breakdown = payments.values('payment_method__name').annotate(
-            total=Sum('amount'),
-            count=Count('id')
-        ).order_by('-total')
+        method_breakdown = revenue_by_method(start_date, end_date)
         
         return {
             'items': payments_page,
@@ -650,7 +649,7 @@ class ReportsView(TemplateView):
                 'total_payments': total_payments,
                 'payment_count': payment_count,
                 'avg_payment': total_payments / max(payment_count, 1),
-                'method_breakdown': list(method_breakdown),
+                'method_breakdown': method_breakdown,
             },
             'pagination': self._get_pagination_data(payments_page, paginator)
         }
@@ -669,15 +668,14 @@ class ReportsView(TemplateView):
         paginator = Paginator(expenses, 20)
         expenses_page = paginator.get_page(page)
         
-        # Calculate summary
-        total_expenses = expenses.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        expense_count = expenses.count()
+        # Calculate summary from the daily expense facts
+        from .fact_utils import expense_totals, expenses_by_category
+        totals = expense_totals(start_date, end_date)
+        total_expenses = totals['total']
+        expense_count = totals['count']
         
         # Category breakdown
-        category_breakdown = expenses.values('category__name').annotate(
-            total=Sum('total_amount'),
-            count=Count('id')
-        ).order_by('-total')
+        category_breakdown = expenses_by_category(start_date, end_date)
         
         return {
             'items': expenses_page,
@@ -685,7 +683,7 @@ class ReportsView(TemplateView):
                 'total_expenses': total_expenses,
                 'expense_count': expense_count,
                 'avg_expense': total_expenses / max(expense_count, 1),
-                'category_breakdown': list(category_breakdown),
+                'category_breakdown': category_breakdown,
             },
             'pagination': self._get_pagination_data(expenses_page, paginator)
         }
@@ -801,27 +799,17 @@ class ReportsView(TemplateView):
             created_at__range=[start_datetime, end_datetime]
         ).exclude(status='cancelled')
         
-        # Get revenue ONLY from completely paid non-cancelled orders
-        revenue = Payment.objects.filter(
-            service_order__in=orders_in_period,
-            status__in=['completed', 'verified']
-        ).exclude(
-            payment_type='refund'  # Exclude refunds from revenue
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        # Totals come from the daily facts for non-cancelled orders
+        from .fact_utils import expense_totals, refund_record_total, revenue_totals
+        revenue = revenue_totals(start_date, end_date, exclude_order_statuses=['cancelled'])['amount']
         
         # Track refunds separately for orders created in this period
-        refunds = Payment.objects.filter(
-            service_order__in=orders_in_period,
-            payment_type='refund',
-            status__in=['completed', 'verified']
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        refunds = revenue_totals(
+            start_date, end_date, refunds=True, exclude_order_statuses=['cancelled']
+        )['amount']
         
         # Also get refunds from PaymentRefund model
-        from apps.payments.models import PaymentRefund
-        refund_records = PaymentRefund.objects.filter(
-            original_payment__service_order__in=orders_in_period,
-            status='completed'
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        refund_records = refund_record_total(start_date, end_date, exclude_order_statuses=['cancelled'])
         
         # Total refunds = refund payments + refund records
         total_refunds = refunds + refund_records
@@ -830,10 +818,7 @@ class ReportsView(TemplateView):
         net_revenue = revenue - total_refunds
         
         # Get only approved expenses for the period
-        expenses = Expense.objects.filter(
-            expense_date__range=[start_date, end_date],
-            status='approved'  # Only approved expenses
-        ).aggregate(total=Sum('total_amount'))['total'] or 0
+        expenses = expense_totals(start_date, end_date)['total']
         
         # Get recent financial transactions
         transactions = []
@@ -914,126 +899,84 @@ class ReportsView(TemplateView):
         """Get daily summary data based on service orders created each day"""
         from django.core.paginator import Paginator
         
-        # Convert dates to datetime for proper filtering
-        start_datetime, end_datetime = self._get_datetime_range(start_date, end_date)
-        
-        # Get daily aggregated service order data
-        daily_order_data = ServiceOrder.objects.filter(
-            created_at__range=[start_datetime, end_datetime]
-        ).values('created_at__date').annotate(
-            orders_count=Count('id'),
-            total_order_value=Sum('total_amount'),
-            unique_customers=Count('customer', distinct=True),
-            # Get revenue from payments for orders created on this day (regardless of when payment was made)
-            revenue_from_payments=Sum(
-                'payments__amount',
-                filter=Q(
-                    payments__status__in=['completed', 'verified']
-                ) & ~Q(payments__payment_type='refund')
-            ),
-            paid_orders_count=Count(
-                'payments',
-                distinct=True,
-                filter=Q(
-                    payments__status__in=['completed', 'verified']
-                ) & ~Q(payments__payment_type='refund')
-            )
-        ).order_by('-created_at__date')
-        
-        # Convert to list for pagination
-        daily_list = list(daily_order_data)
+        # Every day in the range, newest first; days without orders are zero
+        daily_list, series = self._get_period_summary(start_date, end_date, 'day')
+        for day in daily_list:
+            day['created_at__date'] = day.pop('day')
         
         # Paginate daily data
         paginator = Paginator(daily_list, 20)
         daily_page = paginator.get_page(page)
         
         # Calculate summary
-        total_days = len(daily_list)
-        avg_daily_orders = sum(day['orders_count'] for day in daily_list) / max(total_days, 1)
-        avg_daily_revenue = sum(day['revenue_from_payments'] or 0 for day in daily_list) / max(total_days, 1)
-        total_revenue = sum(day['revenue_from_payments'] or 0 for day in daily_list)
-        total_orders = sum(day['orders_count'] for day in daily_list)
-        total_order_value = sum(day['total_order_value'] or 0 for day in daily_list)
+        total_days = len(series)
+        total_revenue = series.total('revenue_from_payments')
+        total_orders = int(series.total('orders_count'))
+        total_order_value = series.total('total_order_value')
         
         return {
             'items': daily_page,
             'summary': {
                 'total_days': total_days,
-                'avg_daily_orders': avg_daily_orders,
-                'avg_daily_revenue': avg_daily_revenue,
+                'avg_daily_orders': total_orders / max(total_days, 1),
+                'avg_daily_revenue': total_revenue / max(total_days, 1),
                 'total_revenue': total_revenue,
                 'total_orders': total_orders,
                 'total_order_value': total_order_value,
                 'avg_order_value': total_order_value / max(total_orders, 1),
             },
+            'charts': self._summary_charts(series),
             'pagination': self._get_pagination_data(daily_page, paginator)
         }
     
+    def _get_period_summary(self, start_date, end_date, period):
+        """
+        Daily order facts binned into days, weeks or months.
+        
+        Returns ``(rows newest first, TimeSeries)``.
+        """
+        from .fact_utils import order_summary_by_day, unique_customers_by_period
+        from .timeseries_utils import TimeSeries
+        
+        series = TimeSeries.from_rows(
+            order_summary_by_day(start_date, end_date), start_date, end_date, period,
+            orders_count='orders_count',
+            total_order_value='total_order_value',
+            revenue_from_payments='revenue_from_payments',
+            paid_orders_count='paid_orders_count',
+        )
+        customers = unique_customers_by_period(start_date, end_date, period)
+        rows = series.rows(
+            'orders_count', 'total_order_value', 'revenue_from_payments', 'paid_orders_count',
+            integers=('orders_count', 'paid_orders_count'), newest_first=True, key=period,
+        )
+        for row in rows:
+            row['unique_customers'] = customers.get(row[period], 0)
+        return rows, series
+    
+    def _summary_charts(self, series):
+        """Revenue and order series with moving averages and period-over-period change"""
+        return {
+            'revenue': series.chart('revenue_from_payments'),
+            'orders': series.chart('orders_count'),
+            'order_value': series.chart('total_order_value'),
+        }
+    
     def _get_weekly_summary_data(self, start_date, end_date, page):
         """Get weekly summary data based on service orders created in each week"""
         from django.core.paginator import Paginator
-        from datetime import datetime, timedelta
         
         try:
-            # Convert dates to datetime for proper filtering
-            start_datetime, end_datetime = self._get_datetime_range(start_date, end_date)
-            
-            # Get all service orders in the date range
-            orders = ServiceOrder.objects.filter(
-                created_at__range=[start_datetime, end_datetime]
-            ).select_related('customer').order_by('-created_at')
-            
-            # Group orders by week manually
-            weekly_data = {}
-            for order in orders:
-                # Get the start of the week (Monday)
-                order_date = order.created_at.date()
-                week_start = order_date - timedelta(days=order_date.weekday())
-                week_key = week_start.strftime('%Y-%m-%d')
-                
-                if week_key not in weekly_data:
-                    weekly_data[week_key] = {
-                        'week': week_start,
-                        'orders_count': 0,
-                        'total_order_value': 0,
-                        'revenue_from_payments': 0,
-                        'unique_customers': set(),
-                        'paid_orders': set()
-                    }
-                
-                weekly_data[week_key]['orders_count'] += 1
-                weekly_data[week_key]['total_order_value'] += float(order.total_amount or 0)
-                if order.customer_id:
-                    weekly_data[week_key]['unique_customers'].add(order.customer_id)
-                
-                # Add payment revenue for this order (regardless of when payment was made)
-                order_payments = Payment.objects.filter(
-                    service_order=order,
-                    status__in=['completed', 'verified']
-                ).exclude(payment_type='refund')
-                
-                for payment in order_payments:
-                    weekly_data[week_key]['revenue_from_payments'] += float(payment.amount or 0)
-                    weekly_data[week_key]['paid_orders'].add(order.id)
-            
-            # Convert sets to counts and prepare final data
-            for week_data in weekly_data.values():
-                week_data['unique_customers'] = len(week_data['unique_customers'])
-                week_data['paid_orders_count'] = len(week_data['paid_orders'])
-                del week_data['paid_orders']  # Remove the set, keep only the count
-            
-            # Convert to list and sort by week
-            weekly_list = list(weekly_data.values())
-            weekly_list.sort(key=lambda x: x['week'], reverse=True)
+            weekly_list, series = self._get_period_summary(start_date, end_date, 'week')
             
             # Paginate weekly data
             paginator = Paginator(weekly_list, 20)
             weekly_page = paginator.get_page(page)
             
             # Calculate summary
-            total_weeks = len(weekly_list)
-            total_orders = sum(week['orders_count'] for week in weekly_list)
-            total_revenue = sum(week['revenue_from_payments'] for week in weekly_list)
+            total_weeks = len(series)
+            total_orders = int(series.total('orders_count'))
+            total_revenue = series.total('revenue_from_payments')
             avg_weekly_orders = total_orders / max(total_weeks, 1)
             avg_weekly_revenue = total_revenue / max(total_weeks, 1)
             
@@ -1046,6 +989,7 @@ class ReportsView(TemplateView):
                     'total_orders': total_orders,
                     'total_revenue': total_revenue,
                 },
+                'charts': self._summary_charts(series),
                 'pagination': self._get_pagination_data(weekly_page, paginator)
             }
         except Exception as e:
@@ -1065,69 +1009,19 @@ class ReportsView(TemplateView):
     def _get_monthly_summary_data(self, start_date, end_date, page):
         """Get monthly summary data based on service orders created each month"""
         from django.core.paginator import Paginator
-        from datetime import datetime
         
         try:
-            # Convert dates to datetime for proper filtering
-            start_datetime, end_datetime = self._get_datetime_range(start_date, end_date)
-            
-            # Get all service orders in the date range
-            orders = ServiceOrder.objects.filter(
-                created_at__range=[start_datetime, end_datetime]
-            ).select_related('customer').order_by('-created_at')
-            
-            # Group orders by month manually
-            monthly_data = {}
-            for order in orders:
-                # Get the first day of the month
-                order_date = order.created_at.date()
-                month_key = order_date.strftime('%Y-%m')
-                month_start = order_date.replace(day=1)
-                
-                if month_key not in monthly_data:
-                    monthly_data[month_key] = {
-                        'month': month_start,
-                        'orders_count': 0,
-                        'total_order_value': 0,
-                        'revenue_from_payments': 0,
-                        'unique_customers': set(),
-                        'paid_orders': set()
-                    }
-                
-                monthly_data[month_key]['orders_count'] += 1
-                monthly_data[month_key]['total_order_value'] += float(order.total_amount or 0)
-                if order.customer_id:
-                    monthly_data[month_key]['unique_customers'].add(order.customer_id)
-                
-                # Add payment revenue for this order (regardless of when payment was made)
-                order_payments = Payment.objects.filter(
-                    service_order=order,
-                    status__in=['completed', 'verified']
-                ).exclude(payment_type='refund')
-                
-                for payment in order_payments:
-                    monthly_data[month_key]['revenue_from_payments'] += float(payment.amount or 0)
-                    monthly_data[month_key]['paid_orders'].add(order.id)
-            
-            # Convert sets to counts
-            for month_data in monthly_data.values():
-                month_data['unique_customers'] = len(month_data['unique_customers'])
-                month_data['paid_orders_count'] = len(month_data['paid_orders'])
-                del month_data['paid_orders']  # Remove the set, keep only the count
-            
-            # Convert to list and sort by month
-            monthly_list = list(monthly_data.values())
-            monthly_list.sort(key=lambda x: x['month'], reverse=True)
+            monthly_list, series = self._get_period_summary(start_date, end_date, 'month')
             
             # Paginate monthly data
             paginator = Paginator(monthly_list, 20)
             monthly_page = paginator.get_page(page)
             
             # Calculate summary
-            total_months = len(monthly_list)
-            total_orders = sum(month['orders_count'] for month in monthly_list)
-            total_revenue = sum(month['revenue_from_payments'] for month in monthly_list)
-            total_order_value = sum(month['total_order_value'] for month in monthly_list)
+            total_months = len(series)
+            total_orders = int(series.total('orders_count'))
+            total_revenue = series.total('revenue_from_payments')
+            total_order_value = series.total('total_order_value')
             avg_monthly_orders = total_orders / max(total_months, 1)
             avg_monthly_revenue = total_revenue / max(total_months, 1)
             
@@ -1141,6 +1035,7 @@ class ReportsView(TemplateView):
                     'total_revenue': total_revenue,
                     'total_order_value': total_order_value,
                 },
+                'charts': self._summary_charts(series),
                 'pagination': self._get_pagination_data(monthly_page, paginator)
             }
         except Exception as e:
@@ -1199,8 +1094,17 @@ class ReportsView(TemplateView):
         total_orders = sum(item['orders_count'] or 0 for item in sales_list)
         total_paid_orders = sum(item['paid_orders_count'] or 0 for item in sales_list)
         
+        # Daily/weekly order value for the five best-selling services
+        from .timeseries_utils import TimeSeries, period_for_range
+        services_series = TimeSeries.from_queryset(
+            ServiceOrderItem.objects.filter(order__created_at__range=[start_datetime, end_datetime]),
+            'order__created_at', start_date, end_date, period_for_range(start_date, end_date),
+            dimension='service__name', revenue='total_price', quantity='quantity',
+        ).top('revenue', 5)
+        
         return {
             'items': sales_page,
+            'charts': {'services': services_series.chart('revenue')},
             'summary': {
                 'total_services': total_services,
                 'total_sales_revenue': total_sales_revenue,
@@ -1484,6 +1388,7 @@ class ReportsView(TemplateView):
             # Paginate attendance
             paginator = Paginator(attendance, 20)
             attendance_page = paginator.get_page(page)
+            prefetch_users(attendance_page.object_list, 'employee')
             
             # Calculate summary
             total_records = attendance.count()
@@ -1901,13 +1806,8 @@ class ReportsView(TemplateView):
                 refund_types[refund_type]['amount'] += item['amount']
             
             # Get revenue for comparison
-            orders_in_period = ServiceOrder.objects.filter(
-                created_at__range=[start_datetime, end_datetime]
-            )
-            total_revenue = Payment.objects.filter(
-                service_order__in=orders_in_period,
-                status__in=['completed', 'verified']
-            ).exclude(payment_type='refund').aggregate(Sum('amount'))['amount__sum'] or 0
+            from .fact_utils import revenue_totals
+            total_revenue = revenue_totals(start_date, end_date)['amount']
             
             refund_rate = (total_refund_amount / max(total_revenue, 1)) * 100
             
@@ -2048,20 +1948,29 @@ class ReportsView(TemplateView):
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
         
-        # Get all report data (not paginated for export)
-        report_data = self._get_export_data(report_type, start_date, end_date, employee_id)
+        if export_format == 'pdf' and not PDF_AVAILABLE:
+            return JsonResponse({'error': 'PDF generation not available'}, status=500)
+        if export_format == 'excel' and not EXCEL_AVAILABLE:
+            return JsonResponse({'error': 'Excel generation not available'}, status=500)
         
-        # Get the actual business object from the public database
-        from apps.core.tenant_models import Tenant
-        from apps.core.database_router import tenant_context
+        # Rendering runs in a background job; identical requests reuse its file
+        from .job_utils import request_report
+        job, created = request_report(
+            report_type, start_date, end_date, export_format,
+            employee_id=employee_id,
+            generated_by=getattr(request, 'employee', None),
+        )
         
-        # Query the Tenant model from the default database (no context manager needed for public data)
-        business = Tenant.objects.using('default').get(id=request.business.id)
+        state = _job_payload(request, job)
+        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            return JsonResponse(state)
+        if state['ready']:
+            return redirect(state['download_url'])
         
-        if export_format == 'pdf':
-            return self._generate_pdf_export(report_data, business)
-        else:  # excel
-            return self._generate_excel_export(report_data, business)
+        messages.info(request, f"Your {job.get_export_format_display()} report is being prepared. Export again in a moment to download it.")
+        query = request.GET.copy()
+        query.pop('export', None)
+        return redirect(f"{request.path}?{query.urlencode()}")
     
     def _get_export_data(self, report_type, start_date, end_date, employee_id=None):
         """Get all data for export (no pagination) - Updated to use order-based data"""
@@ -2095,18 +2004,17 @@ class ReportsView(TemplateView):
                     created_at__range=[start_datetime, end_datetime]
                 ).exclude(status='cancelled').order_by('-created_at'))
             elif report_type == 'inventory':
-                # Get inventory items with movement data
-                items = InventoryItem.objects.select_related('category', 'unit').annotate(
-                    total_in=Sum('stock_movements__quantity', 
-                                filter=Q(stock_movements__created_at__range=[start_datetime, end_datetime],
-                                       stock_movements__movement_type='in')),
-                    total_out=Sum('stock_movements__quantity', 
-                                 filter=Q(stock_movements__created_at__range=[start_datetime, end_datetime],
-                                        stock_movements__movement_type='out')),
-                    movement_count=Count('stock_movements', 
-                                       filter=Q(stock_movements__created_at__range=[start_datetime, end_datetime]))
-                ).order_by('-movement_count', 'name')
-                data['items'] = list(items)
+                # Get inventory items with movement totals from the daily stock facts
+                from .fact_utils import stock_by_item
+                movements = {row['item_id']: row for row in stock_by_item(start_date, end_date)}
+                items = list(InventoryItem.objects.select_related('category', 'unit'))
+                for item in items:
+                    movement = movements.get(item.id, {})
+                    item.total_in = movement.get('quantity_in')
+                    item.total_out = movement.get('quantity_out')
+                    item.movement_count = movement.get('movement_count') or 0
+                items.sort(key=lambda item: (-item.movement_count, item.name))
+                data['items'] = items
             elif report_type == 'services':
                 # Get services with performance metrics based on orders created in period
                 services = Service.objects.select_related('category').annotate(
@@ -2320,17 +2228,26 @@ class ReportsView(TemplateView):
         return data
     
     def _generate_pdf_export(self, report_data, business):
-        """Generate comprehensive PDF for specific report type"""
+        """
+        Generate comprehensive PDF for specific report type.
+
+        The detail table is rendered in page-sized chunks (see ``pdf_utils``);
+        exports with more rows than ``REPORT_PDF_MAX_ROWS`` are produced as
+        Excel instead.
+        """
         if not PDF_AVAILABLE:
             return JsonResponse({'error': 'PDF generation not available'}, status=500)
         
+        from . import pdf_utils
+        
+        if pdf_utils.exceeds_row_limit(report_data.get('items')) and EXCEL_AVAILABLE:
+            return self._generate_excel_export(report_data, business)
+        
         # Import necessary reportlab components
         from reportlab.lib.units import inch
         from reportlab.platypus import Image
         
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.8*inch, bottomMargin=1*inch)
-        styles = getSampleStyleSheet()
+        styles = pdf_utils.paragraph_styles()
         story = []
         
         # Header with logo and business information
@@ -2392,13 +2309,7 @@ class ReportsView(TemplateView):
             [getattr(business, 'phone', ''), '']
         ]
         header_table = Table(header_data, colWidths=[4*inch, 2.5*inch])
-        header_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (0, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ]))
+        header_table.setStyle(pdf_utils.header_table_style())
         story.append(header_table)
         story.append(Spacer(1, 20))
         
@@ -2427,16 +2338,7 @@ class ReportsView(TemplateView):
             ]
             
             employee_table = Table(employee_data, colWidths=[2*inch, 3*inch])
-            employee_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (0, -1), colors.lightblue),
-                ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                ('BACKGROUND', (1, 0), (1, -1), colors.white),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ]))
+            employee_table.setStyle(pdf_utils.details_table_style())
             story.append(employee_table)
             story.append(Spacer(1, 20))
         
@@ -2460,21 +2362,12 @@ class ReportsView(TemplateView):
             
             if summary_data:
                 summary_table = Table(summary_data, colWidths=[3*inch, 2*inch])
-                summary_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.lightblue),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 12),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey])
-                ]))
+                summary_table.setStyle(pdf_utils.summary_table_style())
                 story.append(summary_table)
                 story.append(Spacer(1, 30))
         
-        # Detailed Data Table
+        # Detailed Data Table, rendered in chunks after the story built so far
+        table_header, table_rows = [], []
         if report_data.get('items'):
             data_title = Paragraph("<b>Detailed Data</b>", styles['Heading2'])
             story.append(data_title)
@@ -2484,24 +2377,9 @@ class ReportsView(TemplateView):
             table_data = self._generate_pdf_table_data(report_data)
             
             if table_data:
-                # Create table with appropriate column widths
-                col_count = len(table_data[0]) if table_data else 0
-                col_width = 6.5*inch / col_count if col_count > 0 else 1*inch
-                
-                data_table = Table(table_data, colWidths=[col_width] * col_count)
-                data_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('FONTSIZE', (0, 1), (-1, -1), 9),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey])
-                ]))
-                story.append(data_table)
+                table_header, table_rows = table_data[0], table_data[1:]
+        
+        head, story = story, []
         
         # Add signature section for individual employee reports
         if report_data.get('type') == 'individual_employee' and report_data.get('employee'):
@@ -2518,14 +2396,7 @@ class ReportsView(TemplateView):
                 [f"Date: {timezone.now().strftime('%B %d, %Y')}", '', f"Date: {timezone.now().strftime('%B %d, %Y')}"]
             ]
             signature_table = Table(signature_data, colWidths=[2.5*inch, 1*inch, 2.5*inch])
-            signature_table.setStyle(TableStyle([
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('TOPPADDING', (0, 0), (-1, -1), 6),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ]))
+            signature_table.setStyle(pdf_utils.signature_table_style())
             story.append(signature_table)
         
         # Footer
@@ -2534,10 +2405,9 @@ class ReportsView(TemplateView):
         footer = Paragraph(footer_text, styles['Normal'])
         story.append(footer)
         
-        doc.build(story)
-        buffer.seek(0)
+        pdf = pdf_utils.render_story(head, table_header, table_rows, story)
         
-        response = HttpResponse(buffer.read(), content_type='application/pdf')
+        response = HttpResponse(pdf, content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="{business.name}_{report_data.get("type", "report")}_report.pdf"'
         return response
     
@@ -2559,7 +2429,10 @@ class ReportsView(TemplateView):
                 total_amount += amount
                 
                 # Check if order has completed payments
-                has_payments = item.payments.filter(status__in=['completed', 'verified']).exclude(payment_type='refund').exists()
+                has_payments = any(
+                    payment.status in ('completed', 'verified') and payment.payment_type != 'refund'
+                    for payment in item.payments.all()  # prefetched by _get_export_data
+                )
                 payment_status = 'Paid' if has_payments else 'Unpaid'
                 
                 if has_payments:
@@ -2927,45 +2800,59 @@ class ReportsView(TemplateView):
         return table_data
     
     def _generate_excel_export(self, report_data, business):
-        """Generate comprehensive Excel for specific report type"""
+        """
+        Generate comprehensive Excel for specific report type.
+
+        Uses a write-only workbook: rows are serialised as they are appended
+        instead of being kept as cell objects, and the file is spooled to disk.
+        """
         if not EXCEL_AVAILABLE:
             return JsonResponse({'error': 'Excel generation not available'}, status=500)
-        
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = report_data.get('title', 'Report')
-        
+
+        import tempfile
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.utils import get_column_letter
+
+        wb = openpyxl.Workbook(write_only=True)
+        ws = wb.create_sheet(report_data.get('title', 'Report')[:31])
+
+        def cell(value, **styles):
+            styled = WriteOnlyCell(ws, value=value)
+            for name, style in styles.items():
+                setattr(styled, name, style)
+            return styled
+
+        # Column widths must be set before the first row is written
+        table_data = self._generate_excel_table_data(report_data) if report_data.get('items') else None
+        if table_data:
+            widths = {}
+            for row_data in table_data:
+                for col_idx, cell_value in enumerate(row_data, 1):
+                    widths[col_idx] = max(widths.get(col_idx, 0), len(str(cell_value)))
+            for col_idx, max_length in widths.items():
+                ws.column_dimensions[get_column_letter(col_idx)].width = min(max_length + 2, 50)
+
         # Header with business information
-        ws['A1'] = business.name
-        ws['A1'].font = Font(bold=True, size=16)
-        ws['B1'] = f"Generated: {timezone.now().strftime('%B %d, %Y at %I:%M %p')}"
-        ws['B1'].font = Font(size=10)
-        
-        ws['A2'] = getattr(business, 'address', 'Address not available')
-        ws['B2'] = f"Report Period: {report_data.get('period', '')}"
-        ws['B2'].font = Font(bold=True)
-        
+        ws.append([
+            cell(business.name, font=Font(bold=True, size=16)),
+            cell(f"Generated: {timezone.now().strftime('%B %d, %Y at %I:%M %p')}", font=Font(size=10)),
+        ])
+        ws.append([
+            getattr(business, 'address', 'Address not available'),
+            cell(f"Report Period: {report_data.get('period', '')}", font=Font(bold=True)),
+        ])
+
         # Main title
-        current_row = 4
-        ws[f'A{current_row}'] = report_data.get('title', 'Business Report')
-        ws[f'A{current_row}'].font = Font(bold=True, size=14)
-        current_row += 2
-        
+        ws.append([])
+        ws.append([cell(report_data.get('title', 'Business Report'), font=Font(bold=True, size=14))])
+        ws.append([])
+
         # Add employee details for individual employee report
         if report_data.get('type') == 'individual_employee' and report_data.get('employee_details'):
             employee_details = report_data['employee_details']
-            ws[f'A{current_row}'] = 'EMPLOYEE INFORMATION'
-            ws[f'A{current_row}'].font = Font(bold=True, size=12)
-            current_row += 1
-            
-            # Employee details headers
-            ws[f'A{current_row}'] = 'Field'
-            ws[f'B{current_row}'] = 'Value'
-            ws[f'A{current_row}'].font = Font(bold=True)
-            ws[f'B{current_row}'].font = Font(bold=True)
-            current_row += 1
-            
-            # Employee details data
+            ws.append([cell('EMPLOYEE INFORMATION', font=Font(bold=True, size=12))])
+            ws.append([cell('Field', font=Font(bold=True)), cell('Value', font=Font(bold=True))])
+
             employee_fields = [
                 ('Employee ID', employee_details.get('employee_id', 'N/A')),
                 ('Full Name', employee_details.get('full_name', 'N/A')),
@@ -2976,93 +2863,62 @@ class ReportsView(TemplateView):
                 ('Hire Date', str(employee_details.get('hire_date', 'N/A'))),
                 ('Status', 'Active' if employee_details.get('is_active') else 'Inactive')
             ]
-            
             for field_name, field_value in employee_fields:
-                ws[f'A{current_row}'] = field_name
-                ws[f'B{current_row}'] = field_value
-                current_row += 1
-            
-            current_row += 2  # Add spacing
-        
+                ws.append([field_name, field_value])
+
+            ws.append([])
+            ws.append([])
+
         # Summary section
         if report_data.get('summary'):
-            ws[f'A{current_row}'] = 'SUMMARY'
-            ws[f'A{current_row}'].font = Font(bold=True, size=12)
-            current_row += 1
-            
-            # Summary headers
-            ws[f'A{current_row}'] = 'Metric'
-            ws[f'B{current_row}'] = 'Value'
-            ws[f'A{current_row}'].font = Font(bold=True)
-            ws[f'B{current_row}'].font = Font(bold=True)
-            current_row += 1
-            
+            ws.append([cell('SUMMARY', font=Font(bold=True, size=12))])
+            ws.append([cell('Metric', font=Font(bold=True)), cell('Value', font=Font(bold=True))])
+
             for key, value in report_data['summary'].items():
                 if key != 'error' and value is not None:
                     formatted_key = key.replace('_', ' ').title()
-                    ws[f'A{current_row}'] = formatted_key
                     if 'revenue' in key.lower() or 'profit' in key.lower() or 'value' in key.lower() or 'amount' in key.lower():
-                        ws[f'B{current_row}'] = f"KES {value:,.2f}"
+                        formatted_value = f"KES {value:,.2f}"
                     elif 'rate' in key.lower() or 'margin' in key.lower():
-                        ws[f'B{current_row}'] = f"{value:.1f}%" if isinstance(value, (int, float)) else str(value)
+                        formatted_value = f"{value:.1f}%" if isinstance(value, (int, float)) else str(value)
                     else:
-                        ws[f'B{current_row}'] = str(value)
-                    current_row += 1
-            
-            current_row += 2  # Add spacing
-        
+                        formatted_value = str(value)
+                    ws.append([formatted_key, formatted_value])
+
+            ws.append([])
+            ws.append([])
+
         # Detailed Data section
         if report_data.get('items'):
-            ws[f'A{current_row}'] = 'DETAILED DATA'
-            ws[f'A{current_row}'].font = Font(bold=True, size=12)
-            current_row += 1
-            
-            # Generate Excel table data
-            table_data = self._generate_excel_table_data(report_data)
-            
+            ws.append([cell('DETAILED DATA', font=Font(bold=True, size=12))])
+
             if table_data:
-                # Add headers
-                for col_idx, header in enumerate(table_data[0], 1):
-                    cell = ws.cell(row=current_row, column=col_idx, value=header)
-                    cell.font = Font(bold=True)
-                    cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-                    cell.font = Font(bold=True, color="FFFFFF")
-                current_row += 1
-                
-                # Add data rows
+                header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+                ws.append([
+                    cell(header, font=Font(bold=True, color="FFFFFF"), fill=header_fill)
+                    for header in table_data[0]
+                ])
                 for row_data in table_data[1:]:
-                    for col_idx, cell_value in enumerate(row_data, 1):
-                        ws.cell(row=current_row, column=col_idx, value=cell_value)
-                    current_row += 1
-                
-                # Auto-adjust column widths
-                for column in ws.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)
-                    ws.column_dimensions[column_letter].width = adjusted_width
-        
+                    ws.append(list(row_data))
+
         # Footer
-        current_row += 2
-        ws[f'A{current_row}'] = f"Report generated by {business.name} - AutoWash Management System"
-        ws[f'A{current_row}'].font = Font(italic=True, size=9)
-        
-        buffer = io.BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
-        
-        response = HttpResponse(
-            buffer.read(),
+        ws.append([])
+        ws.append([])
+        ws.append([cell(
+            f"Report generated by {business.name} - AutoWash Management System",
+            font=Font(italic=True, size=9)
+        )])
+
+        output = tempfile.TemporaryFile()
+        wb.save(output)
+        output.seek(0)
+
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename=f'{business.name}_{report_data.get("type", "report")}_report.xlsx',
             content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
-        response['Content-Disposition'] = f'attachment; filename="{business.name}_{report_data.get("type", "report")}_report.xlsx"'
-        return response
     
     def _generate_excel_table_data(self, report_data):
         """Generate table data for Excel based on report type - Updated for payment-based data"""
@@ -3082,7 +2938,10 @@ class ReportsView(TemplateView):
                 total_amount += amount
                 
                 # Check if order has completed payments
-                has_payments = item.payments.filter(status__in=['completed', 'verified']).exclude(payment_type='refund').exists()
+                has_payments = any(
+                    payment.status in ('completed', 'verified') and payment.payment_type != 'refund'
+                    for payment in item.payments.all()  # prefetched by _get_export_data
+                )
                 payment_status = 'Paid' if has_payments else 'Unpaid'
                 
                 if has_payments:
@@ -3481,3 +3340,43 @@ class ReportsView(TemplateView):
                 ])
         
         return table_data
+
+
+# ============== REPORT JOBS ==============
+
+def _job_payload(request, job):
+    """Job state plus the URLs the export buttons poll and download from"""
+    from .job_utils import job_state
+    
+    base_url = f"/business/{request.tenant.slug}/reports/jobs/{job.pk}"
+    state = job_state(job)
+    state['status_url'] = f"{base_url}/"
+    state['download_url'] = f"{base_url}/download/"
+    return state
+
+
+@login_required
+@business_required
+def report_job_status(request, job_id):
+    """Progress of a background export, polled by the export buttons"""
+    from .models import BusinessReport
+    
+    job = get_object_or_404(BusinessReport, id=job_id)
+    return JsonResponse(_job_payload(request, job))
+
+
+@login_required
+@business_required
+def report_job_download(request, job_id):
+    """Download the file produced by a finished export job"""
+    from django.utils.text import slugify
+    from .job_utils import EXPORT_EXTENSIONS
+    from .models import BusinessReport
+    
+    job = get_object_or_404(BusinessReport, id=job_id, status='completed')
+    output_file = job.output_file
+    if not output_file:
+        raise Http404("Report file not available")
+    
+    filename = f"{slugify(request.tenant.name)}_{job.report_type}_report.{EXPORT_EXTENSIONS.get(job.export_format, 'bin')}"
+    return FileResponse(output_file.open('rb'), as_attachment=True, filename=filename)
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ServicesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.services'
+    
+    def ready(self):
+        # Import signals
+        try:
+            import apps.services.signals
+        except ImportError:
+            pass
@@ -0,0 +1,165 @@
+"""
+Service catalog statistics
+
+Catalog pages read per-service order counts, revenue, ratings and durations
+from the ``ServiceStats`` rollup and category/package service counts from
+queryset annotations, so list and detail pages run a fixed number of queries
+regardless of catalog size. Rollup rows are refreshed by signals when order
+items change or orders enter/leave the completed status, and can be rebuilt
+with ``manage.py rebuild_service_stats``.
+"""
+from datetime import timedelta
+from decimal import Decimal
+import logging
+
+from django.db import router, transaction
+from django.db.models import BigIntegerField, Count, DurationField, ExpressionWrapper, F, Q, Sum
+
+from .models import Service, ServiceOrderItem, ServiceStats
+
+logger = logging.getLogger(__name__)
+
+STATS_FIELDS = [
+    'completed_orders', 'total_revenue', 'rating_total', 'rating_count',
+    'timed_count', 'total_duration_seconds',
+]
+
+
+# ================================
+# QUERYSET HELPERS
+# ================================
+
+def with_service_stats(queryset):
+    """Join the rollup row so total_orders/average_rating cost no extra queries"""
+    return queryset.select_related('stats')
+
+
+def with_category_counts(queryset):
+    """Annotate ``active_service_count`` used by ServiceCategory.service_count"""
+    return queryset.annotate(
+        active_service_count=Count(
+            'services',
+            filter=Q(services__is_active=True, services__is_deleted=False),
+            distinct=True
+        )
+    )
+
+
+def with_package_counts(queryset):
+    """Annotate ``included_service_count`` used by ServicePackage.service_count"""
+    return queryset.annotate(
+        included_service_count=Count(
+            'services',
+            filter=Q(services__is_deleted=False),
+            distinct=True
+        )
+    )
+
+
+# ================================
+# ROLLUP MAINTENANCE
+# ================================
+
+def _seconds(value):
+    """Summed durations come back as a timedelta or as microseconds depending on backend"""
+    if not value:
+        return 0
+    if isinstance(value, timedelta):
+        return int(value.total_seconds())
+    return int(value) // 1000000
+
+
+def _aggregate_stats(service_ids=None):
+    """One grouped query returning {service_id: field values} for the rollup"""
+    completed = Q(order__status='completed')
+    timed = Q(started_at__isnull=False, completed_at__isnull=False)
+    duration = ExpressionWrapper(F('completed_at') - F('started_at'), output_field=DurationField())
+
+    items = ServiceOrderItem.objects.filter(service__isnull=False)
+    if service_ids is not None:
+        items = items.filter(service_id__in=service_ids)
+
+    rows = items.values('service_id').annotate(
+        orders=Count('id', filter=completed),
+        revenue=Sum('total_price', filter=completed),
+        ratings=Sum('rating', filter=completed),
+        rated=Count('rating', filter=completed),
+        timed=Count('id', filter=timed),
+        duration=Sum(duration, filter=timed, output_field=BigIntegerField()),
+    ).order_by()
+
+    return {
+        row['service_id']: {
+            'completed_orders': row['orders'],
+            'total_revenue': row['revenue'] or Decimal('0.00'),
+            'rating_total': row['ratings'] or 0,
+            'rating_count': row['rated'],
+            'timed_count': row['timed'],
+            'total_duration_seconds': _seconds(row['duration']),
+        }
+        for row in rows
+    }
+
+
+def refresh_service_stats(service_ids):
+    """Recompute the rollup rows for the given services"""
+    service_ids = {service_id for service_id in service_ids if service_id}
+    if not service_ids:
+        return 0
+
+    values = _aggregate_stats(service_ids)
+    zero = {field: 0 for field in STATS_FIELDS}
+
+    with transaction.atomic(using=router.db_for_write(ServiceStats)):
+        existing = {
+            stats.service_id: stats
+            for stats in ServiceStats.objects.select_for_update().filter(service_id__in=service_ids)
+        }
+        to_create, to_update = [], []
+        for service_id in service_ids:
+            fields = values.get(service_id, zero)
+            stats = existing.get(service_id)
+            if stats is None:
+                to_create.append(ServiceStats(service_id=service_id, **fields))
+                continue
+            if any(getattr(stats, field) != value for field, value in fields.items()):
+                for field, value in fields.items():
+                    setattr(stats, field, value)
+                to_update.append(stats)
+
+        if to_create:
+            ServiceStats.objects.bulk_create(to_create, ignore_conflicts=True)
+        if to_update:
+            ServiceStats.objects.bulk_update(to_update, STATS_FIELDS)
+
+    return len(to_create) + len(to_update)
+
+
+def unsaved_service_stats(service_id):
+    """Rollup figures for one service computed on read, without writing a row"""
+    fields = _aggregate_stats({service_id}).get(service_id, {field: 0 for field in STATS_FIELDS})
+    return ServiceStats(service_id=service_id, **fields)
+
+
+def refresh_order_service_stats(order_id):
+    """Refresh stats for every service on an order (status changes, ratings)"""
+    service_ids = ServiceOrderItem.objects.filter(
+        order_id=order_id, service__isnull=False
+    ).values_list('service_id', flat=True)
+    return refresh_service_stats(set(service_ids))
+
+
+def rebuild_service_stats():
+    """Rebuild the rollup for every service in the current tenant database"""
+    values = _aggregate_stats()
+    zero = {field: 0 for field in STATS_FIELDS}
+    rows = [
+        ServiceStats(service_id=service_id, **values.get(service_id, zero))
+        for service_id in Service.all_objects.values_list('id', flat=True)
+    ]
+
+    with transaction.atomic(using=router.db_for_write(ServiceStats)):
+        ServiceStats.objects.all().delete()
+        ServiceStats.objects.bulk_create(rows, batch_size=1000)
+
+    return len(rows)
@@ -0,0 +1,453 @@
+"""
+Commission rollups and bulk commission settlement
+
+Dashboards and reports read per-employee, per-day totals from
+EmployeeCommissionRollup instead of aggregating ServiceOrderItem rows on
+every request. Settlement creates one Expense per employee batch and marks
+the items with a single bulk_update inside one transaction.
+"""
+from collections import defaultdict
+from decimal import Decimal
+import logging
+
+from django.db import connections, router, transaction
+from django.db.models import Sum, Count, Case, When, F, DecimalField, IntegerField, Value
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import ServiceOrderItem, EmployeeCommissionRollup
+
+logger = logging.getLogger(__name__)
+
+COMMISSION_CATEGORY_NAME = 'Employee Commissions'
+BULK_BATCH_SIZE = 500
+
+
+def _local_date(value):
+    """Convert a completion timestamp to the local business date"""
+    if value is None:
+        return None
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.date()
+
+
+def commission_key(state):
+    """Return the (employee_id, date) rollup key for a commission state tuple"""
+    if not state:
+        return None
+    employee_id, completed_at = state[0], state[1]
+    if not employee_id or not completed_at:
+        return None
+    return (employee_id, _local_date(completed_at))
+
+
+def refresh_commission_rollups(keys):
+    """
+    Recompute rollup rows for the given (employee_id, date) keys.
+
+    Runs one grouped aggregate over the affected items, one lookup of the
+    existing rollup rows and at most one bulk write per operation, no matter
+    how many keys are refreshed.
+    """
+    keys = {key for key in keys if key and key[0] and key[1]}
+    if not keys:
+        return 0
+
+    employee_ids = {employee_id for employee_id, _ in keys}
+    dates = {day for _, day in keys}
+
+    totals = {}
+    rows = ServiceOrderItem.objects.filter(
+        assigned_to_id__in=employee_ids,
+        completed_at__date__in=dates,
+        commission_amount__gt=0,
+    ).annotate(
+        day=TruncDate('completed_at')
+    ).values('assigned_to_id', 'day').annotate(
+        service_count=Count('id'),
+        paid_count=Count(Case(When(commission_paid=True, then=Value(1)), output_field=IntegerField())),
+        total_commission=Sum('commission_amount'),
+        paid_commission=Sum(Case(
+            When(commission_paid=True, then='commission_amount'),
+            default=Value(Decimal('0.00')),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        )),
+    )
+    for row in rows:
+        key = (row['assigned_to_id'], row['day'])
+        if key in keys:
+            totals[key] = row
+
+    existing = {
+        (rollup.employee_id, rollup.date): rollup
+        for rollup in EmployeeCommissionRollup.objects.filter(
+            employee_id__in=employee_ids, date__in=dates
+        )
+    }
+
+    to_create, to_update, to_delete = [], [], []
+    now = timezone.now()
+    for key in keys:
+        row = totals.get(key)
+        rollup = existing.get(key)
+        if row is None:
+            if rollup is not None:
+                to_delete.append(rollup.pk)
+            continue
+        if rollup is None:
+            rollup = EmployeeCommissionRollup(employee_id=key[0], date=key[1])
+            to_create.append(rollup)
+        else:
+            to_update.append(rollup)
+        rollup.service_count = row['service_count']
+        rollup.paid_count = row['paid_count']
+        rollup.total_commission = row['total_commission'] or Decimal('0.00')
+        rollup.paid_commission = row['paid_commission'] or Decimal('0.00')
+        rollup.updated_at = now
+
+    if to_create:
+        EmployeeCommissionRollup.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+    if to_update:
+        EmployeeCommissionRollup.objects.bulk_update(
+            to_update,
+            ['service_count', 'paid_count', 'total_commission', 'paid_commission', 'updated_at'],
+            batch_size=BULK_BATCH_SIZE
+        )
+    if to_delete:
+        EmployeeCommissionRollup.objects.filter(pk__in=to_delete).delete()
+
+    return len(to_create) + len(to_update) + len(to_delete)
+
+
+def rebuild_commission_rollups(date_from=None, date_to=None):
+    """Rebuild all rollup rows in a date range from the underlying order items"""
+    items = ServiceOrderItem.objects.filter(
+        assigned_to__isnull=False,
+        completed_at__isnull=False,
+        commission_amount__gt=0,
+    )
+    rollups = EmployeeCommissionRollup.objects.all()
+    if date_from:
+        items = items.filter(completed_at__date__gte=date_from)
+        rollups = rollups.filter(date__gte=date_from)
+    if date_to:
+        items = items.filter(completed_at__date__lte=date_to)
+        rollups = rollups.filter(date__lte=date_to)
+
+    keys = set(
+        items.annotate(day=TruncDate('completed_at'))
+        .values_list('assigned_to_id', 'day')
+        .distinct()
+    )
+    # Include stale rows so days that no longer have commissions are removed
+    keys.update(rollups.values_list('employee_id', 'date'))
+
+    db_alias = router.db_for_write(EmployeeCommissionRollup)
+    with transaction.atomic(using=db_alias):
+        return refresh_commission_rollups(keys)
+
+
+def get_commission_summary(date_from=None, date_to=None, employee_id=None):
+    """Aggregate totals from the rollup table for a date range"""
+    rollups = _filtered_rollups(date_from, date_to, employee_id)
+    summary = rollups.aggregate(
+        total=Sum('total_commission'),
+        paid=Sum('paid_commission'),
+        services=Sum('service_count'),
+        paid_services=Sum('paid_count'),
+    )
+    total = summary['total'] or Decimal('0')
+    paid = summary['paid'] or Decimal('0')
+    service_count = summary['services'] or 0
+    paid_count = summary['paid_services'] or 0
+    return {
+        'total_commission': total,
+        'paid_commission': paid,
+        'pending_commission': total - paid,
+        'service_count': service_count,
+        'paid_count': paid_count,
+        'pending_count': service_count - paid_count,
+    }
+
+
+def get_employee_commission_breakdown(date_from=None, date_to=None):
+    """Per-employee commission totals for a date range, largest first"""
+    from apps.employees.models import Employee
+
+    rows = list(
+        _filtered_rollups(date_from, date_to)
+        .values('employee_id')
+        .annotate(
+            total=Sum('total_commission'),
+            paid=Sum('paid_commission'),
+            services=Sum('service_count'),
+        )
+        .order_by('-total')
+    )
+    employees = Employee.objects.in_bulk([row['employee_id'] for row in rows])
+    users = _users_for_employees(employees.values())
+
+    breakdown = []
+    for row in rows:
+        employee = employees.get(row['employee_id'])
+        if not employee:
+            continue
+        user = users.get(employee.user_id)
+        total = row['total'] or Decimal('0')
+        paid = row['paid'] or Decimal('0')
+        breakdown.append({
+            'employee': employee,
+            'assigned_to__employee_id': employee.employee_id,
+            'assigned_to__first_name': user.first_name if user else '',
+            'assigned_to__last_name': user.last_name if user else '',
+            'total_commission': total,
+            'paid_commission': paid,
+            'pending_commission': total - paid,
+            'completed_services': row['services'] or 0,
+        })
+    return breakdown
+
+
+def get_daily_commission_trend(date_from=None, date_to=None, employee_id=None):
+    """Daily commission totals for charts"""
+    rows = (
+        _filtered_rollups(date_from, date_to, employee_id)
+        .values(day=F('date'))
+        .annotate(
+            total=Sum('total_commission'),
+            services_count=Sum('service_count'),
+        )
+        .order_by('day')
+    )
+    return [
+        {
+            'day': row['day'],
+            'total_commission': row['total'] or Decimal('0'),
+            'services_count': row['services_count'] or 0,
+        }
+        for row in rows
+    ]
+
+
+def get_monthly_commission_breakdown(date_from=None, date_to=None, employee_id=None):
+    """Monthly commission totals, newest month first"""
+    rows = (
+        _filtered_rollups(date_from, date_to, employee_id)
+        .annotate(period=TruncMonth('date'))
+        .values('period')
+        .annotate(
+            total=Sum('total_commission'),
+            paid=Sum('paid_commission'),
+            services=Sum('service_count'),
+        )
+        .order_by('-period')
+    )
+    return [
+        {
+            'month': row['period'].strftime('%Y-%m') if row['period'] else None,
+            'total_commission': row['total'] or Decimal('0'),
+            'paid_commission': row['paid'] or Decimal('0'),
+            'pending_commission': (row['total'] or Decimal('0')) - (row['paid'] or Decimal('0')),
+            'service_count': row['services'] or 0,
+        }
+        for row in rows
+    ]
+
+
+def _filtered_rollups(date_from=None, date_to=None, employee_id=None):
+    rollups = EmployeeCommissionRollup.objects.all()
+    if date_from:
+        rollups = rollups.filter(date__gte=date_from)
+    if date_to:
+        rollups = rollups.filter(date__lte=date_to)
+    if employee_id:
+        rollups = rollups.filter(employee_id=employee_id)
+    return rollups
+
+
+def get_commission_category():
+    """Get or create the expense category used for commission payouts"""
+    from apps.expenses.models import ExpenseCategory
+
+    category, _ = ExpenseCategory.objects.get_or_create(
+        name=COMMISSION_CATEGORY_NAME,
+        defaults={
+            'description': 'Commission payments to employees for completed services',
+            'is_active': True
+        }
+    )
+    return category
+
+
+def settle_commissions(items, create_expense=True, user=None, status='approved',
+                       notes='Bulk commission payment recorded'):
+    """
+    Mark unpaid commissions as paid in one transaction.
+
+    Creates one Expense per employee batch (when ``create_expense`` is set),
+    marks every item with a single bulk_update and refreshes the affected
+    rollup rows. The number of queries does not depend on how many items or
+    employees are settled.
+
+    Returns a dict with the settled item count, total amount and expenses.
+    """
+    from apps.expenses.models import Expense
+    from apps.reports.fact_utils import mark_dirty
+
+    db_alias = router.db_for_write(ServiceOrderItem)
+    with transaction.atomic(using=db_alias):
+        pending = items.filter(
+            commission_amount__gt=0, commission_paid=False
+        ).select_related('order', 'service', 'inventory_item', 'assigned_to')
+        # Lock only the item rows so concurrent settlements cannot pay twice
+        if connections[db_alias].features.has_select_for_update_of:
+            pending = pending.select_for_update(of=('self',))
+        else:
+            pending = pending.select_for_update()
+        pending = list(pending)
+        if not pending:
+            return {'count': 0, 'total_amount': Decimal('0'), 'expenses': []}
+
+        batches = defaultdict(list)
+        for item in pending:
+            batches[item.assigned_to_id].append(item)
+
+        expenses = []
+        if create_expense:
+            category = get_commission_category()
+            user_names = _employee_display_names(
+                item.assigned_to for item in pending if item.assigned_to_id
+            )
+            today = timezone.now().date()
+
+            for employee_id, batch in batches.items():
+                amount = sum((item.commission_amount for item in batch), Decimal('0.00'))
+                if len(batch) == 1:
+                    item = batch[0]
+                    title = f"Commission for {item.item_name} - Order #{item.order.order_number}"
+                else:
+                    title = f"Commission settlement - {user_names.get(employee_id, 'Unassigned')} ({len(batch)} services)"
+                expense = Expense(
+                    title=title[:200],
+                    category=category,
+                    amount=amount,
+                    total_amount=amount,
+                    expense_date=today,
+                    status=status,
+                    expense_type='commission',
+                    linked_employee_id=employee_id,
+                    linked_service_order_item_id=batch[0].id if len(batch) == 1 else None,
+                    notes=notes,
+                )
+                if user:
+                    expense.set_created_by(user)
+                expenses.append(expense)
+                for item in batch:
+                    item.commission_expense_id = expense.id
+
+            Expense.objects.bulk_create(expenses, batch_size=BULK_BATCH_SIZE)
+            # bulk_create sends no post_save, so the expense facts are refreshed here
+            mark_dirty(db_alias, ['expenses'], {today})
+
+        for item in pending:
+            item.commission_paid = True
+            if not create_expense:
+                item.commission_expense_id = None
+
+        ServiceOrderItem.objects.bulk_update(
+            pending, ['commission_paid', 'commission_expense_id'], batch_size=BULK_BATCH_SIZE
+        )
+        refresh_commission_rollups(
+            commission_key(item.commission_state) for item in pending
+        )
+
+    return {
+        'count': len(pending),
+        'total_amount': sum((item.commission_amount for item in pending), Decimal('0.00')),
+        'expenses': expenses,
+    }
+
+
+def reverse_commission_settlement(items):
+    """
+    Mark paid commissions as unpaid again.
+
+    Batch expenses shrink by the reversed amount and are removed once no
+    settled items point at them any more.
+    """
+    from apps.expenses.models import Expense
+    from apps.reports.fact_utils import mark_dirty
+
+    db_alias = router.db_for_write(ServiceOrderItem)
+    with transaction.atomic(using=db_alias):
+        paid = list(
+            items.filter(commission_amount__gt=0, commission_paid=True)
+            .select_for_update()
+            .only('id', 'assigned_to_id', 'completed_at', 'commission_amount',
+                  'commission_paid', 'commission_expense_id')
+        )
+        if not paid:
+            return {'count': 0, 'total_amount': Decimal('0')}
+
+        expense_ids = {item.commission_expense_id for item in paid if item.commission_expense_id}
+        for item in paid:
+            item.commission_paid = False
+            item.commission_expense_id = None
+        ServiceOrderItem.objects.bulk_update(
+            paid, ['commission_paid', 'commission_expense_id'], batch_size=BULK_BATCH_SIZE
+        )
+
+        if expense_ids:
+            # The bulk writes below send no post_save, so the expense facts are refreshed here
+            mark_dirty(db_alias, ['expenses'], set(
+                Expense.objects.filter(id__in=expense_ids).values_list('expense_date', flat=True)
+            ))
+            remaining = dict(
+                ServiceOrderItem.objects.filter(
+                    commission_expense_id__in=expense_ids, commission_paid=True
+                ).values('commission_expense_id').annotate(
+                    total=Sum('commission_amount')
+                ).values_list('commission_expense_id', 'total')
+            )
+            empty = [expense_id for expense_id in expense_ids if expense_id not in remaining]
+            if empty:
+                Expense.objects.filter(id__in=empty).delete()
+            shrunk = list(Expense.objects.filter(id__in=remaining.keys()))
+            for expense in shrunk:
+                expense.amount = remaining[expense.id]
+                expense.total_amount = expense.amount + expense.tax_amount
+            if shrunk:
+                Expense.objects.bulk_update(shrunk, ['amount', 'total_amount'], batch_size=BULK_BATCH_SIZE)
+
+        refresh_commission_rollups(
+            commission_key(item.commission_state) for item in paid
+        )
+
+    return {
+        'count': len(paid),
+        'total_amount': sum((item.commission_amount for item in paid), Decimal('0.00')),
+    }
+
+
+def _users_for_employees(employees):
+    """Fetch the main-database users behind a set of employees in one query"""
+    from apps.employees.user_utils import prefetch_users
+
+    employees = prefetch_users([employee for employee in employees if employee])
+    return {employee.user_id: employee.user for employee in employees if employee.user}
+
+
+def _employee_display_names(employees):
+    """Resolve employee display names with a single query against the main database"""
+    employees = {employee.id: employee for employee in employees if employee}
+    users = _users_for_employees(employees.values())
+
+    names = {}
+    for employee_id, employee in employees.items():
+        user = users.get(employee.user_id)
+        if user:
+            names[employee_id] = user.get_full_name() or user.username
+        else:
+            names[employee_id] = employee.employee_id
+    return names
@@ -0,0 +1,67 @@
+"""
+Management command to rebuild per-employee daily commission rollups
+"""
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from apps.core.tenant_models import Tenant
+from apps.core.database_router import TenantDatabaseManager, tenant_context
+
+
+class Command(BaseCommand):
+    help = 'Rebuild employee commission rollups from completed service order items'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            help='Specific tenant slug to rebuild (rebuilds all active tenants if not specified)'
+        )
+        parser.add_argument(
+            '--date-from',
+            type=str,
+            help='First date to rebuild (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--date-to',
+            type=str,
+            help='Last date to rebuild (YYYY-MM-DD)'
+        )
+
+    def handle(self, *args, **options):
+        date_from = self._parse_date(options.get('date_from'))
+        date_to = self._parse_date(options.get('date_to'))
+
+        if options.get('tenant'):
+            tenants = Tenant.objects.filter(slug=options['tenant'])
+            if not tenants.exists():
+                raise CommandError(f"Tenant '{options['tenant']}' not found")
+        else:
+            tenants = Tenant.objects.filter(is_active=True)
+
+        for tenant in tenants:
+            self.rebuild_tenant(tenant, date_from, date_to)
+
+    def rebuild_tenant(self, tenant, date_from=None, date_to=None):
+        """Rebuild rollups for a single tenant database"""
+        from apps.services.commission_utils import rebuild_commission_rollups
+
+        TenantDatabaseManager.add_tenant_to_settings(tenant)
+
+        try:
+            with tenant_context(tenant):
+                changed = rebuild_commission_rollups(date_from, date_to)
+            self.stdout.write(
+                self.style.SUCCESS(f"✓ {tenant.name}: {changed} commission rollup rows rebuilt")
+            )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f"✗ {tenant.name}: {e}")
+            )
+
+    def _parse_date(self, value):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD")
@@ -0,0 +1,45 @@
+"""
+Management command to rebuild per-service catalog statistics
+"""
+from django.core.management.base import BaseCommand, CommandError
+from apps.core.tenant_models import Tenant
+from apps.core.database_router import TenantDatabaseManager, tenant_context
+
+
+class Command(BaseCommand):
+    help = 'Rebuild service catalog statistics (orders, revenue, ratings, durations)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            help='Specific tenant slug to rebuild (rebuilds all active tenants if not specified)'
+        )
+
+    def handle(self, *args, **options):
+        if options.get('tenant'):
+            tenants = Tenant.objects.filter(slug=options['tenant'])
+            if not tenants.exists():
+                raise CommandError(f"Tenant '{options['tenant']}' not found")
+        else:
+            tenants = Tenant.objects.filter(is_active=True)
+
+        for tenant in tenants:
+            self.rebuild_tenant(tenant)
+
+    def rebuild_tenant(self, tenant):
+        """Rebuild service stats for a single tenant database"""
+        from apps.services.catalog_utils import rebuild_service_stats
+
+        TenantDatabaseManager.add_tenant_to_settings(tenant)
+
+        try:
+            with tenant_context(tenant):
+                count = rebuild_service_stats()
+            self.stdout.write(
+                self.style.SUCCESS(f"✓ {tenant.name}: stats rebuilt for {count} services")
+            )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f"✗ {tenant.name}: {e}")
+            )
@@ -0,0 +1,49 @@
+"""
+Management command to backfill ServiceOrder.priority_rank from priority
+"""
+from django.core.management.base import BaseCommand, CommandError
+from apps.core.tenant_models import Tenant
+from apps.core.database_router import TenantDatabaseManager, tenant_context
+
+
+class Command(BaseCommand):
+    help = 'Sync the stored priority rank used to sort service order lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            type=str,
+            help='Specific tenant slug to sync (syncs all active tenants if not specified)'
+        )
+
+    def handle(self, *args, **options):
+        if options.get('tenant'):
+            tenants = Tenant.objects.filter(slug=options['tenant'])
+            if not tenants.exists():
+                raise CommandError(f"Tenant '{options['tenant']}' not found")
+        else:
+            tenants = Tenant.objects.filter(is_active=True)
+
+        for tenant in tenants:
+            self.sync_tenant(tenant)
+
+    def sync_tenant(self, tenant):
+        """One UPDATE per priority value, touching only rows that are out of step"""
+        from apps.services.models import ServiceOrder
+
+        TenantDatabaseManager.add_tenant_to_settings(tenant)
+
+        try:
+            with tenant_context(tenant):
+                updated = 0
+                for priority, rank in ServiceOrder.PRIORITY_RANKS.items():
+                    updated += ServiceOrder.objects.filter(
+                        priority=priority
+                    ).exclude(priority_rank=rank).update(priority_rank=rank)
+            self.stdout.write(
+                self.style.SUCCESS(f"✓ {tenant.name}: {updated} orders updated")
+            )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f"✗ {tenant.name}: {e}")
+            )
@@ -25,6 +25,9 @@ class ServiceCategory(TenantTimeStampedModel):
     
     @property
     def service_count(self):
+        # Catalog list views annotate the count (see catalog_utils.with_category_counts)
+        if hasattr(self, 'active_service_count'):
+            return self.active_service_count
         return self.services.filter(is_active=True).count()
     
     @property
@@ -148,9 +151,20 @@ class Service(TenantSoftDeleteModel):
         """Get minimum price for price editing"""
         return self.min_price or self.base_price
     
+    @property
+    def catalog_stats(self):
+        """Rollup row for this service, or None if it has not been built yet"""
+        try:
+            return self.stats
+        except ServiceStats.DoesNotExist:
+            return None
+    
     @property
     def average_rating(self):
         """Calculate average rating from completed orders"""
+        stats = self.catalog_stats
+        if stats is not None:
+            return stats.average_rating
         ratings = self.order_items.filter(
             order__status='completed'
         ).exclude(rating__isnull=True).values_list('rating', flat=True)
@@ -159,6 +173,9 @@ class Service(TenantSoftDeleteModel):
     @property
     def total_orders(self):
         """Get total number of times this service was ordered"""
+        stats = self.catalog_stats
+        if stats is not None:
+            return stats.completed_orders
         return self.order_items.filter(order__status='completed').count()
     
     def is_compatible_with_vehicle(self, vehicle):
@@ -224,6 +241,8 @@ class ServicePackage(TenantSoftDeleteModel):
     @property
     def service_count(self):
         """Get number of services in package"""
+        if hasattr(self, 'included_service_count'):
+            return self.included_service_count
         return self.services.count()
     
     class Meta:
@@ -231,6 +250,43 @@ class ServicePackage(TenantSoftDeleteModel):
         verbose_name_plural = "Service Packages"
         ordering = ['name']
 
+class ServiceStats(models.Model):
+    """Per-service rollup of completed orders, revenue, ratings and durations"""
+    service = models.OneToOneField(
+        Service,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    
+    # Items on completed orders
+    completed_orders = models.PositiveIntegerField(default=0)
+    total_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    rating_total = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    
+    # Items with both start and completion times
+    timed_count = models.PositiveIntegerField(default=0)
+    total_duration_seconds = models.BigIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.service_id}: {self.completed_orders} orders"
+    
+    @property
+    def average_rating(self):
+        return self.rating_total / self.rating_count if self.rating_count else 0
+    
+    @property
+    def average_duration(self):
+        """Average service duration in minutes"""
+        return self.total_duration_seconds / self.timed_count / 60 if self.timed_count else 0
+    
+    class Meta:
+        verbose_name = "Service Statistics"
+        verbose_name_plural = "Service Statistics"
+
 class PackageService(models.Model):
     """Through model for service packages"""
     package = models.ForeignKey(ServicePackage, on_delete=models.CASCADE)
@@ -262,6 +318,14 @@ class ServiceOrder(TenantTimeStampedModel):
         ('urgent', 'Urgent'),
     ]
     
+    # Sort rank per priority (lower sorts first); stored so order lists can use an index
+    PRIORITY_RANKS = {
+        'urgent': 1,
+        'high': 2,
+        'normal': 3,
+        'low': 4,
+    }
+    
     # Order identification
     order_number = models.CharField(max_length=20, unique=True)
     
@@ -291,6 +355,7 @@ class ServiceOrder(TenantTimeStampedModel):
     # Status and priority
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     priority = models.CharField(max_length=20, choices=PRIORITY_CHOICES, default='normal')
+    priority_rank = models.PositiveSmallIntegerField(default=3, editable=False)
     
     # Pricing
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -357,10 +422,34 @@ class ServiceOrder(TenantTimeStampedModel):
         else:
             self.created_by_id = None
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Loaded status, so catalog stats only refresh when completion changes
+        instance._status_origin = instance.__dict__.get('status')
+        instance._lifetime_origin = instance.lifetime_state
+        return instance
+    
+    @property
+    def lifetime_state(self):
+        """Fields that feed customer and vehicle lifetime statistics"""
+        return (
+            self.__dict__.get('customer_id'),
+            self.__dict__.get('vehicle_id'),
+            self.__dict__.get('status'),
+            self.__dict__.get('total_amount'),
+            self.__dict__.get('created_at'),
+        )
+    
     def save(self, *args, **kwargs):
         if not self.order_number:
             self.order_number = generate_unique_code('ORD', 8)
         
+        self.priority_rank = self.PRIORITY_RANKS.get(self.priority, 3)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'priority' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'priority_rank'}
+        
         # Call original save
         is_new = self.pk is None
         super().save(*args, **kwargs)
@@ -744,6 +833,10 @@ class ServiceOrder(TenantTimeStampedModel):
         verbose_name = "Service Order"
         verbose_name_plural = "Service Orders"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['priority_rank', '-created_at', '-id']),
+            models.Index(fields=['status', 'priority_rank', '-created_at']),
+        ]
 class ServiceOrderItem(models.Model):
     """Individual items in a service order"""
     order = models.ForeignKey(ServiceOrder, on_delete=models.CASCADE, related_name='order_items')
@@ -933,38 +1026,20 @@ class ServiceOrderItem(models.Model):
     def _create_commission_expense(self):
         """Create expense record for commission payment"""
         try:
-            from apps.expenses.models import Expense, ExpenseCategory
-            from django.utils import timezone
+            from .commission_utils import settle_commissions
             
-            # Get or create commission category
-            commission_category, created = ExpenseCategory.objects.get_or_create(
-                name='Employee Commissions',
-                defaults={
-                    'description': 'Commission payments to employees for completed services',
-                    'is_active': True
-                }
-            )
-            
-            # Create expense record
-            expense = Expense.objects.create(
-                title=f"Commission for {self.item_name} - Order #{self.order.order_number}",
-                category=commission_category,
-                amount=self.commission_amount,
-                expense_date=timezone.now().date(),
+            result = settle_commissions(
+                ServiceOrderItem.objects.filter(id=self.id),
+                create_expense=True,
                 status='pending',
-                expense_type='commission',
-                linked_employee_id=self.assigned_to.id if self.assigned_to else None,
-                linked_service_order_item_id=self.id,
-                notes=f"Auto-generated commission expense for service completion"
+                notes="Auto-generated commission expense for service completion"
             )
             
             # Update commission tracking
-            self.commission_expense_id = expense.id
-            self.commission_paid = True
-            ServiceOrderItem.objects.filter(id=self.id).update(
-                commission_expense_id=expense.id,
-                commission_paid=True
-            )
+            if result['expenses']:
+                self.commission_expense_id = result['expenses'][0].id
+                self.commission_paid = True
+                self._commission_origin = self.commission_state
             
         except Exception as e:
             # Log error but don't fail the save
@@ -1005,9 +1080,76 @@ class ServiceOrderItem(models.Model):
     def __str__(self):
         return f"{self.service.name} x{self.quantity} - {self.order.order_number}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded commission state so the rollup signal only
+        # refreshes the (employee, day) rows that actually changed
+        instance._commission_origin = instance.commission_state
+        instance._catalog_origin = instance.catalog_state
+        return instance
+    
+    @property
+    def commission_state(self):
+        """Fields that feed the per-employee commission rollup"""
+        return (
+            self.__dict__.get('assigned_to_id'),
+            self.__dict__.get('completed_at'),
+            self.__dict__.get('commission_amount'),
+            self.__dict__.get('commission_paid'),
+        )
+    
+    @property
+    def catalog_state(self):
+        """Fields that feed the per-service catalog stats"""
+        return (
+            self.__dict__.get('service_id'),
+            self.__dict__.get('total_price'),
+            self.__dict__.get('rating'),
+            self.__dict__.get('started_at'),
+            self.__dict__.get('completed_at'),
+        )
+    
     class Meta:
         unique_together = ['order', 'service']
 
+
+class EmployeeCommissionRollup(models.Model):
+    """Per-employee, per-day commission totals maintained as order items complete"""
+    employee = models.ForeignKey(
+        'employees.Employee',
+        on_delete=models.CASCADE,
+        related_name='commission_rollups'
+    )
+    date = models.DateField()
+    
+    service_count = models.PositiveIntegerField(default=0)
+    paid_count = models.PositiveIntegerField(default=0)
+    total_commission = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    paid_commission = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.employee_id} - {self.date}: KES {self.total_commission}"
+    
+    @property
+    def pending_commission(self):
+        return self.total_commission - self.paid_commission
+    
+    @property
+    def pending_count(self):
+        return self.service_count - self.paid_count
+    
+    class Meta:
+        verbose_name = "Employee Commission Rollup"
+        verbose_name_plural = "Employee Commission Rollups"
+        unique_together = ['employee', 'date']
+        indexes = [
+            models.Index(fields=['date', 'employee']),
+        ]
+        ordering = ['-date']
+
 class ServiceQueue(TenantTimeStampedModel):
     """Service queue management"""
     
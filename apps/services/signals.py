@@ -0,0 +1,98 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+import logging
+
+from .models import Service, ServiceOrder, ServiceOrderItem
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=ServiceOrderItem)
+def update_commission_rollup(sender, instance, created, **kwargs):
+    """Keep the per-employee, per-day commission rollup in step with order items"""
+    from .commission_utils import commission_key, refresh_commission_rollups
+
+    origin = getattr(instance, '_commission_origin', None)
+    current = instance.commission_state
+    if origin == current:
+        return
+
+    try:
+        refresh_commission_rollups({commission_key(origin), commission_key(current)})
+    except Exception as e:
+        logger.error(f"Failed to refresh commission rollup for item {instance.pk}: {e}")
+    instance._commission_origin = current
+
+
+@receiver(post_delete, sender=ServiceOrderItem)
+def remove_commission_rollup(sender, instance, **kwargs):
+    """Drop deleted items from the commission rollup"""
+    from .commission_utils import commission_key, refresh_commission_rollups
+
+    try:
+        refresh_commission_rollups({
+            commission_key(getattr(instance, '_commission_origin', None)),
+            commission_key(instance.commission_state),
+        })
+    except Exception as e:
+        logger.error(f"Failed to refresh commission rollup after deleting item {instance.pk}: {e}")
+
+
+@receiver(post_save, sender=ServiceOrderItem)
+def update_item_service_stats(sender, instance, created, **kwargs):
+    """Refresh catalog stats when an item's price, rating or timing changes"""
+    from .catalog_utils import refresh_service_stats
+
+    origin = getattr(instance, '_catalog_origin', None)
+    current = instance.catalog_state
+    instance._catalog_origin = current
+    if origin == current:
+        return
+    if created and current[3] is None and current[4] is None:
+        # New, untimed items only count once their order completes
+        if ServiceOrderItem.order.is_cached(instance) and instance.order.status != 'completed':
+            return
+
+    try:
+        refresh_service_stats({origin[0] if origin else None, current[0]})
+    except Exception as e:
+        logger.error(f"Failed to refresh service stats for item {instance.pk}: {e}")
+
+
+@receiver(post_delete, sender=ServiceOrderItem)
+def remove_item_service_stats(sender, instance, **kwargs):
+    from .catalog_utils import refresh_service_stats
+
+    try:
+        refresh_service_stats({instance.service_id})
+    except Exception as e:
+        logger.error(f"Failed to refresh service stats after deleting item {instance.pk}: {e}")
+
+
+@receiver(post_save, sender=ServiceOrder)
+def update_order_service_stats(sender, instance, created, **kwargs):
+    """Orders entering or leaving 'completed' change every included service's stats"""
+    from .catalog_utils import refresh_order_service_stats
+
+    origin = getattr(instance, '_status_origin', None)
+    instance._status_origin = instance.status
+    if created or origin == instance.status or 'completed' not in (origin, instance.status):
+        return
+
+    try:
+        refresh_order_service_stats(instance.pk)
+    except Exception as e:
+        logger.error(f"Failed to refresh service stats for order {instance.pk}: {e}")
+
+
+@receiver(post_save, sender=Service)
+def create_service_stats(sender, instance, created, **kwargs):
+    """Give new services an empty rollup row so catalog pages never fall back to queries"""
+    if not created:
+        return
+    from .models import ServiceStats
+
+    try:
+        ServiceStats.objects.get_or_create(service=instance)
+    except Exception as e:
+        logger.error(f"Failed to create stats for service {instance.pk}: {e}")
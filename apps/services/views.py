@@ -10,7 +10,7 @@ import base64
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods, require_POST
 from django.views.decorators.csrf import csrf_protect
 from django.views.decorators.cache import never_cache
@@ -24,8 +24,12 @@ from apps.core.decorators import employee_required, ajax_required, owner_require
 from apps.core.utils import generate_unique_code, send_sms_notification, send_email_notification
 from apps.core.cache_manager import MultiTenantCacheManager
 from apps.core.logging_utils import AutoWashLogger
+from apps.core.pagination_utils import KeysetPaginator
+from apps.core.idempotency_utils import idempotent
 from apps.employees.models import Employee
+from apps.employees.user_utils import prefetch_users
 from apps.payments.models import Payment
+from apps.customers import search as search_index
 from django.views.decorators.http import require_GET
 
 from .models import (
@@ -37,6 +41,14 @@ from .forms import (
     ServiceOrderForm, QuickOrderForm, ServiceOrderItemForm, ServiceRatingForm
 )
 from .notifications import send_service_notification_email
+from .commission_utils import (
+    settle_commissions, reverse_commission_settlement, get_commission_summary,
+    get_employee_commission_breakdown, get_daily_commission_trend,
+    get_monthly_commission_breakdown
+)
+from .catalog_utils import (
+    with_service_stats, with_category_counts, with_package_counts, unsaved_service_stats
+)
 from datetime import datetime, timedelta
 import json
 import logging
@@ -141,7 +153,7 @@ def services_list_ajax(request):
 @employee_required()
 def service_list_view(request):
     """List all services with categories"""
-    categories = ServiceCategory.objects.filter(is_active=True).prefetch_related('services')
+    categories = ServiceCategory.objects.filter(is_active=True).order_by('display_order', 'name')
     
     # Filter services
     category_id = request.GET.get('category')
@@ -156,7 +168,9 @@ def service_list_view(request):
             Q(description__icontains=search)
         )
     
-    services = services.select_related('category').order_by('category', 'display_order', 'name')
+    services = with_service_stats(
+        services.select_related('category')
+    ).order_by('category', 'display_order', 'name')
     
     # Pagination
     paginator = Paginator(services, 12)
@@ -164,13 +178,16 @@ def service_list_view(request):
     services_page = paginator.get_page(page)
     
     # Statistics
+    service_totals = Service.objects.filter(is_active=True).aggregate(
+        total=Count('id'),
+        popular=Count('id', filter=Q(is_popular=True)),
+        avg_price=Avg('base_price')
+    )
     stats = {
-        'total_services': Service.objects.filter(is_active=True).count(),
+        'total_services': service_totals['total'],
         'total_categories': categories.count(),
-        'popular_services': Service.objects.filter(is_popular=True, is_active=True).count(),
-        'avg_price': Service.objects.filter(is_active=True).aggregate(
-            avg_price=Avg('base_price')
-        )['avg_price'] or 0,
+        'popular_services': service_totals['popular'],
+        'avg_price': service_totals['avg_price'] or 0,
     }
     
     context = {
@@ -211,65 +228,24 @@ def service_create_view(request):
 @employee_required()
 def service_detail_view(request, pk):
     """Service detail view"""
-    service = get_object_or_404(Service, pk=pk)
+    service = get_object_or_404(with_service_stats(Service.objects.select_related('category')), pk=pk)
     
     # Get recent orders for this service
     recent_orders = ServiceOrderItem.objects.filter(
         service=service
     ).select_related('order', 'order__customer').order_by('-order__created_at')[:10]
     
-    # Calculate statistics
+    # Statistics come from the per-service rollup; services created before it
+    # existed get the same figures computed without storing them
+    catalog_stats = service.catalog_stats or unsaved_service_stats(service.pk)
+    
     stats = {
-        'total_orders': service.total_orders,
-        'average_rating': service.average_rating,
-        'total_revenue': ServiceOrderItem.objects.filter(
-            service=service,
-            order__status='completed'
-        ).aggregate(total=Sum('total_price'))['total'] or 0,
-        # FIXED: Calculate average duration using raw SQL for MySQL compatibility
-        'avg_duration': 0,  # We'll calculate this separately
+        'total_orders': catalog_stats.completed_orders,
+        'average_rating': catalog_stats.average_rating,
+        'total_revenue': catalog_stats.total_revenue,
+        'avg_duration': catalog_stats.average_duration,
     }
     
-    # Calculate average duration using tenant-aware database connection
-    from django.db import connections
-    from apps.core.database_router import get_current_tenant
-    
-    # Get the current tenant and use the appropriate database connection
-    current_tenant = get_current_tenant()
-    if current_tenant:
-        db_alias = f"tenant_{current_tenant.id}"
-        # Ensure tenant database is added to settings
-        if db_alias not in connections.databases:
-            from apps.core.database_router import TenantDatabaseManager
-            TenantDatabaseManager.add_tenant_to_settings(current_tenant)
-        
-        # Use tenant database connection for raw SQL
-        with connections[db_alias].cursor() as cursor:
-            cursor.execute("""
-                SELECT AVG(TIMESTAMPDIFF(MINUTE, started_at, completed_at)) as avg_duration
-                FROM services_serviceorderitem 
-                WHERE service_id = %s 
-                AND completed_at IS NOT NULL 
-                AND started_at IS NOT NULL
-            """, [service.id])
-            result = cursor.fetchone()
-            if result and result[0]:
-                stats['avg_duration'] = float(result[0])
-    else:
-        # Fallback: use default connection if no tenant context
-        from django.db import connection
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT AVG(TIMESTAMPDIFF(MINUTE, started_at, completed_at)) as avg_duration
-                FROM services_serviceorderitem 
-                WHERE service_id = %s 
-                AND completed_at IS NOT NULL 
-                AND started_at IS NOT NULL
-            """, [service.id])
-            result = cursor.fetchone()
-            if result and result[0]:
-                stats['avg_duration'] = float(result[0])
-    
     # ADDED: Split compatible vehicle types for template
     compatible_vehicle_types = []
     if service.compatible_vehicle_types:
@@ -344,30 +320,14 @@ def order_list_view(request):
             # Invalid date format, ignore filter
             date_to = None
     if search:
-        orders = orders.filter(
-            Q(order_number__icontains=search) |
-            Q(customer__first_name__icontains=search) |
-            Q(customer__last_name__icontains=search) |
-            Q(vehicle__registration_number__icontains=search)
-        )
+        orders = search_index.filter_orders(orders, search)
     
-    # Sort by priority and creation date
-    orders = orders.order_by(
-        Case(
-            When(priority='urgent', then=Value(1)),
-            When(priority='high', then=Value(2)),
-            When(priority='normal', then=Value(3)),
-            When(priority='low', then=Value(4)),
-            default=Value(3),
-            output_field=IntegerField(),
-        ),
-        '-created_at'
-    )
+    # Sort by priority and creation date (stored rank so the index is used)
+    orders = orders.order_by('priority_rank', '-created_at', '-id')
     
     # Pagination
-    paginator = Paginator(orders, 20)
-    page = request.GET.get('page')
-    orders_page = paginator.get_page(page)
+    paginator = KeysetPaginator(orders, 20)
+    orders_page = paginator.get_page(request.GET)
     
     # Get attendants for filter
     from apps.employees.models import Employee
@@ -436,7 +396,7 @@ def order_list_view(request):
         'today_revenue': today_revenue,
         
         # Overall metrics for context (filtered)
-        'total_orders': orders.count(),
+        'total_orders': paginator.count,
         'active_orders': orders.filter(status__in=['pending', 'in_progress']).count(),
         
         # Average metrics
@@ -462,6 +422,7 @@ def order_list_view(request):
 
 @login_required
 @employee_required()
+@idempotent()
 def order_create_view(request):
     """Create new service order"""
     if request.method == 'POST':
@@ -546,6 +507,7 @@ def order_create_view(request):
 @csrf_protect
 @employee_required()
 @require_http_methods(["GET", "POST"])
+@idempotent()
 def quick_order_view(request):
     """Quick order creation"""
     if request.method == 'POST':
@@ -1244,9 +1206,9 @@ def quick_order_view(request):
     all_services = Service.objects.filter(is_active=True).select_related('category')
 
     # Get service packages
-    service_packages = ServicePackage.objects.filter(
+    service_packages = with_package_counts(ServicePackage.objects.filter(
         is_active=True
-    ).order_by('-is_popular', 'name')[:8]
+    )).order_by('-is_popular', 'name')[:8]
 
     # Get service categories with their active services
     categories = ServiceCategory.objects.filter(is_active=True).prefetch_related(
@@ -2239,8 +2201,8 @@ def service_delete_view(request, pk):
 @employee_required(['owner', 'manager'])
 def category_list_view(request):
     """List service categories"""
-    categories = ServiceCategory.objects.filter(is_active=True).annotate(
-        service_count=Count('services', filter=Q(services__is_active=True))
+    categories = with_category_counts(
+        ServiceCategory.objects.filter(is_active=True)
     ).order_by('display_order', 'name')
     
     context = {
@@ -2635,6 +2597,7 @@ def my_services_view(request):
     paginator = Paginator(my_orders, 20)
     page = request.GET.get('page')
     orders_page = paginator.get_page(page)
+    prefetch_users(orders_page.object_list, 'assigned_attendant')
     
     context = {
         'orders': orders_page,
@@ -2725,13 +2688,7 @@ def customer_search_ajax(request):
     
     from apps.customers.models import Customer
     
-    customers = Customer.objects.filter(
-        Q(first_name__icontains=query) |
-        Q(last_name__icontains=query) |
-        Q(phone__icontains=query) |
-        Q(customer_id__icontains=query),
-        is_active=True
-    )[:10]
+    customers = search_index.filter_customers(Customer.objects.filter(is_active=True), query)[:10]
     
     results = [
         {
@@ -2762,11 +2719,7 @@ def vehicle_search_ajax(request):
         vehicles = vehicles.filter(customer_id=customer_id)
     
     if query:
-        vehicles = vehicles.filter(
-            Q(registration_number__icontains=query) |
-            Q(make__icontains=query) |
-            Q(model__icontains=query)
-        )
+        vehicles = search_index.filter_vehicles(vehicles, query)
     
     vehicles = vehicles.select_related('customer')[:10]
     
@@ -2958,14 +2911,13 @@ def service_edit_view(request, pk):
 @login_required
 @employee_required(['owner', 'manager'])
 def category_list_view(request):
-    categories = ServiceCategory.objects.filter(is_active=True).annotate(
-        total_services=Count('services', filter=Q(services__is_active=True)),
-        active_services_count=Count('services', filter=Q(services__is_active=True))
-    ).order_by('display_order', 'name')
+    categories = list(with_category_counts(
+        ServiceCategory.objects.filter(is_active=True)
+    ).order_by('display_order', 'name'))
     
     # Calculate overall statistics
-    total_categories = categories.count()
-    total_services = Service.objects.filter(is_active=True, category__in=categories).count()
+    total_categories = len(categories)
+    total_services = sum(category.active_service_count for category in categories)
     
     context = {
         'categories': categories,
@@ -3311,6 +3263,7 @@ def resume_service(request, order_id):
 # Payment Views
 @login_required
 @employee_required()
+@idempotent()
 def process_payment(request, order_id):
     """Process payment for order"""
     order = get_object_or_404(ServiceOrder, id=order_id)
@@ -3391,8 +3344,8 @@ def update_queue_priority(request, queue_id):
 @employee_required(['owner', 'manager'])
 def package_list_view(request):
     """List service packages"""
-    packages = ServicePackage.objects.filter(is_active=True).prefetch_related(
-        'services'  
+    packages = with_package_counts(
+        ServicePackage.objects.filter(is_active=True)
     ).order_by('name')
     
     context = {
@@ -3423,7 +3376,7 @@ def package_create_view(request):
 @employee_required()
 def package_detail_view(request, pk):
     """Service package detail"""
-    package = get_object_or_404(ServicePackage, pk=pk)
+    package = get_object_or_404(with_package_counts(ServicePackage.objects.all()), pk=pk)
     package_services = package.packageservice_set.all().select_related('service')
     
     context = {
@@ -4027,33 +3980,23 @@ def quick_service_assign(request):
 @login_required
 @employee_required(['owner', 'manager'])
 def service_export_view(request):
-    """Export services to CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="services_export.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
+    """Export services to CSV (or Excel with ``?format=xlsx``), streamed in chunks"""
+    from apps.core.export_utils import export_response, iter_values
+
+    header = [
         'Name', 'Category', 'Description', 'Base Price', 'Estimated Duration',
         'Required Skill Level', 'Compatible Vehicles', 'Is Popular', 'Is Premium', 'Is Active'
-    ])
-    
-    services = Service.objects.select_related('category').order_by('category', 'name')
-    
-    for service in services:
-        writer.writerow([
-            service.name,
-            service.category.name if service.category else '',
-            service.description,
-            service.base_price,
-            service.estimated_duration,
-            service.required_skill_level,
-            service.compatible_vehicle_types,
-            service.is_popular,
-            service.is_premium,
-            service.is_active
-        ])
-    
-    return response
+    ]
+    fields = [
+        'name', 'category__name', 'description', 'base_price', 'estimated_duration',
+        'required_skill_level', 'compatible_vehicle_types', 'is_popular', 'is_premium', 'is_active',
+    ]
+
+    def rows():
+        for service in iter_values(Service.objects.all(), fields, ordering=['category_id', 'name']):
+            yield [service[field] if service[field] is not None else '' for field in fields]
+
+    return export_response(request, 'services_export', header, rows(), 'Services')
 
 @login_required
 @employee_required(['owner', 'manager'])
@@ -4135,13 +4078,9 @@ def customer_search_ajax(request):
     try:
         from apps.customers.models import Customer
         
-        customers = Customer.objects.filter(
-            Q(first_name__icontains=query) |
-            Q(last_name__icontains=query) |
-            Q(phone__icontains=query) |
-            Q(customer_id__icontains=query) |
-            Q(company_name__icontains=query)
-        ).select_related().prefetch_related('vehicles')[:10]
+        customers = search_index.filter_customers(
+            Customer.objects.all(), query
+        ).prefetch_related('vehicles')[:10]
         
         # Format the results
         results = []
@@ -4179,11 +4118,7 @@ def vehicle_search_ajax(request):
         vehicles = vehicles.filter(customer_id=customer_id)
     
     if query:
-        vehicles = vehicles.filter(
-            Q(registration_number__icontains=query) |
-            Q(make__icontains=query) |
-            Q(model__icontains=query)
-        )
+        vehicles = search_index.filter_vehicles(vehicles, query)
     
     vehicles = vehicles.select_related('customer')[:10]
     
@@ -4819,13 +4754,12 @@ def invoice_list(request):
         invoices = invoices.filter(issue_date__lte=date_to)
     
     # Pagination
-    paginator = Paginator(invoices, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = KeysetPaginator(invoices, 25)
+    page_obj = paginator.get_page(request.GET)
     
     # Summary statistics
     stats = {
-        'total_invoices': invoices.count(),
+        'total_invoices': paginator.count,
         'total_amount': invoices.aggregate(Sum('total_amount'))['total_amount__sum'] or 0,
         'draft_count': invoices.filter(status='draft').count(),
         'sent_count': invoices.filter(status='sent').count(),
@@ -5209,8 +5143,8 @@ def quotation_list(request):
         )
     
     # Sort by status priority and creation date
-    quotations = quotations.order_by(
-        Case(
+    quotations = quotations.annotate(
+        status_rank=Case(
             When(status='draft', then=Value(1)),
             When(status='sent', then=Value(2)),
             When(status='accepted', then=Value(3)),
@@ -5219,19 +5153,17 @@ def quotation_list(request):
             When(status='converted', then=Value(6)),
             default=Value(3),
             output_field=IntegerField(),
-        ),
-        '-created_at'
-    )
+        )
+    ).order_by('status_rank', '-created_at', '-id')
     
     # Pagination
-    paginator = Paginator(quotations, 20)
-    page = request.GET.get('page')
-    quotations_page = paginator.get_page(page)
+    paginator = KeysetPaginator(quotations, 20)
+    quotations_page = paginator.get_page(request.GET)
     
     # Statistics
     today = timezone.now().date()
     stats = {
-        'total_quotations': quotations.count(),
+        'total_quotations': paginator.count,
         'draft_quotations': quotations.filter(status='draft').count(),
         'sent_quotations': quotations.filter(status='sent').count(),
         'accepted_quotations': quotations.filter(status='accepted').count(),
@@ -5877,46 +5809,14 @@ def commission_dashboard_view(request):
         'order', 'order__customer', 'assigned_to', 'service'
     ).order_by('-completed_at')
 
-    # Calculate summary statistics
-    total_commission = commission_items.aggregate(
-        total=Sum('commission_amount')
-    )['total'] or Decimal('0')
-
-    paid_commission = commission_items.filter(
-        commission_paid=True
-    ).aggregate(
-        total=Sum('commission_amount')
-    )['total'] or Decimal('0')
-
-    pending_commission = total_commission - paid_commission
-
-    # Employee commission breakdown - using employee properties
-    employee_commissions = []
-    employees_with_commissions = commission_items.values('assigned_to').distinct()
-
-    for emp_data in employees_with_commissions:
-        employee_id = emp_data['assigned_to']
-        if employee_id:
-            emp_commissions = commission_items.filter(assigned_to_id=employee_id)
-            employee = emp_commissions.first().assigned_to if emp_commissions.exists() else None
-
-            if employee:
-                total_commission = emp_commissions.aggregate(total=Sum('commission_amount'))['total'] or Decimal('0')
-                paid_commission = emp_commissions.filter(commission_paid=True).aggregate(total=Sum('commission_amount'))['total'] or Decimal('0')
-                pending_commission = emp_commissions.filter(commission_paid=False).aggregate(total=Sum('commission_amount'))['total'] or Decimal('0')
-
-                employee_commissions.append({
-                    'assigned_to__employee_id': employee.employee_id,
-                    'assigned_to__first_name': employee.first_name,
-                    'assigned_to__last_name': employee.last_name,
-                    'total_commission': total_commission,
-                    'paid_commission': paid_commission,
-                    'pending_commission': pending_commission,
-                    'completed_services': emp_commissions.count()
-                })
+    # Summary statistics and breakdowns come from the per-employee daily rollup
+    summary = get_commission_summary(date_from_obj, date_to_obj)
+    total_commission = summary['total_commission']
+    paid_commission = summary['paid_commission']
+    pending_commission = summary['pending_commission']
 
-    # Sort by total commission
-    employee_commissions.sort(key=lambda x: x['total_commission'], reverse=True)
+    # Employee commission breakdown, sorted by total commission
+    employee_commissions = get_employee_commission_breakdown(date_from_obj, date_to_obj)
 
     # Commission by service type
     service_commissions = commission_items.values(
@@ -5928,12 +5828,7 @@ def commission_dashboard_view(request):
     ).order_by('-total_commission')[:10]
 
     # Daily commission trend
-    daily_commissions = commission_items.extra(
-        select={'day': 'DATE(completed_at)'}
-    ).values('day').annotate(
-        total_commission=Sum('commission_amount'),
-        services_count=Count('id')
-    ).order_by('day')
+    daily_commissions = get_daily_commission_trend(date_from_obj, date_to_obj)
 
     context = {
         'commission_items': commission_items[:50],  # Show recent 50
@@ -5981,6 +5876,7 @@ def commission_list_view(request):
         elif status == 'pending':
             commission_items = commission_items.filter(commission_paid=False)
 
+    date_from_obj = date_to_obj = None
     if date_from:
         try:
             from datetime import datetime
@@ -6028,14 +5924,39 @@ def commission_list_view(request):
         role__in=['attendant', 'supervisor', 'manager']
     ).order_by('employee_id')
 
-    # Summary statistics
+    # Summary statistics - served from the rollup unless a free-text search narrows the items
+    if search:
+        totals = commission_items.aggregate(
+            total=Sum('commission_amount'),
+            paid=Sum(Case(When(commission_paid=True, then='commission_amount'), default=Decimal('0'))),
+            records=Count('id'),
+            paid_records=Count('id', filter=Q(commission_paid=True)),
+        )
+        summary = {
+            'total_commission': totals['total'] or Decimal('0'),
+            'paid_commission': totals['paid'] or Decimal('0'),
+            'service_count': totals['records'],
+            'paid_count': totals['paid_records'],
+        }
+        summary['pending_commission'] = summary['total_commission'] - summary['paid_commission']
+        summary['pending_count'] = summary['service_count'] - summary['paid_count']
+    else:
+        summary = get_commission_summary(date_from_obj, date_to_obj, employee_id)
+        # Rollups only cover items with an assigned employee and completion date
+        if status == 'paid':
+            summary.update(total_commission=summary['paid_commission'], pending_commission=Decimal('0'),
+                           service_count=summary['paid_count'], pending_count=0)
+        elif status == 'pending':
+            summary.update(total_commission=summary['pending_commission'], paid_commission=Decimal('0'),
+                           service_count=summary['pending_count'], paid_count=0)
+
     stats = {
-        'total_commission': commission_items.aggregate(total=Sum('commission_amount'))['total'] or Decimal('0'),
-        'paid_commission': commission_items.filter(commission_paid=True).aggregate(total=Sum('commission_amount'))['total'] or Decimal('0'),
-        'pending_commission': commission_items.filter(commission_paid=False).aggregate(total=Sum('commission_amount'))['total'] or Decimal('0'),
-        'total_records': commission_items.count(),
-        'paid_records': commission_items.filter(commission_paid=True).count(),
-        'pending_records': commission_items.filter(commission_paid=False).count(),
+        'total_commission': summary['total_commission'],
+        'paid_commission': summary['paid_commission'],
+        'pending_commission': summary['pending_commission'],
+        'total_records': summary['service_count'],
+        'paid_records': summary['paid_count'],
+        'pending_records': summary['pending_count'],
     }
 
     context = {
@@ -6100,38 +6021,12 @@ def mark_commission_paid(request, item_id):
         # Check if expense record should be created
         create_expense = request.POST.get('create_expense', 'false') == 'true'
 
-        expense = None
-        if create_expense:
-            # Create expense record for the commission
-            from apps.expenses.models import Expense, ExpenseCategory
-            from django.utils import timezone
-
-            # Get or create commission category
-            commission_category, created = ExpenseCategory.objects.get_or_create(
-                name='Employee Commissions',
-                defaults={
-                    'description': 'Commission payments to employees for completed services',
-                    'is_active': True
-                }
-            )
-
-            # Create expense record
-            expense = Expense.objects.create(
-                title=f"Commission for {commission_item.item_name} - Order #{commission_item.order.order_number}",
-                category=commission_category,
-                amount=commission_item.commission_amount,
-                expense_date=timezone.now().date(),
-                status='approved',
-                expense_type='commission',
-                linked_employee_id=commission_item.assigned_to.id if commission_item.assigned_to else None,
-                linked_service_order_item_id=commission_item.id,
-                notes=f"Commission payment recorded for service completion"
-            )
-
-        # Update commission tracking
-        commission_item.commission_expense_id = expense.id if expense else None
-        commission_item.commission_paid = True
-        commission_item.save()
+        settle_commissions(
+            ServiceOrderItem.objects.filter(id=commission_item.id),
+            create_expense=create_expense,
+            user=request.user,
+            notes="Commission payment recorded for service completion"
+        )
 
         if create_expense:
             messages.success(
@@ -6224,19 +6119,8 @@ def mark_commission_unpaid(request, item_id):
         return redirect(get_business_url(request, 'services:commission_detail', item_id=item_id))
 
     try:
-        # Delete or cancel the expense record
-        if commission_item.commission_expense_id:
-            from apps.expenses.models import Expense
-            try:
-                expense = Expense.objects.get(id=commission_item.commission_expense_id)
-                expense.delete()  # This will soft delete the expense
-            except Expense.DoesNotExist:
-                pass
-
-        # Update commission tracking
-        commission_item.commission_expense_id = None
-        commission_item.commission_paid = False
-        commission_item.save()
+        # Shrinks or removes the (possibly batched) expense record
+        reverse_commission_settlement(ServiceOrderItem.objects.filter(id=commission_item.id))
 
         messages.success(
             request,
@@ -6283,30 +6167,14 @@ def employee_commission_report(request, employee_id):
         'order', 'order__customer', 'service'
     ).order_by('-completed_at')
 
-    # Calculate totals
-    total_commission = commission_items.aggregate(
-        total=Sum('commission_amount')
-    )['total'] or Decimal('0')
-
-    paid_commission = commission_items.filter(
-        commission_paid=True
-    ).aggregate(
-        total=Sum('commission_amount')
-    )['total'] or Decimal('0')
-
-    pending_commission = total_commission - paid_commission
+    # Calculate totals from the daily rollup
+    summary = get_commission_summary(date_from_obj, date_to_obj, employee.id)
+    total_commission = summary['total_commission']
+    paid_commission = summary['paid_commission']
+    pending_commission = summary['pending_commission']
 
     # Monthly breakdown
-    monthly_commissions = commission_items.extra(
-        select={'month': 'DATE_FORMAT(completed_at, "%%Y-%%m")'}
-    ).values('month').annotate(
-        total_commission=Sum('commission_amount'),
-        paid_commission=Sum(Case(
-            When(commission_paid=True, then='commission_amount'),
-            default=Decimal('0')
-        )),
-        service_count=Count('id')
-    ).order_by('-month')
+    monthly_commissions = get_monthly_commission_breakdown(date_from_obj, date_to_obj, employee.id)
 
     context = {
         'employee': employee,
@@ -6323,6 +6191,25 @@ def employee_commission_report(request, employee_id):
     return render(request, 'services/employee_commission_report.html', context)
 
 
+def _filter_commissions_by_period(commission_items, period, employee_id=None):
+    """Apply the bulk payment period ('all', 'today', 'week', 'month') and employee filters"""
+    today = timezone.now().date()
+
+    if period == 'today':
+        commission_items = commission_items.filter(completed_at__date=today)
+    elif period == 'week':
+        week_start = today - timedelta(days=today.weekday())
+        commission_items = commission_items.filter(completed_at__date__gte=week_start)
+    elif period == 'month':
+        month_start = today.replace(day=1)
+        commission_items = commission_items.filter(completed_at__date__gte=month_start)
+
+    if employee_id:
+        commission_items = commission_items.filter(assigned_to_id=employee_id)
+
+    return commission_items
+
+
 @login_required
 @employee_required(['owner', 'manager'])
 def bulk_commission_payment(request):
@@ -6330,9 +6217,11 @@ def bulk_commission_payment(request):
     if request.method == 'POST':
         commission_ids = request.POST.getlist('commission_ids')
         action = request.POST.get('action')  # 'mark_paid' or 'mark_unpaid'
-        create_expense = request.POST.get('create_expense', 'true') == 'true'
+        create_expense = request.POST.get('create_expense', 'true') in ('true', 'on')
+        # 'filtered' settles every commission matching the period/employee filters
+        settle_scope = request.POST.get('scope', 'selected')
 
-        if not commission_ids:
+        if not commission_ids and settle_scope != 'filtered':
             messages.error(request, 'No commissions selected.')
             return redirect(get_business_url(request, 'services:commission_list'))
 
@@ -6342,77 +6231,43 @@ def bulk_commission_payment(request):
 
         try:
             commission_items = ServiceOrderItem.objects.filter(
-                id__in=commission_ids,
                 commission_amount__gt=0
             )
+            if settle_scope == 'filtered':
+                commission_items = _filter_commissions_by_period(
+                    commission_items,
+                    request.POST.get('period', 'all'),
+                    request.POST.get('employee')
+                )
+            else:
+                commission_items = commission_items.filter(id__in=commission_ids)
 
-            success_count = 0
-            error_count = 0
-
-            for item in commission_items:
-                try:
-                    if action == 'mark_paid' and not item.commission_paid:
-                        expense = None
-                        if create_expense:
-                            # Create expense for unpaid commission
-                            from apps.expenses.models import Expense, ExpenseCategory
-                            from django.utils import timezone
-
-                            commission_category, created = ExpenseCategory.objects.get_or_create(
-                                name='Employee Commissions',
-                                defaults={
-                                    'description': 'Commission payments to employees for completed services',
-                                    'is_active': True
-                                }
-                            )
-
-                            expense = Expense.objects.create(
-                                title=f"Commission for {item.item_name} - Order #{item.order.order_number}",
-                                category=commission_category,
-                                amount=item.commission_amount,
-                                expense_date=timezone.now().date(),
-                                status='approved',
-                                expense_type='commission',
-                                linked_employee_id=item.assigned_to.id if item.assigned_to else None,
-                                linked_service_order_item_id=item.id,
-                                notes=f"Bulk commission payment recorded"
-                            )
-
-                        item.commission_expense_id = expense.id if expense else None
-                        item.commission_paid = True
-                        item.save()
-                        success_count += 1
-
-                    elif action == 'mark_unpaid' and item.commission_paid:
-                        # Remove expense for paid commission
-                        if item.commission_expense_id:
-                            from apps.expenses.models import Expense
-                            try:
-                                expense = Expense.objects.get(id=item.commission_expense_id)
-                                expense.delete()
-                            except Expense.DoesNotExist:
-                                pass
-
-                        item.commission_expense_id = None
-                        item.commission_paid = False
-                        item.save()
-                        success_count += 1
-
-                except Exception as e:
-                    error_count += 1
-                    logger.error(f"Error processing commission {item.id}: {str(e)}")
-
-            if success_count > 0:
-                expense_msg = " with expense records created" if create_expense else " without expense records"
+            if action == 'mark_paid':
+                result = settle_commissions(commission_items, create_expense=create_expense, user=request.user)
+            elif action == 'mark_unpaid':
+                result = reverse_commission_settlement(commission_items)
+            else:
+                messages.error(request, 'Invalid action.')
+                return redirect(get_business_url(request, 'services:commission_list'))
+
+            if result['count'] > 0:
+                if action == 'mark_paid':
+                    expense_msg = (
+                        f" with {len(result['expenses'])} expense records created"
+                        if create_expense else " without expense records"
+                    )
+                else:
+                    expense_msg = ""
                 messages.success(
                     request,
-                    f'Successfully processed {success_count} commissions{expense_msg}. '
-                    f'{error_count} errors occurred.'
+                    f"Successfully processed {result['count']} commissions "
+                    f"(KES {result['total_amount']:,.2f}){expense_msg}."
                 )
             else:
-                messages.warning(request, f'No commissions were processed. {error_count} errors occurred.')
+                messages.warning(request, 'No commissions were processed.')
 
         except Exception as e:
+            logger.error(f"Error processing bulk commission payments: {str(e)}")
             messages.error(request, f'Error processing bulk commission payments: {str(e)}')
 
         return redirect(get_business_url(request, 'services:commission_list'))
@@ -6430,23 +6285,11 @@ def bulk_commission_payment(request):
         'order', 'order__customer', 'assigned_to', 'service'
     )
 
-    # Apply period filter
-    from django.utils import timezone
-    today = timezone.now().date()
-
-    if period == 'today':
-        unpaid_commissions = unpaid_commissions.filter(completed_at__date=today)
-    elif period == 'week':
-        week_start = today - timezone.timedelta(days=today.weekday())
-        unpaid_commissions = unpaid_commissions.filter(completed_at__date__gte=week_start)
-    elif period == 'month':
-        month_start = today.replace(day=1)
-        unpaid_commissions = unpaid_commissions.filter(completed_at__date__gte=month_start)
-
-    # Apply employee filter
-    if employee_id:
-        unpaid_commissions = unpaid_commissions.filter(assigned_to_id=employee_id)
+    # Apply period and employee filters
+    unpaid_commissions = _filter_commissions_by_period(unpaid_commissions, period, employee_id)
 
+    # Summary covers every matching commission, the table shows the latest 200
+    totals = unpaid_commissions.aggregate(total=Sum('commission_amount'), count=Count('id'))
     unpaid_commissions = unpaid_commissions.order_by('-completed_at')[:200]
 
     # Get employees for filter
@@ -6457,10 +6300,8 @@ def bulk_commission_payment(request):
     ).order_by('employee_id')
 
     # Calculate summary statistics
-    total_pending = unpaid_commissions.count()
-    total_amount = unpaid_commissions.aggregate(
-        total=models.Sum('commission_amount')
-    )['total'] or Decimal('0')
+    total_pending = totals['count']
+    total_amount = totals['total'] or Decimal('0')
 
     context = {
         'unpaid_commissions': unpaid_commissions,
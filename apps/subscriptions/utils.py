@@ -1,93 +1,32 @@
 # subscriptions/utils.py
-import requests
 import base64
 import json
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from django.conf import settings
 from django.utils import timezone
-from django.core.cache import cache
 from .models import SubscriptionDiscount
+from apps.core.http_utils import http_post
+from apps.core.oauth_utils import get_mpesa_token, invalidate_token, mpesa_token_name
 
 logger = logging.getLogger(__name__)
 
 def get_mpesa_access_token():
-    """Get M-Pesa access token with caching"""
-    cache_key = 'mpesa_subscription_token'
-    
-    # Try cache first
+    """Get M-Pesa access token from the shared token manager"""
     try:
-        token_data = cache.get(cache_key)
-        if token_data and token_data.get('expires_at') > timezone.now():
-            return token_data['token']
-    except Exception as e:
-        logger.warning(f"Cache get failed: {e}")
-    
-    try:
-        # M-Pesa OAuth URL
-        url = f"{settings.MPESA_BASE_URL}/oauth/v1/generate?grant_type=client_credentials"
-        
-        # Create auth header
-        auth_string = f"{settings.MPESA_CONSUMER_KEY}:{settings.MPESA_CONSUMER_SECRET}"
-        auth_bytes = auth_string.encode('ascii')
-        auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
-        
-        headers = {
-            'Authorization': f'Basic {auth_b64}',
-            'Content-Type': 'application/json'
-        }
-        
-        response = requests.get(url, headers=headers, timeout=30)
-        
-        if response.status_code == 200:
-            data = response.json()
-            access_token = data['access_token']
-            expires_in = int(data.get('expires_in', 3600))
-            
-            # Cache token
-            expires_at = timezone.now() + timedelta(seconds=expires_in - 60)
-            try:
-                cache.set(cache_key, {
-                    'token': access_token,
-                    'expires_at': expires_at
-                }, expires_in - 60)
-            except Exception as e:
-                logger.warning(f"Cache set failed: {e}")
-            
-            return access_token
-        else:
-            logger.error(f"Token request failed: {response.status_code} - {response.text}")
-            
-            # Development fallback
-            if settings.DEBUG and settings.MPESA_ENVIRONMENT == 'sandbox':
-                logger.warning("Using development fallback token")
-                fallback_token = "fake_development_token"
-                try:
-                    cache.set(cache_key, {
-                        'token': fallback_token,
-                        'expires_at': timezone.now() + timedelta(minutes=5)
-                    }, 300)
-                except Exception:
-                    pass
-                return fallback_token
-            
-            return None
-            
+        return get_mpesa_token(
+            settings.MPESA_BASE_URL,
+            settings.MPESA_CONSUMER_KEY,
+            settings.MPESA_CONSUMER_SECRET,
+            'subscriptions'
+        )
     except Exception as e:
         logger.error(f"Error getting M-Pesa token: {e}")
         
         # Development fallback
         if settings.DEBUG and settings.MPESA_ENVIRONMENT == 'sandbox':
             logger.warning("Using development fallback token due to exception")
-            fallback_token = "fake_development_token"
-            try:
-                cache.set(cache_key, {
-                    'token': fallback_token,
-                    'expires_at': timezone.now() + timedelta(minutes=5)
-                }, 300)
-            except Exception:
-                pass
-            return fallback_token
+            return "fake_development_token"
         
         return None
 
@@ -138,7 +77,14 @@ def create_mpesa_payment(payment, phone_number):
             'Content-Type': 'application/json'
         }
         
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
+        response = http_post('mpesa', url, json=payload, headers=headers)
+        if response.status_code == 401:
+            # Rejected token: drop it and retry once with a fresh one
+            invalidate_token(mpesa_token_name('subscriptions'))
+            fresh_token = get_mpesa_access_token()
+            if fresh_token:
+                headers['Authorization'] = f'Bearer {fresh_token}'
+                response = http_post('mpesa', url, json=payload, headers=headers)
         
         if response.status_code == 200:
             data = response.json()
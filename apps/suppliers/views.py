@@ -14,7 +14,6 @@ from django.views.decorators.http import require_http_methods
 from django.contrib.auth.mixins import LoginRequiredMixin
 from datetime import datetime, timedelta
 import json
-import csv
 
 from apps.core.decorators import business_required, employee_required, manager_required
 from .models import (
@@ -1313,34 +1312,38 @@ def supplier_categories(request):
 @business_required
 @employee_required(['owner', 'manager'])
 def export_suppliers(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="suppliers.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
+    from apps.core.export_utils import choice_labels, export_response, iter_values
+
+    header = [
         'Supplier Code', 'Name', 'Business Name', 'Category', 'Type', 'Status',
         'Email', 'Phone', 'Total Orders', 'Total Value', 'Rating', 'Last Order Date'
-    ])
-    
-    suppliers = Supplier.objects.filter(is_deleted=False).select_related('category')
-    
-    for supplier in suppliers:
-        writer.writerow([
-            supplier.supplier_code,
-            supplier.name,
-            supplier.business_name,
-            supplier.category.name if supplier.category else '',
-            supplier.get_supplier_type_display(),
-            supplier.get_status_display(),
-            supplier.email,
-            str(supplier.phone) if supplier.phone else '',
-            supplier.total_orders,
-            supplier.total_value,
-            supplier.rating,
-            supplier.last_order_date.strftime('%Y-%m-%d') if supplier.last_order_date else '',
-        ])
-    
-    return response
+    ]
+    type_labels = choice_labels(Supplier, 'supplier_type')
+    status_labels = choice_labels(Supplier, 'status')
+    fields = [
+        'supplier_code', 'name', 'business_name', 'category__name', 'supplier_type', 'status',
+        'email', 'phone', 'total_orders', 'total_value', 'rating', 'last_order_date',
+    ]
+
+    def rows():
+        for supplier in iter_values(Supplier.objects.filter(is_deleted=False), fields, ordering=['name']):
+            last_order_date = supplier['last_order_date']
+            yield [
+                supplier['supplier_code'],
+                supplier['name'],
+                supplier['business_name'],
+                supplier['category__name'] or '',
+                type_labels.get(supplier['supplier_type'], supplier['supplier_type']),
+                status_labels.get(supplier['status'], supplier['status']),
+                supplier['email'],
+                str(supplier['phone']) if supplier['phone'] else '',
+                supplier['total_orders'],
+                supplier['total_value'],
+                supplier['rating'],
+                last_order_date.strftime('%Y-%m-%d') if last_order_date else '',
+            ]
+
+    return export_response(request, 'suppliers', header, rows(), 'Suppliers')
 
 @login_required
 @business_required
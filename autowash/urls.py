@@ -9,7 +9,7 @@ from django.views.static import serve
 import os
 
 from apps.core.views import health_check, serve_legal_document
-from apps.core.health_api import health_check as api_health_check, ping
+from apps.core.health_api import health_check as api_health_check, http_client_metrics, ping
 
 admin.site.site_header = "Autowash System Administration"
 admin.site.site_title = "System Admin"
@@ -140,6 +140,7 @@ urlpatterns = [
     
     # API endpoints
     path('api/health/', api_health_check, name='api_health_check'),
+    path('api/health/http-clients/', http_client_metrics, name='api_http_client_metrics'),
     path('api/ping/', ping, name='api_ping'),
     
     # Core app URLs (PWA, manifest, etc.)
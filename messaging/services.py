@@ -6,6 +6,7 @@ import json
 from django.conf import settings
 from django.utils import timezone
 from .models import SMSMessage, TenantSMSSettings
+from apps.core.http_utils import http_post
 import logging
 
 logger = logging.getLogger(__name__)
@@ -66,11 +67,11 @@ class HostPinnacleSMSService(BaseSMSService):
             )
             
             # Send request
-            response = requests.post(
+            response = http_post(
+                'host_pinnacle',
                 self.api_url,
                 json=payload,
-                headers={'Content-Type': 'application/json'},
-                timeout=30
+                headers={'Content-Type': 'application/json'}
             )
             
             response_data = response.json()
@@ -123,11 +124,12 @@ class HostPinnacleSMSService(BaseSMSService):
                 "message_id": message_id
             }
             
-            response = requests.post(
+            response = http_post(
+                'host_pinnacle',
                 self.status_url,
                 json=payload,
                 headers={'Content-Type': 'application/json'},
-                timeout=10
+                retry=True
             )
             
             if response.status_code == 200:
@@ -178,11 +180,11 @@ class AfricasTalkingSMSService(BaseSMSService):
             )
             
             # Send request
-            response = requests.post(
+            response = http_post(
+                'africas_talking',
                 self.api_url,
                 data=payload,
-                headers=headers,
-                timeout=30
+                headers=headers
             )
             
             response_data = response.json()
@@ -1935,6 +1935,16 @@ function preSubmissionValidation() {
 }
 
 // Form Submission
+// Idempotency key for the current order attempt; retries of the same submission reuse it
+let orderIdempotencyKey = null;
+
+function newIdempotencyKey() {
+    if (window.crypto && typeof window.crypto.randomUUID === 'function') {
+        return window.crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}${Math.random().toString(36).slice(2)}`;
+}
+
 function submitOrder() {
     // Validate that we have all required data
     if (!validateAllSteps()) {
@@ -2148,6 +2158,10 @@ function submitOrder() {
         // Log the data being sent (for debugging)
         console.log('Submitting order with data:', Object.fromEntries(formData.entries()));
         
+        if (!orderIdempotencyKey) {
+            orderIdempotencyKey = newIdempotencyKey();
+        }
+        
         // Function to make the actual request
         const makeRequest = (token) => {
             return fetch(window.location.href, {
@@ -2155,7 +2169,8 @@ function submitOrder() {
                 body: formData,
                 headers: {
                     'X-CSRFToken': token,
-                    'X-Requested-With': 'XMLHttpRequest'
+                    'X-Requested-With': 'XMLHttpRequest',
+                    'Idempotency-Key': orderIdempotencyKey
                 },
                 credentials: 'same-origin'  // Important for CSRF
             });